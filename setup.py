@@ -154,6 +154,15 @@ ttfautohint_exe = Executable(
     "ttfautohint.ttfautohint",
     cwd=os.path.join("src", "c"),
     output_dir=os.path.join("build", "local", "bin"),
+    # see src/c/Makefile
+    env={
+        # "full" (default) or "slim"
+        "BUILD_PROFILE": os.environ.get("TTFAUTOHINTPY_BUILD_PROFILE", "full"),
+        # "yes" or "no" (default)
+        "EXPERIMENTAL_PATCHES": os.environ.get(
+            "TTFAUTOHINTPY_EXPERIMENTAL_PATCHES", "no"
+        ),
+    },
 )
 
 cmdclass = {}
@@ -187,7 +196,7 @@ setup(
     zip_safe=True,
     cmdclass=cmdclass,
     setup_requires=["setuptools_scm"],
-    extras_require={"testing": ["pytest", "coverage", "fontTools"]},
+    extras_require={"testing": ["pytest", "coverage", "fontTools", "freetype-py"]},
     python_requires=">=3.9",
     classifiers=[
         "Development Status :: 5 - Production/Stable",
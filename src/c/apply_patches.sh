@@ -23,4 +23,22 @@ else
     echo "  harfbuzz patch applied successfully"
 fi
 
+cd "${SCRIPT_DIR}/ttfautohint"
+if [ "${EXPERIMENTAL_PATCHES:-no}" = "yes" ]; then
+    echo "Applying ttfautohint patch..."
+    if ! git apply --check "${TTFAUTOHINT_PATCH}" 2>/dev/null; then
+        echo "  ttfautohint patch already applied or not applicable"
+    else
+        git apply "${TTFAUTOHINT_PATCH}"
+        echo "  ttfautohint patch applied successfully"
+    fi
+elif git apply --reverse --check "${TTFAUTOHINT_PATCH}" 2>/dev/null; then
+    # applied by a previous build with EXPERIMENTAL_PATCHES=yes
+    echo "Reverting ttfautohint patch..."
+    git apply --reverse "${TTFAUTOHINT_PATCH}"
+    echo "  ttfautohint patch reverted"
+else
+    echo "Skipping ttfautohint patch (EXPERIMENTAL_PATCHES=yes to apply it)"
+fi
+
 echo "All patches processed."
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Compare the size and the exec-to-exit latency of ttfautohint executables.
+
+Each executable is spawned `--runs` times with `--version` (start-up and
+exit only) and to hint a few tiny fonts, which are subset from the test font
+with fontTools unless fonts are given with `--font`. The runs of the
+executables are interleaved, so that they are affected alike by changes of
+load on the machine.
+
+Typical use, comparing the default and the slim build profiles:
+
+    make -C src/c && cp build/local/bin/ttfautohint /tmp/ttfautohint-full
+    make -C src/c clean && make -C src/c BUILD_PROFILE=slim
+    python src/c/benchmark.py /tmp/ttfautohint-full build/local/bin/ttfautohint
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TEST_FONT = os.path.join(ROOT, "tests", "data", "NotoSansMono-Regular.ttf")
+# the glyphs of each generated tiny font; 'o' is the standard character of
+# the latin script
+TINY_TEXTS = (
+    "o",
+    "Hamburgefonstiv",
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz",
+)
+
+
+def tiny_fonts(directory):
+    try:
+        from fontTools import subset
+        from fontTools.ttLib import TTFont
+    except ImportError:
+        sys.exit("error: fontTools is required to generate tiny fonts; use --font")
+    paths = []
+    for i, text in enumerate(TINY_TEXTS):
+        font = TTFont(TEST_FONT)
+        options = subset.Options()
+        options.layout_features = []
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(text=text)
+        subsetter.subset(font)
+        path = os.path.join(directory, f"tiny{i}.ttf")
+        font.save(path)
+        paths.append(path)
+    return paths
+
+
+def run(args, data):
+    start = time.perf_counter()
+    subprocess.run(args, input=data, stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def summarize(times):
+    times = sorted(times)
+    return {
+        "min_ms": times[0] * 1000,
+        "median_ms": statistics.median(times) * 1000,
+        "p90_ms": times[int(0.9 * (len(times) - 1))] * 1000,
+    }
+
+
+def benchmark(executables, fonts, runs):
+    cases = [("--version", ["--version"], None)]
+    for path in fonts:
+        with open(path, "rb") as f:
+            cases.append((os.path.basename(path), [], f.read()))
+    times = {(exe, name): [] for exe in executables for name, _, _ in cases}
+    for name, args, data in cases:
+        # warm up the page cache
+        for exe in executables:
+            run([exe] + args, data)
+        for _ in range(runs):
+            for exe in executables:
+                times[exe, name].append(run([exe] + args, data))
+    return [
+        {
+            "executable": exe,
+            "size": os.path.getsize(exe),
+            "cases": {name: summarize(times[exe, name]) for name, _, _ in cases},
+        }
+        for exe in executables
+    ]
+
+
+def print_report(results, file=sys.stdout):
+    names = list(results[0]["cases"])
+    width = max(len(r["executable"]) for r in results)
+    print(f"{'executable':<{width}}  {'size':>12}", file=file)
+    for r in results:
+        print(f"{r['executable']:<{width}}  {r['size']:>12,}", file=file)
+    print(file=file)
+    print("median (min) exec-to-exit latency, ms", file=file)
+    print(
+        f"{'case':<20}" + "".join(f"  {i:>16}" for i in range(len(results))), file=file
+    )
+    for name in names:
+        cells = "".join(
+            "  {median_ms:>8.2f} ({min_ms:>5.2f})".format(**r["cases"][name])
+            for r in results
+        )
+        print(f"{name:<20}{cells}", file=file)
+    if len(results) > 1:
+        base = results[0]
+        print(file=file)
+        for i, r in enumerate(results[1:], 1):
+            size = r["size"] / base["size"] - 1
+            latency = statistics.mean(
+                r["cases"][n]["median_ms"] / base["cases"][n]["median_ms"] - 1
+                for n in names
+            )
+            print(
+                f"{i} vs 0: size {size:+.1%}, median latency {latency:+.1%}",
+                file=file,
+            )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("executables", nargs="+", help="the executables to compare")
+    parser.add_argument(
+        "--font",
+        dest="fonts",
+        action="append",
+        help="hint this font (can be repeated; default: tiny generated fonts)",
+    )
+    parser.add_argument(
+        "-n", "--runs", type=int, default=50, help="default: %(default)s"
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON results")
+    options = parser.parse_args(args)
+
+    executables = [os.path.abspath(exe) for exe in options.executables]
+    with tempfile.TemporaryDirectory() as directory:
+        fonts = options.fonts or tiny_fonts(directory)
+        results = benchmark(executables, fonts, options.runs)
+    if options.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+/*
+ * HarfBuzz configuration for the slim build profile (`make
+ * BUILD_PROFILE=slim'), included by `hb-config.hh' when HarfBuzz is
+ * compiled with `-DHAVE_CONFIG_OVERRIDE_H -I<this directory>'.
+ *
+ * This is HarfBuzz's HB_LEAN set, minus the features ttfautohint needs:
+ * it shapes TrueType fonts through `hb-ft', and collects the glyphs of
+ * GSUB lookups with `hb_ot_layout_lookup_collect_glyphs' (disabled by
+ * HB_NO_LAYOUT_COLLECT_GLYPHS) to find the glyphs covered by each feature.
+ * See `CONFIG.md' in HarfBuzz's sources.
+ */
+
+#define HB_DISABLE_DEPRECATED
+#define HB_NDEBUG
+#define HB_NO_ATEXIT
+#define HB_NO_BUFFER_MESSAGE
+#define HB_NO_BUFFER_SERIALIZE
+#define HB_NO_BUFFER_VERIFY
+#define HB_NO_BITMAP
+#define HB_NO_CFF
+#define HB_NO_COLOR
+#define HB_NO_DRAW
+#define HB_NO_ERRNO
+#define HB_NO_FACE_COLLECT_UNICODES
+#define HB_NO_GETENV
+#define HB_NO_HINTING
+#define HB_NO_LANGUAGE_LONG
+#define HB_NO_LANGUAGE_PRIVATE_SUBTAG
+#define HB_NO_LAYOUT_FEATURE_PARAMS
+#define HB_NO_LAYOUT_RARELY_USED
+#define HB_NO_LAYOUT_UNUSED
+#define HB_NO_MATH
+#define HB_NO_META
+#define HB_NO_METRICS
+#define HB_NO_MMAP
+#define HB_NO_NAME
+#define HB_NO_OPEN
+#define HB_NO_OT_FONT_GLYPH_NAMES
+#define HB_NO_OT_SHAPE_FRACTIONS
+#define HB_NO_PAINT
+#define HB_NO_SETLOCALE
+#define HB_NO_STYLE
+#define HB_NO_SUBSET_LAYOUT
+#define HB_NO_VERTICAL
+#define HB_NO_VAR
+
+/* ttfautohint doesn't support AAT layout tables */
+#define HB_NO_AAT
@@ -1,18 +1,54 @@
+"""Python wrapper for the 'ttfautohint' executable.
+
+Thread safety: `ttfautohint()`, `run()` and `ttfautohint_ttfont()` can be
+called from any number of threads at once, also on free-threaded builds of
+Python, as long as each call has its own streams and TTFont. The bundled
+executable is located (or extracted) once per process, under a lock. Each
+call owns the temporary files it creates for a `control_buffer` or a
+`reference_buffer`, and removes them before returning, whether or not it
+succeeds. Hinter, RetryPolicy, ResultCache, AnalysisCache and metrics.Registry
+objects can be shared by threads; a Hinter must not be closed while other
+threads use it.
+"""
 import atexit
 import io
 import os
+import re
+import shutil
 import stat
 import subprocess
 import sys
+import threading
 from contextlib import ExitStack
 from importlib.resources import as_file, files, is_resource
 
 from ttfautohint._version import __version__
+from ttfautohint import metrics as _metrics
+from ttfautohint._exe_cache import cached_executable
+from ttfautohint._pipeline import HintingConfig, Pipeline
+from ttfautohint._utils import seekable
 from ttfautohint.errors import TAError
-from ttfautohint.options import validate_options, format_kwargs, StemWidthMode
-
-
-__all__ = ["__version__", "ttfautohint", "TAError", "StemWidthMode", "run"]
+from ttfautohint.options import validate_options, StemWidthMode
+from ttfautohint.hinter import Hinter
+from ttfautohint.retry import RetryPolicy
+from ttfautohint.cache import ResultCache
+from ttfautohint.analysis import AnalysisCache
+from ttfautohint.ttfont import ttfautohint_ttfont
+
+
+__all__ = [
+    "__version__",
+    "ttfautohint",
+    "ttfautohint_ttfont",
+    "TAError",
+    "StemWidthMode",
+    "run",
+    "Hinter",
+    "HintingConfig",
+    "RetryPolicy",
+    "ResultCache",
+    "AnalysisCache",
+]
 
 
 # clean up resources on exit
@@ -23,29 +59,78 @@ _exe_basename = "ttfautohint"
 if sys.platform == "win32":
     _exe_basename += ".exe"
 _exe_full_path = None
+_exe_lock = threading.Lock()
+# the long options accepted by each executable, by path
+_exe_options = {}
+
+
+def _extract_executable(resource):
+    # e.g. from a zip file: reuse the copy installed in the user's cache by
+    # a previous process, or else extract it to a temporary file
+    try:
+        return cached_executable(resource, _exe_basename)
+    except OSError:
+        return str(_exit_stack.enter_context(as_file(resource)))
+
+
+def _find_executable():
+    if is_resource(__name__, _exe_basename):
+        resource = files(__name__).joinpath(_exe_basename)
+        if isinstance(resource, os.PathLike):
+            # installed as a regular file
+            path = os.fspath(resource)
+        else:
+            path = _extract_executable(resource)
+        if not os.access(path, os.X_OK):
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        return path
+    path = shutil.which(_exe_basename)
+    if path is None:
+        # the shell's exit status for commands that are not found
+        raise TAError(127, "ttfautohint executable not found on $PATH")
+    return path
 
 
 def _executable_path() -> str:
     global _exe_full_path
 
-    if _exe_full_path is None:
-        if is_resource(__name__, _exe_basename):
-            _exe_full_path = str(
-                _exit_stack.enter_context(
-                    as_file(files(__name__).joinpath(_exe_basename))
-                )
-            )
-            # need to chmod +x in case it was extracted from a zip
-            if not os.access(_exe_full_path, os.X_OK):
-                os.chmod(_exe_full_path, os.stat(_exe_full_path).st_mode | stat.S_IEXEC)
-        else:
-            import shutil
-
-            _exe_full_path = shutil.which(_exe_basename)
+    path = _exe_full_path
+    if path is None:
+        with _exe_lock:
+            # only publish the path once the executable is ready to run
             if _exe_full_path is None:
-                raise TAError("ttfautohint executable not found on $PATH")
+                _exe_full_path = _find_executable()
+            path = _exe_full_path
+    return path
+
 
-    return _exe_full_path
+def _executable_options() -> frozenset:
+    """Return the names of the long options accepted by the executable (e.g.
+    "profile-fd"), as listed by its --help, to detect the optional features
+    of a patched build. The executable is only asked once.
+    """
+    path = _executable_path()
+    options = _exe_options.get(path)
+    if options is None:
+        with _exe_lock:
+            options = _exe_options.get(path)
+            if options is None:
+                try:
+                    result = subprocess.run(
+                        [path, "--help"],
+                        stdin=subprocess.DEVNULL,
+                        capture_output=True,
+                        timeout=60,
+                    )
+                    help_text = result.stdout if result.returncode == 0 else b""
+                except (OSError, subprocess.SubprocessError):
+                    help_text = b""
+                options = frozenset(
+                    name.decode("ascii")
+                    for name in re.findall(rb"--([a-z][a-z0-9-]*)", help_text)
+                )
+                _exe_options[path] = options
+    return options
 
 
 def run(args, **kwargs):
@@ -60,51 +145,80 @@ def run(args, **kwargs):
         subprocess.CompletedProcess object with the following attributes:
         args, returncode, stdout, stderr.
     """
-    return subprocess.run([_executable_path()] + list(args), **kwargs)
+    with _metrics.observe_process() as observation:
+        result = subprocess.run([_executable_path()] + list(args), **kwargs)
+        observation.returncode = result.returncode
+    return result
+
+
+def _tell(f):
+    if f is None or not seekable(f):
+        return None
+    return f.tell()
+
+
+def _input_size(in_file, in_buffer):
+    # number of bytes of input, or None if unknown
+    if in_file is None:
+        return len(in_buffer)
+    position = _tell(in_file)
+    if position is None:
+        return None
+    try:
+        st = os.fstat(in_file.fileno())
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pass
+    else:
+        return st.st_size - position if stat.S_ISREG(st.st_mode) else None
+    try:
+        return len(in_file.getbuffer()) - position
+    except (AttributeError, ValueError):
+        return None
 
 
 # TODO: add docstring
 def ttfautohint(**kwargs):
-    options = validate_options(kwargs)
-
+    # the temporary files of this call, removed whatever happens
+    tempfiles = []
+    options = validate_options(kwargs, tempfiles)
+    in_file = options.pop("in_file")
     in_buffer = options.pop("in_buffer")
     out_file = options.pop("out_file")
+    # the input was checked by validate_options
+    with Pipeline(options, tempfiles) as pipeline:
+        return _ttfautohint(pipeline, in_file, in_buffer, out_file)
+
 
-    capture_output = True
+def _ttfautohint(pipeline, in_file, in_buffer, out_file):
     stdout = None
+    sink = None
     should_close_stdout = False
     if out_file is not None:
         if isinstance(out_file, (str, bytes, os.PathLike)):
-            stdout, out_file = open(out_file, "w"), None
+            stdout = open(out_file, "wb")
             should_close_stdout = True
-            capture_output = False
         else:
             try:
                 out_file.fileno()
-            except io.UnsupportedOperation:
-                if not out_file.writable():
+            except (AttributeError, io.UnsupportedOperation):
+                writable = getattr(out_file, "writable", lambda: True)
+                if not hasattr(out_file, "write") or not writable():
                     raise TypeError(f"{out_file} is not writable")
+                # stream the output in chunks, rather than holding it all
+                sink = out_file
             else:
-                stdout, out_file = out_file, None
-                capture_output = False
-
-    args = format_kwargs(**options)
-
-    result = run(
-        args,
-        input=in_buffer,
-        capture_output=capture_output,
-        stdout=stdout,
-    )
-    if result.returncode != 0:
-        raise TAError(result.returncode, result.stderr)
-
-    output_data = result.stdout
-
-    if output_data and out_file is not None:
-        out_file.write(output_data)
-
-    if stdout is not None and should_close_stdout:
-        stdout.close()
-
-    return output_data
+                stdout = out_file
+
+    out = stdout if stdout is not None else sink
+    out_start = _tell(out)
+    with _metrics.observe_call(_input_size(in_file, in_buffer)) as observation:
+        try:
+            result = pipeline.run(in_file, in_buffer, stdout, sink)
+            if result is not None:
+                observation.out_size = len(result)
+            elif out_start is not None:
+                observation.out_size = _tell(out) - out_start
+        finally:
+            if should_close_stdout:
+                stdout.close()
+    return result
@@ -1,11 +1,5 @@
 import sys
-from ttfautohint import run
-
-
-def main(args=None):
-    if args is None:
-        args = sys.argv[1:]
-    return run(args).returncode
+from ttfautohint.cli import main
 
 
 if __name__ == "__main__":
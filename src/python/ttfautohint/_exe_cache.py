@@ -0,0 +1,159 @@
+"""Persistent per-user cache of the bundled executable.
+
+When the package is imported from a zip file (it is zip_safe), the
+executable must be extracted before it can be run. Rather than extracting
+it to a new temporary file in every process, `cached_executable` installs
+it once in a per-user cache directory, under a name derived from its
+content, so that later processes (and other installs of the same version)
+find it there. Installation is atomic and serialized across processes with
+a lock file, and versions that were not used for `MAX_AGE` seconds are
+removed when a new one is installed.
+
+The cache directory is $TTFAUTOHINT_CACHE_DIR if set, else "ttfautohint/bin"
+in the user's cache directory.
+"""
+import hashlib
+import os
+import stat
+import sys
+import tempfile
+import time
+import zipfile
+from contextlib import contextmanager
+
+from ttfautohint._utils import user_cache_dir
+
+
+CACHE_DIR_ENV = "TTFAUTOHINT_CACHE_DIR"
+# versions not used for this many seconds are removed
+MAX_AGE = 30 * 24 * 3600
+# the modification time of a cached executable is refreshed when used, at
+# most this often
+TOUCH_INTERVAL = 24 * 3600
+# temporary files older than this were left by a crashed process
+STALE_TMP_AGE = 3600
+
+
+def cache_dir():
+    return os.environ.get(CACHE_DIR_ENV) or os.path.join(user_cache_dir(), "bin")
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on the file at `path` (created if missing),
+    shared by all processes.
+    """
+    with open(path, "a+b") as f:
+        if sys.platform == "win32":
+            import msvcrt
+
+            while True:
+                try:
+                    # retries for 10 seconds before failing
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _resource_key(resource):
+    # Return (key, size, data) identifying the content of the `resource`.
+    # The CRC-32 and size of a zip member are read from the archive's
+    # directory, so that cached executables are found without decompressing
+    # them; other resources are hashed, and their `data` returned.
+    if isinstance(resource, zipfile.Path):
+        info = resource.root.getinfo(resource.at)
+        return "%08x%x" % (info.CRC, info.file_size), info.file_size, None
+    data = resource.read_bytes()
+    return hashlib.sha256(data).hexdigest()[:32], len(data), data
+
+
+def _is_installed(path, size):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return st.st_size == size and os.access(path, os.X_OK)
+
+
+def _touch(path, now):
+    try:
+        if now - os.stat(path).st_mtime > TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:
+        pass
+
+
+def _collect_garbage(directory, prefix, suffix, keep, max_age, now):
+    for entry in os.scandir(directory):
+        name = entry.name
+        if entry.path == keep:
+            continue
+        if name.startswith(prefix) and name.endswith(suffix):
+            age = max_age
+        elif name.startswith("." + prefix) and name.endswith(".tmp"):
+            age = STALE_TMP_AGE
+        else:
+            continue
+        try:
+            if now - entry.stat().st_mtime > age:
+                # fails on Windows if another process is running it
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def cached_executable(resource, basename, directory=None, max_age=MAX_AGE):
+    """Return the path of an executable copy of `resource` (an
+    importlib.resources Traversable) in the cache `directory` (default:
+    `cache_dir()`), installing it first if needed.
+
+    Raise OSError if the directory isn't writable.
+    """
+    directory = directory or cache_dir()
+    key, size, data = _resource_key(resource)
+    stem, ext = os.path.splitext(basename)
+    path = os.path.join(directory, f"{stem}-{key}{ext}")
+    now = time.time()
+    if _is_installed(path, size):
+        _touch(path, now)
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    with file_lock(os.path.join(directory, ".lock")):
+        # another process may have installed it in the meantime
+        if _is_installed(path, size):
+            return path
+        if data is None:
+            data = resource.read_bytes()
+        fd, tmp = tempfile.mkstemp(
+            dir=directory, prefix="." + stem + "-", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp, stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        _collect_garbage(directory, stem + "-", ext, path, max_age, now)
+    return path
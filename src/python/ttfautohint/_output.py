@@ -0,0 +1,29 @@
+"""Post-processing of the hinted font data by the Python wrapper."""
+from ttfautohint.options import WRAPPER_OPTIONS
+
+
+# wrapper options that transform the output of the 'ttfautohint' executable
+POSTPROCESS_OPTIONS = ("optimize", "out_format")
+
+
+def pop_postprocess_options(opts):
+    """Remove the post-processing options from the validated `opts` dict, and
+    return them as a dict; or None if they are all set to their defaults,
+    meaning that the output is used as is.
+    """
+    options = {name: opts.pop(name) for name in POSTPROCESS_OPTIONS}
+    if all(options[name] == WRAPPER_OPTIONS[name] for name in options):
+        return None
+    return options
+
+
+def postprocess(data, optimize=False, out_format="sfnt"):
+    if optimize:
+        from ttfautohint.optimize import optimize_font
+
+        data = optimize_font(data)
+    if out_format == "woff":
+        from ttfautohint._woff import encode_woff
+
+        data = encode_woff(data)
+    return data
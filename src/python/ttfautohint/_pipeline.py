@@ -0,0 +1,438 @@
+"""The steps of hinting a font, shared by `ttfautohint()` and Hinter.
+
+A Pipeline is built once from a set of validated options: control
+instructions are checked and written in canonical form to a temporary file,
+and the options are converted to command-line arguments. `Pipeline.run`
+then hints each font:
+
+    preflight -> result cache lookup -> retry (strip tables -> executable,
+    with the analysis cache and profile -> splice tables -> postprocess)
+    -> result cache store
+
+The temporary files of a Pipeline (those created by `validate_options` and
+its own) are removed by `close()`, when it is garbage-collected, or at exit.
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import weakref
+
+import ttfautohint
+from ttfautohint import metrics as _metrics
+from ttfautohint._output import pop_postprocess_options, postprocess
+from ttfautohint._stream import pump
+from ttfautohint._strip import MIN_STRIP_SIZE, splice_tables, strip_tables
+from ttfautohint._strip import strippable_size
+from ttfautohint._utils import seekable as _seekable
+from ttfautohint._utils import sha256_hexdigest
+from ttfautohint.analysis import analysis_keys
+from ttfautohint.cache import executable_digest, result_key
+from ttfautohint.control import _compile, _uses_glyph_names, parse_control
+from ttfautohint.errors import make_error
+from ttfautohint.options import check_out_format, format_kwargs
+from ttfautohint.preflight import preflight, preflight_stream
+from ttfautohint.profile import Profile, profile_args, split_profile
+
+
+def _stream_digest(f):
+    # digest of the rest of the seekable stream `f`, which is rewound
+    h = hashlib.sha256()
+    start = f.tell()
+    for chunk in iter(lambda: f.read(1 << 16), b""):
+        h.update(chunk)
+    f.seek(start)
+    return h.hexdigest()
+
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return _stream_digest(f)
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _write_output(data, stdout, sink):
+    # write `data` to the `stdout` file or the `sink` file object, or else
+    # return it
+    if stdout is not None:
+        getattr(stdout, "buffer", stdout).write(data)
+    elif sink is not None:
+        sink.write(data)
+    else:
+        return data
+
+
+class HintingConfig(object):
+    """Immutable, hashable set of validated ttfautohint options.
+
+    Control instructions and reference font are identified by the digest of
+    their content rather than by their file name, so two configs compare
+    equal (and have the same `key`) whenever they would produce the same
+    output for the same input font.
+    """
+
+    __slots__ = ("options", "control_digest", "reference_digest", "args", "key")
+
+    def __init__(self, options, control_digest=None, reference_digest=None, args=()):
+        items = []
+        for name, value in sorted(options.items()):
+            if isinstance(value, int) and not isinstance(value, bool):
+                value = int(value)  # StemWidthMode -> int
+            items.append((name, value))
+        spec = [items, control_digest, reference_digest]
+        if args:
+            # additional command-line arguments
+            spec.append(list(args))
+        key = hashlib.sha256(
+            json.dumps(spec, separators=(",", ":")).encode("utf-8")
+        ).hexdigest()
+        object.__setattr__(self, "options", tuple(items))
+        object.__setattr__(self, "control_digest", control_digest)
+        object.__setattr__(self, "reference_digest", reference_digest)
+        object.__setattr__(self, "args", tuple(args))
+        object.__setattr__(self, "key", key)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, HintingConfig):
+            return NotImplemented
+        return self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(key={self.key[:12]!r})"
+
+    def as_dict(self):
+        return dict(self.options)
+
+
+class Pipeline(object):
+    """Hint fonts with the validated `options` (the result of
+    `validate_options`, without the input and output ones), taking ownership
+    of the `tempfiles` list it was given. Fonts are checked before running
+    the executable if `preflight` is true. `args` are additional
+    command-line arguments passed on to the executable.
+    """
+
+    def __init__(self, options, tempfiles, preflight=False, args=()):
+        self._tempfiles = tempfiles
+        self._finalizer = weakref.finalize(self, _remove_files, tempfiles)
+        try:
+            self._configure(dict(options), preflight, list(args))
+        except BaseException:
+            self.close()
+            raise
+
+    def _configure(self, opts, preflight, args):
+        self.retry = opts.pop("retry")
+        self.cache = opts.pop("cache")
+        self.profile = opts.pop("profile")
+        self.analysis_cache = opts.pop("analysis_cache")
+        self.strip_tables = opts.pop("strip_tables")
+        self.preflight = preflight
+        self._ignore_restrictions = opts["ignore_restrictions"]
+        self._postprocess_options = pop_postprocess_options(dict(opts))
+
+        control_file = opts.pop("control_file", None)
+        control_digest = None
+        if control_file is not None:
+            control_file, control_digest = self._compile_control(control_file)
+        reference_file = opts.pop("reference_file", None)
+        # the arguments identifying the results in the caches, without the
+        # names of temporary files
+        self._cache_args = format_kwargs(**opts) + args
+        self.config = HintingConfig(
+            opts,
+            control_digest=control_digest,
+            reference_digest=reference_file and _file_digest(reference_file),
+            args=args,
+        )
+        self.args = (
+            format_kwargs(
+                control_file=control_file, reference_file=reference_file, **opts
+            )
+            + args
+        )
+        # fail early if the executable can't be found
+        ttfautohint._executable_path()
+        supported = frozenset()
+        if self.profile is not None or self.analysis_cache is not None:
+            supported = ttfautohint._executable_options()
+        # executables built without the profiling patch are timed from here
+        self._profile_records = self.profile is not None and "profile-fd" in supported
+        if self._profile_records:
+            self.args += profile_args()
+        if not {"analysis-in", "analysis-out"} <= supported:
+            # the executable always analyzes the whole font
+            self.analysis_cache = None
+
+    def _compile_control(self, control_file):
+        # check the control instructions now rather than after the executable
+        # has loaded the font, and store them in canonical form so that
+        # equivalent instructions produce the same config key
+        user_file = control_file not in self._tempfiles
+        with open(control_file, "rb") as f:
+            entries = parse_control(f, filename=control_file if user_file else None)
+        data = _compile(entries).encode("utf-8")
+        if _uses_glyph_names(entries):
+            # the executable resolves the names against each font: give it
+            # the instructions as written, so that its errors point at the
+            # lines of the original file
+            return control_file, sha256_hexdigest(data)
+        if not user_file:
+            self._tempfiles.remove(control_file)
+            _remove_files([control_file])
+        with tempfile.NamedTemporaryFile(suffix=".txt", delete=False) as tmp:
+            tmp.write(data)
+        self._tempfiles.append(tmp.name)
+        return tmp.name, sha256_hexdigest(data)
+
+    @property
+    def closed(self):
+        return not self._finalizer.alive
+
+    def close(self):
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def _failure_key(self, input_digest):
+        return self.config.key + ":" + input_digest
+
+    def _result_key(self, input_digest):
+        return result_key(
+            self._cache_args,
+            input_digest,
+            control_digest=self.config.control_digest,
+            reference_digest=self.config.reference_digest,
+            executable=executable_digest(ttfautohint._executable_path()),
+            postprocess=self._postprocess_options,
+        )
+
+    def _analysis_keys(self, input_digest):
+        return analysis_keys(
+            self._cache_args,
+            input_digest,
+            control_digest=self.config.control_digest,
+            reference_digest=self.config.reference_digest,
+            executable=executable_digest(ttfautohint._executable_path()),
+        )
+
+    def _postprocess(self, data):
+        if self._postprocess_options is None:
+            return data
+        return postprocess(data, **self._postprocess_options)
+
+    def run(
+        self,
+        in_file=None,
+        in_buffer=None,
+        stdout=None,
+        sink=None,
+        timeout=None,
+        usage=None,
+    ):
+        """Hint the font read from the `in_file` binary stream or contained
+        in the `in_buffer` bytes, writing the result to the `stdout` file or
+        to the `sink` file object, or else returning it.
+
+        If `timeout` (in seconds) expires, the 'ttfautohint' process is
+        killed and subprocess.TimeoutExpired is raised. `usage` is called
+        with the resource usage of each successful run of the executable
+        (see `ttfautohint._stream.pump`).
+        """
+        if self.closed:
+            raise ValueError(f"{type(self).__name__} is closed")
+        if in_file is not None:
+            in_file, in_buffer = self._prepare_stream(in_file)
+        elif self.preflight:
+            in_buffer = preflight(in_buffer, self._ignore_restrictions)
+        if self._postprocess_options is not None:
+            check_out_format(
+                self._postprocess_options["out_format"], in_file, in_buffer
+            )
+        input_digest = None
+        if (
+            self.cache is not None
+            or self.analysis_cache is not None
+            or (self.retry is not None and self.retry.memoize)
+        ):
+            if in_file is not None:
+                input_digest = _stream_digest(in_file)
+            else:
+                input_digest = sha256_hexdigest(in_buffer)
+        if self.cache is None:
+            return self._run_with_retry(
+                in_file, in_buffer, input_digest, stdout, sink, timeout, usage
+            )
+        key = self._result_key(input_digest)
+        output_data = self.cache.get(key)
+        if output_data is None:
+            output_data = self._run_with_retry(
+                None, in_buffer, input_digest, None, None, timeout, usage
+            )
+            self.cache.put(key, output_data)
+        return _write_output(output_data, stdout, sink)
+
+    def _prepare_stream(self, in_file):
+        # return (in_file, None) to stream the input to the executable, or
+        # (None, data) when it is needed in memory
+        if not _seekable(in_file):
+            if (
+                self.cache is None
+                and self.analysis_cache is None
+                and self.retry is None
+            ):
+                # neither checked nor stripped
+                return in_file, None
+            # the input stream can't be hashed or rewound to retry
+            data = in_file.read()
+        else:
+            if self.preflight:
+                # WOFF2 fonts are unwrapped in memory
+                data = preflight_stream(in_file, self._ignore_restrictions)
+                if data is not None:
+                    return None, data
+            in_memory = self.cache is not None
+            if not in_memory and self.strip_tables:
+                start = in_file.tell()
+                in_memory = strippable_size(in_file) >= MIN_STRIP_SIZE
+                in_file.seek(start)
+            if not in_memory:
+                return in_file, None
+            # already checked
+            return None, in_file.read()
+        if self.preflight:
+            data = preflight(data, self._ignore_restrictions)
+        return None, data
+
+    def _run_with_retry(
+        self, in_file, in_buffer, input_digest, stdout, sink, timeout, usage
+    ):
+        if self.retry is None:
+            return self._run_once(
+                in_file, in_buffer, input_digest, stdout, sink, timeout, usage
+            )
+        key = None
+        if self.retry.memoize:
+            key = self._failure_key(input_digest)
+
+        out = stdout if stdout is not None else sink
+        spool = None
+        if out is not None and not _seekable(out):
+            # write the output of each attempt to a temporary file, which is
+            # copied to the unseekable output once hinting succeeded
+            spool = tempfile.TemporaryFile()
+            stdout, sink = spool, None
+        positions = [(f, f.tell()) for f in (in_file, stdout, sink) if f is not None]
+
+        def rewind():
+            for f, position in positions:
+                f.seek(position)
+                if f is not in_file:
+                    f.truncate()
+
+        try:
+            result = self.retry.call(
+                self._run_once,
+                in_file,
+                in_buffer,
+                input_digest,
+                stdout,
+                sink,
+                timeout,
+                usage,
+                key=key,
+                before_retry=rewind,
+            )
+            if spool is not None:
+                spool.seek(0)
+                shutil.copyfileobj(spool, getattr(out, "buffer", out))
+            return result
+        finally:
+            if spool is not None:
+                spool.close()
+
+    def _run_once(self, in_file, in_buffer, input_digest, stdout, sink, timeout, usage):
+        stripped = None
+        if self.strip_tables and in_buffer is not None:
+            in_buffer, stripped = strip_tables(in_buffer)
+        source = in_file if in_file is not None else in_buffer
+        if self._postprocess_options is None and stripped is None:
+            return self._execute(source, input_digest, stdout, sink, timeout, usage)
+        output_data = self._execute(source, input_digest, timeout=timeout, usage=usage)
+        output_data = self._postprocess(splice_tables(output_data, stripped))
+        return _write_output(output_data, stdout, sink)
+
+    def _execute(
+        self, source, input_digest, stdout=None, sink=None, timeout=None, usage=None
+    ):
+        if self.analysis_cache is not None and input_digest is not None:
+            keys = self._analysis_keys(input_digest)
+            with self.analysis_cache.session(keys) as analysis_args:
+                return self._spawn(
+                    self.args + analysis_args, source, stdout, sink, timeout, usage
+                )
+        return self._spawn(self.args, source, stdout, sink, timeout, usage)
+
+    def _spawn(self, args, source, stdout, sink, timeout, usage):
+        # run the executable once, streaming the input from the `source`
+        # bytes or file object
+        rusage = None
+        start = time.perf_counter()
+        if timeout is not None:
+            # subprocess.run kills the process when the timeout expires
+            result = ttfautohint.run(
+                args,
+                input=source if isinstance(source, bytes) else source.read(),
+                capture_output=True,
+                timeout=timeout,
+            )
+            returncode, stderr = result.returncode, result.stderr
+            output_data = result.stdout
+        else:
+            collect = io.BytesIO() if stdout is None and sink is None else None
+            with _metrics.observe_process() as observation:
+                returncode, stderr, rusage = pump(
+                    [ttfautohint._executable_path()] + args,
+                    source,
+                    sink=collect if collect is not None else sink,
+                    stdout=stdout,
+                )
+                observation.returncode = returncode
+            output_data = collect.getvalue() if collect is not None else None
+        timings = None
+        if self._profile_records:
+            timings, stderr = split_profile(stderr)
+        elif self.profile is not None:
+            timings = Profile(total_seconds=time.perf_counter() - start)
+        if returncode != 0:
+            raise make_error(returncode, stderr)
+        if timings is not None:
+            self.profile(timings)
+        if usage is not None:
+            usage(rusage)
+        if timeout is not None:
+            return _write_output(output_data, stdout, sink)
+        return output_data
@@ -0,0 +1,183 @@
+"""Minimal reader for the sfnt (TrueType/OpenType) table directory, and
+writer for sfnt fonts made of raw tables.
+
+This only looks at the headers, so it is cheap enough to be called on every
+font, without depending on fontTools.
+"""
+import io
+import struct
+from collections import namedtuple
+
+
+SFNT_HEADER = struct.Struct(">4sHHHH")
+TABLE_RECORD = struct.Struct(">4sLLL")
+TTC_HEADER = struct.Struct(">4sLL")
+
+TableRecord = namedtuple("TableRecord", "tag checksum offset length")
+
+# offset of the checkSumAdjustment field in the `head' table
+HEAD_CHECKSUM_ADJUSTMENT_OFFSET = 8
+CHECKSUM_MAGIC = 0xB1B0AFBA
+
+
+class SFNTError(ValueError):
+    pass
+
+
+def _unpack(fmt, data, offset, what):
+    if offset + fmt.size > len(data):
+        raise SFNTError(f"truncated {what}")
+    return fmt.unpack_from(data, offset)
+
+
+def reader(font):
+    """Return (read, size, close) for `font` (a path, bytes or a seekable
+    binary file object): `read(offset, length)` returns the bytes at
+    `offset` (relative to the current position of a file object), `size` is
+    the total size, and `close()` closes the file opened for a path.
+    """
+    if isinstance(font, (bytes, bytearray, memoryview)):
+        view = memoryview(font)
+        return (
+            (lambda offset, size: bytes(view[offset : offset + size])),
+            len(view),
+            (lambda: None),
+        )
+    if hasattr(font, "read"):
+        f, close = font, lambda: None
+    else:
+        f = open(font, "rb")
+        close = f.close
+    start = f.tell()
+    size = f.seek(0, io.SEEK_END) - start
+
+    def read(offset, length):
+        f.seek(start + offset)
+        return f.read(length)
+
+    return read, size, close
+
+
+def read_struct(fmt, read, offset, what):
+    """Unpack `fmt` at `offset` with a `read` function returned by
+    `reader`."""
+    data = read(offset, fmt.size)
+    if len(data) < fmt.size:
+        raise SFNTError(f"truncated {what}")
+    return fmt.unpack(data)
+
+
+def font_offsets(data):
+    """Return the offsets of the table directories of the fonts in `data`:
+    one for a single font, or one per subfont for a TrueType collection.
+    """
+    if data[:4] != b"ttcf":
+        return [0]
+    _, _, num_fonts = _unpack(TTC_HEADER, data, 0, "TTC header")
+    fmt = struct.Struct(">%dL" % num_fonts)
+    return list(_unpack(fmt, data, TTC_HEADER.size, "TTC header"))
+
+
+def read_table_directory(data, offset=0):
+    """Return (sfnt_version, [TableRecord, ...]) for the font whose table
+    directory starts at `offset`. Table records are checked to lie within
+    the data.
+    """
+    sfnt_version, num_tables, _, _, _ = _unpack(
+        SFNT_HEADER, data, offset, "sfnt header"
+    )
+    records = []
+    pos = offset + SFNT_HEADER.size
+    for _ in range(num_tables):
+        tag, checksum, table_offset, length = _unpack(
+            TABLE_RECORD, data, pos, "table directory"
+        )
+        if table_offset + length > len(data):
+            raise SFNTError(f"table {tag.decode('latin-1')!r} extends past end of data")
+        records.append(
+            TableRecord(tag.decode("latin-1"), checksum, table_offset, length)
+        )
+        pos += TABLE_RECORD.size
+    return sfnt_version, records
+
+
+def table_sizes(data):
+    """Return a dict mapping table tags to their size in bytes. For
+    collections, sizes are summed over all subfonts, counting tables that
+    are shared by several subfonts only once.
+    """
+    sizes = {}
+    seen = set()
+    for offset in font_offsets(data):
+        _, records = read_table_directory(data, offset)
+        for record in records:
+            if (record.tag, record.offset) in seen:
+                continue
+            seen.add((record.tag, record.offset))
+            sizes[record.tag] = sizes.get(record.tag, 0) + record.length
+    return sizes
+
+
+def _pad4(n):
+    return (n + 3) & ~3
+
+
+def calc_checksum(data):
+    """Return the sfnt checksum of `data`: the sum of its big-endian 32-bit
+    words, zero-padded to a multiple of four bytes.
+    """
+    padded_length = _pad4(len(data))
+    if padded_length != len(data):
+        data = bytes(data) + b"\0" * (padded_length - len(data))
+    words = struct.unpack(">%dL" % (padded_length // 4), data)
+    return sum(words) & 0xFFFFFFFF
+
+
+def write_sfnt(sfnt_version, tables):
+    """Return a single font made of `tables`, a list of (tag, data) pairs
+    laid out in that order. The table directory is sorted by tag, and the
+    checksums, including the checkSumAdjustment of the `head` table, are
+    computed.
+    """
+    num_tables = len(tables)
+    entry_selector = max(num_tables, 1).bit_length() - 1
+    search_range = 16 << entry_selector
+    header = SFNT_HEADER.pack(
+        sfnt_version,
+        num_tables,
+        search_range,
+        entry_selector,
+        num_tables * 16 - search_range,
+    )
+    offset = SFNT_HEADER.size + TABLE_RECORD.size * num_tables
+    records = []
+    chunks = []
+    head_offset = None
+    total = 0
+    for tag, data in tables:
+        if tag == "head" and len(data) >= HEAD_CHECKSUM_ADJUSTMENT_OFFSET + 4:
+            pos = HEAD_CHECKSUM_ADJUSTMENT_OFFSET
+            data = bytes(data[:pos]) + b"\0\0\0\0" + bytes(data[pos + 4 :])
+            head_offset = offset
+        checksum = calc_checksum(data)
+        total += checksum
+        records.append(
+            TABLE_RECORD.pack(tag.encode("latin-1"), checksum, offset, len(data))
+        )
+        chunks.append(data)
+        chunks.append(b"\0" * (_pad4(len(data)) - len(data)))
+        offset += _pad4(len(data))
+    records.sort()
+    directory = header + b"".join(records)
+    font = bytearray(directory + b"".join(chunks))
+    if head_offset is not None:
+        # the checksum of the whole font is that of the directory plus those
+        # of the (padded) tables
+        total += calc_checksum(directory)
+        struct.pack_into(
+            ">L",
+            font,
+            head_offset + HEAD_CHECKSUM_ADJUSTMENT_OFFSET,
+            (CHECKSUM_MAGIC - total) & 0xFFFFFFFF,
+        )
+    return bytes(font)
@@ -0,0 +1,161 @@
+"""Run a subprocess while streaming its standard input and output in chunks.
+
+Unlike subprocess.run(input=..., capture_output=True), which needs the
+whole input in memory and accumulates the whole output, `pump` reads the
+input from a file object and writes the output to another one a chunk at a
+time, so the memory used by the parent process doesn't depend on the size
+of the data. On POSIX the pipes are multiplexed with a selector loop; on
+Windows, where selectors don't work with pipes, with helper threads.
+"""
+import os
+import selectors
+import subprocess
+import sys
+import threading
+from collections import namedtuple
+
+
+CHUNK_SIZE = 1 << 16
+
+# `rusage` is the resource usage of the process, as returned by os.wait4,
+# or None where that is not available
+PumpResult = namedtuple("PumpResult", "returncode stderr rusage")
+
+
+def _chunks(source, chunk_size):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        view = memoryview(source)
+        for start in range(0, len(view), chunk_size):
+            yield view[start : start + chunk_size]
+        return
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return
+        if not isinstance(chunk, bytes):
+            raise TypeError(
+                "in_file must be opened in binary mode, read() returned %s"
+                % type(chunk).__name__
+            )
+        yield chunk
+
+
+def _pump_selector(proc, chunks, sink, chunk_size, stderr):
+    pending = memoryview(b"")
+    with selectors.DefaultSelector() as selector:
+        os.set_blocking(proc.stdin.fileno(), False)
+        selector.register(proc.stdin, selectors.EVENT_WRITE)
+        selector.register(proc.stderr, selectors.EVENT_READ)
+        if sink is not None:
+            selector.register(proc.stdout, selectors.EVENT_READ)
+        while selector.get_map():
+            for key, _ in selector.select():
+                fileobj = key.fileobj
+                if fileobj is proc.stdin:
+                    if not pending:
+                        pending = memoryview(next(chunks, b""))
+                    if not pending:
+                        selector.unregister(fileobj)
+                        fileobj.close()
+                        continue
+                    try:
+                        written = os.write(fileobj.fileno(), pending)
+                    except BlockingIOError:
+                        continue
+                    except BrokenPipeError:
+                        # the process exited without reading all the input
+                        selector.unregister(fileobj)
+                        fileobj.close()
+                        continue
+                    pending = pending[written:]
+                else:
+                    data = os.read(fileobj.fileno(), chunk_size)
+                    if not data:
+                        selector.unregister(fileobj)
+                        fileobj.close()
+                    elif fileobj is proc.stdout:
+                        sink.write(data)
+                    else:
+                        stderr.append(data)
+
+
+def _pump_threads(proc, chunks, sink, chunk_size, stderr):
+    errors = []
+
+    def feed():
+        try:
+            for chunk in chunks:
+                proc.stdin.write(chunk)
+        except BrokenPipeError:
+            pass
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+
+    def drain():
+        stderr.append(proc.stderr.read())
+
+    threads = [threading.Thread(target=feed), threading.Thread(target=drain)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    if sink is not None:
+        for data in iter(lambda: proc.stdout.read(chunk_size), b""):
+            sink.write(data)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def wait(proc):
+    """Wait for the subprocess.Popen `proc` to exit, and return a tuple with
+    its return code and resource usage (None if os.wait4 is not available).
+    """
+    if not hasattr(os, "wait4") or proc.returncode is not None:
+        return proc.wait(), None
+    try:
+        _, status, rusage = os.wait4(proc.pid, 0)
+    except ChildProcessError:
+        # already reaped
+        return proc.wait(), None
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, rusage
+
+
+def pump(cmd, source, sink=None, stdout=None, chunk_size=CHUNK_SIZE):
+    """Run `cmd`, feeding its standard input from `source` (bytes, or a
+    binary file object which is read in chunks), and writing its standard
+    output to the `sink` file object in chunks; if `sink` is None, the
+    output goes to `stdout`, which is passed on to subprocess.Popen.
+
+    Return a PumpResult with the return code, the standard error output and
+    the resource usage of the process. If reading from `source` or writing
+    to `sink` fails, the process is killed and the exception is re-raised.
+    """
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE if sink is not None else stdout,
+        stderr=subprocess.PIPE,
+    )
+    stderr = []
+    with proc:
+        try:
+            if sys.platform == "win32":
+                _pump_threads(
+                    proc, _chunks(source, chunk_size), sink, chunk_size, stderr
+                )
+            else:
+                _pump_selector(
+                    proc, _chunks(source, chunk_size), sink, chunk_size, stderr
+                )
+        except BaseException:
+            proc.kill()
+            raise
+        returncode, rusage = wait(proc)
+    return PumpResult(returncode, b"".join(stderr), rusage)
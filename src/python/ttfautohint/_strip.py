@@ -0,0 +1,134 @@
+"""Keep tables that 'ttfautohint' doesn't read out of the executable.
+
+Color and bitmap fonts carry large tables (`CBDT`, `sbix`, `SVG `, ...) that
+the executable never looks at, but still has to receive, parse, copy to its
+output and send back. Unless the `strip_tables` option is false,
+`ttfautohint()` and `Hinter` remove them from the input when they add up to
+at least `MIN_STRIP_SIZE` bytes, and put the original data back into the
+output, laid out as the executable would have written it: the tables of the
+input first, sorted by tag, then those added by hinting, then an empty
+digital signature in place of a `DSIG` table. The result is identical to
+that of hinting the whole font.
+"""
+from collections import namedtuple
+
+from ttfautohint._sfnt import (
+    SFNT_HEADER,
+    TABLE_RECORD,
+    SFNTError,
+    read_struct,
+    read_table_directory,
+    reader,
+    write_sfnt,
+)
+
+
+# tables that neither ttfautohint nor FreeType read while hinting, and
+# that only HarfBuzz uses for positioning, which ttfautohint ignores
+STRIPPED_TABLES = frozenset(
+    [
+        "BASE",
+        "CBDT",
+        "CBLC",
+        "COLR",
+        "CPAL",
+        "DSIG",
+        "EBDT",
+        "EBLC",
+        "EBSC",
+        "GPOS",
+        "JSTF",
+        "MATH",
+        "SVG ",
+        "meta",
+        "sbix",
+    ]
+)
+
+# smaller tables are cheaper to pass through than to splice back
+MIN_STRIP_SIZE = 64 * 1024
+
+# the executable replaces digital signatures, which hinting invalidates,
+# with an empty `DSIG' table (version 1, no signatures)
+EMPTY_DSIG = b"\0\0\0\1\0\0\0\0"
+
+SFNT_VERSIONS = (b"\0\1\0\0", b"true")
+
+
+StrippedTables = namedtuple("StrippedTables", "tables kept")
+StrippedTables.__doc__ = """\
+The tables removed from a font by `strip_tables`: `tables` maps their tags
+to their data, and `kept` is the set of tags of the tables left in the font.
+"""
+
+
+def strippable_size(font):
+    """Return the total size of the tables `strip_tables` would remove from
+    `font` (a path, bytes or a seekable binary file object), reading only
+    its table directory; 0 if it is not a TrueType font.
+    """
+    read, _, close = reader(font)
+    try:
+        version, num_tables, _, _, _ = read_struct(SFNT_HEADER, read, 0, "header")
+        if version not in SFNT_VERSIONS:
+            return 0
+        size = 0
+        for i in range(num_tables):
+            offset = SFNT_HEADER.size + i * TABLE_RECORD.size
+            tag, _, _, length = read_struct(TABLE_RECORD, read, offset, "directory")
+            if tag.decode("latin-1") in STRIPPED_TABLES:
+                size += length
+        return size
+    except SFNTError:
+        return 0
+    finally:
+        close()
+
+
+def strip_tables(data, min_size=MIN_STRIP_SIZE):
+    """Return (data, stripped): the single sfnt font in `data` without the
+    tables in STRIPPED_TABLES, and a StrippedTables tuple for
+    `splice_tables`; or (data, None) if there isn't a total of `min_size`
+    bytes to strip, or `data` is not a TrueType font.
+    """
+    if data[:4] not in SFNT_VERSIONS:
+        return data, None
+    try:
+        sfnt_version, records = read_table_directory(data)
+    except SFNTError:
+        # let the executable report the error
+        return data, None
+    stripped = [r for r in records if r.tag in STRIPPED_TABLES]
+    if not stripped or sum(r.length for r in stripped) < min_size:
+        return data, None
+    kept = sorted(
+        (r for r in records if r.tag not in STRIPPED_TABLES), key=lambda r: r.offset
+    )
+    view = memoryview(data)
+    new_data = write_sfnt(
+        sfnt_version,
+        [(r.tag, view[r.offset : r.offset + r.length]) for r in kept],
+    )
+    tables = {r.tag: bytes(view[r.offset : r.offset + r.length]) for r in stripped}
+    return new_data, StrippedTables(tables, frozenset(r.tag for r in kept))
+
+
+def splice_tables(data, stripped):
+    """Return the font hinted from the output of `strip_tables` in `data`,
+    with the `stripped` tables put back.
+    """
+    if stripped is None:
+        return data
+    sfnt_version, records = read_table_directory(data)
+    records.sort(key=lambda r: r.offset)
+    view = memoryview(data)
+    tables = {r.tag: view[r.offset : r.offset + r.length] for r in records}
+    # the executable writes the tables of its input sorted by tag, then the
+    # ones it adds
+    layout = [(r.tag, tables[r.tag]) for r in records if r.tag in stripped.kept]
+    layout.extend(item for item in stripped.tables.items() if item[0] != "DSIG")
+    layout.sort(key=lambda table: table[0])
+    layout.extend((r.tag, tables[r.tag]) for r in records if r.tag not in stripped.kept)
+    if "DSIG" in stripped.tables and "DSIG" not in tables:
+        layout.append(("DSIG", EMPTY_DSIG))
+    return write_sfnt(sfnt_version, layout)
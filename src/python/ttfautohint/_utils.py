@@ -0,0 +1,58 @@
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+def user_cache_dir():
+    """Return the directory where the package caches files for the user."""
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache, "ttfautohint")
+
+
+def seekable(f):
+    """Return whether the file object `f` can be rewound."""
+    try:
+        return f.seekable()
+    except (AttributeError, ValueError, OSError):
+        return False
+
+
+def sha256_hexdigest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@contextmanager
+def atomic_open(path):
+    """Return a context manager yielding a binary file object, whose content
+    replaces the file at `path` when the block exits without an exception,
+    so that readers never observe a partially written file: the data goes to
+    a temporary file in the same directory, which is then renamed over the
+    destination.
+    """
+    path = os.fspath(path)
+    dirname = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(
+        dir=dirname, prefix="." + os.path.basename(path) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write(path, data):
+    """Write `data` bytes to `path` atomically; see `atomic_open`."""
+    with atomic_open(path) as f:
+        f.write(data)
@@ -0,0 +1,90 @@
+"""Encoder for the WOFF 1.0 web font format.
+
+The tables are taken as raw bytes from the sfnt data, without parsing them,
+and compressed with zlib concurrently (zlib releases the GIL), which is much
+cheaper than loading the font with fontTools to save it as WOFF.
+"""
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from ttfautohint._sfnt import SFNT_HEADER, TABLE_RECORD, SFNTError, read_table_directory
+
+
+WOFF_HEADER = struct.Struct(">4s4sLHHLHHLLLLL")
+WOFF_TABLE_RECORD = struct.Struct(">4sLLLL")
+
+
+def _pad4(n):
+    return (n + 3) & ~3
+
+
+def _compress(table, level):
+    compressed = zlib.compress(table, level)
+    # tables that don't shrink are stored uncompressed
+    return compressed if len(compressed) < len(table) else table
+
+
+def encode_woff(data, level=9, jobs=None):
+    """Return the single font in sfnt `data` converted to WOFF, compressing
+    tables at the given zlib `level` on up to `jobs` threads (default:
+    number of CPUs).
+    """
+    if data[:4] == b"ttcf":
+        raise SFNTError("font collections can't be converted to WOFF")
+    _, records = read_table_directory(data)
+    records.sort(key=lambda r: r.tag)
+    view = memoryview(data)
+    tables = [view[r.offset : r.offset + r.length] for r in records]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(tables) > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            compressed = list(pool.map(_compress, tables, [level] * len(tables)))
+    else:
+        compressed = [_compress(table, level) for table in tables]
+
+    # the WOFF version is the font revision in the 'head' table
+    major = minor = 0
+    for record in records:
+        if record.tag == "head" and record.length >= 8:
+            major, minor = struct.unpack_from(">HH", data, record.offset + 4)
+
+    num_tables = len(records)
+    offset = WOFF_HEADER.size + WOFF_TABLE_RECORD.size * num_tables
+    directory = []
+    chunks = []
+    for record, table in zip(records, compressed):
+        directory.append(
+            WOFF_TABLE_RECORD.pack(
+                record.tag.encode("latin-1"),
+                offset,
+                len(table),
+                record.length,
+                record.checksum,
+            )
+        )
+        chunks.append(table)
+        chunks.append(b"\0" * (_pad4(len(table)) - len(table)))
+        offset += _pad4(len(table))
+    total_sfnt_size = (
+        SFNT_HEADER.size
+        + TABLE_RECORD.size * num_tables
+        + sum(_pad4(r.length) for r in records)
+    )
+    header = WOFF_HEADER.pack(
+        b"wOFF",
+        data[:4],
+        offset,
+        num_tables,
+        0,
+        total_sfnt_size,
+        major,
+        minor,
+        0,
+        0,
+        0,
+        0,
+        0,
+    )
+    return b"".join([header] + directory + chunks)
@@ -0,0 +1,284 @@
+"""Admit concurrent hinting jobs against a memory budget.
+
+The peak memory of 'ttfautohint' varies by orders of magnitude between a
+small Latin font and a large CJK one, so a fixed number of workers either
+runs out of memory or leaves CPUs idle. A `MemoryBudget` instead admits a
+job only when its predicted peak resident set size fits in what is left of
+the budget, and makes the others wait until running jobs release their
+reservation. `RSSPredictor` provides the predictions: those of a
+`ttfautohint.cost.CostModel`, corrected by the peaks observed (with
+os.wait4) for the jobs that already ran.
+
+    >>> budget = MemoryBudget(12 << 30)
+    >>> results = hint_batch(pairs, memory_budget=budget)
+"""
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+__all__ = [
+    "MemoryBudget",
+    "RSSPredictor",
+    "parse_size",
+    "total_memory",
+    "available_memory",
+]
+
+
+_SIZE_UNITS = {
+    "": 1,
+    "K": 1 << 10,
+    "M": 1 << 20,
+    "G": 1 << 30,
+    "T": 1 << 40,
+}
+
+
+def parse_size(s):
+    """Return the number of bytes in a size like "512M", "1.5GiB" or "4096"
+    (binary units, case-insensitive).
+    """
+    text = s.strip().upper()
+    for suffix in ("IB", "B"):
+        if text.endswith(suffix):
+            text = text[: -len(suffix)]
+            break
+    unit = text[-1:] if text[-1:] in _SIZE_UNITS else ""
+    number = text[: len(text) - len(unit)].strip()
+    try:
+        size = float(number) * _SIZE_UNITS[unit]
+    except ValueError:
+        raise ValueError(f"invalid size: {s!r}") from None
+    if size < 0:
+        raise ValueError(f"invalid size: {s!r}")
+    return int(size)
+
+
+def _meminfo(field):
+    # kB values of /proc/meminfo, Linux only
+    try:
+        with open("/proc/meminfo", "rb") as f:
+            for line in f:
+                name, _, value = line.partition(b":")
+                if name == field:
+                    return int(value.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def total_memory():
+    """Return the physical memory of the machine in bytes, or None if it
+    cannot be determined.
+    """
+    if sys.platform.startswith("linux"):
+        size = _meminfo(b"MemTotal")
+        if size is not None:
+            return size
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def available_memory():
+    """Return the memory in bytes that can be allocated without swapping,
+    or None if it cannot be determined (only Linux is supported).
+    """
+    if sys.platform.startswith("linux"):
+        return _meminfo(b"MemAvailable")
+    return None
+
+
+class MemoryBudget(object):
+    """Reserve memory for jobs from a budget of `limit` bytes (default: 75%
+    of the physical memory), shared by threads.
+
+    `acquire` blocks while the reservation does not fit, rather than
+    failing; a job larger than the whole budget is admitted when no other
+    job is running, so that it runs alone. Smaller jobs may be admitted
+    ahead of a waiting larger one, when they fit.
+
+    If `min_available` is given, jobs are also held back while admitting
+    them would leave less than that many bytes of available system memory
+    (see `available_memory`), re-checked every `poll_interval` seconds; this
+    guards against memory used by other processes. As above, a job is
+    always admitted when no other job is running.
+    """
+
+    DEFAULT_FRACTION = 0.75
+
+    def __init__(
+        self,
+        limit=None,
+        min_available=None,
+        poll_interval=0.5,
+        available=available_memory,
+    ):
+        if limit is None:
+            total = total_memory()
+            if total is None:
+                raise ValueError("cannot determine the physical memory size")
+            limit = int(total * self.DEFAULT_FRACTION)
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+        self.limit = limit
+        self.min_available = min_available
+        self.poll_interval = poll_interval
+        self._available = available
+        self._cond = threading.Condition()
+        self._reserved = 0
+        self._running = 0
+        self._waiting = 0
+        self._peak_reserved = 0
+        self._admitted = 0
+        self._paused_seconds = 0.0
+
+    @property
+    def reserved(self):
+        """Number of bytes currently reserved by running jobs."""
+        return self._reserved
+
+    @property
+    def utilization(self):
+        """Fraction of the budget currently reserved (may exceed 1 while an
+        oversized job runs alone).
+        """
+        return self._reserved / self.limit
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def waiting(self):
+        """Number of jobs waiting for admission."""
+        return self._waiting
+
+    def snapshot(self):
+        """Return a dict with the current state and totals of the budget."""
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "reserved": self._reserved,
+                "utilization": self._reserved / self.limit,
+                "running": self._running,
+                "waiting": self._waiting,
+                "peak_reserved": self._peak_reserved,
+                "admitted": self._admitted,
+                "paused_seconds": self._paused_seconds,
+            }
+
+    def _fits(self, nbytes):
+        # called with the condition held
+        if self._running == 0:
+            return True
+        if self._reserved + nbytes > self.limit:
+            return False
+        if self.min_available is not None:
+            available = self._available()
+            if available is not None and available - nbytes < self.min_available:
+                return False
+        return True
+
+    def acquire(self, nbytes, timeout=None):
+        """Reserve `nbytes`, waiting up to `timeout` seconds (default: no
+        limit) until they fit. Return whether they were reserved.
+        """
+        nbytes = max(int(nbytes), 0)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            start = None
+            self._waiting += 1
+            try:
+                while not self._fits(nbytes):
+                    if start is None:
+                        start = time.monotonic()
+                    wait = self.poll_interval if self.min_available else None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._waiting -= 1
+                if start is not None:
+                    self._paused_seconds += time.monotonic() - start
+            self._reserved += nbytes
+            self._running += 1
+            self._admitted += 1
+            self._peak_reserved = max(self._peak_reserved, self._reserved)
+            return True
+
+    def release(self, nbytes):
+        """Return a reservation of `nbytes` made with `acquire`."""
+        nbytes = max(int(nbytes), 0)
+        with self._cond:
+            if self._running == 0:
+                raise RuntimeError("release() called more times than acquire()")
+            self._reserved = max(self._reserved - nbytes, 0)
+            self._running -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, nbytes):
+        """Context manager holding a reservation of `nbytes`."""
+        self.acquire(nbytes)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+
+class RSSPredictor(object):
+    """Predict the peak RSS of hinting a font, learning from observed runs.
+
+    A font that was already hinted with the same number of hint sets is
+    predicted to peak at its last observed RSS; for others the estimate of
+    `model` (a CostModel) is scaled by a moving average of the ratios of
+    observed to estimated peaks, weighted by `smoothing`. All predictions
+    are multiplied by `margin`. Thread-safe.
+    """
+
+    def __init__(self, model=None, margin=1.1, smoothing=0.3):
+        if model is None:
+            from ttfautohint.cost import CostModel
+
+            model = CostModel()
+        self.model = model
+        self.margin = margin
+        self.smoothing = smoothing
+        self.ratio = 1.0
+        self._observed = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(stats, options):
+        from ttfautohint.tune import hint_set_count
+
+        return stats, hint_set_count(options)
+
+    def predict(self, stats, **options):
+        """Return the predicted peak RSS in bytes for a font with the given
+        FontStats and ttfautohint options.
+        """
+        key = self._key(stats, options)
+        with self._lock:
+            rss = self._observed.get(key)
+            if rss is None:
+                rss = self.model.estimate(stats, **options).peak_rss * self.ratio
+        return int(rss * self.margin)
+
+    def observe(self, stats, peak_rss, **options):
+        """Record the `peak_rss` (bytes) measured for hinting a font."""
+        if peak_rss is None:
+            return
+        key = self._key(stats, options)
+        estimate = self.model.estimate(stats, **options).peak_rss
+        with self._lock:
+            self._observed[key] = peak_rss
+            self.ratio += self.smoothing * (peak_rss / estimate - self.ratio)
@@ -0,0 +1,153 @@
+"""Reuse the global analysis of fonts across runs of the executable.
+
+Before hinting any glyph, ttfautohint analyzes the whole font: it assigns a
+style to each glyph (from the cmap and, through HarfBuzz, the GSUB table),
+and computes the blue zones and standard stem widths of each style, or the
+blue zones of the `reference_file` font. The bundled executable can be
+patched (see src/c/ttfautohint.patch) to export this analysis with
+`--analysis-out=FILE`, in a compact binary file, and to load it with
+`--analysis-in=FILE` instead of computing it again.
+
+Pass an `AnalysisCache` as the `analysis_cache` option of `ttfautohint()`
+or `Hinter` to keep these files in a directory, keyed by the digests of the
+font, the reference font, the control instructions and the executable,
+together with the options:
+
+    >>> analysis = AnalysisCache()
+    >>> for path in ["Family-Regular.ttf", "Family-Bold.ttf"]:
+    ...     ttfautohint(in_file=path, reference_file="Family-Regular.ttf",
+    ...                 analysis_cache=analysis)
+
+Hinting the same font again (e.g. with other hinting ranges or a new
+`family_suffix`) skips the whole analysis. With a reference font, the
+analysis is also stored under a key that doesn't depend on the hinted font,
+so that the other fonts of a family reuse the blue zones derived from the
+reference; these are only used for fonts mapping the blue zone characters
+to the same glyphs (the executable compares the digests of their cmap,
+GDEF and GSUB tables). The executable checks that a loaded analysis matches
+the font, and ignores it otherwise, so stale or corrupt entries are never
+harmful.
+
+The patch is only applied to builds with EXPERIMENTAL_PATCHES=yes (see
+src/c/Makefile). With executables that don't list the flags in their
+`--help`, the `analysis_cache` is ignored and each run analyzes the whole
+font.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from ttfautohint._utils import sha256_hexdigest, user_cache_dir
+from ttfautohint.cache import DiskStore
+
+
+__all__ = ["AnalysisCache", "analysis_keys"]
+
+
+# version of the key derivation
+_KEY_VERSION = 1
+
+
+def analysis_keys(
+    args, input_digest, control_digest=None, reference_digest=None, executable=None
+):
+    """Return the keys of the analysis of the font with `input_digest`
+    hinted with the command-line `args` (without file names), most specific
+    first: one identifying the font, and one identifying only the reference
+    font if there is one.
+    """
+
+    def key(*spec):
+        data = json.dumps([_KEY_VERSION, list(args), executable, *spec])
+        return sha256_hexdigest(data.encode("utf-8"))
+
+    keys = [key("font", input_digest, control_digest, reference_digest)]
+    if reference_digest is not None:
+        keys.append(key("reference", reference_digest))
+    return keys
+
+
+class AnalysisCache(object):
+    """Analysis files of fonts, stored in `directory` (default: "analysis"
+    in the user's cache directory); see the module docstring.
+
+    `stats` counts hits (of the font's own analysis, or only that of its
+    reference font) and misses. Safe for concurrent use by threads and
+    processes.
+    """
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = os.path.join(user_cache_dir(), "analysis")
+        self.store = DiskStore(directory)
+        self._lock = threading.Lock()
+        self.stats = dict(hits=0, reference_hits=0, misses=0)
+
+    @property
+    def directory(self):
+        return self.store.directory
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get(self, keys):
+        """Return the analysis stored under the first of `keys` found, and
+        its index in `keys`; or (None, None).
+        """
+        for i, key in enumerate(keys):
+            digest = self.store.get("ac", key)
+            try:
+                data = digest and self.store.get("cas", digest.decode("ascii"))
+            except ValueError:
+                data = None
+            if data:
+                self._count("hits" if i == 0 else "reference_hits")
+                return data, i
+        self._count("misses")
+        return None, None
+
+    def put(self, keys, data):
+        """Store the analysis `data` under all `keys`."""
+        digest = sha256_hexdigest(data)
+        self.store.put("cas", digest, data)
+        for key in keys:
+            self.store.put("ac", key, digest.encode("ascii"))
+
+    @contextmanager
+    def session(self, keys):
+        """Return a context manager for one run of the executable, yielding
+        the arguments that make it load the stored analysis, if any, and
+        export its own. The latter is stored under `keys` when the block
+        exits without an exception.
+        """
+        directory = tempfile.mkdtemp(prefix="ttfautohint-analysis-")
+        try:
+            args = []
+            data, index = self.get(keys)
+            if data is not None:
+                in_path = os.path.join(directory, "in.taan")
+                with open(in_path, "wb") as f:
+                    f.write(data)
+                args.append(f"--analysis-in={in_path}")
+            out_path = os.path.join(directory, "out.taan")
+            args.append(f"--analysis-out={out_path}")
+
+            yield args
+
+            try:
+                with open(out_path, "rb") as f:
+                    new_data = f.read()
+            except FileNotFoundError:
+                new_data = None
+            if new_data and not (index == 0 and new_data == data):
+                try:
+                    self.put(keys, new_data)
+                except OSError:
+                    # the cache is an optimization
+                    pass
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,476 @@
+"""Result cache shared by machines over HTTP, with a local disk tier.
+
+Pass a `ResultCache` as the `cache` option of `ttfautohint()` (or `Hinter`)
+to reuse the hinted fonts produced by earlier runs, on this machine or on
+others sharing the same cache server:
+
+    >>> cache = ResultCache("~/.cache/ttfautohint/results",
+    ...                     url="http://cache.example.com:8463")
+    >>> ttfautohint(in_file="MyFont.ttf", out_file="MyFont-hinted.ttf",
+    ...             cache=cache)
+
+Results are looked up by a key derived from the SHA-256 digests of the input
+font, of the control instructions and reference font (rather than their file
+names), and of the executable, together with the normalized command-line
+arguments, the post-processing options and $SOURCE_DATE_EPOCH. Failures are
+not cached.
+
+The protocol is content-addressed, with two namespaces under the server URL:
+
+GET/PUT /ac/<key>
+    The "action cache": the body is the SHA-256 hex digest of the result
+    for the result `key` (64 lowercase hex digits).
+
+GET/PUT /cas/<digest>
+    The "content-addressable store": the body is the data whose SHA-256 hex
+    digest is `digest`. The server rejects uploads that don't match it
+    (status 400), and the client checks downloads the same way.
+
+Missing entries get status 404, and successful uploads status 201 (or 204
+if the entry already existed). Both tiers are `DiskStore`s, and the
+reference server, run with:
+
+    python -m ttfautohint.cache --directory DIR [--host HOST] [--port PORT]
+
+serves one over HTTP. It only uses the standard library, and doesn't
+authenticate clients: bind it to localhost, or put it behind a proxy.
+Results are uploaded in background threads; uploads still pending at exit
+are completed before the interpreter exits. Errors talking to the server
+are logged and treated as cache misses.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ttfautohint._utils import atomic_write, sha256_hexdigest
+
+
+__all__ = [
+    "DiskStore",
+    "RemoteStore",
+    "ResultCache",
+    "CacheServer",
+    "IntegrityError",
+    "result_key",
+    "executable_digest",
+    "main",
+]
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8463
+
+NAMESPACES = ("ac", "cas")
+_NAME = re.compile(r"[0-9a-f]{64}")
+# version of the key derivation, changed whenever the results may differ
+_KEY_VERSION = 1
+
+
+class IntegrityError(Exception):
+    """Downloaded data doesn't match its digest."""
+
+
+def _check_entry(namespace, name):
+    if namespace not in NAMESPACES:
+        raise ValueError(f"unknown namespace: {namespace!r}")
+    if not _NAME.fullmatch(name):
+        raise ValueError(f"invalid name: {name!r}")
+
+
+_digest_cache = {}
+_digest_lock = threading.Lock()
+
+
+def executable_digest(path):
+    """Return the SHA-256 hex digest of the executable at `path`, computed
+    once per process for each version of the file.
+    """
+    st = os.stat(path)
+    stamp = (path, st.st_size, st.st_mtime_ns, st.st_ino)
+    with _digest_lock:
+        digest = _digest_cache.get(stamp)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with _digest_lock:
+            _digest_cache[stamp] = digest
+    return digest
+
+
+def result_key(
+    args,
+    input_digest,
+    control_digest=None,
+    reference_digest=None,
+    executable=None,
+    postprocess=None,
+):
+    """Return the cache key of hinting the font with `input_digest` using
+    the command-line `args` (see `ttfautohint.options.format_kwargs`;
+    without the control and reference file names, which are identified by
+    their digests), with the `executable` digest, followed by the given
+    `postprocess` options.
+    """
+    epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    spec = [
+        _KEY_VERSION,
+        list(args),
+        input_digest,
+        control_digest,
+        reference_digest,
+        executable,
+        sorted((postprocess or {}).items()),
+        epoch,
+    ]
+    return sha256_hexdigest(json.dumps(spec, separators=(",", ":")).encode("utf-8"))
+
+
+class DiskStore(object):
+    """Cache entries stored as files in `directory`, sharded by the first
+    two characters of their name. Safe for concurrent use by threads and
+    processes: entries are written atomically.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(os.path.expanduser(os.fspath(directory)))
+
+    def _path(self, namespace, name):
+        _check_entry(namespace, name)
+        return os.path.join(self.directory, namespace, name[:2], name)
+
+    def get(self, namespace, name):
+        """Return the data of the entry, or None if it doesn't exist. CAS
+        entries are checked against their digest; corrupt ones are removed.
+        """
+        path = self._path(namespace, name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if namespace == "cas" and sha256_hexdigest(data) != name:
+            log.warning("removing corrupt cache entry %s", path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return data
+
+    def contains(self, namespace, name):
+        return os.path.exists(self._path(namespace, name))
+
+    def put(self, namespace, name, data):
+        """Store the entry; raise ValueError if a CAS entry doesn't match
+        its digest. Return False if the entry already existed.
+        """
+        if namespace == "cas" and sha256_hexdigest(data) != name:
+            raise ValueError("data doesn't match its digest")
+        path = self._path(namespace, name)
+        if namespace == "cas" and os.path.exists(path):
+            return False
+        atomic_write(path, data)
+        return True
+
+
+class RemoteStore(object):
+    """Client of a cache server at `url`; `timeout` is in seconds."""
+
+    def __init__(self, url, timeout=10):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _url(self, namespace, name):
+        _check_entry(namespace, name)
+        return f"{self.url}/{namespace}/{name}"
+
+    def get(self, namespace, name):
+        """Return the data of the entry, or None if it doesn't exist. Raise
+        IntegrityError if a CAS entry doesn't match its digest, and OSError
+        (e.g. urllib.error.URLError) if the request fails.
+        """
+        try:
+            with urllib.request.urlopen(
+                self._url(namespace, name), timeout=self.timeout
+            ) as response:
+                data = response.read()
+        except urllib.error.HTTPError as e:
+            e.close()
+            if e.code == 404:
+                return None
+            raise
+        if namespace == "cas" and sha256_hexdigest(data) != name:
+            raise IntegrityError(f"downloaded data doesn't match digest {name}")
+        return data
+
+    def put(self, namespace, name, data):
+        request = urllib.request.Request(
+            self._url(namespace, name), data=data, method="PUT"
+        )
+        request.add_header("Content-Type", "application/octet-stream")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.status == 201
+
+
+class ResultCache(object):
+    """Two-tier cache of hinting results: a local DiskStore in `directory`
+    (if given) in front of the cache server at `url` (if given).
+
+    Results found on the server are copied to the local tier. New results
+    are stored locally right away, and uploaded by up to `upload_workers`
+    background threads if `upload` is true (e.g. it can be false on
+    developer machines that should only read the CI's results). `timeout`
+    applies to each request to the server, in seconds.
+
+    `stats` counts local and remote hits, misses, uploads and errors.
+    """
+
+    def __init__(
+        self, directory=None, url=None, upload=True, upload_workers=2, timeout=10
+    ):
+        if directory is None and url is None:
+            raise ValueError("a directory or a url is required")
+        self.local = DiskStore(directory) if directory is not None else None
+        self.remote = RemoteStore(url, timeout) if url is not None else None
+        self.upload = upload
+        self._uploads = None
+        if self.remote is not None and upload:
+            self._uploads = ThreadPoolExecutor(
+                max_workers=upload_workers, thread_name_prefix="ttfautohint-cache"
+            )
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.stats = dict(
+            local_hits=0,
+            remote_hits=0,
+            misses=0,
+            uploads=0,
+            upload_errors=0,
+            download_errors=0,
+        )
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _get_remote(self, key):
+        try:
+            digest = self.remote.get("ac", key)
+            if digest is None:
+                return None
+            digest = digest.decode("ascii").strip()
+            return self.remote.get("cas", digest)
+        except (OSError, ValueError, IntegrityError) as e:
+            # ValueError: an invalid digest in the action cache
+            log.warning("error downloading %s from %s: %s", key, self.remote.url, e)
+            self._count("download_errors")
+            return None
+
+    def get(self, key):
+        """Return the cached result for `key`, or None."""
+        if self.local is not None:
+            digest = self.local.get("ac", key)
+            try:
+                data = digest and self.local.get("cas", digest.decode("ascii"))
+            except ValueError:
+                # an invalid digest, overwritten by the next `put`
+                data = None
+            if data:
+                self._count("local_hits")
+                return data
+        if self.remote is not None:
+            data = self._get_remote(key)
+            if data is not None:
+                self._count("remote_hits")
+                if self.local is not None:
+                    self._put_local(key, sha256_hexdigest(data), data)
+                return data
+        self._count("misses")
+        return None
+
+    def _put_local(self, key, digest, data):
+        try:
+            self.local.put("cas", digest, data)
+            self.local.put("ac", key, digest.encode("ascii"))
+        except OSError as e:
+            log.warning("error writing %s to %s: %s", key, self.local.directory, e)
+
+    def _upload(self, key, digest, data):
+        try:
+            self.remote.put("cas", digest, data)
+            self.remote.put("ac", key, digest.encode("ascii"))
+        except OSError as e:
+            log.warning("error uploading %s to %s: %s", key, self.remote.url, e)
+            self._count("upload_errors")
+        else:
+            self._count("uploads")
+
+    def put(self, key, data):
+        """Store the result for `key`; the upload happens in the background."""
+        digest = sha256_hexdigest(data)
+        if self.local is not None:
+            self._put_local(key, digest, data)
+        if self._uploads is not None:
+            future = self._uploads.submit(self._upload, key, digest, data)
+            with self._lock:
+                self._pending.add(future)
+            future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def flush(self, timeout=None):
+        """Wait until the pending uploads are done."""
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            future.result(timeout)
+
+    def close(self):
+        """Finish the pending uploads, and stop the upload threads."""
+        if self._uploads is not None:
+            self._uploads.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "ttfautohint-cache"
+    protocol_version = "HTTP/1.1"
+
+    def _entry(self):
+        parts = self.path.strip("/").split("/")
+        if (
+            len(parts) != 2
+            or parts[0] not in NAMESPACES
+            or not _NAME.fullmatch(parts[1])
+        ):
+            self._send(404, b"not found\n")
+            return None
+        return parts
+
+    def _send(self, status, body=b"", content_type="text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        entry = self._entry()
+        if entry is None:
+            return
+        data = self.server.store.get(*entry)
+        if data is None:
+            return self._send(404, b"not found\n")
+        self._send(200, data, "application/octet-stream")
+
+    do_HEAD = do_GET
+
+    def do_PUT(self):
+        entry = self._entry()
+        if entry is None:
+            return
+        try:
+            length = int(self.headers["Content-Length"])
+        except (TypeError, ValueError):
+            self.close_connection = True
+            return self._send(411, b"Content-Length required\n")
+        if length > self.server.max_entry_size:
+            self.close_connection = True
+            return self._send(413, b"entry too large\n")
+        data = self.rfile.read(length)
+        if entry[0] == "ac" and not _NAME.fullmatch(data.decode("latin-1")):
+            return self._send(400, b"invalid digest\n")
+        try:
+            created = self.server.store.put(*entry, data)
+        except ValueError as e:
+            return self._send(400, str(e).encode("utf-8") + b"\n")
+        self._send(201 if created else 204)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class CacheServer(ThreadingHTTPServer):
+    """Reference cache server, storing the entries in a DiskStore in
+    `directory`; see the module docstring.
+
+    Use `serve_forever()` to run it (e.g. in a thread), and `shutdown()`
+    then `server_close()` to stop it.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        directory,
+        address=("127.0.0.1", DEFAULT_PORT),
+        max_entry_size=256 << 20,
+        verbose=False,
+    ):
+        self.store = DiskStore(directory)
+        self.max_entry_size = max_entry_size
+        self.verbose = verbose
+        super().__init__(address, _Handler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def main(args=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m ttfautohint.cache",
+        description="Serve a ttfautohint result cache stored in a directory.",
+    )
+    parser.add_argument(
+        "--directory", required=True, help="where the cache entries are stored"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="default: %(default)s")
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_PORT,
+        help="default: %(default)s; 0 picks a free port",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="log requests")
+    options = parser.parse_args(args)
+
+    server = CacheServer(
+        options.directory, (options.host, options.port), verbose=options.verbose
+    )
+    print(f"Serving {server.store.directory} on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
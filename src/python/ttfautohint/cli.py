@@ -2,9 +2,404 @@ import sys
 import ttfautohint
 
 
+# Options handled by the Python front-end itself; all the other arguments are
+# forwarded verbatim to the 'ttfautohint' executable.
+WRAPPER_FLAGS = ("--watch", "--batch", "--merge-manifests")
+
+
+def _wrapper_flags(args):
+    return {arg.split("=", 1)[0] for arg in args} & set(WRAPPER_FLAGS)
+
+
+def _has_wrapper_flags(args):
+    return bool(_wrapper_flags(args))
+
+
+def _wrapper_parser():
+    import argparse
+    from ttfautohint.watch import JOURNAL_NAME
+
+    parser = argparse.ArgumentParser(
+        prog="ttfautohint",
+        usage="ttfautohint --watch DIR [--watch DIR]... --output-dir DIR [OPTION]...",
+        description=(
+            "Watch DIR for new or modified TrueType fonts and write hinted "
+            "copies to the output directory. All OPTIONs that are not listed "
+            "below are passed on to ttfautohint for every font."
+        ),
+        allow_abbrev=False,
+    )
+    parser.add_argument(
+        "--watch",
+        metavar="DIR",
+        action="append",
+        required=True,
+        help="directory to watch for changed fonts (can be repeated)",
+    )
+    parser.add_argument(
+        "--output-dir",
+        metavar="DIR",
+        required=True,
+        help="directory where the hinted fonts are written",
+    )
+    parser.add_argument(
+        "--jobs",
+        metavar="N",
+        type=int,
+        default=None,
+        help="maximum number of fonts hinted in parallel (default: CPU count)",
+    )
+    parser.add_argument(
+        "--debounce",
+        metavar="SECONDS",
+        type=float,
+        default=0.5,
+        help="wait for this long after the last change (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="poll the directories instead of using inotify",
+    )
+    parser.add_argument(
+        "--retries",
+        metavar="N",
+        type=int,
+        default=0,
+        help="retry a font up to N times if hinting fails for transient "
+        "reasons, e.g. the process was killed (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="FILE",
+        help="file where the hinted fonts are recorded, so that a restart "
+        "only hints the fonts that changed (default: %s in the output "
+        "directory)" % JOURNAL_NAME,
+    )
+    return parser
+
+
+def _file_options(args):
+    # extract the control and reference files as keyword arguments, for
+    # Hinter to check them and identify them by their contents; the other
+    # arguments are returned unchanged
+    import argparse
+
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("-m", "--control-file")
+    parser.add_argument("-R", "--reference", dest="reference_file")
+    options, args = parser.parse_known_args(args)
+    return {k: v for k, v in vars(options).items() if v is not None}, args
+
+
+def _watch(options, args):
+    import logging
+    from ttfautohint.journal import JobJournal
+    from ttfautohint.retry import RetryPolicy
+    from ttfautohint.watch import Watcher
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    file_options, args = _file_options(args)
+    watcher = Watcher(
+        options.watch,
+        options.output_dir,
+        args=args,
+        jobs=options.jobs,
+        debounce=options.debounce,
+        use_inotify=False if options.poll else None,
+        retry=RetryPolicy(max_attempts=options.retries + 1)
+        if options.retries
+        else None,
+        journal=JobJournal(options.journal) if options.journal else None,
+        **file_options,
+    )
+    with watcher:
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+def _size(s):
+    import argparse
+    from ttfautohint.admission import parse_size
+
+    try:
+        size = parse_size(s)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"invalid size: {s!r}")
+    return size
+
+
+def _shard(s):
+    import argparse
+    from ttfautohint.shard import parse_shard
+
+    try:
+        return parse_shard(s)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _batch_parser():
+    import argparse
+    from ttfautohint.journal import RETRY_FAILED
+    from ttfautohint.shard import STRATEGIES
+
+    parser = argparse.ArgumentParser(
+        prog="ttfautohint",
+        usage="ttfautohint --batch FONT... --output-dir DIR [OPTION]...",
+        description=(
+            "Hint many fonts in parallel, starting with those estimated to "
+            "take longest, and write them to the output directory. All "
+            "OPTIONs that are not listed below are passed on to ttfautohint "
+            "for every font."
+        ),
+        allow_abbrev=False,
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="FONT",
+        nargs="+",
+        required=True,
+        help="fonts to hint",
+    )
+    parser.add_argument(
+        "--output-dir",
+        metavar="DIR",
+        help="directory where the hinted fonts are written (required unless "
+        "--dry-run is given)",
+    )
+    parser.add_argument(
+        "--jobs",
+        metavar="N",
+        type=int,
+        default=None,
+        help="maximum number of fonts hinted in parallel (default: CPU count)",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        metavar="SIZE",
+        type=_size,
+        default=None,
+        help="only start a font when its predicted peak memory fits in SIZE "
+        "bytes (with an optional K, M or G suffix) together with the fonts "
+        "being hinted",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print the estimated cost of the batch and exit",
+    )
+    parser.add_argument(
+        "--history",
+        metavar="FILE",
+        help="file where the cost of each run is recorded, to calibrate the "
+        "estimates (default: in the user's cache directory)",
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="I/N",
+        type=_shard,
+        default=None,
+        help="only hint the fonts of shard I of N (starting at 1), to split "
+        "the batch between N machines running the same command",
+    )
+    parser.add_argument(
+        "--shard-by",
+        choices=STRATEGIES,
+        default="cost",
+        help="assign fonts to shards so as to balance their estimated hinting "
+        "time, or by a hash of their file names (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--manifest",
+        metavar="FILE",
+        help="file where the digests and timings of the hinted fonts are "
+        "written (default with --shard: manifest-I-of-N.json in the output "
+        "directory)",
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="FILE",
+        help="file where each completed font is recorded, so that running "
+        "the batch again with the same journal skips the fonts that are "
+        "already hinted",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        choices=RETRY_FAILED,
+        default="transient",
+        help="which fonts that failed in a previous run with the same "
+        "--journal are hinted again (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--retries",
+        metavar="N",
+        type=int,
+        default=0,
+        help="retry a font up to N times if hinting fails for transient "
+        "reasons, e.g. the process was killed (default: %(default)s)",
+    )
+    return parser
+
+
+def _merge_parser():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="ttfautohint",
+        usage="ttfautohint --merge-manifests MANIFEST... [--output FILE]",
+        description=(
+            "Combine the manifests written by the shards of a batch, and "
+            "check that every font was hinted by exactly one shard."
+        ),
+        allow_abbrev=False,
+    )
+    parser.add_argument(
+        "--merge-manifests",
+        metavar="MANIFEST",
+        nargs="+",
+        required=True,
+        help="manifests written with --batch --shard",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="FILE",
+        help="file where the merged manifest is written",
+    )
+    return parser
+
+
+def _hint_set_options(args):
+    # extract the options that the cost estimates depend on, as keyword
+    # arguments; the other arguments are returned unchanged
+    import argparse
+
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("-l", "--hinting-range-min", type=int)
+    parser.add_argument("-r", "--hinting-range-max", type=int)
+    parser.add_argument(
+        "-c", "--composites", dest="hint_composites", action="store_true"
+    )
+    options, args = parser.parse_known_args(args)
+    return {k: v for k, v in vars(options).items() if v not in (None, False)}, args
+
+
+def _print_progress(result, done, total):
+    if result.resumed:
+        status = "done in a previous run" if result.error is None else "failed"
+    elif result.error is None:
+        status = "%.1f s" % result.seconds
+    else:
+        status = "failed"
+    print(f"[{done}/{total}] {result.in_path}: {status}", file=sys.stderr)
+
+
+def _batch(options, args):
+    import os
+    from ttfautohint.cost import CostHistory, cost_report, hint_batch
+    from ttfautohint.journal import JobJournal
+    from ttfautohint.retry import RetryPolicy
+    from ttfautohint.shard import make_manifest, select_shard, write_manifest
+
+    hint_options, args = _hint_set_options(args)
+    history = CostHistory(options.history)
+    names = [os.path.basename(path) for path in options.batch]
+    if len(set(names)) != len(names):
+        _batch_parser().error("the fonts must have different file names")
+    paths = options.batch
+    if options.shard is not None:
+        paths = select_shard(
+            options.batch, options.shard, options.shard_by, **hint_options
+        )
+    if options.dry_run:
+        report = cost_report(paths, history=history, jobs=options.jobs, **hint_options)
+        print(report.format())
+        return 0
+    if options.output_dir is None:
+        _batch_parser().error("--output-dir is required")
+    pairs = [
+        (path, os.path.join(options.output_dir, os.path.basename(path)))
+        for path in paths
+    ]
+    journal = progress = None
+    if options.journal is not None:
+        journal = JobJournal(options.journal)
+        progress = _print_progress
+    results = hint_batch(
+        pairs,
+        jobs=options.jobs,
+        history=history,
+        args=args,
+        memory_budget=options.memory_budget,
+        journal=journal,
+        retry_failed=options.retry_failed,
+        progress=progress,
+        retry=RetryPolicy(max_attempts=options.retries + 1)
+        if options.retries
+        else None,
+        **hint_options,
+    )
+    failed = 0
+    for result in results:
+        if result.error is not None:
+            failed += 1
+            print(f"{result.in_path}: {result.error}", file=sys.stderr)
+    manifest_path = options.manifest
+    if manifest_path is None and options.shard is not None:
+        manifest_path = os.path.join(
+            options.output_dir,
+            "manifest-%d-of-%d.json" % (options.shard.index, options.shard.count),
+        )
+    if manifest_path is not None:
+        strategy = options.shard_by if options.shard is not None else None
+        manifest = make_manifest(options.shard, strategy, options.batch, results)
+        write_manifest(manifest_path, manifest)
+    return 1 if failed else 0
+
+
+def _merge(options):
+    import json
+    from ttfautohint.shard import (
+        ManifestError,
+        merge_manifests,
+        read_manifest,
+        write_manifest,
+    )
+
+    try:
+        manifest = merge_manifests(
+            [read_manifest(path) for path in options.merge_manifests]
+        )
+    except (OSError, ManifestError) as e:
+        print(f"ttfautohint: {e}", file=sys.stderr)
+        return 1
+    if options.output is not None:
+        write_manifest(options.output, manifest)
+    else:
+        print(json.dumps(manifest, indent=2, sort_keys=True))
+    failed = [font for font in manifest["fonts"] if font["error"] is not None]
+    for font in failed:
+        print(f"{font['input']}: {font['error']}", file=sys.stderr)
+    return 1 if failed else 0
+
+
 def main(args=None):
     if args is None:
         args = sys.argv[1:]
+    flags = _wrapper_flags(args)
+    if flags == {"--batch"}:
+        options, args = _batch_parser().parse_known_args(args)
+        return _batch(options, args)
+    if flags == {"--merge-manifests"}:
+        return _merge(_merge_parser().parse_args(args))
+    if flags:
+        options, args = _wrapper_parser().parse_known_args(args)
+        return _watch(options, args)
     return ttfautohint.run(args).returncode
 
 
@@ -0,0 +1,150 @@
+"""Client for the hinting service in `ttfautohint.server`.
+
+    >>> client = Client("http://127.0.0.1:8462")
+    >>> client.ttfautohint(in_file="MyFont.ttf", out_file="MyFont-hinted.ttf")
+
+`Client.ttfautohint` accepts the same arguments as `ttfautohint.ttfautohint`;
+input files (font, control instructions and reference font) are read
+locally and sent to the server, and output files are written locally.
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import urllib.error
+import urllib.request
+
+from ttfautohint.errors import make_error
+
+
+__all__ = ["Client", "ServerBusy"]
+
+
+class ServerBusy(Exception):
+    """The server's queue for the requested priority lane is full."""
+
+    # the request can be retried later, see ttfautohint.RetryPolicy
+    transient = True
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _read(file, mode="rb"):
+    if hasattr(file, "read"):
+        return file.read()
+    with open(file, mode) as f:
+        return f.read()
+
+
+class Client(object):
+    """Send hinting jobs to the server at `url`, in the given `priority`
+    lane ("interactive" or "batch"). `timeout` is in seconds.
+    """
+
+    def __init__(self, url, priority="interactive", timeout=None):
+        self.url = url.rstrip("/")
+        self.priority = priority
+        self.timeout = timeout
+
+    def _request(self, path, body=None):
+        request = urllib.request.Request(self.url + path, data=body)
+        if body is not None:
+            request.add_header("Content-Type", "application/json")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            with e:
+                data = e.read()
+            try:
+                error = json.loads(data)
+            except ValueError:
+                raise e from None
+            message = error.get("message", "")
+            if error.get("error") == "TAError":
+                raise make_error(error["rv"], message) from None
+            elif e.code == 503:
+                raise ServerBusy(message, e.headers.get("Retry-After")) from None
+            elif error.get("error") == "TypeError":
+                raise TypeError(message) from None
+            elif e.code == 400:
+                raise ValueError(message) from None
+            raise
+
+    def stats(self):
+        """Return the server's queue and latency statistics, as a dict."""
+        return json.loads(self._request("/stats"))
+
+    def ttfautohint(self, priority=None, retry=None, **kwargs):
+        """Hint a font on the server; arguments and return value are the same
+        as for `ttfautohint.ttfautohint`. `priority` overrides the lane of
+        this client. With a `retry` RetryPolicy, transient failures and
+        ServerBusy responses are retried.
+        """
+        in_file = kwargs.pop("in_file", None)
+        in_buffer = kwargs.pop("in_buffer", None)
+        out_file = kwargs.pop("out_file", None)
+        if in_file is not None and in_buffer is not None:
+            raise ValueError("in_file and in_buffer are mutually exclusive")
+        if in_file is not None:
+            in_buffer = _read(in_file)
+        if in_buffer is None:
+            raise ValueError("No input file or buffer provided")
+        if not isinstance(in_buffer, bytes):
+            raise TypeError(
+                "in_buffer type must be bytes, not %s" % type(in_buffer).__name__
+            )
+        control_file = kwargs.pop("control_file", None)
+        if control_file is not None:
+            if kwargs.get("control_buffer") is not None:
+                raise ValueError(
+                    "control_file and control_buffer are mutually exclusive"
+                )
+            kwargs["control_buffer"] = _read(control_file, "r")
+        elif isinstance(kwargs.get("control_buffer"), bytes):
+            kwargs["control_buffer"] = kwargs["control_buffer"].decode("utf-8")
+        reference_file = kwargs.pop("reference_file", None)
+        if reference_file is not None:
+            if kwargs.get("reference_buffer") is not None:
+                raise ValueError(
+                    "reference_file and reference_buffer are mutually exclusive"
+                )
+            kwargs["reference_buffer"] = _read(reference_file)
+        if isinstance(kwargs.get("reference_buffer"), bytes):
+            kwargs["reference_buffer"] = base64.b64encode(
+                kwargs["reference_buffer"]
+            ).decode("ascii")
+        if isinstance(kwargs.get("family_suffix"), bytes):
+            kwargs["family_suffix"] = kwargs["family_suffix"].decode("utf-8")
+
+        body = json.dumps(
+            {
+                "font": base64.b64encode(in_buffer).decode("ascii"),
+                "options": kwargs,
+                "priority": priority or self.priority,
+            }
+        ).encode("utf-8")
+        if retry is not None:
+            key = None
+            if retry.memoize:
+                key = hashlib.sha256(body).hexdigest()
+            data = retry.call(self._request, "/hint", body, key=key)
+        else:
+            data = self._request("/hint", body)
+
+        if out_file is None:
+            return data
+        if isinstance(out_file, (str, bytes, os.PathLike)):
+            with open(out_file, "wb") as f:
+                f.write(data)
+            return None
+        try:
+            out_file.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            out_file.write(data)
+            return None
+        getattr(out_file, "buffer", out_file).write(data)
+        return None
@@ -0,0 +1,744 @@
+"""Parse, validate and normalize ttfautohint control instructions.
+
+The control instructions language is described in `ttfautohint.cli.EPILOG`
+and in the ttfautohint manual. The 'ttfautohint' executable only parses a
+control file after loading and analyzing the whole font; this module checks
+the same grammar upfront and reports errors with their line numbers.
+
+When a font is given, glyph names are resolved to glyph indices (using the
+same glyph order as fontTools, i.e. the names from the `post` table, or
+names derived from the `cmap` table if the font has no glyph names), and
+glyph indices, font indices and point numbers are checked against the font.
+
+`compile_control` returns a canonical, compact version of the instructions:
+one entry per line, no comments, number ranges sorted and merged, delta
+shifts rounded like the executable does. Stem widths are kept in their
+order, with any repetitions, since these change the output. Equivalent
+control files compile to the same text, which can thus be used as a cache
+key. Without a font, glyph names are kept as they are.
+"""
+import os
+import re
+from collections import namedtuple
+
+from ttfautohint.errors import ControlInstructionsError
+
+
+__all__ = [
+    "ControlError",
+    "DeltaEntry",
+    "SegmentEntry",
+    "StyleGlyphsEntry",
+    "StyleWidthsEntry",
+    "parse_control",
+    "compile_control",
+]
+
+
+SCRIPTS = frozenset(
+    (
+        "adlm arab armn avst bamu beng buhd cakm cans cari cher copt cprt cyrl "
+        "deva dsrt ethi geor geok glag goth grek gujr guru hebr hmnp kali khmr "
+        "khms knda lao latn latb latp lisu mlym medf mong mymr nkoo olck orkh "
+        "osge osma rohg saur shaw sinh sund taml tavt telu tfng thai vaii yezi "
+        "none"
+    ).split()
+)
+
+FEATURES = frozenset("c2cp c2sc ordn pcap ruby sinf smcp subs sups titl dflt".split())
+
+# scripts handled by the 'latin' writing system support all features
+# (except 'ruby'), the other scripts only have a default style
+_LATIN_SCRIPTS = frozenset(("cyrl", "grek", "latn"))
+_LATIN_FEATURES = FEATURES - {"ruby"}
+
+# ppem range accepted by delta exceptions
+DELTA_PPEM_MIN = 6
+DELTA_PPEM_MAX = 53
+# delta shifts are in pixels, rounded to multiples of 1/8
+DELTA_SHIFT_FACTOR = 8
+DELTA_SHIFT_MAX = 1.0
+# maximum number of stem widths per style
+MAX_WIDTHS = 16
+
+_KEYWORDS = {
+    "point": "p",
+    "p": "p",
+    "touch": "t",
+    "t": "t",
+    "xshift": "x",
+    "x": "x",
+    "yshift": "y",
+    "y": "y",
+    "left": "l",
+    "l": "l",
+    "right": "r",
+    "r": "r",
+    "nodir": "n",
+    "n": "n",
+    "width": "w",
+    "w": "w",
+}
+
+
+class ControlError(ValueError, ControlInstructionsError):
+    """Invalid control instructions.
+
+    `lineno` is the 1-based line number of the offending entry, `column` the
+    1-based column of the offending token (if known). It is also a
+    ControlInstructionsError, like the error the executable would report
+    for the same instructions.
+    """
+
+    def __init__(self, message, lineno=None, column=None, filename=None):
+        ValueError.__init__(self, message)
+        self.message = message
+        self.lineno = lineno
+        self.column = column
+        self.filename = filename
+        self.rv = 1
+        self.error_string = str(self)
+        self.code = None
+
+    def __reduce__(self):
+        return type(self), (self.message, self.lineno, self.column, self.filename)
+
+    def __str__(self):
+        location = [str(self.filename or "<control>")]
+        if self.lineno is not None:
+            location.append(str(self.lineno))
+            if self.column is not None:
+                location.append(str(self.column))
+        return "%s: %s" % (":".join(location), self.message)
+
+
+# Number sets are tuples of (start, end) ranges, sorted and non-overlapping;
+# None stands for an open end, i.e. the minimum (or maximum) valid value.
+
+DeltaEntry = namedtuple(
+    "DeltaEntry", "font_idx glyph when points x_shift y_shift ppems lineno"
+)
+DeltaEntry.__doc__ = """Delta exception applied before ('t') or after ('p') IUP.
+
+Shifts are in multiples of 1/8 px."""
+
+SegmentEntry = namedtuple(
+    "SegmentEntry", "font_idx glyph direction points left_offset right_offset lineno"
+)
+SegmentEntry.__doc__ = """One-point segments with direction 'l', 'r' or 'n'."""
+
+StyleGlyphsEntry = namedtuple(
+    "StyleGlyphsEntry", "font_idx script feature glyphs lineno"
+)
+StyleGlyphsEntry.__doc__ = """Assign glyphs to a style."""
+
+StyleWidthsEntry = namedtuple(
+    "StyleWidthsEntry", "font_idx script feature widths lineno"
+)
+StyleWidthsEntry.__doc__ = """Assign stem widths to a style; script is '*' for all
+scripts."""
+
+
+_Token = namedtuple("_Token", "type value lineno column")
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<ws>[ \t\f]+)
+  | (?P<eoe>[\n;])
+  | (?P<escaped_newline>\\\n)
+  | (?P<comment>\#[^\n]*)
+  | (?P<real>[0-9]*\.[0-9]+|[0-9]+\.[0-9]*)
+  | (?P<integer>[1-9][0-9]*|0[xX][0-9a-fA-F]+|0[0-7]+)
+  | (?P<char>[0+\-@,()*])
+  | (?P<name>[A-Za-z._][A-Za-z0-9._]*)
+  | (?P<invalid>.)
+    """,
+    re.VERBOSE,
+)
+
+
+def _parse_integer(s):
+    # decimal, hexadecimal (0x...) or octal (0...), like C's strtol
+    if s[:2] in ("0x", "0X"):
+        return int(s[2:], 16)
+    elif s[0] == "0":
+        return int(s, 8)
+    return int(s)
+
+
+def _tokenize(source):
+    """Split source into a list of entries, each a list of tokens."""
+    entries = []
+    tokens = []
+    lineno = 1
+    line_start = 0
+    for m in _TOKEN_RE.finditer(source):
+        kind = m.lastgroup
+        column = m.start() - line_start + 1
+        if kind == "eoe":
+            if tokens:
+                entries.append(tokens)
+                tokens = []
+            if m.group() == "\n":
+                lineno += 1
+                line_start = m.end()
+        elif kind == "escaped_newline":
+            lineno += 1
+            line_start = m.end()
+        elif kind in ("ws", "comment"):
+            continue
+        elif kind == "invalid":
+            raise ControlError(
+                "invalid character %r" % m.group(), lineno=lineno, column=column
+            )
+        else:
+            value = m.group()
+            if kind == "integer":
+                value = _parse_integer(value)
+            elif kind == "real":
+                value = float(value)
+            elif kind == "char":
+                if value == "0":
+                    kind, value = "integer", 0
+            tokens.append(_Token(kind, value, lineno, column))
+    if tokens:
+        entries.append(tokens)
+    return entries
+
+
+class _FontInfo(object):
+    """Glyph names and point counts of the (sub)fonts in a font file."""
+
+    def __init__(self, font):
+        from fontTools.ttLib import TTCollection, TTFont
+
+        if isinstance(font, TTFont):
+            fonts = [font]
+        elif isinstance(font, TTCollection):
+            fonts = list(font.fonts)
+        else:
+            if isinstance(font, bytes):
+                from io import BytesIO
+
+                font = BytesIO(font)
+            elif isinstance(font, (str, os.PathLike)):
+                font = os.fspath(font)
+            data = font
+            if not hasattr(data, "read"):
+                with open(data, "rb") as f:
+                    is_ttc = f.read(4) == b"ttcf"
+            else:
+                pos = data.tell()
+                is_ttc = data.read(4) == b"ttcf"
+                data.seek(pos)
+            if is_ttc:
+                fonts = list(TTCollection(data, lazy=True).fonts)
+            else:
+                fonts = [TTFont(data, lazy=True)]
+        self.fonts = fonts
+        self._glyph_orders = [None] * len(fonts)
+        self._name_maps = [None] * len(fonts)
+        self._num_points = [{} for _ in fonts]
+
+    def __len__(self):
+        return len(self.fonts)
+
+    def glyph_order(self, font_idx):
+        if self._glyph_orders[font_idx] is None:
+            self._glyph_orders[font_idx] = self.fonts[font_idx].getGlyphOrder()
+        return self._glyph_orders[font_idx]
+
+    def num_glyphs(self, font_idx):
+        return len(self.glyph_order(font_idx))
+
+    def glyph_index(self, font_idx, name):
+        if self._name_maps[font_idx] is None:
+            self._name_maps[font_idx] = {
+                n: i for i, n in enumerate(self.glyph_order(font_idx))
+            }
+        return self._name_maps[font_idx].get(name)
+
+    def num_points(self, font_idx, glyph_idx):
+        cache = self._num_points[font_idx]
+        if glyph_idx not in cache:
+            font = self.fonts[font_idx]
+            glyf = font["glyf"]
+            glyph = glyf[self.glyph_order(font_idx)[glyph_idx]]
+            coords, _, _ = glyph.getCoordinates(glyf)
+            cache[glyph_idx] = len(coords)
+        return cache[glyph_idx]
+
+
+class _EntryParser(object):
+    """Recursive-descent parser for the tokens of a single entry."""
+
+    def __init__(self, tokens, font_info):
+        self.tokens = tokens
+        self.pos = 0
+        self.font_info = font_info
+
+    # -- token helpers
+
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else None
+
+    def error(self, message, token=None):
+        if token is None:
+            token = self.peek()
+        if token is None:
+            token = self.tokens[-1]
+            return ControlError(
+                message,
+                lineno=token.lineno,
+                column=token.column + len(str(token.value)),
+            )
+        return ControlError(message, lineno=token.lineno, column=token.column)
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise self.error("unexpected end of entry")
+        self.pos += 1
+        return token
+
+    def accept_char(self, char):
+        token = self.peek()
+        if token is not None and token.type == "char" and token.value == char:
+            self.pos += 1
+            return True
+        return False
+
+    def expect_char(self, char):
+        if not self.accept_char(char):
+            raise self.error("expected %r" % char)
+
+    def keyword(self):
+        return self.keyword_at(0)
+
+    def integer(self):
+        token = self.next()
+        if token.type != "integer":
+            raise self.error("expected integer", token)
+        return token.value
+
+    def signed_integer(self):
+        sign = -1 if self.accept_char("-") else 1
+        if sign == 1:
+            self.accept_char("+")
+        return sign * self.integer()
+
+    def real(self):
+        sign = -1 if self.accept_char("-") else 1
+        if sign == 1:
+            self.accept_char("+")
+        token = self.next()
+        if token.type not in ("integer", "real"):
+            raise self.error("expected number", token)
+        return sign * token.value
+
+    def name(self):
+        token = self.next()
+        if token.type != "name":
+            raise self.error("expected name", token)
+        return token.value
+
+    # -- grammar
+
+    def keyword_at(self, offset):
+        token = self.peek(offset)
+        if token is not None and token.type == "name":
+            return _KEYWORDS.get(token.value)
+        return None
+
+    def parse(self):
+        first = self.peek()
+        if first.type != "integer":
+            return self.parse_entry(0)
+        # A leading integer is either a font index or a glyph index: it is a
+        # glyph index if it's followed by a keyword that isn't itself used as
+        # glyph name (e.g. '1 l 3' vs. '1 l l 3'). If the preferred reading
+        # fails, try the other one before reporting the first error.
+        glyph_first = (
+            self.keyword_at(1) in ("l", "r", "n", "p", "t")
+            and self.keyword_at(2) is None
+        )
+        attempts = [(0, 0), (1, first.value)]
+        if not glyph_first:
+            attempts.reverse()
+        error = None
+        for pos, font_idx in attempts:
+            self.pos = pos
+            try:
+                return self.parse_entry(font_idx)
+            except ControlError as e:
+                if error is None:
+                    error = e
+        raise error
+
+    def parse_entry(self, font_idx):
+        token = self.peek()
+        if token is None:
+            raise self.error("unexpected end of entry")
+        if font_idx and self.font_info is not None and font_idx >= len(self.font_info):
+            raise self.error("invalid font index %d" % font_idx, self.tokens[0])
+
+        if token.type == "char" and token.value == "*":
+            self.pos += 1
+            return self.parse_widths(font_idx, "*")
+        if token.type == "name" and self.peek(1) is not None:
+            second = self.peek(1)
+            if (
+                token.value in SCRIPTS
+                and second.type == "name"
+                and second.value not in _KEYWORDS
+            ):
+                if second.value not in FEATURES:
+                    raise self.error("invalid feature %r" % second.value, second)
+                self.pos += 2
+                self.check_style(token.value, second.value, token)
+                if self.keyword() == "w":
+                    return self.parse_widths(font_idx, token.value, second.value)
+                return self.parse_glyphs(font_idx, token.value, second.value)
+
+        glyph = self.glyph_id(font_idx)
+        kind = self.keyword()
+        if kind in ("p", "t"):
+            self.pos += 1
+            return self.parse_delta(font_idx, glyph, kind)
+        elif kind in ("l", "r", "n"):
+            self.pos += 1
+            return self.parse_segment(font_idx, glyph, kind)
+        raise self.error("expected one of 'l', 'r', 'n', 't', 'p'")
+
+    def check_style(self, script, feature, token):
+        if feature != "dflt" and (
+            script not in _LATIN_SCRIPTS or feature not in _LATIN_FEATURES
+        ):
+            raise self.error("invalid style '%s %s'" % (script, feature), token)
+
+    def glyph_id(self, font_idx):
+        token = self.next()
+        info = self.font_info
+        if token.type == "integer":
+            if info is not None and token.value >= info.num_glyphs(font_idx):
+                raise self.error("invalid glyph index %d" % token.value, token)
+            return token.value
+        elif token.type == "name":
+            if info is None:
+                return token.value
+            if token.value == ".notdef":
+                return 0
+            glyph_idx = info.glyph_index(font_idx, token.value)
+            if glyph_idx is None:
+                raise self.error("invalid glyph name %r" % token.value, token)
+            return glyph_idx
+        raise self.error("expected glyph name or index", token)
+
+    def number_set(self, minimum, maximum):
+        """Parse a number set, return a tuple of sorted, merged ranges.
+        `maximum` is None if unknown (no font given).
+        """
+        ranges = []
+        while True:
+            token = self.peek()
+            if self.accept_char("-"):
+                nxt = self.peek()
+                if nxt is not None and nxt.type == "integer":
+                    ranges.append((None, self.integer()))
+                else:
+                    ranges.append((None, None))
+            else:
+                start = self.integer()
+                if self.accept_char("-"):
+                    nxt = self.peek()
+                    if nxt is not None and nxt.type == "integer":
+                        end = self.integer()
+                        ranges.append((min(start, end), max(start, end)))
+                    else:
+                        ranges.append((start, None))
+                else:
+                    ranges.append((start, start))
+            for value in ranges[-1]:
+                if value is None:
+                    continue
+                if value < minimum or (maximum is not None and value > maximum):
+                    raise self.error("value %d out of range" % value, token)
+            if not self.accept_char(","):
+                break
+        return _normalize_ranges(ranges, minimum, maximum)
+
+    def points(self, font_idx, glyph):
+        maximum = None
+        if self.font_info is not None:
+            maximum = self.font_info.num_points(font_idx, glyph) - 1
+            if maximum < 0:
+                raise self.error("glyph has no points", self.tokens[self.pos - 1])
+        return self.number_set(0, maximum)
+
+    def parse_delta(self, font_idx, glyph, when):
+        points = self.points(font_idx, glyph)
+        x_shift = y_shift = 0
+        if self.keyword() == "x":
+            self.pos += 1
+            x_shift = self.shift()
+        if self.keyword() == "y":
+            self.pos += 1
+            y_shift = self.shift()
+        if not self.accept_char("@"):
+            raise self.error("expected '@' followed by ppem values")
+        ppems = self.number_set(DELTA_PPEM_MIN, DELTA_PPEM_MAX)
+        self.end()
+        lineno = self.tokens[0].lineno
+        return DeltaEntry(
+            font_idx, glyph, when, points, x_shift, y_shift, ppems, lineno
+        )
+
+    def shift(self):
+        token = self.peek()
+        value = self.real()
+        if not -DELTA_SHIFT_MAX <= value <= DELTA_SHIFT_MAX:
+            raise self.error("shift value out of range [-1.0;1.0]", token)
+        # round to multiples of 1/8px like the executable does
+        return int(value * DELTA_SHIFT_FACTOR + (0.5 if value > 0 else -0.5))
+
+    def parse_segment(self, font_idx, glyph, direction):
+        points = self.points(font_idx, glyph)
+        left = right = 0
+        if direction != "n" and self.accept_char("("):
+            left = self.offset()
+            self.expect_char(",")
+            right = self.offset()
+            self.expect_char(")")
+        self.end()
+        lineno = self.tokens[0].lineno
+        return SegmentEntry(font_idx, glyph, direction, points, left, right, lineno)
+
+    def offset(self):
+        token = self.peek()
+        value = self.signed_integer()
+        if not -0x8000 <= value <= 0x7FFF:
+            raise self.error("offset value out of range", token)
+        return value
+
+    def parse_glyphs(self, font_idx, script, feature):
+        lineno = self.tokens[0].lineno
+        if not self.accept_char("@"):
+            raise self.error("expected '@' followed by glyph ids")
+        glyphs = []
+        while True:
+            start = self.glyph_id(font_idx)
+            if self.accept_char("-"):
+                end = self.glyph_id(font_idx)
+                glyphs.append((start, end))
+            else:
+                glyphs.append((start, start))
+            if not self.accept_char(","):
+                break
+        self.end()
+        if self.font_info is not None:
+            # glyph sets can't have open ranges, so don't pass a maximum
+            glyphs = _normalize_ranges([(min(r), max(r)) for r in glyphs], 0, None)
+        else:
+            glyphs = tuple(_unique(glyphs))
+        return StyleGlyphsEntry(font_idx, script, feature, glyphs, lineno)
+
+    def parse_widths(self, font_idx, script, feature=None):
+        lineno = self.tokens[0].lineno
+        if feature is None:
+            feature = self.name()
+            if feature not in FEATURES:
+                raise self.error(
+                    "invalid feature %r" % feature, self.tokens[self.pos - 1]
+                )
+        if self.keyword() != "w":
+            raise self.error("expected 'w' followed by stem widths")
+        self.pos += 1
+        widths = []
+        while True:
+            token = self.peek()
+            value = self.integer()
+            if not 1 <= value <= 0xFFFF:
+                raise self.error("stem width out of range", token)
+            widths.append(value)
+            if not self.accept_char(","):
+                break
+        if len(widths) > MAX_WIDTHS:
+            raise self.error("too many stem widths (maximum %d)" % MAX_WIDTHS, token)
+        self.end()
+        # kept as is: the executable doesn't treat the first width (the
+        # default one) or repeated widths like a set
+        return StyleWidthsEntry(font_idx, script, feature, tuple(widths), lineno)
+
+    def end(self):
+        if self.peek() is not None:
+            raise self.error("unexpected %r" % str(self.peek().value))
+
+
+def _unique(iterable):
+    seen = set()
+    for item in iterable:
+        if item not in seen:
+            seen.add(item)
+            yield item
+
+
+def _normalize_ranges(ranges, minimum, maximum):
+    """Sort ranges, merge overlapping or adjacent ones, and collapse ranges
+    that cover the whole [minimum, maximum] interval into open ones.
+    """
+    closed = []
+    for start, end in ranges:
+        start = minimum if start is None else start
+        end = float("inf") if end is None else end
+        closed.append([start, end])
+    closed.sort()
+    merged = []
+    for start, end in closed:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    result = []
+    for start, end in merged:
+        if maximum is not None and end >= maximum:
+            end = float("inf")
+        result.append(
+            (
+                None if start == minimum and end == float("inf") else start,
+                None if end == float("inf") else end,
+            )
+        )
+    return tuple(result)
+
+
+def _format_range(r):
+    start, end = r
+    if start is None and end is None:
+        return "-"
+    elif start is None:
+        return "-%d" % end
+    elif end is None:
+        return "%d-" % start
+    elif start == end:
+        return "%d" % start
+    return "%d-%d" % (start, end)
+
+
+def _format_glyph_range(r):
+    start, end = r
+    if start == end:
+        return str(start)
+    return "%s-%s" % (start, end)
+
+
+def _format_shift(value):
+    return ("%.3f" % (value / DELTA_SHIFT_FACTOR)).rstrip("0").rstrip(".")
+
+
+def format_entry(entry):
+    """Return the canonical text representation of a control entry."""
+    parts = []
+    if entry.font_idx:
+        parts.append(str(entry.font_idx))
+    if isinstance(entry, DeltaEntry):
+        parts += [
+            str(entry.glyph),
+            entry.when,
+            ",".join(map(_format_range, entry.points)),
+        ]
+        if entry.x_shift:
+            parts += ["x", _format_shift(entry.x_shift)]
+        if entry.y_shift:
+            parts += ["y", _format_shift(entry.y_shift)]
+        parts += ["@", ",".join(map(_format_range, entry.ppems))]
+    elif isinstance(entry, SegmentEntry):
+        parts += [
+            str(entry.glyph),
+            entry.direction,
+            ",".join(map(_format_range, entry.points)),
+        ]
+        if entry.left_offset or entry.right_offset:
+            parts.append("(%d,%d)" % (entry.left_offset, entry.right_offset))
+    elif isinstance(entry, StyleGlyphsEntry):
+        parts += [
+            entry.script,
+            entry.feature,
+            "@",
+            ",".join(map(_format_glyph_range, entry.glyphs)),
+        ]
+    elif isinstance(entry, StyleWidthsEntry):
+        parts += [
+            entry.script,
+            entry.feature,
+            "w",
+            ",".join(map(str, entry.widths)),
+        ]
+    else:
+        raise TypeError(f"not a control entry: {entry!r}")
+    return " ".join(parts)
+
+
+def _read_source(source):
+    if hasattr(source, "read"):
+        source = source.read()
+    if isinstance(source, bytes):
+        try:
+            source = source.decode("utf-8")
+        except UnicodeDecodeError as e:
+            lineno = source.count(b"\n", 0, e.start) + 1
+            column = e.start - (source.rfind(b"\n", 0, e.start) + 1) + 1
+            raise ControlError("invalid UTF-8", lineno, column)
+    return source.replace("\r\n", "\n")
+
+
+def _uses_glyph_names(entries):
+    # whether the parsed entries refer to glyphs by names, which only the
+    # font can resolve
+    for entry in entries:
+        if isinstance(entry, StyleGlyphsEntry):
+            glyphs = [g for glyph_range in entry.glyphs for g in glyph_range]
+        elif isinstance(entry, (DeltaEntry, SegmentEntry)):
+            glyphs = [entry.glyph]
+        else:
+            continue
+        if any(isinstance(glyph, str) for glyph in glyphs):
+            return True
+    return False
+
+
+def parse_control(source, font=None, filename=None):
+    """Parse control instructions and return a list of entries.
+
+    `source` can be a string, bytes or a readable file object. `font` can be
+    a path, bytes, a file object, or a fontTools TTFont or TTCollection; if
+    given, glyph names are resolved to indices and all values are checked
+    against the font. Without a font, only the syntax and the value ranges
+    that don't depend on the font are checked.
+
+    Raise ControlError on the first invalid entry.
+    """
+    entries = []
+    try:
+        text = _read_source(source)
+        font_info = _FontInfo(font) if font is not None else None
+        for tokens in _tokenize(text):
+            entries.append(_EntryParser(tokens, font_info).parse())
+    except ControlError as e:
+        e.filename = filename
+        e.error_string = str(e)
+        raise
+    return entries
+
+
+def compile_control(source, font=None, filename=None):
+    """Parse and validate control instructions (see `parse_control`) and
+    return them in canonical form: one entry per line, without comments
+    or duplicate entries, with sorted and merged number ranges.
+    """
+    return _compile(parse_control(source, font, filename))
+
+
+def _compile(entries):
+    lines = _unique(format_entry(entry) for entry in entries)
+    return "".join(line + "\n" for line in lines)
@@ -0,0 +1,582 @@
+"""Predict the cost of hinting fonts, and schedule batches by it.
+
+Hinting time grows with the number of glyphs times the number of hint sets
+(see `ttfautohint.tune.hint_set_count`), so in a mixed batch a single large
+font submitted last can dominate the total time while the other workers sit
+idle. `read_font_stats` reads only the sfnt table directory and the `maxp`
+table of a font, and a `CostModel` turns these statistics into an
+`Estimate` of the hinting time and peak memory of the 'ttfautohint' process.
+
+The model is calibrated from past runs, which `hint_batch` records in a
+`CostHistory` file (by default in the user's cache directory) together with
+the time and peak resident set size measured with os.wait4. `hint_batch`
+starts the most expensive fonts first (longest processing time first
+scheduling), optionally within a memory budget (see
+`ttfautohint.admission`), and `cost_report` returns the estimates without
+hinting anything, e.g. for capacity planning:
+
+    >>> print(cost_report(["Latin.ttf", "CJK.ttf"], jobs=8).format())
+"""
+import heapq
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from ttfautohint._sfnt import (
+    SFNT_HEADER,
+    TTC_HEADER,
+    SFNTError,
+    read_struct,
+    reader,
+)
+from ttfautohint._utils import user_cache_dir
+from ttfautohint.admission import MemoryBudget, RSSPredictor
+from ttfautohint.hinter import Hinter
+from ttfautohint.journal import (
+    PreviousFailure,
+    _file_digest,
+    job_fingerprint,
+)
+from ttfautohint.tune import hint_set_count
+
+
+__all__ = [
+    "FontStats",
+    "Estimate",
+    "CostModel",
+    "CostHistory",
+    "BatchResult",
+    "CostReport",
+    "read_font_stats",
+    "lpt_order",
+    "makespan",
+    "hint_batch",
+    "cost_report",
+]
+
+
+FontStats = namedtuple(
+    "FontStats",
+    "file_size num_fonts num_glyphs glyf_size loca_size max_points max_contours",
+)
+FontStats.__doc__ = """Cheap statistics of a font file (summed over the
+subfonts of a collection)."""
+
+Estimate = namedtuple("Estimate", "seconds peak_rss")
+Estimate.__doc__ = """Predicted hinting time in seconds and peak resident set
+size in bytes of the 'ttfautohint' process."""
+
+BatchResult = namedtuple(
+    "BatchResult",
+    "in_path out_path estimate seconds peak_rss error resumed",
+    defaults=(False,),
+)
+BatchResult.__doc__ = """Outcome of hinting a font with `hint_batch`; `error`
+is the exception raised, or None on success. `resumed` is true if the
+outcome comes from the journal of a previous run."""
+
+# struct format of the beginning of the 'maxp' table, version 1.0
+_MAXP = struct.Struct(">LHHH")
+
+
+def read_font_stats(font):
+    """Return the FontStats of `font` (a path, bytes or a binary file
+    object), reading only the table directories and the `maxp` tables.
+
+    Raise SFNTError if the headers are truncated or inconsistent.
+    """
+    read, file_size, close = reader(font)
+    try:
+        offsets = [0]
+        if read(0, 4) == b"ttcf":
+            _, _, num_fonts = read_struct(TTC_HEADER, read, 0, "TTC header")
+            fmt = struct.Struct(">%dL" % num_fonts)
+            offsets = read_struct(fmt, read, TTC_HEADER.size, "TTC header")
+        totals = dict(num_glyphs=0, glyf_size=0, loca_size=0)
+        max_points = max_contours = 0
+        seen = set()
+        for offset in offsets:
+            _, num_tables, _, _, _ = read_struct(
+                SFNT_HEADER, read, offset, "sfnt header"
+            )
+            fmt = struct.Struct(">" + "4sLLL" * num_tables)
+            fields = read_struct(
+                fmt, read, offset + SFNT_HEADER.size, "table directory"
+            )
+            tables = {}
+            for i in range(0, len(fields), 4):
+                tag, _, table_offset, length = fields[i : i + 4]
+                if table_offset + length > file_size:
+                    raise SFNTError(
+                        f"table {tag.decode('latin-1')!r} extends past end of data"
+                    )
+                tables[tag] = (table_offset, length)
+            if b"maxp" not in tables:
+                raise SFNTError("missing 'maxp' table")
+            _, num_glyphs, points, contours = read_struct(
+                _MAXP, read, tables[b"maxp"][0], "'maxp' table"
+            )
+            totals["num_glyphs"] += num_glyphs
+            max_points = max(max_points, points)
+            max_contours = max(max_contours, contours)
+            for tag in (b"glyf", b"loca"):
+                if tag in tables and tables[tag] not in seen:
+                    # tables shared by subfonts are counted once
+                    seen.add(tables[tag])
+                    totals[tag.decode() + "_size"] += tables[tag][1]
+        return FontStats(
+            file_size=file_size,
+            num_fonts=len(offsets),
+            max_points=max_points,
+            max_contours=max_contours,
+            **totals,
+        )
+    finally:
+        close()
+
+
+def _features(stats, hint_sets):
+    work = stats.num_glyphs * hint_sets
+    return (
+        1.0,
+        stats.num_glyphs / 1e3,
+        work / 1e6,
+        work * hint_sets / 1e8,
+        stats.file_size / 1e6,
+    )
+
+
+def _solve(a, b):
+    # solve the linear system a x = b by Gaussian elimination with partial
+    # pivoting; `a` is a list of rows
+    n = len(b)
+    m = [list(row) + [v] for row, v in zip(a, b)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+        if abs(m[pivot][col]) < 1e-12:
+            raise ValueError("singular matrix")
+        m[col], m[pivot] = m[pivot], m[col]
+        for r in range(col + 1, n):
+            factor = m[r][col] / m[col][col]
+            for c in range(col, n + 1):
+                m[r][c] -= factor * m[col][c]
+    x = [0.0] * n
+    for r in reversed(range(n)):
+        x[r] = (m[r][n] - sum(m[r][c] * x[c] for c in range(r + 1, n))) / m[r][r]
+    return x
+
+
+def _fit(xs, ys, prior, ridge):
+    # least squares fit of ys ~ xs . coefs, shrunk towards the `prior`
+    # coefficients: minimize |X c - y|^2 + ridge * n * |c - prior|^2
+    n = len(prior)
+    penalty = ridge * len(ys)
+    a = [[penalty if i == j else 0.0 for j in range(n)] for i in range(n)]
+    b = [penalty * p for p in prior]
+    for x, y in zip(xs, ys):
+        for i in range(n):
+            b[i] += x[i] * y
+            for j in range(n):
+                a[i][j] += x[i] * x[j]
+    return _solve(a, b)
+
+
+class CostModel(object):
+    """Linear model of the hinting time (seconds) and peak RSS (bytes), as
+    functions of the number of glyphs, the number of hint sets and the file
+    size. The default coefficients were measured with a Latin font of a few
+    thousand glyphs and a subset of it; use `fit` (or `CostHistory.model`)
+    to calibrate them for the fonts and machine at hand.
+    """
+
+    TIME_COEFS = (0.01, 0.025, 0.23, 2.0, 0.0)
+    RSS_COEFS = (8e6, 0.0, 40e6, 0.0, 40e6)
+
+    # predictions are never lower than these
+    MIN_SECONDS = 0.001
+    MIN_RSS = 1 << 20
+
+    def __init__(self, time_coefs=TIME_COEFS, rss_coefs=RSS_COEFS):
+        self.time_coefs = tuple(time_coefs)
+        self.rss_coefs = tuple(rss_coefs)
+
+    def __repr__(self):
+        return "%s(time_coefs=%r, rss_coefs=%r)" % (
+            type(self).__name__,
+            self.time_coefs,
+            self.rss_coefs,
+        )
+
+    @classmethod
+    def fit(cls, records, ridge=1e-3, prior=None):
+        """Return a model fitted to `records`, a sequence of dicts with the
+        "stats" (FontStats fields), "hint_sets", "seconds" and "peak_rss"
+        of past runs. Coefficients are shrunk towards those of `prior`
+        (default: the built-in ones), so a few records are enough to adjust
+        the model to the speed of the machine.
+        """
+        prior = prior or cls()
+        xs, times, rsss = [], [], []
+        for record in records:
+            stats = FontStats(**record["stats"])
+            xs.append(_features(stats, record["hint_sets"]))
+            times.append(record["seconds"])
+            rsss.append(record.get("peak_rss"))
+        if not xs:
+            return cls(prior.time_coefs, prior.rss_coefs)
+        time_coefs = _fit(xs, times, prior.time_coefs, ridge)
+        rss_pairs = [(x, r) for x, r in zip(xs, rsss) if r is not None]
+        if rss_pairs:
+            rss_coefs = _fit(
+                [x for x, _ in rss_pairs],
+                [r for _, r in rss_pairs],
+                prior.rss_coefs,
+                ridge,
+            )
+        else:
+            rss_coefs = prior.rss_coefs
+        return cls(time_coefs, rss_coefs)
+
+    def estimate(self, stats, **options):
+        """Return the Estimate for hinting a font with the given FontStats and
+        ttfautohint options.
+        """
+        x = _features(stats, hint_set_count(options))
+        seconds = sum(c * v for c, v in zip(self.time_coefs, x))
+        peak_rss = sum(c * v for c, v in zip(self.rss_coefs, x))
+        return Estimate(max(seconds, self.MIN_SECONDS), max(peak_rss, self.MIN_RSS))
+
+
+def default_history_path():
+    return os.path.join(user_cache_dir(), "cost-history.jsonl")
+
+
+def peak_rss(rusage):
+    """Return the peak RSS in bytes from an os.wait4 `rusage`, or None.
+
+    Note that on Linux the peak of a child process includes the memory it
+    had before exec, i.e. (part of) the parent's at fork time.
+    """
+    if rusage is None:
+        return None
+    # kilobytes, except on macOS
+    return rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+class CostHistory(object):
+    """Append-only JSON lines file of measured hinting runs, shared by
+    threads and processes. Only the last `max_records` are used.
+    """
+
+    def __init__(self, path=None, max_records=10000):
+        self.path = os.fspath(path) if path is not None else default_history_path()
+        self.max_records = max_records
+        self._lock = threading.Lock()
+        self._cache = None
+
+    def record(self, stats, options, seconds, peak_rss=None):
+        line = json.dumps(
+            {
+                "stats": stats._asdict(),
+                "hint_sets": hint_set_count(options),
+                "seconds": seconds,
+                "peak_rss": peak_rss,
+            },
+            separators=(",", ":"),
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # a single write to a file opened in append mode is not interleaved
+        # with the writes of other processes
+        with self._lock, open(self.path, "ab") as f:
+            f.write(line.encode("utf-8") + b"\n")
+
+    def records(self):
+        try:
+            with open(self.path, "rb") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        records = []
+        for line in lines[-self.max_records :]:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # e.g. a line being written by another process
+                continue
+        return records
+
+    def model(self):
+        """Return a CostModel fitted to the recorded runs; it is cached until
+        the history file changes.
+        """
+        try:
+            st = os.stat(self.path)
+            version = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            version = None
+        with self._lock:
+            if self._cache is not None and self._cache[0] == version:
+                return self._cache[1]
+        model = CostModel.fit(self.records())
+        with self._lock:
+            self._cache = (version, model)
+        return model
+
+
+def lpt_order(costs):
+    """Return the indices of `costs` by decreasing cost: the longest
+    processing time first order, which keeps the makespan of greedy
+    scheduling within 4/3 of the optimum.
+    """
+    return sorted(range(len(costs)), key=lambda i: costs[i], reverse=True)
+
+
+def makespan(costs, workers):
+    """Return the total time taken by `workers` to process jobs with the
+    given `costs` in this order, each taking the next job when idle.
+    """
+    finish = [0.0] * max(1, min(workers, len(costs)))
+    for cost in costs:
+        heapq.heapreplace(finish, finish[0] + cost)
+    return max(finish)
+
+
+class CostReport(object):
+    """Estimated cost of hinting a batch of fonts; see `cost_report`."""
+
+    def __init__(self, paths, stats, estimates, jobs):
+        self.paths = paths
+        self.stats = stats
+        self.estimates = estimates
+        self.jobs = jobs
+
+    @property
+    def total_seconds(self):
+        return sum(e.seconds for e in self.estimates)
+
+    @property
+    def peak_rss(self):
+        """Largest estimated peak RSS of a single job."""
+        return max((e.peak_rss for e in self.estimates), default=0)
+
+    @property
+    def makespan(self):
+        """Estimated wall time with `jobs` workers and LPT scheduling."""
+        order = lpt_order([e.seconds for e in self.estimates])
+        return makespan([self.estimates[i].seconds for i in order], self.jobs)
+
+    def as_dict(self):
+        return {
+            "jobs": self.jobs,
+            "total_seconds": self.total_seconds,
+            "makespan": self.makespan,
+            "peak_rss": self.peak_rss,
+            "fonts": [
+                dict(path=p, glyphs=s.num_glyphs, **e._asdict())
+                for p, s, e in zip(self.paths, self.stats, self.estimates)
+            ],
+        }
+
+    def format(self):
+        """Return a text table of the estimates, most expensive first."""
+        lines = ["  ".join(["time", "peak_rss", "glyphs", "path"])]
+        for i in lpt_order([e.seconds for e in self.estimates]):
+            estimate = self.estimates[i]
+            lines.append(
+                "  ".join(
+                    [
+                        "%.2f" % estimate.seconds,
+                        "%dM" % round(estimate.peak_rss / (1 << 20)),
+                        str(self.stats[i].num_glyphs),
+                        os.fsdecode(self.paths[i]),
+                    ]
+                )
+            )
+        lines.append(
+            "total %.2fs, %.2fs with %d jobs, peak RSS per job %dM"
+            % (
+                self.total_seconds,
+                self.makespan,
+                self.jobs,
+                round(self.peak_rss / (1 << 20)),
+            )
+        )
+        return "\n".join(lines)
+
+
+def _model(model, history):
+    if model is not None:
+        return model
+    return (history or CostHistory()).model()
+
+
+def cost_report(paths, model=None, history=None, jobs=None, **options):
+    """Return a CostReport estimating the cost of hinting the fonts at
+    `paths` with the given ttfautohint options, using `jobs` workers
+    (default: number of CPUs). Nothing is hinted. The `model` defaults to
+    one fitted to the `history` (default: the user's CostHistory).
+    """
+    model = _model(model, history)
+    stats = [read_font_stats(path) for path in paths]
+    estimates = [model.estimate(s, **options) for s in stats]
+    return CostReport(list(paths), stats, estimates, jobs or os.cpu_count() or 1)
+
+
+def _hint_measured(hinter, in_path, out_path):
+    # return the time taken, and the peak RSS of the executable or None if
+    # it didn't run (e.g. the result was cached)
+    usages = []
+    start = time.perf_counter()
+    hinter._hint_file(in_path, out_path, usage=usages.append)
+    seconds = time.perf_counter() - start
+    if not usages:
+        return seconds, None, False
+    return seconds, peak_rss(usages[-1]), True
+
+
+def hint_batch(
+    pairs,
+    jobs=None,
+    model=None,
+    history=None,
+    record=True,
+    args=(),
+    memory_budget=None,
+    journal=None,
+    retry_failed="transient",
+    progress=None,
+    **options,
+):
+    """Hint many fonts with the same options, using up to `jobs` concurrent
+    processes (default: number of CPUs), starting with the ones estimated to
+    take longest. The `options` are those of `ttfautohint.Hinter`, which
+    runs each job (so retries, caches, preflight checks and profiles apply).
+    `args` are additional command-line arguments passed on to the
+    executable, which are not taken into account by the estimates.
+
+    If `memory_budget` is given (a `ttfautohint.admission.MemoryBudget`, or
+    its limit in bytes), a font is only started when its predicted peak RSS
+    fits in the budget; the predictions are corrected with the peaks
+    measured during the batch.
+
+    `pairs` is a sequence of (input path, output path) tuples; outputs are
+    written atomically. The time and peak memory of each successful run of
+    the executable (not of results found in a cache) are added to the
+    `history` (default: the user's CostHistory) if `record` is
+    true, and the estimates come from `model` (default: fitted to the
+    history). Return a list of BatchResult, in the same order as `pairs`;
+    failures are reported there rather than raised.
+
+    If `journal` (a `ttfautohint.journal.JobJournal`) is given, each outcome
+    is recorded in it as soon as the font is done, and the fonts that a
+    previous run with the same journal completed are skipped, as are those
+    that failed unless `retry_failed` says otherwise (see
+    `ttfautohint.journal`). `progress`, if given, is called with each
+    BatchResult and the numbers of fonts done and in the batch, the skipped
+    ones first.
+    """
+    history = history or CostHistory()
+    model = _model(model, history)
+    pairs = list(pairs)
+    estimates = []
+    stats = []
+    for in_path, _ in pairs:
+        try:
+            s = read_font_stats(in_path)
+        except (OSError, SFNTError):
+            # let the executable report the error
+            s = None
+        stats.append(s)
+        estimates.append(model.estimate(s, **options) if s is not None else None)
+
+    if memory_budget is not None and not isinstance(memory_budget, MemoryBudget):
+        memory_budget = MemoryBudget(memory_budget)
+    predictor = RSSPredictor(model)
+
+    results = [None] * len(pairs)
+    done = [0]
+    progress_lock = threading.Lock()
+
+    def finish(i, result):
+        results[i] = result
+        if progress is not None:
+            with progress_lock:
+                done[0] += 1
+                progress(result, done[0], len(pairs))
+
+    with Hinter(args=args, **options) as hinter:
+        pending = range(len(pairs))
+        if journal is not None:
+            fingerprint = job_fingerprint(hinter)
+            entries = journal.entries()
+            pending = []
+            for i, (in_path, out_path) in enumerate(pairs):
+                entry = journal.resume(
+                    entries, in_path, out_path, fingerprint, retry_failed
+                )
+                if entry is None:
+                    pending.append(i)
+                    continue
+                error = None
+                if entry["status"] != "done":
+                    error = PreviousFailure(entry["error"])
+                finish(
+                    i,
+                    BatchResult(
+                        in_path,
+                        out_path,
+                        estimates[i],
+                        entry["seconds"],
+                        entry["peak_rss"],
+                        error,
+                        resumed=True,
+                    ),
+                )
+
+        def run(i):
+            in_path, out_path = pairs[i]
+            if memory_budget is None:
+                return _hint_measured(hinter, in_path, out_path)
+            if stats[i] is None:
+                reservation = CostModel.MIN_RSS
+            else:
+                reservation = predictor.predict(stats[i], **options)
+            with memory_budget.reserve(reservation):
+                seconds, rss, ran = _hint_measured(hinter, in_path, out_path)
+            if stats[i] is not None:
+                predictor.observe(stats[i], rss, **options)
+            return seconds, rss, ran
+
+        def job(i):
+            in_path, out_path = pairs[i]
+            if journal is not None:
+                input_digest = _file_digest(in_path)
+            try:
+                seconds, rss, ran = run(i)
+            except Exception as e:
+                if journal is not None:
+                    journal.record(
+                        in_path, out_path, input_digest, fingerprint, error=e
+                    )
+                finish(i, BatchResult(in_path, out_path, estimates[i], None, None, e))
+                return
+            if journal is not None:
+                journal.record(
+                    in_path, out_path, input_digest, fingerprint, seconds, rss
+                )
+            if record and ran and stats[i] is not None:
+                history.record(stats[i], options, seconds, rss)
+            finish(i, BatchResult(in_path, out_path, estimates[i], seconds, rss, None))
+
+        # unreadable fonts fail fast, so they are run last
+        costs = [e.seconds if e else 0.0 for e in estimates]
+        order = [pending[i] for i in lpt_order([costs[i] for i in pending])]
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+            for future in [pool.submit(job, i) for i in order]:
+                future.result()
+    return results
@@ -0,0 +1,313 @@
+"""Hint glyphs with identical outlines only once.
+
+CJK fonts and fonts with many compatibility characters contain thousands of
+glyphs with byte-identical outlines (compatibility ideographs, alternate
+encodings, aliases), which ttfautohint hints one by one. `hint_deduplicated`
+finds them, and hints a copy of the font in which all but one glyph of each
+set of duplicates (its 'representative') are emptied; each duplicate is then
+replaced by the hinted representative, so that hinting time depends on the
+number of unique outlines. The `glyf` and `loca` tables are laid out like
+ttfautohint does, so that the result is the one of hinting the whole font.
+
+Glyphs are only treated as duplicates if ttfautohint would hint them the
+same way: they must be simple glyphs with the same data (apart from their
+instructions) and the same horizontal metrics, mapped by the `cmap` table
+to characters of the same script (from which ttfautohint derives their
+style), and neither be components of composite glyphs, nor results of GSUB
+substitutions, nor appear in control instructions. The representative is
+the glyph of the smallest code point, so that the glyphs from which the
+blue zones and stem widths are derived, which are in the main block of
+each script, are never emptied. This is a heuristic, though: with
+`verify=True`, the font is also hinted as a whole, and DedupError is raised
+if the results differ.
+
+Example:
+
+    >>> with open("NotoSansCJK.ttf", "rb") as f:
+    ...     hinted = hint_deduplicated(f.read(), verify=True)
+
+Requires fontTools.
+"""
+import struct
+from collections import namedtuple
+from io import BytesIO
+
+from ttfautohint._sfnt import read_table_directory, write_sfnt
+
+__all__ = ["DedupError", "DedupStats", "find_duplicates", "hint_deduplicated"]
+
+# offset of the indexToLocFormat field in the `head' table
+HEAD_LOCA_FORMAT_OFFSET = 50
+
+
+class DedupError(ValueError):
+    pass
+
+
+DedupStats = namedtuple("DedupStats", "glyphs unique duplicates")
+DedupStats.__doc__ = """\
+The number of glyphs of a font, of glyphs hinted by `hint_deduplicated`,
+and of duplicates given the instructions of their representative.
+"""
+
+
+def _load(data):
+    from fontTools.ttLib import TTFont
+
+    return TTFont(BytesIO(data), recalcBBoxes=False, recalcTimestamp=False)
+
+
+def _outline_data(data):
+    # the glyph data without its instructions, or None if it isn't a simple
+    # glyph with contours
+    if len(data) < 10:
+        return None
+    (num_contours,) = struct.unpack(">h", data[:2])
+    if num_contours <= 0:
+        return None
+    offset = 10 + 2 * num_contours
+    (length,) = struct.unpack(">H", data[offset : offset + 2])
+    return data[:offset] + data[offset + 2 + length :]
+
+
+def _glyph_length(data):
+    # the length of the simple glyph `data` without its padding
+    if not data:
+        return 0
+    (num_contours,) = struct.unpack_from(">h", data)
+    end_points = struct.unpack_from(">%dH" % num_contours, data, 10)
+    num_points = end_points[-1] + 1
+    offset = 10 + 2 * num_contours
+    (length,) = struct.unpack_from(">H", data, offset)
+    offset += 2 + length
+    coordinates = 0
+    point = 0
+    while point < num_points:
+        flag = data[offset]
+        offset += 1
+        repeat = 1
+        if flag & 0x08:
+            repeat += data[offset]
+            offset += 1
+        for short, same in ((0x02, 0x10), (0x04, 0x20)):
+            if flag & short:
+                coordinates += repeat
+            elif not flag & same:
+                coordinates += 2 * repeat
+        point += repeat
+    return offset + coordinates
+
+
+def _replace_glyphs(output, replacements):
+    # return the `glyf', `loca' and `head' tables of the font `output`, with
+    # the data of the glyphs at the indices of `replacements` replaced by
+    # that of the glyphs at the mapped indices, laid out like the executable
+    # does: the glyphs are padded to four bytes, except the last one, padded
+    # to two, and `loca' uses the short format if possible
+    _, records = read_table_directory(output)
+    tables = {r.tag: output[r.offset : r.offset + r.length] for r in records}
+    head, glyf = tables["head"], tables["glyf"]
+    (loca_format,) = struct.unpack_from(">h", head, HEAD_LOCA_FORMAT_OFFSET)
+    if loca_format:
+        offsets = struct.unpack(">%dL" % (len(tables["loca"]) // 4), tables["loca"])
+    else:
+        offsets = [
+            2 * o
+            for o in struct.unpack(">%dH" % (len(tables["loca"]) // 2), tables["loca"])
+        ]
+    glyphs = [glyf[start:end] for start, end in zip(offsets, offsets[1:])]
+    for index, source in replacements.items():
+        data = glyphs[source]
+        data = data[: _glyph_length(data)]
+        padding = 2 if index == len(glyphs) - 1 else 4
+        glyphs[index] = data + b"\0" * (-len(data) % padding)
+    offsets = [0]
+    for data in glyphs:
+        offsets.append(offsets[-1] + len(data))
+    if offsets[-1] <= 0x1FFFE:
+        loca = struct.pack(">%dH" % len(offsets), *(o // 2 for o in offsets))
+        loca_format = 0
+    else:
+        loca = struct.pack(">%dL" % len(offsets), *offsets)
+        loca_format = 1
+    head = (
+        head[:HEAD_LOCA_FORMAT_OFFSET]
+        + struct.pack(">h", loca_format)
+        + head[HEAD_LOCA_FORMAT_OFFSET + 2 :]
+    )
+    return {"glyf": b"".join(glyphs), "loca": loca, "head": head}
+
+
+def _substituted_glyphs(font):
+    # the glyphs that GSUB lookups can substitute for others
+    glyphs = set()
+    if "GSUB" not in font or font["GSUB"].table.LookupList is None:
+        return glyphs
+    for lookup in font["GSUB"].table.LookupList.Lookup:
+        for subtable in lookup.SubTable:
+            if lookup.LookupType == 7:
+                subtable = subtable.ExtSubTable
+            if hasattr(subtable, "mapping"):  # single, multiple
+                for value in subtable.mapping.values():
+                    glyphs.update([value] if isinstance(value, str) else value)
+            elif hasattr(subtable, "alternates"):
+                for value in subtable.alternates.values():
+                    glyphs.update(value)
+            elif hasattr(subtable, "ligatures"):
+                for ligatures in subtable.ligatures.values():
+                    glyphs.update(ligature.LigGlyph for ligature in ligatures)
+    return glyphs
+
+
+def _control_glyphs(control, font):
+    from ttfautohint.control import StyleGlyphsEntry, parse_control
+
+    glyph_order = font.getGlyphOrder()
+    glyphs = set()
+    for entry in parse_control(control, font):
+        if isinstance(entry, StyleGlyphsEntry):
+            for start, end in entry.glyphs:
+                glyphs.update(glyph_order[start : end + 1])
+        elif hasattr(entry, "glyph"):
+            glyphs.add(glyph_order[entry.glyph])
+    return glyphs
+
+
+def find_duplicates(font, control=None):
+    """Return a dict mapping the names of the glyphs of the fontTools TTFont
+    `font` that can be hinted like another glyph (see the module docstring)
+    to the name of that glyph. `control` are the control instructions the
+    font is hinted with, if any.
+    """
+    from fontTools import unicodedata
+
+    glyf = font["glyf"]
+    hmtx = font["hmtx"]
+    scripts = {}
+    code_points = {}
+    for code_point, name in sorted(font.getBestCmap().items()):
+        scripts.setdefault(name, set()).add(unicodedata.script(chr(code_point)))
+        code_points.setdefault(name, code_point)
+
+    excluded = _substituted_glyphs(font)
+    for glyph in glyf.glyphs.values():
+        excluded.update(glyph.getComponentNames(glyf))
+    if control is not None:
+        excluded |= _control_glyphs(control, font)
+
+    representatives = {}
+    duplicates = {}
+    for name in sorted(code_points, key=code_points.get):
+        if name in excluded:
+            continue
+        glyph = glyf.glyphs[name]
+        data = getattr(glyph, "data", None)
+        if data is None:
+            # empty, or already decompiled
+            data = glyph.compile(glyf, recalcBBoxes=False)
+        outline = _outline_data(data)
+        if outline is None:
+            continue
+        key = (outline, hmtx[name], frozenset(scripts[name]))
+        representative = representatives.setdefault(key, name)
+        if representative != name:
+            duplicates[name] = representative
+    return duplicates
+
+
+def _control_source(options):
+    if options.get("control_buffer") is not None:
+        return options["control_buffer"]
+    if options.get("control_file") is not None:
+        with open(options["control_file"], "rb") as f:
+            return f.read()
+    return None
+
+
+def _differences(expected, actual):
+    # the tags of the tables, or the names of the glyphs, that differ
+    _, expected_records = read_table_directory(expected)
+    _, actual_records = read_table_directory(actual)
+    expected_tables = {
+        r.tag: expected[r.offset : r.offset + r.length] for r in expected_records
+    }
+    actual_tables = {
+        r.tag: actual[r.offset : r.offset + r.length] for r in actual_records
+    }
+    differences = sorted(set(expected_tables) ^ set(actual_tables))
+    for tag in sorted(set(expected_tables) & set(actual_tables)):
+        a, b = expected_tables[tag], actual_tables[tag]
+        if tag == "head":
+            # checkSumAdjustment
+            a, b = a[:8] + a[12:], b[:8] + b[12:]
+        if tag not in ("glyf", "loca") and a != b:
+            differences.append(tag)
+    expected_glyf = _load(expected)["glyf"]
+    actual_glyf = _load(actual)["glyf"]
+    for name in expected_glyf.keys():
+        a = expected_glyf.glyphs[name].compile(expected_glyf, recalcBBoxes=False)
+        b = actual_glyf.glyphs[name].compile(actual_glyf, recalcBBoxes=False)
+        if a != b:
+            differences.append(name)
+    return differences
+
+
+def hint_deduplicated(data, verify=False, stats=None, **options):
+    """Hint the font `data` (bytes) like `ttfautohint(in_buffer=data,
+    **options)`, but hint duplicate glyphs only once; see the module
+    docstring. If `stats` is a list, a DedupStats tuple is appended to it.
+
+    With `verify`, also hint the whole font and raise DedupError if the
+    results differ.
+    """
+    from fontTools.ttLib.tables._g_l_y_f import Glyph
+
+    from ttfautohint import ttfautohint
+
+    for name in ("in_file", "in_buffer", "out_file", "out_format", "optimize"):
+        if name in options:
+            raise TypeError(
+                f"hint_deduplicated() got an unexpected keyword argument {name!r}"
+            )
+    if not isinstance(data, bytes):
+        raise TypeError(f"data type must be bytes, not {type(data).__name__}")
+
+    font = _load(data)
+    duplicates = find_duplicates(font, _control_source(options))
+    if stats is not None:
+        num_glyphs = len(font.getGlyphOrder())
+        stats.append(
+            DedupStats(num_glyphs, num_glyphs - len(duplicates), len(duplicates))
+        )
+    if not duplicates:
+        result = ttfautohint(in_buffer=data, **options)
+    else:
+        glyf = font["glyf"]
+        for name in duplicates:
+            glyf.glyphs[name] = Glyph()
+        buf = BytesIO()
+        font.save(buf, reorderTables=None)
+
+        output = ttfautohint(in_buffer=buf.getvalue(), **options)
+        # keep the layout of the executable's output, which a full run would
+        # have produced, replacing only `glyf', `loca' and `head'
+        index = {name: i for i, name in enumerate(font.getGlyphOrder())}
+        replaced = _replace_glyphs(
+            output,
+            {index[name]: index[source] for name, source in duplicates.items()},
+        )
+        sfnt_version, records = read_table_directory(output)
+        records.sort(key=lambda r: r.offset)
+        tables = [(r.tag, output[r.offset : r.offset + r.length]) for r in records]
+        result = write_sfnt(
+            sfnt_version, [(tag, replaced.get(tag, table)) for tag, table in tables]
+        )
+
+    if verify:
+        expected = ttfautohint(in_buffer=data, **options)
+        if result != expected:
+            differences = _differences(expected, result) or ["table layout"]
+            raise DedupError(
+                "deduplicated font differs in %s" % ", ".join(differences[:10])
+            )
+    return result
@@ -1,7 +1,106 @@
+import re
+import signal as _signal
+
+
+# Error codes reported by the ttfautohint library (see ttfautohint-errors.h),
+# plus the FreeType ones that are relevant to classifying failures.
+TA_ERR_OUT_OF_MEMORY = 0x40  # FT_Err_Out_Of_Memory
+TA_ERR_INVALID_FREETYPE_VERSION = 0x0E
+TA_ERR_MISSING_LEGAL_PERMISSION = 0x0F
+TA_ERR_INVALID_STREAM_WRITE = 0x5F
+TA_ERR_MISSING_GLYPH = 0xF1
+TA_ERR_MISSING_UNICODE_CMAP = 0xF2
+TA_ERR_MISSING_SYMBOL_CMAP = 0xF3
+TA_ERR_CANCELED = 0xF4
+TA_ERR_ALREADY_PROCESSED = 0xF5
+TA_ERR_INVALID_FONT_TYPE = 0xF6
+TA_ERR_UNKNOWN_ARGUMENT = 0xF7
+TA_ERR_XHEIGHT_SNAPPING_ALLOCATION_ERROR = 0x106
+TA_ERR_CONTROL_ALLOCATION_ERROR = 0x210
+# the executable reports errors loading the reference font with this offset
+TA_ERR_REFERENCE_OFFSET = 0x300
+
+# The executable exits with status 1 on every error, and reports the actual
+# error code on stderr, either as a number or, for the most common errors,
+# with a more user-friendly message.
+_CODE_PATTERNS = [
+    (re.compile(r"code 0x([0-9a-fA-F]+) occurred while loading the reference"), 0x300),
+    (re.compile(r"code 0x([0-9a-fA-F]+) occurred"), 0),
+    (re.compile(r"\(0x([0-9a-fA-F]+)\)$", re.MULTILINE), 0),
+]
+_MESSAGES = [
+    ("FreeType version 2.4.5 or higher", TA_ERR_INVALID_FREETYPE_VERSION),
+    ("not a valid font in SFNT format", TA_ERR_INVALID_FONT_TYPE),
+    ("already been processed", TA_ERR_ALREADY_PROCESSED),
+    ("must not be modified without permission", TA_ERR_MISSING_LEGAL_PERMISSION),
+    ("No Unicode character map", TA_ERR_MISSING_UNICODE_CMAP),
+    ("No symbol character map", TA_ERR_MISSING_SYMBOL_CMAP),
+    ("No glyph for a standard character", TA_ERR_MISSING_GLYPH),
+]
+
+_TRANSIENT_CODES = frozenset(
+    [
+        TA_ERR_OUT_OF_MEMORY,
+        TA_ERR_INVALID_STREAM_WRITE,
+        TA_ERR_CANCELED,
+        TA_ERR_XHEIGHT_SNAPPING_ALLOCATION_ERROR,
+        TA_ERR_CONTROL_ALLOCATION_ERROR,
+    ]
+)
+# signals sent from outside (e.g. by the OOM killer, a timeout or the user),
+# rather than raised by a bug in the executable
+_TRANSIENT_SIGNALS = frozenset(
+    getattr(_signal, name)
+    for name in ("SIGKILL", "SIGTERM", "SIGINT", "SIGHUP", "SIGXCPU", "SIGPIPE")
+    if hasattr(_signal, name)
+)
+
+
+def parse_error_code(error_string):
+    """Return the ttfautohint library error code reported in the executable's
+    `error_string` output, or None if there is none.
+    """
+    for pattern, offset in _CODE_PATTERNS:
+        match = pattern.search(error_string)
+        if match:
+            return int(match.group(1), 16) + offset
+    collapsed = " ".join(error_string.split())
+    for message, code in _MESSAGES:
+        if message in collapsed:
+            return code
+    return None
+
+
 class TAError(Exception):
+    """The 'ttfautohint' executable failed.
+
+    `rv` is its return code (negative if it was killed by a signal), and
+    `error_string` its decoded stderr. `code` is the library error code
+    parsed from the latter, if any. Use `make_error` to get an instance of
+    the subclass matching the kind of failure; its `category` tells whether
+    the same input is bound to fail again (`deterministic` is True), or the
+    failure depends on the circumstances and can be retried (`transient` is
+    True). Failures that couldn't be classified are neither.
+    """
+
+    category = "unknown"
+    transient = False
+    deterministic = False
+
     def __init__(self, rv, error_string):
         self.rv = int(rv)
-        self.error_string = error_string.decode("utf-8", errors="replace")
+        if isinstance(error_string, bytes):
+            error_string = error_string.decode("utf-8", errors="replace")
+        self.error_string = error_string or ""
+        self.code = parse_error_code(self.error_string)
+
+    @property
+    def signal(self):
+        """Number of the signal that killed the process, or None."""
+        return -self.rv if self.rv < 0 else None
+
+    def __reduce__(self):
+        return type(self), (self.rv, self.error_string)
 
     def __str__(self):
         error = self.rv
@@ -10,3 +109,84 @@ class TAError(Exception):
         if error_string:
             s += ": %s" % error_string
         return s
+
+
+class TransientError(TAError):
+    """Failure caused by the environment (the process was killed, or ran out
+    of memory or disk space), which may not happen again."""
+
+    category = "transient"
+    transient = True
+
+
+class InvalidFontError(TAError):
+    """The input font can't be hinted: it is not a TrueType font, has no
+    suitable character map or glyphs, or was already hinted."""
+
+    category = "invalid-font"
+    deterministic = True
+
+
+class RestrictedFontError(TAError):
+    """The font's license forbids modifying it; see `ignore_restrictions`."""
+
+    category = "restricted"
+    deterministic = True
+
+
+class InvalidReferenceError(TAError):
+    """The reference font can't be loaded."""
+
+    category = "invalid-reference"
+    deterministic = True
+
+
+class ControlInstructionsError(TAError):
+    """The control instructions file is invalid."""
+
+    category = "control"
+    deterministic = True
+
+
+class InvalidOptionError(TAError):
+    """An option value was rejected by the executable."""
+
+    category = "options"
+    deterministic = True
+
+
+class CrashError(TAError):
+    """The executable crashed (e.g. with a segmentation fault)."""
+
+    category = "crash"
+
+
+def _error_class(rv, code):
+    if rv < 0:
+        return TransientError if -rv in _TRANSIENT_SIGNALS else CrashError
+    if code is None:
+        return TAError
+    if code in _TRANSIENT_CODES:
+        return TransientError
+    if code == TA_ERR_MISSING_LEGAL_PERMISSION:
+        return RestrictedFontError
+    if code >= TA_ERR_REFERENCE_OFFSET:
+        return InvalidReferenceError
+    if code >= 0x200:
+        return ControlInstructionsError
+    if code >= 0x100 or code == TA_ERR_UNKNOWN_ARGUMENT:
+        return InvalidOptionError
+    if code == TA_ERR_INVALID_FREETYPE_VERSION:
+        return TAError
+    return InvalidFontError
+
+
+def make_error(rv, error_string):
+    """Return the TAError subclass instance describing a failed run of the
+    executable, from its return code `rv` and its stderr `error_string`.
+    """
+    error = TAError(rv, error_string)
+    cls = _error_class(error.rv, error.code)
+    if cls is not TAError:
+        error = cls(rv, error.error_string)
+    return error
@@ -0,0 +1,133 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from ttfautohint._pipeline import Pipeline
+from ttfautohint._utils import atomic_open, sha256_hexdigest
+from ttfautohint.options import WRAPPER_OPTIONS, validate_options
+
+
+# options that identify the input and output, supplied to each hint call
+_IO_OPTIONS = ("in_file", "in_buffer", "out_file")
+
+
+class Hinter(Pipeline):
+    """Hint many fonts with the same options.
+
+    The options (the same keyword arguments accepted by `ttfautohint()`,
+    except for `in_file`, `in_buffer` and `out_file`) are validated and
+    converted to command-line arguments only once. Control instructions are
+    checked upfront (raising `ttfautohint.control.ControlError`) and written
+    once, in canonical form, to a temporary file; so is a `reference_buffer`.
+    Temporary files are removed by `close()` (or when the Hinter is
+    garbage-collected, or at exit).
+
+    Unless the `preflight` option is false, fonts are checked before running
+    the executable, and WOFF2 fonts are unwrapped (see
+    `ttfautohint.preflight`). Unless `strip_tables` is false, large tables
+    that the executable doesn't read are kept out of it (see
+    `ttfautohint._strip`).
+
+    If the `retry` option is a `ttfautohint.RetryPolicy`, transient failures
+    of the executable are retried, and deterministic ones are memoized by
+    `cache_key`. With an `analysis_cache` (see `ttfautohint.analysis`), the
+    global analysis of each font is reused across runs. A `profile` callback
+    (see `ttfautohint.profile`) is called from the thread that ran the
+    executable.
+
+    `args` are additional command-line arguments passed on to the
+    executable, which are part of the `config`.
+
+    Hinter objects can be used as context managers, and can be shared by
+    multiple threads.
+    """
+
+    def __init__(self, args=(), **options):
+        for name in _IO_OPTIONS:
+            if name in options:
+                raise TypeError(
+                    f"{name!r} must be passed to the hint methods, not to Hinter"
+                )
+        # the fonts are checked by the hint methods
+        tempfiles = []
+        opts = validate_options(
+            dict(options, in_buffer=b"", preflight=False), tempfiles
+        )
+        del opts["in_file"], opts["in_buffer"], opts["out_file"]
+        super().__init__(
+            opts,
+            tempfiles,
+            preflight=bool(options.get("preflight", WRAPPER_OPTIONS["preflight"])),
+            args=args,
+        )
+
+    def hint(self, data, timeout=None):
+        """Hint the font contained in `data` bytes and return the result.
+
+        If `timeout` (in seconds) expires, the 'ttfautohint' process is killed
+        and subprocess.TimeoutExpired is raised.
+        """
+        if not isinstance(data, bytes):
+            raise TypeError(f"data type must be bytes, not {type(data).__name__}")
+        return self.run(in_buffer=data, timeout=timeout)
+
+    def hint_file(self, in_path, out_path=None):
+        """Hint the font at `in_path`.
+
+        If `out_path` is None, return the hinted font data; else write it to
+        `out_path` atomically and return None.
+        """
+        return self._hint_file(in_path, out_path)
+
+    def _hint_file(self, in_path, out_path, usage=None):
+        # `usage` is called with the resource usage of the executable, if it
+        # ran successfully; see Pipeline.run
+        with open(in_path, "rb") as f:
+            if out_path is None:
+                return self.run(in_file=f, usage=usage)
+            with atomic_open(out_path) as out:
+                self.run(in_file=f, stdout=out, usage=usage)
+
+    def hint_many(self, items, jobs=None, model=None, history=None):
+        """Hint several fonts concurrently, using up to `jobs` threads (default:
+        number of CPUs), each running a 'ttfautohint' subprocess.
+
+        Each item can be font data bytes, an input path, or a tuple of
+        (input path, output path). Return a list with the results of `hint`
+        or `hint_file` for each item, in the same order.
+
+        The fonts estimated to take longest (see `ttfautohint.cost`) are
+        started first, so that a large font doesn't delay the whole batch.
+        The estimates come from `model` (default: fitted to the `history`,
+        which defaults to the user's CostHistory), as for `hint_batch`.
+        """
+        from ttfautohint._sfnt import SFNTError
+        from ttfautohint.cost import _model, lpt_order, read_font_stats
+
+        items = list(items)
+        model = _model(model, history)
+        options = self.config.as_dict()
+
+        def estimate(item):
+            try:
+                stats = read_font_stats(item[0] if isinstance(item, tuple) else item)
+            except (OSError, SFNTError):
+                return 0.0
+            return model.estimate(stats, **options).seconds
+
+        def hint_one(item):
+            if isinstance(item, bytes):
+                return self.hint(item)
+            elif isinstance(item, tuple):
+                return self.hint_file(*item)
+            return self.hint_file(item)
+
+        order = lpt_order([estimate(item) for item in items])
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+            futures = {i: pool.submit(hint_one, items[i]) for i in order}
+            return [futures[i].result() for i in range(len(items))]
+
+    def cache_key(self, data):
+        """Return a key identifying the result of hinting `data` with this
+        Hinter's options.
+        """
+        return self._failure_key(sha256_hexdigest(data))
@@ -0,0 +1,160 @@
+"""Resume interrupted batches from a journal of completed jobs.
+
+A long batch that dies (preemption, out of memory, deployment) shouldn't
+start over. When `ttfautohint.cost.hint_batch` is given a `JobJournal`, it
+appends a line to it as soon as each font is done, recording the digests of
+the input and output files, a fingerprint of the options (see
+`job_fingerprint`), whether it succeeded, and how long it took:
+
+    $ ttfautohint --batch fonts/*.ttf --output-dir out --journal out/journal.jsonl
+
+Running the same batch again with the same journal skips the fonts whose
+input, options and output are unchanged since they were hinted; fonts that
+failed are hinted again according to the `retry_failed` policy: "all" of
+them, only those that failed for a "transient" reason (e.g. the process was
+killed; the default), or "none". Since outputs are written atomically, a
+crash never leaves a truncated font behind, and an output that doesn't
+match its digest in the journal is hinted again.
+"""
+import json
+import os
+import threading
+import time
+
+from ttfautohint.cache import executable_digest, result_key
+
+
+__all__ = ["RETRY_FAILED", "JobJournal", "PreviousFailure", "job_fingerprint"]
+
+
+RETRY_FAILED = ("all", "transient", "none")
+
+
+class PreviousFailure(Exception):
+    """A font that failed in a previous run, and wasn't hinted again."""
+
+
+def _file_digest(path):
+    from ttfautohint._pipeline import _file_digest
+
+    try:
+        return _file_digest(path)
+    except OSError:
+        return None
+
+
+def job_fingerprint(hinter, args=()):
+    """Return a digest of the options of `hinter` (a Hinter) and of the
+    additional command-line `args`, with the digests of its control and
+    reference files and of the executable; a font is only hinted again if it
+    changes.
+    """
+    import ttfautohint
+
+    return result_key(
+        list(hinter._cache_args) + list(args),
+        None,
+        control_digest=hinter.config.control_digest,
+        reference_digest=hinter.config.reference_digest,
+        executable=executable_digest(ttfautohint._executable_path()),
+        postprocess=hinter._postprocess_options,
+    )
+
+
+def _job(in_path, out_path):
+    return (
+        os.path.abspath(os.fsdecode(in_path)),
+        os.path.abspath(os.fsdecode(out_path)),
+    )
+
+
+class JobJournal(object):
+    """Append-only JSON lines file of the jobs completed by batches, shared
+    by threads. Each line is flushed to disk before `record` returns.
+    """
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        self._lock = threading.Lock()
+
+    def entries(self):
+        """Return a dict mapping the (input, output) absolute paths of each
+        job to its last entry.
+        """
+        try:
+            with open(self.path, "rb") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return {}
+        entries = {}
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                entries[(entry["input"], entry["output"])] = entry
+            except (ValueError, KeyError, TypeError):
+                # e.g. the last line, if the batch died while writing it
+                continue
+        return entries
+
+    def record(
+        self,
+        in_path,
+        out_path,
+        input_digest,
+        fingerprint,
+        seconds=None,
+        peak_rss=None,
+        error=None,
+    ):
+        """Append the outcome of hinting the font at `in_path` to
+        `out_path`; `error` is the exception raised, if it failed.
+        """
+        in_path, out_path = _job(in_path, out_path)
+        entry = {
+            "input": in_path,
+            "output": out_path,
+            "input_sha256": input_digest,
+            "options": fingerprint,
+            "status": "done" if error is None else "failed",
+            "output_sha256": _file_digest(out_path) if error is None else None,
+            "seconds": seconds,
+            "peak_rss": peak_rss,
+            "error": None if error is None else str(error),
+            "transient": bool(getattr(error, "transient", False)),
+            "time": time.time(),
+        }
+        line = json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n"
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(dirname, exist_ok=True)
+        with self._lock, open(self.path, "a+b") as f:
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # the rest of a line torn by a crash
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        return entry
+
+    def resume(self, entries, in_path, out_path, fingerprint, retry_failed="transient"):
+        """Return the entry of a previous run of the job if it doesn't need
+        to run again, or None. `entries` is the result of `entries()`.
+        """
+        if retry_failed not in RETRY_FAILED:
+            raise ValueError(f"unknown retry_failed policy {retry_failed!r}")
+        entry = entries.get(_job(in_path, out_path))
+        if entry is None or entry.get("options") != fingerprint:
+            return None
+        input_digest = _file_digest(in_path)
+        if input_digest is None or entry.get("input_sha256") != input_digest:
+            return None
+        if entry.get("status") == "done":
+            if _file_digest(out_path) != entry.get("output_sha256"):
+                return None
+            return entry
+        if retry_failed == "all":
+            return None
+        if retry_failed == "transient" and entry.get("transient"):
+            return None
+        return entry
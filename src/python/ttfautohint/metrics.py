@@ -0,0 +1,572 @@
+"""Opt-in metrics for the hinting calls made by this process (or processes).
+
+    >>> from ttfautohint import metrics
+    >>> registry = metrics.enable()
+    >>> ttfautohint(in_file="MyFont.ttf", out_file="out.ttf")
+    >>> print(registry.to_prometheus())
+
+Once enabled, every `ttfautohint()` call reports its latency (bucketed by
+input font size), outcome, failures by TAError category and code, and bytes
+read and written; and every run of the executable (including those made by
+`Hinter`, `Watcher`, etc.) its duration and exit status. The number of calls
+and processes in flight are tracked by gauges. Nothing is recorded, and
+there is no overhead, until `enable()` is called.
+
+A Registry is thread-safe. To aggregate the metrics of several worker
+processes, enable them with the same `directory`: each process periodically
+(and at exit) writes a snapshot of its own metrics to a file there, and
+`collect()`, `snapshot()` and `to_prometheus()` return the sum over all of
+them. Gauges of processes that are no longer running are ignored.
+
+Metrics can be exported in the Prometheus text exposition format, or as a
+JSON-serializable snapshot; no third-party dependency is needed.
+"""
+import atexit
+import bisect
+import json
+import math
+import os
+import sys
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from ttfautohint._utils import atomic_write
+
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "enable",
+    "disable",
+    "active_registry",
+]
+
+
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# upper bounds of the font size classes used to label latencies, in bytes
+DEFAULT_SIZE_BUCKETS = (64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20)
+
+_SNAPSHOT_SUFFIX = ".metrics.json"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{%s}" % ",".join(f'{name}="{_escape(str(v))}"' for name, v in pairs)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_size(size):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size:g}{unit}"
+        size /= 1024
+
+
+class _Metric(object):
+    type = None
+
+    def __init__(self, name, help, labelnames, lock):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = lock
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        with self._lock:
+            return [[list(k), self._copy(v)] for k, v in self._values.items()]
+
+    def _copy(self, value):
+        return value
+
+    def _describe(self):
+        return {"type": self.type, "help": self.help, "labelnames": self.labelnames}
+
+    def get(self, **labels):
+        with self._lock:
+            return self._copy(self._values.get(self._key(labels), self._zero()))
+
+    def _zero(self):
+        return 0
+
+    def _reset(self):
+        self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("counters can only be incremented")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, e.g. the number of jobs in flight."""
+
+    type = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over the given bucket upper bounds.
+
+    Values are stored as a list of per-bucket counts (the last one for
+    +Inf), followed by the sum of all the observed values.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames, lock, buckets):
+        super().__init__(name, help, labelnames, lock)
+        buckets = sorted(float(b) for b in buckets)
+        if not buckets:
+            raise ValueError("a histogram needs at least one bucket")
+        if buckets[-1] != math.inf:
+            buckets.append(math.inf)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = self._zero()
+            counts[index] += 1
+            counts[-1] += value
+
+    def _zero(self):
+        return [0] * len(self.buckets) + [0.0]
+
+    def _copy(self, value):
+        return list(value)
+
+    def _describe(self):
+        description = super()._describe()
+        description["buckets"] = [b if b != math.inf else "+Inf" for b in self.buckets]
+        return description
+
+
+def _merge(families, snapshot, live):
+    for name, family in snapshot.items():
+        if family["type"] == "gauge" and not live:
+            continue
+        merged = families.setdefault(
+            name, dict(family, labelnames=list(family["labelnames"]), samples={})
+        )
+        if merged["type"] != family["type"] or merged.get("buckets") != family.get(
+            "buckets"
+        ):
+            raise ValueError(f"inconsistent definitions of metric {name!r}")
+        samples = merged["samples"]
+        for labels, value in family["samples"]:
+            key = tuple(labels)
+            if key not in samples:
+                samples[key] = value
+            elif isinstance(value, list):
+                samples[key] = [a + b for a, b in zip(samples[key], value)]
+            else:
+                samples[key] += value
+
+
+def _pid_alive(pid):
+    if sys.platform == "win32":
+        # os.kill would terminate the process
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+# the registries in use, flushed at exit and reset in forked children by
+# hooks registered once, which don't keep them alive
+_registries = weakref.WeakSet()
+_registries_lock = threading.Lock()
+
+
+def _live_registries():
+    with _registries_lock:
+        return list(_registries)
+
+
+def _flush_registries():
+    for registry in _live_registries():
+        try:
+            registry.flush()
+        except OSError:
+            pass
+
+
+def _reset_registries():
+    # forked children start counting from zero, or their snapshot would
+    # count the parent's samples twice; the locks may have been held by
+    # other threads of the parent
+    global _registries_lock, _active_lock
+
+    _registries_lock = threading.Lock()
+    _active_lock = threading.Lock()
+    for registry in _live_registries():
+        registry._lock = threading.RLock()
+        for metric in registry._metrics.values():
+            metric._lock = registry._lock
+        registry._reset()
+
+
+atexit.register(_flush_registries)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_registries)
+
+
+class Registry(object):
+    """Collection of named metrics.
+
+    If `directory` is given, the metrics of this process are written there
+    by `flush()`, at most every `flush_interval` seconds by `maybe_flush()`,
+    and at exit if the registry is still in use; and the exported metrics
+    include those of all the processes sharing the directory.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = os.fspath(directory) if directory is not None else None
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._metrics = {}
+        self._last_flush = time.monotonic()
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+        with _registries_lock:
+            _registries.add(self)
+
+    def _add(self, cls, name, help, labelnames, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, help, labelnames, self._lock, *args)
+                self._metrics[name] = metric
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"metric {name!r} is already defined differently")
+            return metric
+
+    def counter(self, name, help="", labelnames=()):
+        return self._add(Counter, name, help, labelnames)
+
+    def gauge(self, name, help="", labelnames=()):
+        return self._add(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help="", labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._add(Histogram, name, help, labelnames, buckets)
+
+    def __getitem__(self, name):
+        return self._metrics[name]
+
+    def _reset(self):
+        for metric in self._metrics.values():
+            metric._reset()
+
+    def _local(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: dict(m._describe(), samples=m._samples()) for m in metrics}
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.directory, f"{pid}{_SNAPSHOT_SUFFIX}")
+
+    def flush(self):
+        """Write the metrics of this process to the shared directory."""
+        if self.directory is None:
+            return
+        data = {"pid": os.getpid(), "time": time.time(), "metrics": self._local()}
+        atomic_write(
+            self._snapshot_path(os.getpid()),
+            json.dumps(data, separators=(",", ":")).encode("utf-8"),
+        )
+        self._last_flush = time.monotonic()
+
+    def maybe_flush(self):
+        if (
+            self.directory is not None
+            and time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def collect(self):
+        """Return a dict of metric families, keyed by name, each with its
+        "type", "help", "labelnames", "buckets" (for histograms) and
+        "samples", a dict mapping label value tuples to the (summed) values.
+        """
+        families = {}
+        _merge(families, self._local(), live=True)
+        if self.directory is None:
+            return families
+        pid = os.getpid()
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith(_SNAPSHOT_SUFFIX):
+                continue
+            try:
+                other = int(filename[: -len(_SNAPSHOT_SUFFIX)])
+            except ValueError:
+                continue
+            if other == pid:
+                continue
+            try:
+                with open(os.path.join(self.directory, filename), "rb") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            _merge(families, data["metrics"], live=_pid_alive(other))
+        return families
+
+    def snapshot(self):
+        """Return the metrics as a JSON-serializable dict."""
+        result = {}
+        for name, family in sorted(self.collect().items()):
+            family = dict(family)
+            family["samples"] = [
+                {"labels": dict(zip(family["labelnames"], key)), "value": value}
+                for key, value in sorted(family["samples"].items())
+            ]
+            if family["type"] == "histogram":
+                for sample in family["samples"]:
+                    counts = sample.pop("value")
+                    sample["buckets"] = counts[:-1]
+                    sample["count"] = sum(counts[:-1])
+                    sample["sum"] = counts[-1]
+            result[name] = family
+        return result
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, family in sorted(self.collect().items()):
+            labelnames = family["labelnames"]
+            if family["help"]:
+                help = family["help"].replace("\\", "\\\\").replace("\n", "\\n")
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for key, value in sorted(family["samples"].items()):
+                if family["type"] != "histogram":
+                    labels = _format_labels(labelnames, key)
+                    lines.append(f"{name}{labels} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(family["buckets"], value):
+                    cumulative += count
+                    le = ("le", "+Inf" if bound == "+Inf" else _format_value(bound))
+                    labels = _format_labels(labelnames, key, [le])
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+                labels = _format_labels(labelnames, key)
+                lines.append(f"{name}_sum{labels} {_format_value(value[-1])}")
+                lines.append(f"{name}_count{labels} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+class _HintMetrics(object):
+    # the metrics reported by ttfautohint() and run()
+
+    def __init__(self, registry, latency_buckets, size_buckets):
+        self.registry = registry
+        self.size_buckets = tuple(sorted(size_buckets))
+        self.calls = registry.counter(
+            "ttfautohint_calls_total",
+            "Number of completed ttfautohint() calls.",
+            ["status"],
+        )
+        self.errors = registry.counter(
+            "ttfautohint_errors_total",
+            "Number of ttfautohint() calls failed with a TAError.",
+            ["category", "code"],
+        )
+        self.latency = registry.histogram(
+            "ttfautohint_duration_seconds",
+            "Duration of ttfautohint() calls, by input font size.",
+            ["size"],
+            buckets=latency_buckets,
+        )
+        self.bytes_in = registry.counter(
+            "ttfautohint_input_bytes_total", "Size of the input fonts."
+        )
+        self.bytes_out = registry.counter(
+            "ttfautohint_output_bytes_total", "Size of the output fonts."
+        )
+        self.in_flight = registry.gauge(
+            "ttfautohint_calls_in_flight", "Number of running ttfautohint() calls."
+        )
+        self.process_runs = registry.counter(
+            "ttfautohint_process_runs_total",
+            "Number of runs of the ttfautohint executable, by exit status.",
+            ["returncode"],
+        )
+        self.process_latency = registry.histogram(
+            "ttfautohint_process_duration_seconds",
+            "Duration of the runs of the ttfautohint executable.",
+            buckets=latency_buckets,
+        )
+        self.processes = registry.gauge(
+            "ttfautohint_processes_running",
+            "Number of running ttfautohint processes.",
+        )
+
+    def size_label(self, size):
+        if size is None:
+            return "unknown"
+        index = bisect.bisect_left(self.size_buckets, size)
+        if index == len(self.size_buckets):
+            return ">" + _format_size(self.size_buckets[-1])
+        return "<=" + _format_size(self.size_buckets[index])
+
+
+class _Observation(object):
+    __slots__ = ("in_size", "out_size", "returncode")
+
+    def __init__(self, in_size=None):
+        self.in_size = in_size
+        self.out_size = None
+        self.returncode = None
+
+
+_active = None
+_active_lock = threading.Lock()
+
+
+def enable(
+    registry=None,
+    directory=None,
+    latency_buckets=DEFAULT_LATENCY_BUCKETS,
+    size_buckets=DEFAULT_SIZE_BUCKETS,
+):
+    """Start reporting the hinting calls to `registry` (by default, a new
+    Registry sharing `directory`, if given), and return it.
+
+    `latency_buckets` are the upper bounds in seconds of the duration
+    histograms; `size_buckets` those in bytes of the input size classes
+    used to label the ttfautohint() durations.
+    """
+    global _active
+    if registry is None:
+        registry = Registry(directory)
+    with _active_lock:
+        _active = _HintMetrics(registry, latency_buckets, size_buckets)
+    return registry
+
+
+def disable():
+    """Stop reporting the hinting calls."""
+    global _active
+    with _active_lock:
+        active, _active = _active, None
+    if active is not None:
+        active.registry.flush()
+
+
+def active_registry():
+    """Return the Registry passed to `enable()`, or None if disabled."""
+    active = _active
+    return active.registry if active is not None else None
+
+
+@contextmanager
+def observe_call(in_size=None):
+    """Record a ttfautohint() call; the caller sets the `out_size` of the
+    yielded object. Does nothing if metrics are disabled.
+    """
+    active = _active
+    observation = _Observation(in_size)
+    if active is None:
+        yield observation
+        return
+    active.in_flight.inc()
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield observation
+        status = "ok"
+    except Exception as e:
+        category = getattr(e, "category", None)
+        if category is not None:
+            code = getattr(e, "code", None)
+            active.errors.inc(
+                category=category, code="none" if code is None else "0x%02X" % code
+            )
+        raise
+    finally:
+        active.latency.observe(
+            time.perf_counter() - start, size=active.size_label(in_size)
+        )
+        active.in_flight.dec()
+        active.calls.inc(status=status)
+        if in_size is not None:
+            active.bytes_in.inc(in_size)
+        if observation.out_size is not None and status == "ok":
+            active.bytes_out.inc(observation.out_size)
+        active.registry.maybe_flush()
+
+
+@contextmanager
+def observe_process():
+    """Record a run of the executable; the caller sets the `returncode` of
+    the yielded object. Does nothing if metrics are disabled.
+    """
+    active = _active
+    observation = _Observation()
+    if active is None:
+        yield observation
+        return
+    active.processes.inc()
+    start = time.perf_counter()
+    try:
+        yield observation
+    finally:
+        active.process_latency.observe(time.perf_counter() - start)
+        active.processes.dec()
+        returncode = observation.returncode
+        active.process_runs.inc(returncode="none" if returncode is None else returncode)
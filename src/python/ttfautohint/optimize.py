@@ -0,0 +1,631 @@
+"""Shrink the TrueType bytecode of hinted fonts.
+
+ttfautohint emits a short, highly regular program for every glyph, so the
+same instruction sequences recur thousands of times. `optimize_font()`
+post-processes a hinted font to make it smaller without changing how it
+renders:
+
+- instruction sequences repeated across glyph programs are moved to new
+  functions in the `fpgm` table, and replaced by calls;
+- consecutive push instructions are merged;
+- function definitions that are never called have their body removed, and
+  trailing CVT entries that are never accessed are dropped; this is only
+  done when all the function numbers and CVT indices used by the font's
+  bytecode are literal values, which is never the case for ttfautohint's
+  own functions, so it mostly applies to fonts hinted by other means;
+- the `maxp` limits are updated accordingly.
+
+The result is checked twice: every optimized glyph program, with the new
+function calls inlined back, must push the same values and execute the same
+instructions as the original one; and if the `freetype-py` package is
+installed, all glyphs of both fonts are loaded with FreeType's bytecode
+interpreter at a sample of PPEM sizes, and their hinted outlines compared.
+
+Requires fontTools.
+"""
+import heapq
+import importlib.util
+import logging
+import struct
+from collections import Counter, namedtuple
+from io import BytesIO
+
+
+__all__ = [
+    "DEFAULT_PPEMS",
+    "OptimizeError",
+    "OptimizeStats",
+    "optimize_font",
+    "optimize_ttfont",
+    "verify_font",
+]
+
+
+log = logging.getLogger(__name__)
+
+# the PPEM sizes at which optimized and original fonts are compared
+DEFAULT_PPEMS = (9, 12, 16, 24)
+
+NPUSHB, NPUSHW = 0x40, 0x41
+PUSHB, PUSHW = 0xB0, 0xB8
+CALL, LOOPCALL = 0x2B, 0x2A
+FDEF, ENDF, IDEF = 0x2C, 0x2D, 0x89
+JUMPS = frozenset((0x1C, 0x78, 0x79))  # JMPR, JROT, JROF
+# instructions that can't be moved into a function
+CONTROL_FLOW = JUMPS | {0x58, 0x1B, 0x59, FDEF, ENDF, IDEF}  # + IF, ELSE, EIF
+
+# instructions taking a CVT index from the stack, and its depth
+CVT_OPERANDS = {0x45: (0,), 0x44: (1,), 0x70: (1,), 0x3E: (0,), 0x3F: (0,)}
+CVT_OPERANDS.update((op, (0,)) for op in range(0xE0, 0x100))  # MIRP
+DELTAC = frozenset((0x73, 0x74, 0x75))
+
+
+class OptimizeError(ValueError):
+    pass
+
+
+OptimizeStats = namedtuple(
+    "OptimizeStats",
+    "size_before size_after functions_added functions_dropped cvt_dropped",
+)
+OptimizeStats.__doc__ = """Bytecode savings of `optimize_ttfont()`.
+
+`size_before` and `size_after` are the total size in bytes of the glyph
+programs plus the `fpgm`, `prep` and `cvt ` tables."""
+
+
+def decode(code):
+    """Split TrueType bytecode into a list of instructions, each a bytes
+    object including the data of push instructions.
+    """
+    result = []
+    i, n = 0, len(code)
+    while i < n:
+        op = code[i]
+        if op == NPUSHB:
+            size = 2 + (code[i + 1] if i + 1 < n else 0)
+        elif op == NPUSHW:
+            size = 2 + 2 * (code[i + 1] if i + 1 < n else 0)
+        elif PUSHB <= op < PUSHB + 8:
+            size = 2 + op - PUSHB
+        elif PUSHW <= op < PUSHW + 8:
+            size = 1 + 2 * (1 + op - PUSHW)
+        else:
+            size = 1
+        if i + size > n:
+            raise OptimizeError("truncated push instruction")
+        result.append(code[i : i + size])
+        i += size
+    return result
+
+
+def push_values(instruction):
+    """Return the list of values pushed by a push instruction, or None for
+    any other instruction.
+    """
+    op = instruction[0]
+    if op == NPUSHB:
+        return list(instruction[2:])
+    elif PUSHB <= op < PUSHB + 8:
+        return list(instruction[1:])
+    elif op == NPUSHW:
+        data = instruction[2:]
+    elif PUSHW <= op < PUSHW + 8:
+        data = instruction[1:]
+    else:
+        return None
+    return list(struct.unpack(">%dh" % (len(data) // 2), data))
+
+
+def _encode_run(values, is_byte):
+    code = bytearray()
+    for start in range(0, len(values), 255):
+        chunk = values[start : start + 255]
+        n = len(chunk)
+        if is_byte:
+            head = bytes([PUSHB + n - 1]) if n <= 8 else bytes([NPUSHB, n])
+            code += head + bytes(chunk)
+        else:
+            head = bytes([PUSHW + n - 1]) if n <= 8 else bytes([NPUSHW, n])
+            code += head + struct.pack(">%dh" % n, *chunk)
+    return bytes(code)
+
+
+def encode_push(values):
+    """Return push instructions for the given values, using bytes where
+    possible.
+    """
+    code = b""
+    start = 0
+    for i in range(1, len(values) + 1):
+        if i == len(values) or (0 <= values[i] < 256) != (0 <= values[start] < 256):
+            code += _encode_run(values[start:i], 0 <= values[start] < 256)
+            start = i
+    return code
+
+
+def _canonical(instructions):
+    # pushed values become ints, so that different encodings of the same
+    # values compare equal
+    result = []
+    for instruction in instructions:
+        values = push_values(instruction)
+        if values is None:
+            result.append(instruction)
+        else:
+            result.extend(values)
+    return result
+
+
+def _merge_pushes(instructions):
+    result = []
+    run = []
+
+    def flush():
+        if len(run) > 1:
+            merged = encode_push(_canonical(run))
+            if len(merged) < sum(len(i) for i in run):
+                result.extend(decode(merged))
+                del run[:]
+                return
+        result.extend(run)
+        del run[:]
+
+    for instruction in instructions:
+        if push_values(instruction) is not None:
+            run.append(instruction)
+        else:
+            flush()
+            result.append(instruction)
+    flush()
+    return result
+
+
+def _literal(canonical, index, depth):
+    # the value at `depth` on the stack before executing the instruction at
+    # `index`, if it was pushed right before it; else None
+    pos = index - 1 - depth
+    if pos < 0 or any(isinstance(x, bytes) for x in canonical[pos:index]):
+        return None
+    return canonical[pos]
+
+
+def _references(canonical):
+    """Return the sets of function numbers and CVT indices referenced by a
+    canonical program, or None in place of a set if any of them is computed
+    at run time.
+    """
+    functions, cvts = set(), set()
+    for i, item in enumerate(canonical):
+        if not isinstance(item, bytes):
+            continue
+        op = item[0]
+        if op in (CALL, LOOPCALL):
+            value = _literal(canonical, i, 0)
+            if value is None:
+                functions = None
+            elif functions is not None:
+                functions.add(value)
+        elif op in CVT_OPERANDS or op in DELTAC:
+            if op in DELTAC:
+                count = _literal(canonical, i, 0)
+                if count is None:
+                    cvts = None
+                    continue
+                # pairs of (CVT index, exception) below the count
+                depths = range(1, 2 * count + 1)
+            else:
+                depths = CVT_OPERANDS[op]
+            for depth in depths:
+                value = _literal(canonical, i, depth)
+                if value is None:
+                    cvts = None
+                elif cvts is not None:
+                    cvts.add(value)
+    return functions, cvts
+
+
+def _split_fpgm(instructions):
+    """Return a dict mapping function numbers to (start, end) slices of the
+    function bodies, and the list of top-level instructions (including IDEF
+    bodies). Return None if the function numbers can't be determined.
+    """
+    functions = {}
+    top_level = []
+    stack = []
+    i, n = 0, len(instructions)
+    while i < n:
+        instruction = instructions[i]
+        op = instruction[0]
+        if op in (FDEF, IDEF):
+            if op == FDEF and not stack:
+                return None
+            number = stack.pop() if op == FDEF else None
+            start = i + 1
+            while i < n and instructions[i][0] != ENDF:
+                i += 1
+            if op == FDEF:
+                functions[number] = (start, i)
+            else:
+                top_level.extend(instructions[start:i])
+        else:
+            values = push_values(instruction)
+            if values is None:
+                return None
+            stack.extend(values)
+            top_level.append(instruction)
+        i += 1
+    return functions, top_level
+
+
+class _Factorizer(object):
+    """Greedily move the instruction sequences that save the most bytes to
+    new functions, until no sequence is worth a function.
+
+    Programs are lists of instructions (bytes), in which calls to the new
+    functions are represented by the function number (int).
+    """
+
+    def __init__(self, programs, first_function, max_functions, max_length):
+        self.programs = programs
+        self.next_function = first_function
+        self.max_functions = max_functions
+        self.max_length = max_length
+        self.functions = {}
+
+    def count(self):
+        """Return the number of (possibly overlapping) occurrences of every
+        sequence that can be moved to a function, and the indices of the
+        programs in which each occurs.
+        """
+        counts = Counter()
+        where = {}
+        for p, program in enumerate(self.programs):
+            for i in range(len(program)):
+                for j in range(i, min(i + self.max_length, len(program))):
+                    if program[j][0] in CONTROL_FLOW:
+                        break
+                    sequence = tuple(program[i : j + 1])
+                    counts[sequence] += 1
+                    where.setdefault(sequence, set()).add(p)
+        return counts, where
+
+    def gain(self, sequence, occurrences):
+        size = sum(len(i) for i in sequence)
+        call_size = 3 if self.next_function < 256 else 4
+        # the definition costs FDEF, ENDF and the function number in a push
+        return occurrences * (size - call_size) - (size + 3)
+
+    def find(self, program, sequence):
+        k = len(sequence)
+        i = 0
+        while i <= len(program) - k:
+            if tuple(program[i : i + k]) == sequence:
+                yield i
+                i += k
+            else:
+                i += 1
+
+    def replace(self, sequence, number, indices):
+        k = len(sequence)
+        for p in indices:
+            program = self.programs[p]
+            for i in reversed(list(self.find(program, sequence))):
+                program[i : i + k] = [number]
+
+    def run(self):
+        counts, where = self.count()
+        # lazy greedy: the occurrences of a sequence can only decrease as
+        # other sequences are replaced (sequences with calls aren't moved to
+        # functions), so estimates are upper bounds, refreshed when popped
+        heap = [
+            (-self.gain(sequence, n), order, sequence)
+            for order, (sequence, n) in enumerate(counts.items())
+            if n > 1
+        ]
+        heapq.heapify(heap)
+        while heap and len(self.functions) < self.max_functions:
+            estimate, order, sequence = heapq.heappop(heap)
+            if -estimate <= 0:
+                break
+            found = {
+                p: len(list(self.find(self.programs[p], sequence)))
+                for p in where[sequence]
+            }
+            indices = [p for p, n in found.items() if n]
+            gain = self.gain(sequence, sum(found.values()))
+            where[sequence] = indices
+            if heap and gain < -heap[0][0]:
+                heapq.heappush(heap, (-gain, order, sequence))
+                continue
+            if gain <= 0:
+                continue
+            number = self.next_function
+            self.next_function += 1
+            self.functions[number] = list(sequence)
+            self.replace(sequence, number, indices)
+
+
+def _encode_program(program):
+    instructions = []
+    for item in program:
+        if isinstance(item, int):
+            instructions.extend(decode(encode_push([item])))
+            instructions.append(bytes([CALL]))
+        else:
+            instructions.append(item)
+    return b"".join(_merge_pushes(instructions))
+
+
+def _inline(code, functions):
+    result = []
+    for item in _canonical(decode(code)):
+        if (
+            item == bytes([CALL])
+            and result
+            and isinstance(result[-1], int)
+            and result[-1] in functions
+        ):
+            result.extend(_inline(functions[result.pop()], functions))
+        else:
+            result.append(item)
+    return result
+
+
+def _glyph_programs(font):
+    glyf = font["glyf"]
+    programs = {}
+    for name in font.getGlyphOrder():
+        glyph = glyf[name]
+        program = getattr(glyph, "program", None)
+        if program is not None:
+            code = program.getBytecode()
+            if code:
+                programs[name] = code
+    return programs
+
+
+def _program_bytes(font, tag):
+    return font[tag].program.getBytecode() if tag in font else b""
+
+
+def _set_program(obj, code):
+    from fontTools.ttLib.tables import ttProgram
+
+    program = ttProgram.Program()
+    program.fromBytecode(code)
+    obj.program = program
+
+
+def optimize_ttfont(font, max_functions=1024, max_length=16):
+    """Optimize the bytecode of a fontTools TTFont in place, and return an
+    OptimizeStats tuple.
+
+    At most `max_functions` functions are added, each made of up to
+    `max_length` instructions.
+    """
+    if "glyf" not in font or "fpgm" not in font or "maxp" not in font:
+        raise OptimizeError("font has no TrueType bytecode")
+    maxp = font["maxp"]
+    fpgm = decode(_program_bytes(font, "fpgm"))
+    prep = decode(_program_bytes(font, "prep"))
+    cvt = list(font["cvt "].values) if "cvt " in font else []
+    originals = _glyph_programs(font)
+    size_before = (
+        sum(len(code) for code in originals.values())
+        + sum(len(i) for i in fpgm + prep)
+        + 2 * len(cvt)
+    )
+
+    # relative jumps would need fixing; leave those programs alone
+    decoded = {name: decode(code) for name, code in originals.items()}
+    names = [
+        name
+        for name, instructions in decoded.items()
+        if not any(i[0] in JUMPS for i in instructions)
+    ]
+    factorizer = _Factorizer(
+        [decoded[name] for name in names],
+        maxp.maxFunctionDefs,
+        max_functions,
+        max_length,
+    )
+    factorizer.run()
+    new_functions = {
+        number: b"".join(body) for number, body in factorizer.functions.items()
+    }
+    programs = dict(originals)
+    for name, program in zip(names, factorizer.programs):
+        programs[name] = _encode_program(program)
+
+    for name, code in programs.items():
+        if _inline(code, new_functions) != _canonical(decode(originals[name])):
+            raise OptimizeError(f"bytecode of glyph {name!r} was altered")
+
+    # drop what's unreferenced, if everything is referenced by a literal
+    functions_dropped = cvt_dropped = 0
+    split = _split_fpgm(fpgm)
+    roots = [_canonical(decode(code)) for code in programs.values()]
+    roots.append(_canonical(prep))
+    roots.extend(_canonical(decode(code)) for code in new_functions.values())
+    bodies = {}
+    if split is not None:
+        defined, top_level = split
+        roots.append(_canonical(top_level))
+        bodies = {
+            number: _references(_canonical(fpgm[start:end]))
+            for number, (start, end) in defined.items()
+        }
+    else:
+        roots.append(_canonical(fpgm))
+    called = accessed = set()
+    for functions, cvts in [_references(code) for code in roots] + list(
+        bodies.values()
+    ):
+        called = None if functions is None or called is None else called | functions
+        accessed = None if cvts is None or accessed is None else accessed | cvts
+    if split is not None and called is not None:
+        # functions only called by unreferenced functions are unreferenced too
+        reachable = set()
+        todo = [_references(code)[0] for code in roots]
+        while todo:
+            for number in todo.pop():
+                if number not in reachable:
+                    reachable.add(number)
+                    if number in bodies:
+                        todo.append(bodies[number][0])
+        dropped = sorted(
+            (start, end)
+            for number, (start, end) in defined.items()
+            if number not in reachable and end > start
+        )
+        for start, end in reversed(dropped):
+            del fpgm[start:end]
+        functions_dropped = len(dropped)
+    if accessed is not None and cvt:
+        keep = max(accessed) + 1 if accessed else 0
+        if keep < len(cvt):
+            cvt_dropped = len(cvt) - keep
+            cvt = cvt[:keep]
+            font["cvt "].values = cvt
+
+    # append the new function definitions, with their numbers pushed once
+    if new_functions:
+        numbers = sorted(new_functions, reverse=True)
+        fpgm.extend(decode(encode_push(numbers)))
+        for number in reversed(numbers):
+            fpgm.append(bytes([FDEF]))
+            fpgm.extend(decode(new_functions[number]))
+            fpgm.append(bytes([ENDF]))
+    fpgm_code = b"".join(fpgm)
+    _set_program(font["fpgm"], fpgm_code)
+
+    glyf = font["glyf"]
+    for name, code in programs.items():
+        if code != originals[name]:
+            _set_program(glyf[name], code)
+
+    maxp.maxFunctionDefs = factorizer.next_function
+    # a call pushes the function number before the instructions it replaces,
+    # and the numbers of the new functions are all pushed at the end of fpgm
+    if new_functions:
+        maxp.maxStackElements += len(new_functions)
+    maxp.maxSizeOfInstructions = max(
+        [len(fpgm_code), len(b"".join(prep))]
+        + [len(code) for code in programs.values()]
+    )
+
+    size_after = (
+        sum(len(code) for code in programs.values())
+        + len(fpgm_code)
+        + sum(len(i) for i in prep)
+        + 2 * len(cvt)
+    )
+    return OptimizeStats(
+        size_before,
+        size_after,
+        len(new_functions),
+        functions_dropped,
+        cvt_dropped,
+    )
+
+
+def _load_fonts(data):
+    from fontTools.ttLib import TTCollection, TTFont
+
+    if data[:4] == b"ttcf":
+        collection = TTCollection(
+            BytesIO(data), recalcBBoxes=False, recalcTimestamp=False
+        )
+        return collection, list(collection.fonts)
+    font = TTFont(BytesIO(data), recalcBBoxes=False, recalcTimestamp=False)
+    return font, [font]
+
+
+def _hinted_outlines(data, index, ppems, glyphs, load_flags):
+    import ctypes
+    import freetype
+
+    face = freetype.Face(BytesIO(data), index)
+    if glyphs is None:
+        glyphs = range(face.num_glyphs)
+    for ppem in ppems:
+        face.set_pixel_sizes(0, ppem)
+        for glyph in glyphs:
+            for flags in load_flags:
+                face.load_glyph(glyph, flags)
+                slot = face.glyph
+                # compare the raw arrays, much faster than freetype-py's lists
+                outline = slot.outline._FT_Outline
+                n = outline.n_points
+                yield (
+                    ppem,
+                    glyph,
+                    slot.advance.x,
+                    ctypes.string_at(
+                        outline.points, n * ctypes.sizeof(freetype.FT_Vector)
+                    )
+                    if n
+                    else b"",
+                    ctypes.string_at(outline.tags, n) if n else b"",
+                )
+
+
+def verify_font(original, optimized, ppems=DEFAULT_PPEMS, glyphs=None):
+    """Check that the glyphs of the `optimized` font data are hinted like
+    those of the `original` at the given PPEM sizes, as rendered by
+    FreeType's TrueType interpreter, both in grayscale and monochrome mode.
+    `glyphs` is an optional list of glyph indices to compare (default: all).
+
+    Raise OptimizeError on the first difference. Requires freetype-py.
+    """
+    import freetype
+
+    load_flags = (
+        freetype.FT_LOAD_NO_AUTOHINT | freetype.FT_LOAD_NO_BITMAP,
+        freetype.FT_LOAD_NO_AUTOHINT
+        | freetype.FT_LOAD_NO_BITMAP
+        | freetype.FT_LOAD_TARGET_MONO,
+    )
+    num_fonts = len(_font_offsets(original))
+    for index in range(num_fonts):
+        expected = _hinted_outlines(original, index, ppems, glyphs, load_flags)
+        actual = _hinted_outlines(optimized, index, ppems, glyphs, load_flags)
+        for a, b in zip(expected, actual):
+            if a != b:
+                raise OptimizeError(
+                    "glyph %d is hinted differently at %d ppem" % (a[1], a[0])
+                )
+
+
+def _font_offsets(data):
+    from ttfautohint._sfnt import font_offsets
+
+    return font_offsets(data)
+
+
+def optimize_font(data, verify=True, ppems=DEFAULT_PPEMS, **kwargs):
+    """Return a copy of the hinted font (or font collection) `data` with
+    smaller bytecode, or `data` unchanged if nothing could be saved.
+
+    If `verify` is true and freetype-py is installed, the result is checked
+    with `verify_font` at the given `ppems`. Other keyword arguments are
+    passed to `optimize_ttfont`.
+    """
+    container, fonts = _load_fonts(data)
+    saved = 0
+    for font in fonts:
+        stats = optimize_ttfont(font, **kwargs)
+        log.debug("%s", stats)
+        saved += stats.size_before - stats.size_after
+    if saved <= 0:
+        return data
+    buf = BytesIO()
+    container.save(buf)
+    result = buf.getvalue()
+    if verify:
+        if importlib.util.find_spec("freetype") is None:
+            log.info("freetype-py is not installed; skipped rendering check")
+        else:
+            verify_font(data, result, ppems)
+    return result
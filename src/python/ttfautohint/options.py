@@ -1,9 +1,15 @@
+import io
 import sys
 import os
 import tempfile
 from collections import OrderedDict
 from enum import IntEnum
 from ttfautohint._compat import ensure_binary, ensure_text
+from ttfautohint._utils import seekable
+from ttfautohint.analysis import AnalysisCache
+from ttfautohint.cache import ResultCache
+from ttfautohint.preflight import preflight, preflight_stream
+from ttfautohint.retry import RetryPolicy
 
 USER_OPTIONS = dict(
     in_file=None,
@@ -58,6 +64,21 @@ STEM_WIDTH_MODE_OPTIONS = OrderedDict(
 
 USER_OPTIONS.update(STEM_WIDTH_MODE_OPTIONS)
 
+# Options handled by the Python wrapper, which are not passed on to the
+# 'ttfautohint' executable.
+WRAPPER_OPTIONS = dict(
+    optimize=False,
+    out_format="sfnt",
+    retry=None,
+    preflight=True,
+    strip_tables=True,
+    cache=None,
+    profile=None,
+    analysis_cache=None,
+)
+
+OUT_FORMATS = ("sfnt", "woff")
+
 # Deprecated; use stem width mode options
 STRONG_STEM_WIDTH_OPTIONS = dict(
     gdi_cleartype_strong_stem_width=True,
@@ -66,8 +87,37 @@ STRONG_STEM_WIDTH_OPTIONS = dict(
 )
 
 
-def validate_options(kwargs):
+def validate_options(kwargs, tempfiles=None):
+    """Return the validated options from the `kwargs` of `ttfautohint()`.
+
+    Unless the `preflight` option is false, the input font is checked (see
+    `ttfautohint.preflight`): `in_file` streams are peeked at and rewound
+    if they are seekable, and not checked otherwise; WOFF2 fonts are
+    unwrapped to `in_buffer`.
+
+    A `control_buffer` or `reference_buffer` is written to a temporary file,
+    whose name is appended to the `tempfiles` list: the caller owns it, and
+    must remove it when done. If validation fails, the temporary files are
+    removed before raising; without `tempfiles`, they are left behind.
+    """
+    created = []
+    try:
+        opts = _validate_options(kwargs, created)
+    except BaseException:
+        for path in created:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        raise
+    if tempfiles is not None:
+        tempfiles.extend(created)
+    return opts
+
+
+def _validate_options(kwargs, tempfiles):
     opts = {k: kwargs.pop(k, USER_OPTIONS[k]) for k in USER_OPTIONS}
+    opts.update((k, kwargs.pop(k, v)) for k, v in WRAPPER_OPTIONS.items())
     if kwargs:
         raise TypeError(
             "unknown keyword argument%s: %s"
@@ -83,15 +133,28 @@ def validate_options(kwargs):
     elif in_file is not None and in_buffer is not None:
         raise ValueError("in_file and in_buffer are mutually exclusive")
     if in_file is not None:
-        try:
-            in_buffer = in_file.read()
-        except AttributeError:
+        if hasattr(in_file, "read"):
+            # file objects are streamed to the executable by ttfautohint()
+            if isinstance(in_file, io.TextIOBase):
+                raise TypeError("in_file must be opened in binary mode")
+        else:
             with open(in_file, "rb") as f:
                 in_buffer = f.read()
-    if not isinstance(in_buffer, bytes):
+            in_file = None
+    if in_file is None and not isinstance(in_buffer, bytes):
         raise TypeError(
             "in_buffer type must be bytes, not %s" % type(in_buffer).__name__
         )
+    if opts.pop("preflight"):
+        # fail before spawning the executable, and unwrap WOFF2 fonts;
+        # unseekable streams can't be peeked at, and are not checked
+        if in_buffer is not None:
+            in_buffer = preflight(in_buffer, opts["ignore_restrictions"])
+        elif seekable(in_file):
+            in_buffer = preflight_stream(in_file, opts["ignore_restrictions"])
+            if in_buffer is not None:
+                in_file = None
+    opts["in_file"] = in_file
     opts["in_buffer"] = in_buffer
 
     control_file = opts.pop("control_file")
@@ -100,6 +163,7 @@ def validate_options(kwargs):
         if control_file is not None:
             raise ValueError("control_file and control_buffer are mutually exclusive")
         with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            tempfiles.append(tmp.name)
             tmp.write(ensure_binary(control_buffer, "utf-8"))
         control_file = tmp.name
     if control_file is not None:
@@ -118,11 +182,41 @@ def validate_options(kwargs):
                 % type(reference_buffer).__name__
             )
         with tempfile.NamedTemporaryFile(delete=False) as tmp:
+            tempfiles.append(tmp.name)
             tmp.write(ensure_binary(reference_buffer, "utf-8"))
         reference_file = tmp.name
     if reference_file is not None:
         opts["reference_file"] = reference_file
 
+    if opts["out_format"] not in OUT_FORMATS:
+        raise ValueError(
+            "out_format must be one of %s, not %r"
+            % (", ".join(repr(f) for f in OUT_FORMATS), opts["out_format"])
+        )
+    check_out_format(opts["out_format"], opts["in_file"], opts["in_buffer"])
+
+    if opts["retry"] is not None and not isinstance(opts["retry"], RetryPolicy):
+        raise TypeError(
+            "retry must be a RetryPolicy, not %s" % type(opts["retry"]).__name__
+        )
+
+    if opts["cache"] is not None and not isinstance(opts["cache"], ResultCache):
+        raise TypeError(
+            "cache must be a ResultCache, not %s" % type(opts["cache"]).__name__
+        )
+
+    analysis_cache = opts["analysis_cache"]
+    if analysis_cache is not None and not isinstance(analysis_cache, AnalysisCache):
+        raise TypeError(
+            "analysis_cache must be an AnalysisCache, not %s"
+            % type(analysis_cache).__name__
+        )
+
+    if opts["profile"] is not None and not callable(opts["profile"]):
+        raise TypeError(
+            "profile must be callable, not %s" % type(opts["profile"]).__name__
+        )
+
     if opts["family_suffix"] is not None:
         opts["family_suffix"] = ensure_text(opts["family_suffix"])
 
@@ -142,6 +236,25 @@ SPECIAL_OPT_NAMES = {
 }
 
 
+def check_out_format(out_format, in_file=None, in_buffer=None):
+    """Raise ValueError if the input font can't be written in `out_format`,
+    before it is hinted: font collections can't be converted to WOFF.
+    Unseekable `in_file` streams are only checked once hinted.
+    """
+    if out_format != "woff":
+        return
+    if in_buffer is not None:
+        signature = in_buffer[:4]
+    elif seekable(in_file):
+        start = in_file.tell()
+        signature = in_file.read(4)
+        in_file.seek(start)
+    else:
+        return
+    if signature == b"ttcf":
+        raise ValueError("font collections can't be converted to WOFF")
+
+
 def format_kwargs(**options):
     # convert keyword parameters to CLI flags suitable for ttfautohint command line
     result = []
@@ -0,0 +1,206 @@
+"""Reject fonts that 'ttfautohint' can't hint without running it.
+
+Fonts with CFF outlines, truncated files or fonts whose `OS/2` fsType
+forbids modifications are only rejected by the executable after it was
+spawned and loaded the whole font. `check_font` reads just the sfnt (or
+TrueType collection, or WOFF) table directory and the `OS/2` table, and
+raises the same TAError subclass the executable would, with the same
+message: InvalidFontError or RestrictedFontError.
+
+`ttfautohint()` and `Hinter` run these checks on their input unless the
+`preflight` option is false. Inputs streamed from file objects are checked
+by peeking at their headers and rewinding them (see `preflight_stream`),
+if they are seekable; unseekable streams (e.g. pipes) are not checked.
+WOFF fonts are hinted as is (FreeType reads them), and WOFF2 fonts,
+which the bundled FreeType can't read, are unwrapped to sfnt with
+`unwrap_woff2` first, if fontTools and brotli are installed.
+"""
+import io
+import struct
+import zlib
+
+from ttfautohint._sfnt import (
+    SFNT_HEADER,
+    TTC_HEADER,
+    SFNTError,
+    read_struct,
+    reader,
+)
+from ttfautohint.errors import InvalidFontError, RestrictedFontError
+
+
+__all__ = ["check_font", "unwrap_woff2", "preflight", "preflight_stream"]
+
+
+# the messages printed by the executable for these errors
+INVALID_FONT_MESSAGE = (
+    "This font is not a valid font in SFNT format with TrueType outlines.\n"
+    "In particular, CFF outlines are not supported.\n"
+)
+RESTRICTED_FONT_MESSAGE = (
+    "Bit 1 in the `fsType' field of the `OS/2' table is set:\n"
+    "This font must not be modified without permission of the legal owner.\n"
+    "Use option `ignore_restrictions' to continue"
+    " if you have such a permission.\n"
+)
+
+# the executable rejects smaller inputs upfront
+MIN_FONT_SIZE = 100
+
+SFNT_VERSIONS = (b"\0\1\0\0", b"true", b"OTTO")
+# the tables ttfautohint requires (non-empty)
+REQUIRED_TABLES = ("glyf", "loca", "head", "maxp")
+
+WOFF_HEADER = struct.Struct(">4s4sLH")
+WOFF_TABLE_RECORD = struct.Struct(">4sLLLL")
+WOFF_TABLE_DIRECTORY_OFFSET = 44
+# offset of the fsType field in the `OS/2' table
+OS2_FSTYPE_OFFSET = 8
+
+
+def _invalid(reason):
+    # the executable exits with status 1
+    return InvalidFontError(1, reason + "\n" + INVALID_FONT_MESSAGE)
+
+
+def _check_tables(tables, fs_type, ignore_restrictions):
+    # `tables` maps tags to lengths
+    missing = [tag for tag in REQUIRED_TABLES if not tables.get(tag)]
+    if missing:
+        if "CFF " in tables or "CFF2" in tables:
+            raise _invalid("The font has CFF outlines.")
+        raise _invalid(f"The font has no {missing[0]!r} table.")
+    if fs_type is not None and fs_type & 0xFF == 0x02 and not ignore_restrictions:
+        raise RestrictedFontError(1, RESTRICTED_FONT_MESSAGE)
+
+
+def _check_sfnt(read, size, offset, ignore_restrictions):
+    version, num_tables, _, _, _ = read_struct(SFNT_HEADER, read, offset, "sfnt header")
+    if version not in SFNT_VERSIONS:
+        raise _invalid("Unknown sfnt version %r." % version)
+    fmt = struct.Struct(">" + "4sLLL" * num_tables)
+    fields = read_struct(fmt, read, offset + SFNT_HEADER.size, "table directory")
+    tables = {}
+    fs_type = None
+    for i in range(0, len(fields), 4):
+        tag, _, table_offset, length = fields[i : i + 4]
+        tag = tag.decode("latin-1")
+        if table_offset + length > size:
+            raise SFNTError(f"table {tag!r} extends past end of data")
+        tables[tag] = length
+        if tag == "OS/2" and length >= OS2_FSTYPE_OFFSET + 2:
+            (fs_type,) = struct.unpack(">H", read(table_offset + OS2_FSTYPE_OFFSET, 2))
+    _check_tables(tables, fs_type, ignore_restrictions)
+
+
+def _check_woff(read, size, ignore_restrictions):
+    _, flavor, length, num_tables = read_struct(WOFF_HEADER, read, 0, "WOFF header")
+    if length != size:
+        raise SFNTError("WOFF length doesn't match the data size")
+    if flavor not in SFNT_VERSIONS:
+        raise _invalid("Unknown sfnt version %r." % flavor)
+    tables = {}
+    fs_type = None
+    for i in range(num_tables):
+        tag, offset, comp_length, orig_length, _ = read_struct(
+            WOFF_TABLE_RECORD,
+            read,
+            WOFF_TABLE_DIRECTORY_OFFSET + i * WOFF_TABLE_RECORD.size,
+            "WOFF table directory",
+        )
+        tag = tag.decode("latin-1")
+        if offset + comp_length > size:
+            raise SFNTError(f"table {tag!r} extends past end of data")
+        tables[tag] = orig_length
+        if tag == "OS/2" and orig_length >= OS2_FSTYPE_OFFSET + 2:
+            table = read(offset, comp_length)
+            if comp_length < orig_length:
+                try:
+                    table = zlib.decompress(table)
+                except zlib.error as e:
+                    raise SFNTError(f"invalid 'OS/2' table: {e}") from None
+            (fs_type,) = struct.unpack_from(">H", table, OS2_FSTYPE_OFFSET)
+    _check_tables(tables, fs_type, ignore_restrictions)
+
+
+def check_font(font, ignore_restrictions=False):
+    """Check that `font` (a path, bytes or a seekable binary file object)
+    can be hinted, reading only its headers, and return its format: "sfnt",
+    "ttc", "woff" or "woff2". The contents of WOFF2 fonts are not checked.
+
+    Raise InvalidFontError if it isn't a font with TrueType outlines, or
+    RestrictedFontError if its fsType forbids modifying it and
+    `ignore_restrictions` is false.
+    """
+    read, size, close = reader(font)
+    try:
+        if size < MIN_FONT_SIZE:
+            raise _invalid("The file is too small to be a font.")
+        signature = read(0, 4)
+        if signature == b"wOF2":
+            return "woff2"
+        elif signature == b"wOFF":
+            _check_woff(read, size, ignore_restrictions)
+            return "woff"
+        elif signature == b"ttcf":
+            _, _, num_fonts = read_struct(TTC_HEADER, read, 0, "TTC header")
+            fmt = struct.Struct(">%dL" % num_fonts)
+            offsets = read_struct(fmt, read, TTC_HEADER.size, "TTC header")
+            for i, offset in enumerate(offsets):
+                try:
+                    _check_sfnt(read, size, offset, ignore_restrictions)
+                except SFNTError as e:
+                    raise SFNTError(f"font {i}: {e}") from None
+            return "ttc"
+        _check_sfnt(read, size, 0, ignore_restrictions)
+        return "sfnt"
+    except SFNTError as e:
+        raise _invalid(f"Invalid font data: {e}.") from None
+    finally:
+        close()
+
+
+def unwrap_woff2(data):
+    """Return the sfnt font contained in WOFF2 `data`.
+
+    Requires fontTools and brotli; raise InvalidFontError if they aren't
+    installed, or if `data` can't be decompressed.
+    """
+    try:
+        from fontTools.ttLib import TTFont
+        import brotli  # noqa: F401
+    except ImportError:
+        raise _invalid(
+            "WOFF2 fonts can only be hinted if fontTools and brotli are installed."
+        ) from None
+    try:
+        font = TTFont(io.BytesIO(data), recalcBBoxes=False, recalcTimestamp=False)
+        font.flavor = None
+        out = io.BytesIO()
+        font.save(out, reorderTables=False)
+    except Exception as e:
+        raise _invalid(f"Invalid WOFF2 font: {e}.") from None
+    return out.getvalue()
+
+
+def preflight(data, ignore_restrictions=False):
+    """Check font `data` with `check_font`, and return it, or the unwrapped
+    sfnt font if it is WOFF2.
+    """
+    if check_font(data, ignore_restrictions) == "woff2":
+        data = unwrap_woff2(data)
+        check_font(data, ignore_restrictions)
+    return data
+
+
+def preflight_stream(f, ignore_restrictions=False):
+    """Check the font read from the seekable binary file object `f` with
+    `check_font`, reading only its headers, and rewind it. Return None, or
+    the unwrapped sfnt font data if it is WOFF2 (the rest of `f` is read).
+    """
+    start = f.tell()
+    fmt = check_font(f, ignore_restrictions)
+    f.seek(start)
+    if fmt != "woff2":
+        return None
+    return preflight(f.read(), ignore_restrictions)
@@ -0,0 +1,177 @@
+"""Where the 'ttfautohint' executable spends its time.
+
+The bundled executable can be patched (see src/c/ttfautohint.patch) with an
+opt-in `--profile-fd=N` flag, which makes it write tab-separated timing
+records to file descriptor N once the font is done, or hinting failed:
+
+    ttfautohint-profile  version  1
+    ttfautohint-profile  phase    NAME  SECONDS  COUNT
+    ttfautohint-profile  glyph    SFNT  INDEX    SECONDS  POINTS
+    ttfautohint-profile  glyphs   COUNT SECONDS
+    ttfautohint-profile  total    SECONDS  ERROR
+
+A phase is one step of TTF_autohint: reading the font ("read"), the
+HarfBuzz style coverage analysis ("coverage"), building the "cvt", "fpgm"
+and "prep" tables, hinting the glyphs ("glyf"), writing the output
+("write"), etc. The "metrics" phase (blue zones and standard widths of each
+style) is nested in the phase that first needs them, so the times of the
+phases don't add up to the total. `glyph` records list the `--profile-glyphs`
+slowest glyphs (SFNT is the index of the font in a collection), slowest
+first, and `glyphs` the number and total time of all hinted glyphs.
+
+Pass a callable as the `profile` option of `ttfautohint()` or `Hinter` to
+have it called with a `Profile` of each successful run:
+
+    >>> ttfautohint(in_file="Slow.ttf", profile=lambda p: print(p.format()))
+
+The records are written to stderr, and removed from the error message of a
+TAError. Results found in a `ttfautohint.ResultCache` are not profiled.
+
+The patch is only applied to builds with EXPERIMENTAL_PATCHES=yes (see
+src/c/Makefile). Executables without it, detected from their `--help`, are
+run without the flag, and the callback gets a Profile with no phases or
+glyphs, whose `total_seconds` is the wall time of the whole process.
+"""
+from collections import OrderedDict, namedtuple
+
+
+PREFIX = b"ttfautohint-profile\t"
+VERSION = 1
+# default number of slowest glyphs reported
+SLOWEST_GLYPHS = 10
+
+
+PhaseTiming = namedtuple("PhaseTiming", ["name", "seconds", "count"])
+PhaseTiming.__doc__ = """\
+Total wall time in `seconds` spent in the phase `name`, which was entered
+`count` times (e.g. once per font of a collection).
+"""
+
+GlyphTiming = namedtuple("GlyphTiming", ["sfnt", "index", "seconds", "points"])
+GlyphTiming.__doc__ = """\
+Wall time in `seconds` spent hinting the glyph `index` of the font `sfnt`
+of a collection (0 for a single font), which has `points` outline points.
+"""
+
+
+class Profile(object):
+    """Timings of a run of the executable, parsed by `parse_profile`."""
+
+    def __init__(
+        self,
+        phases=(),
+        slowest_glyphs=(),
+        glyph_count=0,
+        glyph_seconds=0.0,
+        total_seconds=0.0,
+        error=0,
+    ):
+        self.phases = OrderedDict((p.name, p) for p in phases)
+        self.slowest_glyphs = list(slowest_glyphs)
+        self.glyph_count = glyph_count
+        self.glyph_seconds = glyph_seconds
+        self.total_seconds = total_seconds
+        self.error = error
+
+    def __repr__(self):
+        return "%s(total_seconds=%.6f, glyph_count=%d)" % (
+            type(self).__name__,
+            self.total_seconds,
+            self.glyph_count,
+        )
+
+    def as_dict(self):
+        return {
+            "total_seconds": self.total_seconds,
+            "error": self.error,
+            "glyph_count": self.glyph_count,
+            "glyph_seconds": self.glyph_seconds,
+            "phases": [p._asdict() for p in self.phases.values()],
+            "slowest_glyphs": [g._asdict() for g in self.slowest_glyphs],
+        }
+
+    def format(self):
+        """Return a text table of the phases and the slowest glyphs."""
+        total = self.total_seconds or 1.0
+        lines = ["  ".join(["time", "share", "count", "phase"])]
+        for phase in self.phases.values():
+            lines.append(
+                "%.4f  %4.1f%%  %d  %s"
+                % (phase.seconds, 100 * phase.seconds / total, phase.count, phase.name)
+            )
+        lines.append(
+            "total %.4fs, %d glyphs in %.4fs"
+            % (self.total_seconds, self.glyph_count, self.glyph_seconds)
+        )
+        if self.slowest_glyphs:
+            lines.append("")
+            lines.append("  ".join(["time", "points", "glyph"]))
+            for glyph in self.slowest_glyphs:
+                name = str(glyph.index)
+                if glyph.sfnt:
+                    name = "%d:%s" % (glyph.sfnt, name)
+                lines.append("%.4f  %d  %s" % (glyph.seconds, glyph.points, name))
+        return "\n".join(lines)
+
+
+def profile_args(glyphs=SLOWEST_GLYPHS):
+    """Return the arguments making the executable write a profile to stderr,
+    including the `glyphs` slowest glyphs.
+    """
+    return ["--profile-fd=2", f"--profile-glyphs={int(glyphs)}"]
+
+
+def parse_profile(lines):
+    """Return a Profile from the record `lines` (bytes, with or without the
+    prefix). Raise ValueError if they are malformed, or were written by an
+    unsupported version.
+    """
+    phases = []
+    glyphs = []
+    kwargs = {}
+    version = None
+    for line in lines:
+        if line.startswith(PREFIX):
+            line = line[len(PREFIX) :]
+        fields = line.rstrip(b"\r\n").decode("ascii", errors="replace").split("\t")
+        record, values = fields[0], fields[1:]
+        try:
+            if record == "version":
+                (version,) = values
+                version = int(version)
+            elif record == "phase":
+                name, seconds, count = values
+                phases.append(PhaseTiming(name, float(seconds), int(count)))
+            elif record == "glyph":
+                sfnt, index, seconds, points = values
+                glyphs.append(
+                    GlyphTiming(int(sfnt), int(index), float(seconds), int(points))
+                )
+            elif record == "glyphs":
+                count, seconds = values
+                kwargs.update(glyph_count=int(count), glyph_seconds=float(seconds))
+            elif record == "total":
+                seconds, error = values
+                kwargs.update(total_seconds=float(seconds), error=int(error))
+            # unknown records are ignored, for forward compatibility
+        except ValueError:
+            raise ValueError(f"malformed profile record: {line!r}") from None
+    if version is None:
+        raise ValueError("missing profile version record")
+    elif version != VERSION:
+        raise ValueError(f"unsupported profile version {version}")
+    return Profile(phases, glyphs, **kwargs)
+
+
+def split_profile(stderr):
+    """Separate the profile records from the rest of the `stderr` bytes of
+    the executable. Return a (Profile, stderr) tuple; the former is None if
+    there are no records.
+    """
+    if not stderr or PREFIX not in stderr:
+        return None, stderr
+    records = []
+    rest = []
+    for line in stderr.splitlines(keepends=True):
+        (records if line.startswith(PREFIX) else rest).append(line)
+    return parse_profile(records), b"".join(rest)
@@ -0,0 +1,146 @@
+"""Retry transient hinting failures, and remember deterministic ones.
+
+    >>> policy = RetryPolicy(max_attempts=4, backoff=1.0)
+    >>> ttfautohint(in_file="MyFont.ttf", retry=policy)
+
+A RetryPolicy can be passed as the `retry` option to `ttfautohint()`,
+`Hinter`, `Watcher` and `Client.ttfautohint()`, and shared by any number of
+calls and threads. Failures whose `transient` attribute is true (see
+`ttfautohint.errors.make_error`; e.g. the process was killed, or ran out of
+memory) are retried with exponential backoff. Other failures are raised
+immediately and, if they are deterministic (e.g. an invalid font or
+option, but not a failure whose cause couldn't be determined) and the
+caller can identify the input by its digest, memoized, so that hinting the
+same input with the same options again fails at once without running the
+executable.
+"""
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from ttfautohint.errors import TAError
+
+
+__all__ = ["RetryPolicy"]
+
+
+class RetryPolicy(object):
+    """Run a function up to `max_attempts` times while it fails with a
+    transient error.
+
+    The n-th retry waits `backoff * multiplier ** (n - 1)` seconds, at most
+    `max_backoff`, randomized by +/- `jitter` (a fraction); if the error has
+    a `retry_after` attribute (e.g. `ttfautohint.client.ServerBusy`), the
+    wait is at least that long. `retry_on` is a tuple of exception types to
+    retry; by default, those with a true `transient` attribute.
+
+    If `memoize` is true, up to `memo_size` TAErrors whose `deterministic`
+    attribute is true are remembered by the key passed to `call()`.
+    """
+
+    def __init__(
+        self,
+        max_attempts=3,
+        backoff=0.5,
+        multiplier=2.0,
+        max_backoff=30.0,
+        jitter=0.1,
+        retry_on=None,
+        memoize=True,
+        memo_size=1024,
+        sleep=time.sleep,
+    ):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.multiplier = multiplier
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_on = retry_on
+        self.memoize = memoize
+        self.memo_size = memo_size
+        self.sleep = sleep
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "%s(max_attempts=%d, backoff=%r)" % (
+            type(self).__name__,
+            self.max_attempts,
+            self.backoff,
+        )
+
+    def is_transient(self, error):
+        if self.retry_on is not None:
+            return isinstance(error, self.retry_on)
+        return bool(getattr(error, "transient", False))
+
+    def delay(self, attempt, error=None):
+        """Seconds to wait before retrying after the `attempt`-th failure."""
+        delay = min(self.backoff * self.multiplier ** (attempt - 1), self.max_backoff)
+        if self.jitter:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    def call(self, fn, *args, key=None, before_retry=None, **kwargs):
+        """Return `fn(*args, **kwargs)`, retrying it on transient errors.
+
+        `key` identifies the input and options (e.g. `Hinter.cache_key`), for
+        memoizing deterministic failures; None disables it for this call.
+        `before_retry` is called without arguments before each retry, e.g. to
+        rewind the input and output streams.
+        """
+        if key is not None and self.memoize:
+            with self._lock:
+                failure = self._failures.get(key)
+                if failure is not None:
+                    self._failures.move_to_end(key)
+            if failure is not None:
+                cls, rv, error_string = failure
+                raise cls(rv, error_string)
+
+        attempt = 1
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not self.is_transient(e):
+                    if (
+                        key is not None
+                        and self.memoize
+                        and isinstance(e, TAError)
+                        and e.deterministic
+                    ):
+                        self._remember(key, e)
+                    raise
+                if attempt >= self.max_attempts:
+                    raise
+                delay = self.delay(attempt, e)
+            if delay > 0:
+                self.sleep(delay)
+            if before_retry is not None:
+                before_retry()
+            attempt += 1
+
+    def _remember(self, key, error):
+        with self._lock:
+            self._failures[key] = (type(error), error.rv, error.error_string)
+            self._failures.move_to_end(key)
+            while len(self._failures) > self.memo_size:
+                self._failures.popitem(last=False)
+
+    def forget(self, key=None):
+        """Forget the memoized failure for `key`, or all of them."""
+        with self._lock:
+            if key is None:
+                self._failures.clear()
+            else:
+                self._failures.pop(key, None)
@@ -0,0 +1,392 @@
+"""Local HTTP service that hints fonts on a shared, bounded worker pool.
+
+Run it with:
+
+    python -m ttfautohint.server [--host HOST] [--port PORT] [--jobs N]
+
+and use `ttfautohint.client.Client` to talk to it. The protocol is:
+
+POST /hint
+    The request body is a JSON object with the base64-encoded font data
+    ("font"), the ttfautohint options ("options"; a `reference_buffer` is
+    base64-encoded too) and the "priority" lane, either "interactive"
+    (the default) or "batch". Queued interactive jobs always run before
+    batch jobs. Options are validated upfront with `validate_options`.
+
+    On success, the response body is the hinted font data. Otherwise it is a
+    JSON object with the "error" type and "message"; for a TAError (status
+    422), also the "rv" error code of the executable. Invalid requests get
+    status 400. When the lane's queue is full, the request is rejected with
+    status 503 and a Retry-After header.
+
+GET /stats
+    JSON object with the number of workers and running jobs and, for each
+    lane, the queue depth, number of completed, failed and rejected jobs,
+    and statistics of queueing and running times in seconds.
+
+GET /metrics
+    The metrics collected by `ttfautohint.metrics`, in the Prometheus text
+    format (status 404 if they are not enabled; see the --metrics option).
+
+The server only uses the standard library.
+"""
+import base64
+import binascii
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ttfautohint import metrics
+from ttfautohint.errors import TAError
+from ttfautohint.hinter import Hinter
+
+
+__all__ = ["LANES", "HintingServer", "WorkerPool", "main"]
+
+
+# in order of priority
+LANES = ("interactive", "batch")
+
+DEFAULT_PORT = 8462
+
+# options naming files on the client's side, which are sent as buffers
+_PATH_OPTIONS = ("in_file", "in_buffer", "out_file", "control_file", "reference_file")
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _summary(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": percentile(0.5),
+        "p95": percentile(0.95),
+        "max": ordered[-1],
+    }
+
+
+class _LaneStats(object):
+    def __init__(self, window):
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.queue_times = deque(maxlen=window)
+        self.run_times = deque(maxlen=window)
+
+    def as_dict(self):
+        return {
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "queue_time": _summary(self.queue_times),
+            "run_time": _summary(self.run_times),
+        }
+
+
+class WorkerPool(object):
+    """Run jobs on `workers` threads, taking queued jobs by lane priority and
+    then in order of submission. At most `max_queue` jobs wait in each lane;
+    submitting more raises QueueFull. Timing statistics are computed over
+    the last `window` jobs of each lane.
+    """
+
+    def __init__(self, workers=None, max_queue=64, window=1000):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {lane: _LaneStats(window) for lane in LANES}
+        self._running = 0
+        self._threads = [
+            threading.Thread(target=self._work, name=f"ttfautohint-worker-{i}")
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, lane, fn, *args):
+        """Queue `fn(*args)` in `lane`, and return a Future for its result."""
+        stats = self._stats[lane]
+        future = Future()
+        with self._lock:
+            if stats.queued >= self.max_queue:
+                stats.rejected += 1
+                raise QueueFull(lane)
+            stats.queued += 1
+        item = (time.perf_counter(), lane, future, fn, args)
+        self._queue.put((LANES.index(lane), next(self._order), item))
+        return future
+
+    def _work(self):
+        while True:
+            _, _, item = self._queue.get()
+            if item is None:
+                return
+            submitted, lane, future, fn, args = item
+            stats = self._stats[lane]
+            start = time.perf_counter()
+            running = future.set_running_or_notify_cancel()
+            with self._lock:
+                stats.queued -= 1
+                if running:
+                    stats.queue_times.append(start - submitted)
+                    self._running += 1
+            if not running:
+                continue
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                failed = True
+                future.set_exception(e)
+            else:
+                failed = False
+                future.set_result(result)
+            with self._lock:
+                self._running -= 1
+                stats.run_times.append(time.perf_counter() - start)
+                if failed:
+                    stats.failed += 1
+                else:
+                    stats.completed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "lanes": {lane: s.as_dict() for lane, s in self._stats.items()},
+            }
+
+    def shutdown(self):
+        """Finish the queued jobs and stop the worker threads."""
+        for _ in self._threads:
+            self._queue.put((len(LANES), next(self._order), None))
+        for thread in self._threads:
+            thread.join()
+
+
+def _hint(hinter, font):
+    try:
+        return hinter.hint(font)
+    finally:
+        hinter.close()
+
+
+class _BadRequest(Exception):
+    pass
+
+
+def _parse_request(body):
+    try:
+        request = json.loads(body)
+        font = base64.b64decode(request["font"], validate=True)
+        options = dict(request.get("options") or {})
+        priority = request.get("priority", LANES[0])
+    except (ValueError, KeyError, TypeError, binascii.Error) as e:
+        raise _BadRequest(f"malformed request: {e}")
+    if priority not in LANES:
+        raise _BadRequest(f"invalid priority: {priority!r}")
+    for name in _PATH_OPTIONS:
+        if name in options:
+            raise _BadRequest(f"option not allowed: {name!r}")
+    if options.get("reference_buffer") is not None:
+        try:
+            options["reference_buffer"] = base64.b64decode(
+                options["reference_buffer"], validate=True
+            )
+        except (TypeError, binascii.Error) as e:
+            raise _BadRequest(f"malformed reference_buffer: {e}")
+    return font, options, priority
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "ttfautohint-server"
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, body, content_type="application/json", headers=()):
+        if content_type == "application/json":
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, error, message, **extra):
+        self._send(status, dict(error=error, message=message, **extra))
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send(200, self.server.pool.stats())
+        elif self.path == "/metrics":
+            registry = metrics.active_registry()
+            if registry is None:
+                return self._error(404, "NotFound", "metrics are not enabled")
+            self._send(
+                200,
+                registry.to_prometheus().encode("utf-8"),
+                content_type="text/plain; version=0.0.4; charset=utf-8",
+            )
+        else:
+            self._error(404, "NotFound", f"no such resource: {self.path}")
+
+    def do_POST(self):
+        if self.path != "/hint":
+            return self._error(404, "NotFound", f"no such resource: {self.path}")
+        try:
+            length = int(self.headers["Content-Length"])
+        except (TypeError, ValueError):
+            return self._error(411, "LengthRequired", "Content-Length required")
+        if length > self.server.max_request_size:
+            self.close_connection = True
+            return self._error(413, "PayloadTooLarge", "request too large")
+        body = self.rfile.read(length)
+        try:
+            font, options, priority = _parse_request(body)
+            hinter = Hinter(**options)
+        except _BadRequest as e:
+            return self._error(400, "BadRequest", str(e))
+        except (ValueError, TypeError) as e:
+            return self._error(400, type(e).__name__, str(e))
+
+        try:
+            future = self.server.pool.submit(priority, _hint, hinter, font)
+        except QueueFull:
+            hinter.close()
+            self._send(
+                503,
+                {"error": "QueueFull", "message": f"{priority} queue is full"},
+                headers=[("Retry-After", "1")],
+            )
+            return
+        try:
+            result = future.result()
+        except TAError as e:
+            self._error(422, "TAError", e.error_string, rv=e.rv, category=e.category)
+        except Exception as e:
+            self._error(500, type(e).__name__, str(e))
+        else:
+            self._send(200, result, content_type="application/octet-stream")
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class HintingServer(ThreadingHTTPServer):
+    """HTTP server hinting fonts on a WorkerPool; see the module docstring.
+
+    Use `serve_forever()` to run it (e.g. in a thread), and `shutdown()`
+    then `server_close()` to stop it.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address=("127.0.0.1", DEFAULT_PORT),
+        workers=None,
+        max_queue=64,
+        max_request_size=256 << 20,
+        verbose=False,
+    ):
+        self.pool = WorkerPool(workers, max_queue)
+        self.max_request_size = max_request_size
+        self.verbose = verbose
+        super().__init__(address, _Handler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+
+
+def main(args=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m ttfautohint.server",
+        description="Serve ttfautohint over HTTP on a bounded worker pool.",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="default: %(default)s")
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_PORT,
+        help="default: %(default)s; 0 picks a free port",
+    )
+    parser.add_argument(
+        "--jobs",
+        metavar="N",
+        type=int,
+        help="number of concurrent hinting jobs (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--max-queue",
+        metavar="N",
+        type=int,
+        default=64,
+        help="maximum number of queued jobs per priority lane "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="collect metrics of the hinting jobs, served at /metrics",
+    )
+    parser.add_argument(
+        "--metrics-dir",
+        metavar="DIR",
+        help="aggregate the metrics of all the processes sharing DIR "
+        "(implies --metrics)",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="log requests")
+    options = parser.parse_args(args)
+
+    if options.metrics or options.metrics_dir:
+        metrics.enable(directory=options.metrics_dir)
+
+    server = HintingServer(
+        (options.host, options.port),
+        workers=options.jobs,
+        max_queue=options.max_queue,
+        verbose=options.verbose,
+    )
+    print(f"Serving on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
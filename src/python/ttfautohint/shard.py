@@ -0,0 +1,236 @@
+"""Split batches of fonts across several machines.
+
+Every node of a build farm runs the same batch command with its own
+`--shard i/N` (1 <= i <= N), and hints only the fonts assigned to shard i.
+The assignment only depends on the fonts themselves, so that all nodes agree
+on it without coordination:
+
+- "hash": each font goes to the shard given by a SHA-256 hash of its file
+  name, so adding or removing a font doesn't move the others;
+- "cost": the fonts are assigned by decreasing estimated hinting time (from
+  their size and glyph count, with the built-in `ttfautohint.cost.CostModel`
+  rather than the local history, which differs between nodes) to the least
+  loaded shard, which balances the shards' hinting times.
+
+Fonts are identified by their file name, which must be unique in a batch
+since the hinted fonts are written to the same output directory. Each shard
+writes a manifest listing all the fonts of the batch and, for those of the
+shard, the digests of the input and output files and the hinting time;
+`merge_manifests` combines the manifests of all shards and checks that every
+font was hinted by exactly one of them:
+
+    $ ttfautohint --batch fonts/*.ttf --output-dir out --shard 2/3
+    $ ttfautohint --merge-manifests out/manifest-*-of-3.json
+"""
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+from ttfautohint._utils import atomic_write
+
+
+__all__ = [
+    "Shard",
+    "ManifestError",
+    "STRATEGIES",
+    "parse_shard",
+    "format_shard",
+    "font_name",
+    "assign_shards",
+    "select_shard",
+    "make_manifest",
+    "write_manifest",
+    "read_manifest",
+    "merge_manifests",
+]
+
+
+MANIFEST_FORMAT = "ttfautohint-shard-manifest"
+MANIFEST_VERSION = 1
+
+STRATEGIES = ("cost", "hash")
+
+
+Shard = namedtuple("Shard", "index count")
+Shard.__doc__ = """Shard `index` (starting at 1) of `count`."""
+
+
+class ManifestError(ValueError):
+    pass
+
+
+def parse_shard(s):
+    """Return the Shard for a "i/N" string; raise ValueError if invalid."""
+    try:
+        index, count = (int(n) for n in s.split("/"))
+    except ValueError:
+        raise ValueError(f"invalid shard {s!r}, expected i/N") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"invalid shard {s!r}, i must be between 1 and N")
+    return Shard(index, count)
+
+
+def format_shard(shard):
+    return f"{shard.index}/{shard.count}"
+
+
+def font_name(path):
+    """Return the name identifying the font at `path` in a batch."""
+    return os.path.basename(os.fsdecode(path))
+
+
+def _hash_shard(name, count):
+    digest = hashlib.sha256(name.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def _estimated_seconds(path, model, options):
+    from ttfautohint._sfnt import SFNTError
+    from ttfautohint.cost import read_font_stats
+
+    try:
+        stats = read_font_stats(path)
+    except (OSError, SFNTError):
+        # fails fast
+        return 0.0
+    return model.estimate(stats, **options).seconds
+
+
+def assign_shards(paths, count, strategy="cost", **options):
+    """Return the shard index (starting at 1) of each of the fonts at
+    `paths`, using `strategy` ("cost" or "hash"; see the module docstring).
+    Keyword arguments are the ttfautohint options the costs depend on.
+    """
+    names = [font_name(path) for path in paths]
+    if strategy == "hash":
+        return [_hash_shard(name, count) for name in names]
+    if strategy != "cost":
+        raise ValueError(f"unknown sharding strategy {strategy!r}")
+    from ttfautohint.cost import CostModel
+
+    model = CostModel()
+    costs = [_estimated_seconds(path, model, options) for path in paths]
+    loads = [0.0] * count
+    shards = [None] * len(paths)
+    # ties are broken by name, so that the order of the paths doesn't matter
+    for i in sorted(range(len(paths)), key=lambda i: (-costs[i], names[i])):
+        shard = min(range(count), key=lambda s: (loads[s], s))
+        loads[shard] += costs[i]
+        shards[i] = shard + 1
+    return shards
+
+
+def select_shard(paths, shard, strategy="cost", **options):
+    """Return the paths of the fonts assigned to `shard` (a Shard)."""
+    shards = assign_shards(paths, shard.count, strategy, **options)
+    return [path for path, index in zip(paths, shards) if index == shard.index]
+
+
+def _file_digest(path):
+    from ttfautohint._pipeline import _file_digest
+
+    try:
+        return _file_digest(path)
+    except OSError:
+        return None
+
+
+def make_manifest(shard, strategy, paths, results):
+    """Return the manifest of `shard` (a Shard, or None for a whole batch)
+    of the batch of fonts at `paths`, given the `ttfautohint.cost.BatchResult`
+    of each font hinted by the shard.
+    """
+    fonts = []
+    for result in results:
+        ok = result.error is None
+        fonts.append(
+            {
+                "name": font_name(result.in_path),
+                "input": os.fsdecode(result.in_path),
+                "input_sha256": _file_digest(result.in_path),
+                "output": os.fsdecode(result.out_path),
+                "output_sha256": _file_digest(result.out_path) if ok else None,
+                "seconds": result.seconds,
+                "peak_rss": result.peak_rss,
+                "error": None if ok else str(result.error),
+            }
+        )
+    return {
+        "format": MANIFEST_FORMAT,
+        "version": MANIFEST_VERSION,
+        "shard": format_shard(shard or Shard(1, 1)),
+        "strategy": strategy,
+        "batch": sorted(font_name(path) for path in paths),
+        "fonts": fonts,
+    }
+
+
+def write_manifest(path, manifest):
+    data = json.dumps(manifest, indent=2, sort_keys=True) + "\n"
+    atomic_write(path, data.encode("utf-8"))
+
+
+def read_manifest(path):
+    """Return the manifest at `path`; raise ManifestError if it isn't one."""
+    with open(path, "rb") as f:
+        try:
+            manifest = json.loads(f.read())
+        except ValueError as e:
+            raise ManifestError(f"{os.fsdecode(path)}: invalid JSON: {e}") from None
+    if not isinstance(manifest, dict) or manifest.get("format") != MANIFEST_FORMAT:
+        raise ManifestError(f"{os.fsdecode(path)}: not a shard manifest")
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ManifestError(
+            f"{os.fsdecode(path)}: unsupported manifest version "
+            f"{manifest.get('version')!r}"
+        )
+    return manifest
+
+
+def merge_manifests(manifests):
+    """Return the manifest of the whole batch from those of its shards.
+
+    Raise ManifestError if the manifests are of different batches, or if a
+    font of the batch wasn't hinted by exactly one shard. Fonts that failed
+    are kept in the result, with their error.
+    """
+    if not manifests:
+        raise ManifestError("no manifests")
+    problems = []
+    batch = manifests[0]["batch"]
+    counts = {parse_shard(m["shard"]).count for m in manifests}
+    strategies = {m["strategy"] for m in manifests}
+    if any(m["batch"] != batch for m in manifests):
+        problems.append("the manifests are of different batches")
+    if len(counts) > 1 or len(strategies) > 1:
+        problems.append("the manifests are of different shardings")
+    shards = [m["shard"] for m in manifests]
+    for shard in sorted({s for s in shards if shards.count(s) > 1}):
+        problems.append(f"shard {shard} appears more than once")
+
+    fonts = {}
+    duplicates = set()
+    for manifest in manifests:
+        for font in manifest["fonts"]:
+            if font["name"] in fonts:
+                duplicates.add(font["name"])
+            fonts[font["name"]] = font
+    missing = sorted(set(batch) - set(fonts))
+    unknown = sorted(set(fonts) - set(batch))
+    if missing:
+        problems.append("not hinted: " + ", ".join(missing))
+    if duplicates:
+        problems.append("hinted more than once: " + ", ".join(sorted(duplicates)))
+    if unknown:
+        problems.append("not in the batch: " + ", ".join(unknown))
+    if problems:
+        raise ManifestError("; ".join(problems))
+    return {
+        "format": MANIFEST_FORMAT,
+        "version": MANIFEST_VERSION,
+        "shard": "1/1",
+        "strategy": manifests[0]["strategy"],
+        "batch": batch,
+        "fonts": [fonts[name] for name in batch],
+    }
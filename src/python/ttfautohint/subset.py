@@ -0,0 +1,206 @@
+"""Subset fonts with fontTools before hinting them.
+
+Hinting time grows with the number of glyphs, so when only a subset of a
+large font is shipped (e.g. per-language subsets for the web), it is much
+faster to subset first and only hint the glyphs that are kept.
+
+The subset keeps all the OpenType layout features, and the glyphs reachable
+from the requested ones through GSUB (the 'layout closure'), because
+ttfautohint uses HarfBuzz to assign glyphs to styles (small caps,
+superscripts, etc.) by following GSUB lookups. By default, the full font is
+also passed as the reference font (`reference_buffer`), from which blue
+zones are derived, so that all subsets of a font are hinted consistently.
+
+Example:
+
+    >>> with SubsetHinter("MyFont.ttf", hinting_range_max=30) as hinter:
+    ...     latin = hinter.hint(unicodes=range(0x20, 0x250))
+    ...     greek = hinter.hint(unicodes=range(0x370, 0x400))
+
+Requires fontTools.
+"""
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from ttfautohint._utils import atomic_write, sha256_hexdigest
+from ttfautohint.hinter import Hinter
+
+
+__all__ = ["SubsetHinter", "hint_subset", "subset_font"]
+
+
+# fontTools' default is to only keep the features needed for shaping
+DEFAULT_SUBSET_OPTIONS = dict(
+    layout_features=["*"],
+    layout_closure=True,
+    notdef_outline=True,
+    recalc_timestamp=False,
+)
+
+
+def subset_font(font, unicodes=None, glyphs=None, text=None, **subset_options):
+    """Return the subset of `font` (path or bytes) containing the given
+    `unicodes` (integers), `glyphs` (names) and the characters of `text`,
+    plus their GSUB closure, as bytes.
+
+    Keyword arguments are fontTools.subset.Options, overriding the defaults
+    in DEFAULT_SUBSET_OPTIONS.
+    """
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+
+    if unicodes is None and glyphs is None and text is None:
+        raise ValueError("no unicodes, glyphs or text to keep in the subset")
+    if isinstance(font, bytes):
+        font = BytesIO(font)
+    # don't update the modified timestamp, so that the same subset of the
+    # same font always has the same digest
+    ttfont = TTFont(font, recalcTimestamp=False)
+    options = subset.Options(**dict(DEFAULT_SUBSET_OPTIONS, **subset_options))
+    subsetter = subset.Subsetter(options=options)
+    subsetter.populate(
+        unicodes=list(unicodes or ()), glyphs=list(glyphs or ()), text=text or ""
+    )
+    subsetter.subset(ttfont)
+    buf = BytesIO()
+    ttfont.save(buf)
+    return buf.getvalue()
+
+
+class SubsetHinter(object):
+    """Subset and hint a font many times with the same options.
+
+    `font` is the full font (path or bytes). If `pin_blue_zones` is true
+    (the default), the full font is used as `reference_buffer` for all the
+    subsets. `subset_options` are passed to `subset_font`; other keyword
+    arguments are ttfautohint options, as for `Hinter`.
+
+    Results are cached by the digest of the subset font (together with the
+    hinting options and the digest of the executable): in memory, up to `cache_size` entries, and in the
+    `cache_dir` directory if one is given. The digests of recently requested
+    subsets are remembered, so that a repeated request is served from the
+    memory cache without subsetting the font again.
+
+    SubsetHinter objects can be used as context managers, and can be shared
+    by multiple threads.
+    """
+
+    def __init__(
+        self,
+        font,
+        pin_blue_zones=True,
+        cache_size=32,
+        cache_dir=None,
+        subset_options=None,
+        **options,
+    ):
+        if not isinstance(font, bytes):
+            with open(font, "rb") as f:
+                font = f.read()
+        self.font = font
+        if pin_blue_zones:
+            if "reference_file" in options or "reference_buffer" in options:
+                raise ValueError(
+                    "pin_blue_zones can't be used with another reference font"
+                )
+            options["reference_buffer"] = font
+        self.hinter = Hinter(**options)
+        self.subset_options = dict(subset_options or {})
+        self.cache_size = cache_size
+        self.cache_dir = cache_dir
+        self._cache = OrderedDict()
+        self._keys = OrderedDict()  # subset specification -> cache key
+        self._lock = threading.Lock()
+
+    def subset(self, unicodes=None, glyphs=None, text=None):
+        """Return the unhinted subset font, as bytes."""
+        return subset_font(self.font, unicodes, glyphs, text, **self.subset_options)
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key.replace(":", "-") + ".ttf")
+
+    def _cache_get(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        if self.cache_dir is not None:
+            try:
+                with open(self._cache_path(key), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return None
+            self._cache_put(key, data, persist=False)
+            return data
+        return None
+
+    def _cache_put(self, key, data, persist=True):
+        if self.cache_size:
+            with self._lock:
+                self._cache[key] = data
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        if persist and self.cache_dir is not None:
+            atomic_write(self._cache_path(key), data)
+
+    def hint(self, unicodes=None, glyphs=None, text=None):
+        """Return the hinted subset font with the given `unicodes`, `glyphs`
+        and characters of `text`, as bytes.
+        """
+        spec = (
+            frozenset(unicodes or ()) | frozenset(ord(c) for c in text or ""),
+            frozenset(glyphs or ()),
+        )
+        with self._lock:
+            key = self._keys.get(spec)
+        if key is not None:
+            result = self._cache_get(key)
+            if result is not None:
+                return result
+        data = self.subset(unicodes, glyphs, text)
+        key = self.hinter._result_key(sha256_hexdigest(data))
+        result = self._cache_get(key)
+        if result is None:
+            result = self.hinter.hint(data)
+            self._cache_put(key, result)
+        if self.cache_size:
+            with self._lock:
+                self._keys[spec] = key
+                self._keys.move_to_end(spec)
+                while len(self._keys) > self.cache_size:
+                    self._keys.popitem(last=False)
+        return result
+
+    def close(self):
+        self.hinter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+def hint_subset(
+    font,
+    unicodes=None,
+    glyphs=None,
+    text=None,
+    pin_blue_zones=True,
+    subset_options=None,
+    **options,
+):
+    """Subset `font` (path or bytes) and hint the result; see SubsetHinter.
+    Return the hinted subset font as bytes.
+    """
+    with SubsetHinter(
+        font,
+        pin_blue_zones=pin_blue_zones,
+        cache_size=0,
+        subset_options=subset_options,
+        **options,
+    ) as hinter:
+        return hinter.hint(unicodes, glyphs, text)
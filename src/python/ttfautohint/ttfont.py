@@ -0,0 +1,127 @@
+"""Hint fontTools TTFont objects in place.
+
+The usual way of hinting a TTFont is to save it to a buffer, pass that to
+`ttfautohint()`, and load the result into a new TTFont: the whole font is
+compiled, and all the tables the caller looks at afterwards are decompiled
+again, although hinting only changes a few of them (`glyf`, `loca`,
+`fpgm`, `prep`, `cvt `, `gasp`, `maxp`, `head`, `name`, `hdmx`, `TTFA`).
+
+`ttfautohint_ttfont()` updates the caller's TTFont instead:
+
+    >>> font = TTFont("MyFont.ttf")
+    >>> ttfautohint_ttfont(font, hinting_range_max=30)
+    ['cvt ', 'fpgm', 'gasp', 'glyf', 'head', 'loca', 'maxp', 'name', 'prep']
+    >>> font.save("MyFont-hinted.ttf")
+
+Tables are compiled without reordering them, and those that were never
+decompiled are copied as they were read. Only the tables whose data was
+changed by hinting are replaced: they are decompiled lazily from the
+hinted data the next time they are accessed, like the tables of a TTFont
+read from a file; all other tables, and the objects already decompiled
+from them, are left untouched.
+
+Requires fontTools.
+"""
+from io import BytesIO
+
+from ttfautohint._sfnt import read_table_directory
+
+
+__all__ = ["ttfautohint_ttfont"]
+
+
+# options that are given by ttfautohint_ttfont() itself
+_RESERVED_OPTIONS = ("in_file", "in_buffer", "out_file", "out_format")
+
+
+class _HintedReader(object):
+    """Stands in for the reader of a TTFont: returns the data of the tables
+    replaced by hinting from `tables`, and that of the other tables from
+    the font's original `reader` (which may be None).
+    """
+
+    def __init__(self, reader, tables):
+        self.reader = reader
+        self.tables = tables
+
+    def __contains__(self, tag):
+        return tag in self.tables or (self.reader is not None and tag in self.reader)
+
+    def keys(self):
+        keys = list(self.reader.keys()) if self.reader is not None else []
+        return keys + [tag for tag in self.tables if tag not in keys]
+
+    def __getitem__(self, tag):
+        if tag in self.tables:
+            return self.tables[tag]
+        if self.reader is None:
+            raise KeyError(tag)
+        return self.reader[tag]
+
+    def __delitem__(self, tag):
+        found = self.tables.pop(tag, None) is not None
+        if self.reader is not None and tag in self.reader:
+            del self.reader[tag]
+        elif not found:
+            raise KeyError(tag)
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+
+    def __getattr__(self, name):
+        # e.g. the file of the original reader
+        if self.reader is None:
+            raise AttributeError(name)
+        return getattr(self.reader, name)
+
+
+def _tables(data):
+    _, records = read_table_directory(data)
+    return {
+        record.tag: data[record.offset : record.offset + record.length]
+        for record in records
+    }
+
+
+def ttfautohint_ttfont(font, **options):
+    """Hint the fontTools TTFont `font` in place, with the keyword arguments
+    of `ttfautohint()` (except for the input and output ones); return the
+    sorted tags of the tables that were replaced, added or removed.
+
+    Raise TAError if hinting fails, leaving `font` unchanged.
+    """
+    from ttfautohint import ttfautohint
+
+    for name in _RESERVED_OPTIONS:
+        if name in options:
+            raise TypeError(
+                f"ttfautohint_ttfont() got an unexpected keyword argument {name!r}"
+            )
+
+    # the flavor of the font is kept for when the caller saves it
+    flavor = font.flavor
+    font.flavor = None
+    buf = BytesIO()
+    try:
+        # don't sort the tables, which copies the whole font again
+        font.save(buf, reorderTables=None)
+    finally:
+        font.flavor = flavor
+    in_buffer = buf.getvalue()
+    del buf
+
+    out_buffer = ttfautohint(in_buffer=in_buffer, **options)
+
+    before = _tables(in_buffer)
+    after = _tables(out_buffer)
+    replaced = {tag: data for tag, data in after.items() if before.get(tag) != data}
+    removed = [tag for tag in before if tag not in after]
+    for tag in list(replaced) + removed:
+        font.tables.pop(tag, None)
+    reader = _HintedReader(font.reader, replaced)
+    for tag in removed:
+        if font.reader is not None and tag in font.reader:
+            del reader[tag]
+    font.reader = reader
+    return sorted(list(replaced) + removed)
@@ -0,0 +1,245 @@
+"""Explore ttfautohint options to trade hinted font size against coverage.
+
+`tune()` hints a font with every configuration of a user-defined grid (or a
+random sample of it) in parallel, records output size, hinting time and
+per-table byte breakdown of each run, and returns a `TuningReport` with the
+Pareto front of configurations that minimize size and time while maximizing
+hinting coverage.
+
+Example:
+
+    >>> report = tune("MyFont.ttf", space={"hinting_range_max": [20, 30, 50]})
+    >>> print(report.format())
+    >>> ttfautohint(in_file="MyFont.ttf", out_file="out.ttf", **report.best())
+"""
+import itertools
+import os
+import random
+import subprocess
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from ttfautohint._sfnt import table_sizes
+from ttfautohint.errors import TAError
+from ttfautohint.hinter import Hinter
+from ttfautohint.options import USER_OPTIONS
+
+
+__all__ = ["DEFAULT_SPACE", "TuningResult", "TuningReport", "grid", "sample", "tune"]
+
+
+DEFAULT_SPACE = dict(
+    hinting_range_min=[8],
+    hinting_range_max=[16, 24, 36, 50],
+    increase_x_height=[0, 14],
+    hint_composites=[False, True],
+)
+
+_NOT_TUNABLE = frozenset(("in_file", "in_buffer", "out_file"))
+
+
+TuningResult = namedtuple(
+    "TuningResult", "options size time tables coverage pruned error"
+)
+TuningResult.__doc__ = """Outcome of hinting a font with one configuration.
+
+`size` is the hinted font size and `tables` a dict of table sizes, in bytes;
+`time` is the wall time in seconds. If the run was stopped early because it
+was dominated, `pruned` is True and `size` and `tables` are None; if it
+failed, `error` holds the TAError."""
+
+
+def _check_space(space):
+    for name in space:
+        if name not in USER_OPTIONS or name in _NOT_TUNABLE:
+            raise ValueError(f"not a tunable option: {name!r}")
+
+
+def grid(space):
+    """Return all the combinations of the option values in `space`, a dict
+    mapping option names to lists of values, as a list of dicts.
+    """
+    _check_space(space)
+    names = sorted(space)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(space[name] for name in names))
+    ]
+
+
+def sample(space, n, seed=None):
+    """Return `n` distinct configurations drawn at random from `space` (or
+    all of them, if there are fewer).
+    """
+    configs = grid(space)
+    if n >= len(configs):
+        return configs
+    return random.Random(seed).sample(configs, n)
+
+
+def hint_set_count(options):
+    """Default coverage metric: the number of PPEM values for which a hint
+    set is computed, doubled when composite glyphs are hinted too.
+    """
+    lo = options.get("hinting_range_min", USER_OPTIONS["hinting_range_min"])
+    hi = options.get("hinting_range_max", USER_OPTIONS["hinting_range_max"])
+    count = max(0, hi - lo + 1)
+    if options.get("hint_composites", USER_OPTIONS["hint_composites"]):
+        count *= 2
+    return count
+
+
+def _dominates(a, b):
+    """True if result `a` is at least as good as `b` in all objectives
+    (smaller size, shorter time, larger coverage) and better in one.
+    """
+    no_worse = a.size <= b.size and a.time <= b.time and a.coverage >= b.coverage
+    better = a.size < b.size or a.time < b.time or a.coverage > b.coverage
+    return no_worse and better
+
+
+class TuningReport(object):
+    def __init__(self, results, base_options):
+        self.results = results
+        self.base_options = base_options
+
+    @property
+    def completed(self):
+        return [r for r in self.results if not r.pruned and r.error is None]
+
+    @property
+    def pareto(self):
+        """Non-dominated results, sorted by increasing size."""
+        completed = self.completed
+        front = [r for r in completed if not any(_dominates(o, r) for o in completed)]
+        return sorted(front, key=lambda r: (r.size, r.time))
+
+    def best(self, max_size=None, max_time=None):
+        """Return the options of the Pareto-optimal configuration with the
+        largest coverage whose size (and time) are within the given limits,
+        preferring the smallest output among equal coverage. The returned
+        dict includes the base options, and can be passed to ttfautohint().
+        """
+        candidates = [
+            r
+            for r in self.pareto
+            if (max_size is None or r.size <= max_size)
+            and (max_time is None or r.time <= max_time)
+        ]
+        if not candidates:
+            raise ValueError("no configuration satisfies the given limits")
+        best = max(candidates, key=lambda r: (r.coverage, -r.size, -r.time))
+        return dict(self.base_options, **best.options)
+
+    def format(self):
+        """Return a text table of all results, marking Pareto-optimal ones."""
+        front = set(id(r) for r in self.pareto)
+        names = sorted({name for r in self.results for name in r.options})
+        lines = [
+            "  ".join(["*", "size", "time", "coverage"] + names),
+        ]
+        for r in sorted(self.results, key=lambda r: (r.size is None, r.size)):
+            if r.error is not None:
+                status = "error"
+            elif r.pruned:
+                status = "pruned"
+            else:
+                status = "%d" % r.size
+            lines.append(
+                "  ".join(
+                    ["*" if id(r) in front else " ", status, "%.2f" % r.time]
+                    + [str(r.coverage)]
+                    + [str(r.options.get(name, "")) for name in names]
+                )
+            )
+        return "\n".join(lines)
+
+
+def tune(
+    font,
+    space=None,
+    configs=None,
+    samples=None,
+    seed=None,
+    jobs=None,
+    coverage=hint_set_count,
+    prune_factor=2.0,
+    **base_options,
+):
+    """Hint `font` (path or bytes) with many configurations in parallel.
+
+    The configurations are either given explicitly as a list of option dicts
+    (`configs`), or generated from `space` (default: DEFAULT_SPACE): all its
+    combinations, or a random sample of `samples` of them. Additional
+    keyword arguments are ttfautohint options shared by all runs.
+
+    `coverage` is a function returning a number that measures the hinting
+    coverage of an options dict (the higher the better).
+
+    Configurations are started in order of decreasing coverage on up to
+    `jobs` concurrent processes. A run is stopped early when it takes more
+    than `prune_factor` times as long as an already completed configuration
+    with at least the same coverage: such a run is clearly dominated, as
+    output size grows together with hinting time. Set `prune_factor` to None
+    to run all configurations to completion.
+
+    Return a TuningReport.
+    """
+    if not isinstance(font, bytes):
+        with open(font, "rb") as f:
+            font = f.read()
+    if configs is None:
+        space = DEFAULT_SPACE if space is None else space
+        configs = grid(space) if samples is None else sample(space, samples, seed)
+    else:
+        for config in configs:
+            _check_space(config)
+
+    def full_options(config):
+        return dict(base_options, **config)
+
+    def valid(config):
+        # skip combinations that the executable would reject anyway
+        options = dict(USER_OPTIONS, **full_options(config))
+        return options["hinting_range_min"] <= options["hinting_range_max"]
+
+    # start with the largest coverage; pop() takes from the end
+    pending = sorted(filter(valid, configs), key=lambda c: coverage(full_options(c)))
+
+    results = []
+
+    def deadline(cov):
+        if prune_factor is None:
+            return None
+        times = [r.time for r in results if r.coverage >= cov and r.size is not None]
+        return prune_factor * min(times) if times else None
+
+    def evaluate(config, cov, timeout):
+        start = time.perf_counter()
+        try:
+            with Hinter(**full_options(config)) as hinter:
+                data = hinter.hint(font, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            elapsed = time.perf_counter() - start
+            return TuningResult(config, None, elapsed, None, cov, True, None)
+        except TAError as e:
+            elapsed = time.perf_counter() - start
+            return TuningResult(config, None, elapsed, None, cov, False, e)
+        elapsed = time.perf_counter() - start
+        return TuningResult(
+            config, len(data), elapsed, table_sizes(data), cov, False, None
+        )
+
+    max_workers = jobs or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = set()
+        while pending or running:
+            while pending and len(running) < max_workers:
+                config = pending.pop()
+                cov = coverage(full_options(config))
+                running.add(pool.submit(evaluate, config, cov, deadline(cov)))
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            results.extend(f.result() for f in done)
+
+    return TuningReport(results, base_options)
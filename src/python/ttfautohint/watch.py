@@ -0,0 +1,375 @@
+"""Continuously re-hint fonts as they change on disk.
+
+A `Watcher` monitors one or more source directories and writes hinted copies
+of the changed fonts to a mirrored output tree. On Linux, changes are picked
+up with inotify; elsewhere (or if inotify is not available) the directories
+are polled. Bursts of writes (e.g. a font editor exporting a whole family)
+are debounced, and the resulting set of changed files is hinted on a bounded
+pool of worker threads, each running one 'ttfautohint' subprocess.
+
+The fonts are hinted by a `ttfautohint.Hinter`, and recorded in a
+`ttfautohint.journal.JobJournal` (by default, in the output directory), so
+that a restarted Watcher only hints the fonts that changed in the meantime.
+"""
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ttfautohint._utils import atomic_write, sha256_hexdigest
+from ttfautohint.errors import TAError
+from ttfautohint.hinter import Hinter
+from ttfautohint.journal import JobJournal, job_fingerprint
+
+
+log = logging.getLogger(__name__)
+
+FONT_SUFFIXES = (".ttf", ".ttc")
+
+# default journal of a Watcher, in its output directory
+JOURNAL_NAME = ".ttfautohint-watch.jsonl"
+
+
+def _is_font(path, suffixes=FONT_SUFFIXES):
+    name = os.path.basename(path)
+    # skip hidden files, e.g. temporary files written by editors
+    return not name.startswith(".") and name.lower().endswith(suffixes)
+
+
+def _walk_fonts(root, suffixes=FONT_SUFFIXES):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if _is_font(path, suffixes):
+                yield path
+
+
+class PollingBackend(object):
+    """Detect changes by periodically comparing file sizes and mtimes."""
+
+    def __init__(self, roots, suffixes=FONT_SUFFIXES, interval=1.0):
+        self.roots = list(roots)
+        self.suffixes = suffixes
+        self.interval = interval
+        self._stats = self._scan()
+
+    def _scan(self):
+        stats = {}
+        for root in self.roots:
+            for path in _walk_fonts(root, self.suffixes):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                stats[path] = (st.st_mtime_ns, st.st_size)
+        return stats
+
+    def wait(self, timeout):
+        """Block for at most `timeout` seconds and return the set of paths
+        that were created or modified since the previous call.
+        """
+        time.sleep(min(timeout, self.interval))
+        stats = self._scan()
+        changed = {
+            path for path, stat in stats.items() if self._stats.get(path) != stat
+        }
+        self._stats = stats
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyBackend(object):
+    """Detect changes with the Linux inotify API, accessed through ctypes."""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = 0o2000000
+
+    _EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, roots, suffixes=FONT_SUFFIXES):
+        import ctypes
+        import ctypes.util
+
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+
+        self.roots = list(roots)
+        self.suffixes = suffixes
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._dirs = {}
+        for root in self.roots:
+            self._add_tree(root)
+
+    def _add_watch(self, dirpath):
+        import ctypes
+
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), dirpath)
+        self._dirs[wd] = dirpath
+
+    def _add_tree(self, root):
+        """Watch `root` and all its subdirectories, and return the fonts they
+        already contain (relevant for directories created after startup).
+        """
+        fonts = set()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            self._add_watch(dirpath)
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if _is_font(path, self.suffixes):
+                    fonts.add(path)
+        return fonts
+
+    def wait(self, timeout):
+        import select
+
+        changed = set()
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return changed
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        header_size = self._EVENT_HEADER.size
+        while offset + header_size <= len(data):
+            wd, mask, _cookie, length = self._EVENT_HEADER.unpack_from(data, offset)
+            offset += header_size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                # some events were dropped: fall back to a full rescan
+                for root in self.roots:
+                    changed.update(_walk_fonts(root, self.suffixes))
+                continue
+            if mask & self.IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            dirpath = self._dirs.get(wd)
+            if dirpath is None or not name:
+                continue
+            path = os.path.join(dirpath, os.fsdecode(name))
+            if mask & self.IN_ISDIR:
+                if not os.path.basename(path).startswith("."):
+                    changed.update(self._add_tree(path))
+            elif mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO):
+                if _is_font(path, self.suffixes):
+                    changed.add(path)
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class Watcher(object):
+    """Watch `sources` directories and hint changed fonts into `output_dir`.
+
+    Other keyword arguments are ttfautohint options, as for `Hinter`, and
+    `args` is a list of additional command-line options passed on to the
+    'ttfautohint' executable for every font; control and reference files are
+    read once, when the Watcher is created. With a single source directory,
+    its tree is mirrored directly inside `output_dir`; with several, each
+    gets its own subdirectory named after the source directory.
+
+    `jobs` limits the number of concurrent 'ttfautohint' processes (default:
+    number of CPUs). Changes are collected until no new event has arrived for
+    `debounce` seconds. If `use_inotify` is None, inotify is used when
+    available, else directories are polled every `poll_interval` seconds.
+
+    A font is only hinted again if its content changed: files that are merely
+    touched, or re-exported with identical bytes, reuse the existing output.
+    This is also true across restarts, as long as the options are the same:
+    the hinted fonts are recorded in `journal` (a JobJournal), by default
+    the JOURNAL_NAME file of `output_dir`. Transient failures are retried
+    according to the `retry` RetryPolicy, if given.
+    """
+
+    def __init__(
+        self,
+        sources,
+        output_dir,
+        args=(),
+        jobs=None,
+        debounce=0.5,
+        poll_interval=1.0,
+        use_inotify=None,
+        suffixes=FONT_SUFFIXES,
+        retry=None,
+        journal=None,
+        **options,
+    ):
+        if isinstance(sources, (str, bytes, os.PathLike)):
+            sources = [sources]
+        self.sources = [os.path.abspath(os.fsdecode(s)) for s in sources]
+        for source in self.sources:
+            if not os.path.isdir(source):
+                raise ValueError(f"not a directory: {source!r}")
+        self.output_dir = os.path.abspath(os.fsdecode(output_dir))
+        for source in self.sources:
+            if os.path.commonpath([source, self.output_dir]) == source:
+                raise ValueError("output_dir must not be inside a watched directory")
+        self.args = list(args)
+        self.retry = retry
+        self.debounce = debounce
+        self.suffixes = suffixes
+        self.hinter = Hinter(args=self.args, retry=retry, **options)
+        if journal is None:
+            journal = JobJournal(os.path.join(self.output_dir, JOURNAL_NAME))
+        self.journal = journal
+        self._fingerprint = job_fingerprint(self.hinter)
+        self._entries = journal.entries()
+        self._executor = ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1)
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._dirty = set()
+        self._backend = None
+        if use_inotify is None or use_inotify:
+            try:
+                self._backend = InotifyBackend(self.sources, suffixes)
+            except (OSError, AttributeError):
+                if use_inotify:
+                    raise
+        if self._backend is None:
+            self._backend = PollingBackend(self.sources, suffixes, poll_interval)
+
+    def output_path(self, path):
+        for source in self.sources:
+            if os.path.commonpath([source, path]) == source:
+                relpath = os.path.relpath(path, source)
+                if len(self.sources) > 1:
+                    relpath = os.path.join(os.path.basename(source), relpath)
+                return os.path.join(self.output_dir, relpath)
+        raise ValueError(f"{path!r} is not inside a watched directory")
+
+    def scan(self):
+        """Return all the font files currently in the watched directories."""
+        paths = []
+        for source in self.sources:
+            paths.extend(_walk_fonts(source, self.suffixes))
+        return paths
+
+    def hint(self, path):
+        """Hint a single font and atomically write it to the output tree.
+
+        Return True if the font was hinted, False if the previous result was
+        reused because neither the font nor the options changed.
+        """
+        out_path = self.output_path(path)
+        with self._lock:
+            entries = dict(self._entries)
+        # failed fonts are hinted again whenever they are saved
+        if self.journal.resume(entries, path, out_path, self._fingerprint, "all"):
+            return False
+
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = sha256_hexdigest(data)
+        start = time.monotonic()
+        try:
+            output = self.hinter.hint(data)
+        except (TAError, ValueError) as e:
+            self._record(path, out_path, digest, time.monotonic() - start, e)
+            raise
+        atomic_write(out_path, output)
+        seconds = time.monotonic() - start
+        self._record(path, out_path, digest, seconds)
+        log.info("hinted %s in %.2fs", out_path, seconds)
+        return True
+
+    def _record(self, path, out_path, digest, seconds, error=None):
+        entry = self.journal.record(
+            path, out_path, digest, self._fingerprint, seconds=seconds, error=error
+        )
+        with self._lock:
+            self._entries[(entry["input"], entry["output"])] = entry
+
+    def submit(self, paths):
+        """Schedule the given fonts to be hinted on the worker pool.
+
+        A font that is already being hinted is scheduled again once the
+        current job completes, so that the final output always reflects the
+        latest version on disk.
+        """
+        futures = []
+        with self._lock:
+            for path in sorted(paths):
+                if path in self._in_flight:
+                    self._dirty.add(path)
+                    continue
+                self._in_flight.add(path)
+                futures.append(self._executor.submit(self._job, path))
+        return futures
+
+    def _job(self, path):
+        try:
+            return self.hint(path)
+        except FileNotFoundError:
+            # the font was removed (or renamed) before we could read it
+            return False
+        except (OSError, TAError, ValueError) as e:
+            log.error("failed to hint %s: %s", path, e)
+            return False
+        finally:
+            with self._lock:
+                self._in_flight.discard(path)
+                again = path in self._dirty
+                self._dirty.discard(path)
+            if again:
+                self.submit([path])
+
+    def run(self, stop_event=None, initial=True):
+        """Watch the source directories until `stop_event` is set (or forever
+        if it is None). If `initial` is True, all the fonts found at startup
+        are hinted first.
+        """
+        if initial:
+            self.submit(self.scan())
+        pending = set()
+        deadline = None
+        while stop_event is None or not stop_event.is_set():
+            now = time.monotonic()
+            timeout = 0.5 if deadline is None else max(0.0, deadline - now)
+            changed = self._backend.wait(timeout)
+            now = time.monotonic()
+            if changed:
+                pending.update(changed)
+                deadline = now + self.debounce
+            elif pending and now >= deadline:
+                self.submit(pending)
+                pending = set()
+                deadline = None
+
+    def close(self):
+        self._backend.close()
+        self._executor.shutdown(wait=True)
+        self.hinter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
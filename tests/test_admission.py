@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+
+from ttfautohint.admission import MemoryBudget, RSSPredictor, parse_size
+from ttfautohint.cli import main
+from ttfautohint.cost import CostHistory, CostModel, hint_batch, read_font_stats
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.mark.parametrize(
+    "s, expected",
+    [
+        ("4096", 4096),
+        ("512M", 512 << 20),
+        ("1.5GiB", 3 << 29),
+        ("2gb", 2 << 30),
+        ("16 K", 16 << 10),
+    ],
+)
+def test_parse_size(s, expected):
+    assert parse_size(s) == expected
+
+
+@pytest.mark.parametrize("s", ["", "M", "12X", "-1G"])
+def test_parse_size_invalid(s):
+    with pytest.raises(ValueError, match="invalid size"):
+        parse_size(s)
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+class TestMemoryBudget(object):
+    def test_reserve(self):
+        budget = MemoryBudget(100)
+        assert budget.acquire(60)
+        assert budget.reserved == 60
+        assert budget.utilization == 0.6
+        assert not budget.acquire(50, timeout=0.01)
+        assert budget.acquire(40, timeout=0)
+        budget.release(40)
+        budget.release(60)
+        assert budget.reserved == 0
+        with pytest.raises(RuntimeError):
+            budget.release(1)
+        snapshot = budget.snapshot()
+        assert snapshot["peak_reserved"] == 100
+        assert snapshot["admitted"] == 2
+        assert snapshot["paused_seconds"] > 0
+
+    def test_pause(self):
+        budget = MemoryBudget(100)
+        admitted = []
+
+        def job(name, size):
+            with budget.reserve(size):
+                admitted.append(name)
+
+        budget.acquire(80)
+        thread = threading.Thread(target=job, args=("waiting", 30))
+        thread.start()
+        wait_for(lambda: budget.waiting == 1)
+        # a job that fits is admitted ahead of the waiting one
+        job("small", 20)
+        assert admitted == ["small"]
+        budget.release(80)
+        thread.join()
+        assert admitted == ["small", "waiting"]
+        assert budget.running == 0
+
+    def test_oversized(self):
+        budget = MemoryBudget(100)
+        # runs alone
+        assert budget.acquire(250)
+        assert budget.utilization == 2.5
+        assert not budget.acquire(1, timeout=0)
+        budget.release(250)
+        budget.acquire(1)
+        assert not budget.acquire(250, timeout=0)
+
+    def test_min_available(self):
+        available = [1000]
+        budget = MemoryBudget(
+            10000,
+            min_available=500,
+            poll_interval=0.001,
+            available=lambda: available[0],
+        )
+        assert budget.acquire(600)
+        assert not budget.acquire(600, timeout=0.01)
+        # memory freed by another process is noticed without a release
+        thread = threading.Thread(target=budget.acquire, args=(600,))
+        thread.start()
+        wait_for(lambda: budget.waiting == 1)
+        available[0] = 2000
+        thread.join()
+        assert budget.reserved == 1200
+
+
+def test_rss_predictor():
+    model = CostModel()
+    predictor = RSSPredictor(model, margin=1, smoothing=0.5)
+    stats = read_font_stats(FONT)
+    estimate = model.estimate(stats).peak_rss
+    assert predictor.predict(stats) == int(estimate)
+    predictor.observe(stats, 3 * estimate)
+    assert predictor.predict(stats) == int(3 * estimate)
+    assert predictor.ratio == 2
+    # the ratio applies to fonts (or options) that were not hinted yet
+    other = model.estimate(stats, hinting_range_max=20).peak_rss
+    assert predictor.predict(stats, hinting_range_max=20) == int(2 * other)
+    predictor.observe(stats, None)
+    assert predictor.ratio == 2
+
+
+def test_hint_batch(tmpdir):
+    history = CostHistory(str(tmpdir / "history.jsonl"))
+    pairs = [(FONT, str(tmpdir / f"out{i}.ttf")) for i in range(3)]
+    # less than the predicted peak of a single font, so they run one at a time
+    budget = MemoryBudget(CostModel.MIN_RSS)
+    results = hint_batch(pairs, jobs=3, history=history, memory_budget=budget)
+    assert all(r.error is None for r in results)
+    snapshot = budget.snapshot()
+    assert snapshot["admitted"] == 3
+    assert snapshot["reserved"] == 0
+    assert snapshot["peak_reserved"] > CostModel.MIN_RSS
+    assert snapshot["running"] == 0
+
+    results = hint_batch(pairs, history=history, memory_budget=1 << 40)
+    assert all(r.error is None for r in results)
+
+
+def test_cli(tmpdir, capsys):
+    out_dir = str(tmpdir / "out")
+    history = str(tmpdir / "history.jsonl")
+    args = ["--batch", FONT, "--output-dir", out_dir, "--history", history]
+    assert main(args + ["--memory-budget", "1G"]) == 0
+    assert os.path.exists(os.path.join(out_dir, os.path.basename(FONT)))
+    with pytest.raises(SystemExit):
+        main(args + ["--memory-budget", "lots"])
+    assert "invalid size" in capsys.readouterr().err
@@ -0,0 +1,180 @@
+import io
+import os
+import sys
+
+import ttfautohint
+from ttfautohint import AnalysisCache, Hinter
+from ttfautohint.analysis import analysis_keys
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture
+def analyzing_executable(tmpdir, monkeypatch):
+    # stands in for the patched executable: lists the analysis options in its
+    # --help, runs the real executable without the analysis arguments, logs
+    # the content of the analysis it was given (or "-") and exports $ANALYSIS
+    if sys.platform == "win32":
+        pytest.skip("uses a shell script as executable")
+    log = tmpdir / "log.txt"
+    script = tmpdir / "ttfautohint"
+    script.write(
+        "#!/bin/sh\n"
+        'if [ "$1" = --help ]; then\n'
+        f'  "{ttfautohint._executable_path()}" --help\n'
+        "  echo '      --analysis-in=FILE     load the global analysis'\n"
+        "  echo '      --analysis-out=FILE    save the global analysis'\n"
+        "  exit\n"
+        "fi\n"
+        "in=-; out=\n"
+        'for arg; do shift; case "$arg" in\n'
+        '  --analysis-in=*) in=$(cat "${arg#--analysis-in=}");;\n'
+        '  --analysis-out=*) out="${arg#--analysis-out=}";;\n'
+        '  *) set -- "$@" "$arg";;\n'
+        "esac; done\n"
+        f'echo "$in" >> "{log}"\n'
+        f'"{ttfautohint._executable_path()}" "$@" || exit $?\n'
+        'if [ -n "$out" ]; then printf %s "$ANALYSIS" > "$out"; fi\n'
+    )
+    script.chmod(0o755)
+    monkeypatch.setattr(ttfautohint, "_exe_full_path", str(script))
+    monkeypatch.setenv("ANALYSIS", "analysis 1")
+    return lambda: log.read().splitlines() if log.exists() else []
+
+
+@pytest.fixture
+def font_data():
+    with open(FONT, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def other_font_data():
+    # another font of the "family"
+    from fontTools.ttLib import TTFont
+
+    font = TTFont(FONT)
+    font["head"].fontRevision = 2.5
+    buf = io.BytesIO()
+    font.save(buf)
+    return buf.getvalue()
+
+
+def test_analysis_keys():
+    keys = analysis_keys(["-l", "8"], "a" * 64)
+    assert len(keys) == 1
+    assert keys != analysis_keys(["-l", "9"], "a" * 64)
+    assert keys != analysis_keys(["-l", "8"], "b" * 64)
+
+    keys = analysis_keys(["-l", "8"], "a" * 64, reference_digest="r" * 64)
+    other = analysis_keys(["-l", "8"], "b" * 64, reference_digest="r" * 64)
+    assert len(keys) == 2
+    assert keys[0] != other[0]
+    # the fonts of a family share the analysis of their reference
+    assert keys[1] == other[1]
+
+
+class TestAnalysisCache(object):
+    def test_get_put(self, tmpdir):
+        cache = AnalysisCache(str(tmpdir))
+        keys = analysis_keys([], "a" * 64, reference_digest="r" * 64)
+        assert cache.get(keys) == (None, None)
+        cache.put(keys, b"analysis")
+        assert cache.get(keys) == (b"analysis", 0)
+        assert cache.get(keys[1:]) == (b"analysis", 0)
+        other = analysis_keys([], "b" * 64, reference_digest="r" * 64)
+        assert cache.get(other) == (b"analysis", 1)
+        assert cache.stats == dict(hits=2, reference_hits=1, misses=1)
+
+    def test_session(self, tmpdir):
+        cache = AnalysisCache(str(tmpdir / "cache"))
+        keys = analysis_keys([], "a" * 64)
+        with cache.session(keys) as args:
+            (out_arg,) = args
+            assert out_arg.startswith("--analysis-out=")
+            out_path = out_arg.split("=", 1)[1]
+            with open(out_path, "wb") as f:
+                f.write(b"analysis")
+        assert not os.path.exists(os.path.dirname(out_path))
+        assert cache.get(keys)[0] == b"analysis"
+
+        with cache.session(keys) as args:
+            in_arg, out_arg = args
+            with open(in_arg.split("=", 1)[1], "rb") as f:
+                assert f.read() == b"analysis"
+
+    def test_session_error(self, tmpdir):
+        cache = AnalysisCache(str(tmpdir))
+        keys = analysis_keys([], "a" * 64)
+        with pytest.raises(RuntimeError):
+            with cache.session(keys) as args:
+                with open(args[0].split("=", 1)[1], "wb") as f:
+                    f.write(b"partial")
+                raise RuntimeError
+        assert cache.get(keys) == (None, None)
+
+
+def test_invalid_option():
+    with pytest.raises(TypeError, match="analysis_cache must be an AnalysisCache"):
+        ttfautohint.ttfautohint(in_file=FONT, analysis_cache="dir")
+
+
+def test_ttfautohint(analyzing_executable, tmpdir, font_data):
+    cache = AnalysisCache(str(tmpdir / "analysis"))
+    expected = ttfautohint.ttfautohint(in_buffer=font_data)
+    assert ttfautohint.ttfautohint(in_file=FONT, analysis_cache=cache) == expected
+    with open(FONT, "rb") as f:
+        assert ttfautohint.ttfautohint(in_file=f, analysis_cache=cache) == expected
+    # other hinting options reuse nothing
+    ttfautohint.ttfautohint(in_file=FONT, analysis_cache=cache, no_info=True)
+    assert analyzing_executable() == ["-", "-", "analysis 1", "-"]
+    assert cache.stats == dict(hits=1, reference_hits=0, misses=2)
+
+
+def test_reference(analyzing_executable, tmpdir, font_data, other_font_data):
+    cache = AnalysisCache(str(tmpdir / "analysis"))
+    options = dict(reference_buffer=font_data, analysis_cache=cache)
+    ttfautohint.ttfautohint(in_buffer=font_data, **options)
+    ttfautohint.ttfautohint(in_buffer=other_font_data, **options)
+    assert analyzing_executable() == ["-", "analysis 1"]
+    assert cache.stats == dict(hits=0, reference_hits=1, misses=1)
+
+
+def test_failure_not_stored(analyzing_executable, tmpdir):
+    cache = AnalysisCache(str(tmpdir / "analysis"))
+    with pytest.raises(ttfautohint.TAError):
+        ttfautohint.ttfautohint(
+            in_buffer=b"\0\1\0\0" + b"\0" * 200, preflight=False, analysis_cache=cache
+        )
+    assert not os.path.exists(cache.directory)
+
+
+def test_hinter(analyzing_executable, tmpdir, font_data):
+    cache = AnalysisCache(str(tmpdir / "analysis"))
+    with Hinter(analysis_cache=cache) as hinter:
+        hinter.hint_file(FONT, str(tmpdir / "out.ttf"))
+        hinter.hint(font_data)
+        hinter.hint_file(FONT)
+    assert analyzing_executable() == ["-", "analysis 1", "analysis 1"]
+    assert cache.stats["hits"] == 2
+
+
+def test_unpatched_executable(tmpdir, font_data):
+    # the real executable, which doesn't support --analysis-in/--analysis-out
+    if "analysis-in" in ttfautohint._executable_options():
+        pytest.skip("the executable is patched")
+    cache = AnalysisCache(str(tmpdir / "analysis"))
+    expected = ttfautohint.ttfautohint(in_buffer=font_data)
+    for _ in range(2):
+        assert ttfautohint.ttfautohint(in_file=FONT, analysis_cache=cache) == expected
+    assert cache.stats == dict(hits=0, reference_hits=0, misses=0)
+    assert not os.path.exists(cache.directory)
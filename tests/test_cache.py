@@ -0,0 +1,250 @@
+import hashlib
+import io
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import ttfautohint
+from ttfautohint import Hinter, ResultCache
+from ttfautohint.cache import (
+    CacheServer,
+    DiskStore,
+    IntegrityError,
+    RemoteStore,
+    result_key,
+)
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture
+def server(tmpdir):
+    server = CacheServer(str(tmpdir / "server"), address=("127.0.0.1", 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def hinted(source_date_epoch):
+    return ttfautohint.ttfautohint(in_file=FONT)
+
+
+def request(url, data=None, method="GET", headers=None):
+    req = urllib.request.Request(url, data=data, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        with e:
+            return e.code, e.read()
+
+
+def test_result_key(monkeypatch):
+    digest = sha256(b"font")
+    key = result_key(["--hinting-range-min=8"], digest)
+    assert len(key) == 64
+    assert key == result_key(["--hinting-range-min=8"], digest)
+    assert key != result_key(["--hinting-range-min=9"], digest)
+    assert key != result_key(["--hinting-range-min=8"], sha256(b"other"))
+    assert key != result_key(["--hinting-range-min=8"], digest, executable="0")
+    assert key != result_key(
+        ["--hinting-range-min=8"], digest, postprocess={"out_format": "woff"}
+    )
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1")
+    assert key != result_key(["--hinting-range-min=8"], digest)
+
+
+class TestDiskStore(object):
+    def test_get_put(self, tmpdir):
+        store = DiskStore(str(tmpdir))
+        data = b"hinted font"
+        digest = sha256(data)
+        assert store.get("cas", digest) is None
+        assert store.put("cas", digest, data)
+        assert not store.put("cas", digest, data)
+        assert store.get("cas", digest) == data
+        assert os.path.exists(tmpdir / "cas" / digest[:2] / digest)
+
+    def test_invalid(self, tmpdir):
+        store = DiskStore(str(tmpdir))
+        with pytest.raises(ValueError, match="match"):
+            store.put("cas", sha256(b"a"), b"b")
+        with pytest.raises(ValueError, match="namespace"):
+            store.get("tmp", sha256(b"a"))
+        with pytest.raises(ValueError, match="name"):
+            store.get("cas", "../" + sha256(b"a")[3:])
+
+    def test_corrupt(self, tmpdir):
+        store = DiskStore(str(tmpdir))
+        digest = sha256(b"data")
+        store.put("cas", digest, b"data")
+        path = tmpdir / "cas" / digest[:2] / digest
+        path.write_binary(b"dat")
+        assert store.get("cas", digest) is None
+        assert not path.exists()
+
+
+class TestServer(object):
+    def test_get_put(self, server):
+        data = b"hinted font"
+        url = f"{server.url}/cas/{sha256(data)}"
+        assert request(url)[0] == 404
+        assert request(url, data, "PUT")[0] == 201
+        assert request(url, data, "PUT")[0] == 204
+        assert request(url) == (200, data)
+        assert request(url, method="HEAD") == (200, b"")
+
+    def test_digest_mismatch(self, server):
+        key = sha256(b"a")
+        assert request(f"{server.url}/cas/{key}", b"b", "PUT")[0] == 400
+        assert request(f"{server.url}/ac/{key}", b"not a digest", "PUT")[0] == 400
+
+    def test_too_large(self, server):
+        server.max_entry_size = 3
+        assert request(f"{server.url}/cas/{sha256(b'data')}", b"data", "PUT")[0] == 413
+
+    @pytest.mark.parametrize("path", ["/", "/cas", "/tmp/" + "0" * 64, "/cas/0"])
+    def test_not_found(self, server, path):
+        assert request(server.url + path)[0] == 404
+
+    def test_remote_store(self, server, tmpdir):
+        store = RemoteStore(server.url)
+        digest = sha256(b"data")
+        assert store.get("cas", digest) is None
+        assert store.put("cas", digest, b"data")
+        assert store.get("cas", digest) == b"data"
+        # tampered with in transit
+        server.store.get = lambda namespace, name: b"dat"
+        with pytest.raises(IntegrityError):
+            store.get("cas", digest)
+
+
+class TestResultCache(object):
+    def test_local(self, tmpdir):
+        cache = ResultCache(str(tmpdir))
+        key = sha256(b"key")
+        assert cache.get(key) is None
+        cache.put(key, b"result")
+        assert cache.get(key) == b"result"
+        assert cache.stats["misses"] == 1
+        assert cache.stats["local_hits"] == 1
+
+    def test_remote(self, server, tmpdir):
+        key = sha256(b"key")
+        with ResultCache(str(tmpdir / "a"), url=server.url) as cache:
+            cache.put(key, b"result")
+            cache.flush()
+            assert cache.stats["uploads"] == 1
+        with ResultCache(str(tmpdir / "b"), url=server.url) as cache:
+            assert cache.get(key) == b"result"
+            assert cache.get(key) == b"result"
+            assert cache.stats["remote_hits"] == 1
+            assert cache.stats["local_hits"] == 1
+        with ResultCache(url=server.url, upload=False) as cache:
+            cache.put(sha256(b"other"), b"result")
+            assert cache.get(sha256(b"other")) is None
+
+    def test_integrity(self, server, tmpdir):
+        key = sha256(b"key")
+        with ResultCache(url=server.url) as cache:
+            cache.put(key, b"result")
+            cache.flush()
+            digest = sha256(b"result")
+            server.store.get = lambda namespace, name: (
+                b"resul" if namespace == "cas" else digest.encode()
+            )
+            assert cache.get(key) is None
+            assert cache.stats["download_errors"] == 1
+
+    def test_server_down(self, tmpdir):
+        key = sha256(b"key")
+        with ResultCache(str(tmpdir), url="http://127.0.0.1:1", timeout=1) as cache:
+            assert cache.get(key) is None
+            cache.put(key, b"result")
+            cache.flush()
+            assert cache.stats["download_errors"] == 1
+            assert cache.stats["upload_errors"] == 1
+            # still cached locally
+            assert cache.get(key) == b"result"
+
+    def test_required(self):
+        with pytest.raises(ValueError):
+            ResultCache()
+
+
+class TestTTFAutohint(object):
+    def test_cache(self, tmpdir, hinted, monkeypatch):
+        cache = ResultCache(str(tmpdir))
+        assert ttfautohint.ttfautohint(in_file=FONT, cache=cache) == hinted
+        # the second call doesn't run the executable
+        monkeypatch.setattr(ttfautohint.subprocess, "Popen", None)
+        assert ttfautohint.ttfautohint(in_file=FONT, cache=cache) == hinted
+        with open(FONT, "rb") as f:
+            assert ttfautohint.ttfautohint(in_file=f, cache=cache) == hinted
+        out = io.BytesIO()
+        ttfautohint.ttfautohint(in_file=FONT, out_file=out, cache=cache)
+        assert out.getvalue() == hinted
+        assert cache.stats == dict(
+            cache.stats, local_hits=3, misses=1, download_errors=0
+        )
+
+    def test_options_in_key(self, tmpdir, hinted):
+        cache = ResultCache(str(tmpdir))
+        ttfautohint.ttfautohint(in_file=FONT, cache=cache)
+        other = ttfautohint.ttfautohint(in_file=FONT, cache=cache, no_info=True)
+        assert other != hinted
+        assert cache.stats["misses"] == 2
+
+    def test_shared(self, server, tmpdir, hinted):
+        with ResultCache(str(tmpdir / "a"), url=server.url) as cache:
+            ttfautohint.ttfautohint(in_file=FONT, cache=cache)
+        with ResultCache(str(tmpdir / "b"), url=server.url) as cache:
+            assert ttfautohint.ttfautohint(in_file=FONT, cache=cache) == hinted
+            assert cache.stats["remote_hits"] == 1
+
+    def test_invalid(self):
+        with pytest.raises(TypeError, match="cache must be a ResultCache"):
+            ttfautohint.ttfautohint(in_file=FONT, cache="dir")
+
+
+def test_hinter(tmpdir, hinted, monkeypatch):
+    cache = ResultCache(str(tmpdir))
+    with Hinter(cache=cache) as hinter:
+        assert hinter.hint_file(FONT) == hinted
+        monkeypatch.setattr(ttfautohint.subprocess, "Popen", None)
+        with open(FONT, "rb") as f:
+            assert hinter.hint(f.read()) == hinted
+        out_path = str(tmpdir / "out.ttf")
+        hinter.hint_file(FONT, out_path)
+        with open(out_path, "rb") as f:
+            assert f.read() == hinted
+    assert cache.stats["local_hits"] == 2
+
+
+def test_shared_by_ttfautohint_and_hinter(tmpdir):
+    # both compile the control instructions, so equivalent ones share entries
+    cache = ResultCache(str(tmpdir))
+    expected = ttfautohint.ttfautohint(
+        in_file=FONT, cache=cache, control_buffer="a l 1,2 # comment\n"
+    )
+    with Hinter(cache=cache, control_buffer="a left 2,1\n") as hinter:
+        assert hinter.hint_file(FONT) == expected
+    assert cache.stats["local_hits"] == 1 and cache.stats["misses"] == 1
@@ -0,0 +1,179 @@
+import os
+
+import ttfautohint
+from ttfautohint import Hinter
+from ttfautohint.errors import ControlInstructionsError
+from ttfautohint.control import (
+    ControlError,
+    SegmentEntry,
+    StyleWidthsEntry,
+    compile_control,
+    parse_control,
+)
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+def hint_with_control_file(path):
+    # run the executable itself: ttfautohint() compiles the control file
+    result = ttfautohint.run(
+        ["--control-file", str(path), FONT], capture_output=True, check=True
+    )
+    return result.stdout
+
+
+class TestParseControl(object):
+    def test_entries(self):
+        entries = parse_control(
+            "# comment\n"
+            "a left 3-1, 5 (10,-2)\n"
+            "\n"
+            "* sups width 40, 30, 40 ; 1 b n 0x10\n"
+        )
+        assert entries[0] == SegmentEntry(0, "a", "l", ((1, 3), (5, 5)), 10, -2, 2)
+        assert entries[1] == StyleWidthsEntry(0, "*", "sups", (40, 30, 40), 4)
+        assert entries[2].font_idx == 1
+        assert entries[2].points == ((16, 16),)
+
+    def test_bytes_and_file(self, tmpdir):
+        path = tmpdir / "control.txt"
+        path.write_binary(b"a l 1\r\n")
+        with path.open("rb") as f:
+            assert parse_control(f) == parse_control(b"a l 1\n")
+
+    @pytest.mark.parametrize(
+        "source, lineno, message",
+        [
+            ("a l 1\nb q 3", 2, "expected one of"),
+            ("a l 1\n\nlatn xxxx @ a", 3, "invalid feature 'xxxx'"),
+            ("grek ruby @ a", 1, "invalid style 'grek ruby'"),
+            ("a p 1 @ 60", 1, "value 60 out of range"),
+            ("a p 1 x 1.5 @ 10", 1, "shift value out of range"),
+            ("a p 1", 1, "expected '@'"),
+            ("a l 1 (1,2", 1, "expected '\\)'"),
+            ("a l 1 $", 1, "invalid character '\\$'"),
+            ("* dflt w " + ",".join(["1"] * 17), 1, "too many stem widths"),
+            ("a \\\n l 1 2", 2, "unexpected '2'"),
+        ],
+    )
+    def test_errors(self, source, lineno, message):
+        with pytest.raises(ControlError, match=message) as exc_info:
+            parse_control(source, filename="ctrl.txt")
+        assert exc_info.value.lineno == lineno
+        assert str(exc_info.value).startswith(f"ctrl.txt:{lineno}:")
+
+    def test_invalid_utf8(self):
+        with pytest.raises(ControlError, match="ctrl.txt:2:3: invalid UTF-8"):
+            parse_control(b"a l 1\n# \xff\n", filename="ctrl.txt")
+
+    def test_resolve_glyph_names(self):
+        entries = parse_control("a p - @ 6-53\n.notdef n 0\n", font=FONT)
+        assert entries[0].glyph == 68
+        assert entries[0].points == ((None, None),)
+        assert entries[0].ppems == ((None, None),)
+        assert entries[1].glyph == 0
+
+    @pytest.mark.parametrize(
+        "source, message",
+        [
+            ("foobar l 1", "invalid glyph name 'foobar'"),
+            ("99999 l 1", "invalid glyph index 99999"),
+            ("1 a l 1", "invalid font index 1"),
+            ("a r 0-1000", "value 1000 out of range"),
+        ],
+    )
+    def test_font_errors(self, source, message):
+        with pytest.raises(ControlError, match=message):
+            parse_control(source, font=FONT)
+
+
+class TestCompileControl(object):
+    def test_canonical(self):
+        assert compile_control(
+            "latn smcp @ a, b-c ; cyrl dflt @ 10\n"
+            "a l 5, 3-1 (0,0)\n"
+            "a l 1-3,5\n"
+            "1 b t 1,2 x 0.3 y -.5 @ 12, 8-10\n"
+        ) == (
+            "latn smcp @ a,b-c\n"
+            "cyrl dflt @ 10\n"
+            "a l 1-3,5\n"
+            "1 b t 1-2 x 0.25 y -0.5 @ 8-10,12\n"
+        )
+
+    def test_equivalent_output(self, monkeypatch, tmpdir):
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+        source = (
+            "a p - @ 6-53\n"
+            "latn smcp @ a-c\n"
+            "a r 2-1 (3,4)\n"
+            "* dflt w 50,40\n"
+            "b t 3 y 0.4 @ 10,11,12\n"
+        )
+        compiled = compile_control(source, font=FONT)
+        assert compiled.startswith("68 p - @ -\n")
+        original = tmpdir / "original.txt"
+        original.write(source)
+        compiled_file = tmpdir / "compiled.txt"
+        compiled_file.write(compiled)
+        expected = hint_with_control_file(original)
+        assert hint_with_control_file(compiled_file) == expected
+
+    @pytest.mark.parametrize(
+        "source",
+        [
+            "* dflt w 100, 200, 100\n",
+            "latn dflt w 80,60 # comment\nlatn dflt w 80,60\n",
+            "a l 1\n* dflt w 50 ; b r 2-3\n",
+        ],
+    )
+    def test_compiled_file_output(self, monkeypatch, tmpdir, source):
+        # the executable gets the compiled file from ttfautohint() and Hinter
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+        original = tmpdir / "original.txt"
+        original.write(source)
+        compiled = tmpdir / "compiled.txt"
+        compiled.write(compile_control(source))
+        expected = hint_with_control_file(original)
+        assert hint_with_control_file(compiled) == expected
+        assert ttfautohint.ttfautohint(in_file=FONT, control_buffer=source) == expected
+
+    def test_ttfautohint_checks_control(self, tmpdir):
+        control_file = tmpdir / "control.txt"
+        control_file.write("a l 1\nlatn xxxx @ a\n")
+        # before loading the font, with the same errors as the executable
+        with pytest.raises(ControlError, match="control.txt:2:6: invalid feature"):
+            ttfautohint.ttfautohint(
+                in_buffer=b"", preflight=False, control_file=str(control_file)
+            )
+        with pytest.raises(ControlInstructionsError):
+            ttfautohint.ttfautohint(in_file=FONT, control_buffer="a l 1,\n")
+
+    def test_glyph_names_left_to_executable(self, tmpdir):
+        # names the font doesn't have are reported by the executable, at the
+        # lines of the original file
+        control_file = tmpdir / "control.txt"
+        control_file.write("# comment\n\nuni0041 left 1\n")
+        with pytest.raises(ControlInstructionsError, match="control.txt:3:"):
+            ttfautohint.ttfautohint(in_file=FONT, control_file=str(control_file))
+        with pytest.raises(ControlInstructionsError, match=":3:"):
+            ttfautohint.ttfautohint(
+                in_file=FONT, control_buffer="# comment\n\nuni0041 left 1\n"
+            )
+
+    def test_invalid_utf8_file(self, tmpdir):
+        control_file = tmpdir / "control.txt"
+        control_file.write_binary(b"a l 1\xff\n")
+        with pytest.raises(ControlError, match="control.txt:1:6: invalid UTF-8"):
+            Hinter(control_file=str(control_file))
+
+    def test_hinter_checks_control(self):
+        with pytest.raises(ControlError, match="invalid feature"):
+            Hinter(control_buffer="a l 1\nlatn xxxx @ a\n")
+        a = Hinter(control_buffer="a l 1,2 # comment\n").config
+        b = Hinter(control_buffer="a left 2,1\n").config
+        assert a == b
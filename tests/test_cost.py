@@ -0,0 +1,213 @@
+import os
+from io import BytesIO
+
+from fontTools.ttLib import TTFont
+from fontTools.ttLib.ttCollection import TTCollection
+
+from ttfautohint import Hinter, ResultCache, TAError, ttfautohint
+from ttfautohint._sfnt import SFNTError
+from ttfautohint.cli import main
+from ttfautohint.cost import (
+    CostHistory,
+    CostModel,
+    FontStats,
+    cost_report,
+    hint_batch,
+    lpt_order,
+    makespan,
+    read_font_stats,
+)
+from ttfautohint.subset import subset_font
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture(scope="module")
+def small_font(tmp_path_factory):
+    path = tmp_path_factory.mktemp("fonts") / "Small.ttf"
+    path.write_bytes(subset_font(FONT, unicodes=range(0x20, 0x7F)))
+    return str(path)
+
+
+def test_read_font_stats():
+    font = TTFont(FONT)
+    stats = read_font_stats(FONT)
+    assert stats.num_fonts == 1
+    assert stats.num_glyphs == font["maxp"].numGlyphs
+    assert stats.max_points == font["maxp"].maxPoints
+    assert stats.glyf_size == font.reader.tables["glyf"].length
+    assert stats.file_size == os.path.getsize(FONT)
+    with open(FONT, "rb") as f:
+        assert read_font_stats(f.read()) == stats
+        f.seek(0)
+        assert read_font_stats(f) == stats
+
+    with pytest.raises(SFNTError, match="truncated"):
+        read_font_stats(b"\0\1\0\0")
+
+
+def test_read_font_stats_collection(small_font):
+    collection = TTCollection()
+    collection.fonts = [TTFont(FONT), TTFont(small_font)]
+    buf = BytesIO()
+    collection.save(buf, shareTables=True)
+    stats = read_font_stats(buf.getvalue())
+    assert stats.num_fonts == 2
+    assert stats.num_glyphs == (
+        read_font_stats(FONT).num_glyphs + read_font_stats(small_font).num_glyphs
+    )
+
+
+class TestCostModel(object):
+    def test_estimate(self, small_font):
+        model = CostModel()
+        large = model.estimate(read_font_stats(FONT))
+        small = model.estimate(read_font_stats(small_font))
+        assert large.seconds > small.seconds
+        assert large.peak_rss > small.peak_rss
+        more = model.estimate(read_font_stats(FONT), hinting_range_max=100)
+        assert more.seconds > large.seconds
+        assert model.estimate(read_font_stats(FONT), dehint=True).seconds > 0
+
+    def test_fit(self):
+        # a machine twice as slow as the default model
+        default = CostModel()
+        records = []
+        for glyphs in (100, 1000, 5000, 20000):
+            for hinting_range_max in (20, 50):
+                stats = FontStats(glyphs * 100, 1, glyphs, glyphs * 50, 0, 0, 0)
+                options = dict(hinting_range_max=hinting_range_max)
+                estimate = default.estimate(stats, **options)
+                records.append(
+                    dict(
+                        stats=stats._asdict(),
+                        hint_sets=hinting_range_max - 7,
+                        seconds=2 * estimate.seconds,
+                        peak_rss=estimate.peak_rss,
+                    )
+                )
+        model = CostModel.fit(records)
+        stats = FontStats(3000000, 1, 30000, 1500000, 0, 0, 0)
+        expected = default.estimate(stats, hinting_range_max=30)
+        estimate = model.estimate(stats, hinting_range_max=30)
+        assert estimate.seconds == pytest.approx(2 * expected.seconds, rel=0.05)
+        assert estimate.peak_rss == pytest.approx(expected.peak_rss, rel=0.05)
+        assert CostModel.fit([]).time_coefs == default.time_coefs
+
+
+def test_lpt():
+    costs = [1, 5, 2, 4]
+    order = lpt_order(costs)
+    assert order == [1, 3, 2, 0]
+    assert makespan([costs[i] for i in order], 2) == 6
+    # the long job last leaves a worker idle
+    assert makespan([1, 1, 1, 1, 4], 2) == 6
+    assert makespan([4, 1, 1, 1, 1], 2) == 4
+
+
+def test_history(tmpdir):
+    history = CostHistory(str(tmpdir / "sub" / "history.jsonl"))
+    assert history.records() == []
+    assert history.model().time_coefs == CostModel().time_coefs
+    stats = read_font_stats(FONT)
+    history.record(stats, {}, 10.0, 1 << 30)
+    with open(history.path, "ab") as f:
+        f.write(b"{truncated")
+    records = history.records()
+    assert len(records) == 1
+    assert records[0]["hint_sets"] == 43
+    assert history.model().estimate(stats).seconds > 1
+
+
+def test_hint_batch(tmpdir, small_font):
+    history = CostHistory(str(tmpdir / "history.jsonl"))
+    pairs = [
+        (small_font, str(tmpdir / "out" / "small.ttf")),
+        (FONT, str(tmpdir / "out" / "large.ttf")),
+        (__file__, str(tmpdir / "out" / "invalid.ttf")),
+    ]
+    results = hint_batch(pairs, jobs=1, history=history, args=["--no-info"])
+    assert [r.in_path for r in results] == [p[0] for p in pairs]
+    small, large, invalid = results
+    assert large.estimate.seconds > small.estimate.seconds
+    assert large.error is None and large.seconds > 0
+    with open(large.out_path, "rb") as f:
+        assert f.read() == ttfautohint(in_file=FONT, no_info=True)
+    assert isinstance(invalid.error, TAError)
+    assert invalid.estimate is None
+    assert not os.path.exists(invalid.out_path)
+    assert len(history.records()) == 2
+    if large.peak_rss is not None:
+        assert history.records()[0]["peak_rss"] == large.peak_rss
+
+
+def test_hint_batch_with_cache(tmpdir, small_font):
+    # the jobs are run by a Hinter, with its options
+    history = CostHistory(str(tmpdir / "history.jsonl"))
+    cache = ResultCache(str(tmpdir / "cache"))
+    pairs = [(small_font, str(tmpdir / "out" / "small.ttf"))]
+    for _ in range(2):
+        (result,) = hint_batch(pairs, history=history, cache=cache, no_info=True)
+        assert result.error is None
+    # the cached result is neither run nor recorded
+    assert result.peak_rss is None
+    assert len(history.records()) == 1
+    assert cache.stats["local_hits"] == 1
+    with open(result.out_path, "rb") as f:
+        assert f.read() == ttfautohint(in_file=small_font, no_info=True)
+    # the additional arguments are part of the key
+    hint_batch(pairs, history=history, cache=cache, args=["--no-info"])
+    assert cache.stats["misses"] == 2
+
+
+def test_hint_many_order(small_font, monkeypatch, tmpdir):
+    history = CostHistory(str(tmpdir / "history.jsonl"))
+    with Hinter() as hinter:
+        started = []
+        hint_file = hinter.hint_file
+        monkeypatch.setattr(
+            hinter, "hint_file", lambda path: started.append(path) or hint_file(path)
+        )
+        results = hinter.hint_many([small_font, FONT], jobs=1, history=history)
+        assert started == [FONT, small_font]
+        assert len(results[1]) > len(results[0])
+
+        # the same estimates for both fonts, which keep their order
+        started.clear()
+        model = CostModel(time_coefs=[0.0] * len(CostModel.TIME_COEFS))
+        hinter.hint_many([small_font, FONT], jobs=1, model=model)
+        assert started == [small_font, FONT]
+
+
+def test_cost_report(small_font):
+    report = cost_report([small_font, FONT], model=CostModel(), jobs=2)
+    assert report.makespan == max(e.seconds for e in report.estimates)
+    assert report.total_seconds == sum(e.seconds for e in report.estimates)
+    lines = report.format().splitlines()
+    assert lines[1].endswith(FONT)
+    assert lines[-1].startswith("total")
+    assert report.as_dict()["fonts"][0]["glyphs"] < 300
+
+
+def test_cli(tmpdir, small_font, capsys):
+    history = str(tmpdir / "history.jsonl")
+    args = ["--batch", small_font, FONT, "--history", history, "-r", "20"]
+    assert main(args + ["--dry-run"]) == 0
+    out = capsys.readouterr().out
+    assert out.splitlines()[1].endswith(FONT)
+    assert not os.path.exists(history)
+
+    out_dir = tmpdir / "out"
+    assert main(args + ["--output-dir", str(out_dir), "--no-info"]) == 0
+    expected = ttfautohint(in_file=FONT, hinting_range_max=20, no_info=True)
+    assert (out_dir / os.path.basename(FONT)).read_binary() == expected
+    assert len(CostHistory(history).records()) == 2
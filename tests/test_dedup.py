@@ -0,0 +1,144 @@
+import io
+import os
+
+from fontTools.ttLib import TTFont
+from fontTools.ttLib.tables._g_l_y_f import Glyph
+
+import ttfautohint
+from ttfautohint import dedup
+from ttfautohint.dedup import (
+    DedupError,
+    DedupStats,
+    find_duplicates,
+    hint_deduplicated,
+)
+from ttfautohint.subset import subset_font
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+# simple Latin glyphs that aren't components of others, and unused Latin
+# code points for their copies
+ORIGINALS = [0xDF, 0x141, 0x142, 0x166]  # ß Ł ł Ŧ
+COPIES = [0xA722, 0xA723, 0xA724, 0xA725]
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+def add_copies(font, pairs, advance=None):
+    # map each code point in `pairs` to a new copy of the glyph of the other
+    glyf = font["glyf"]
+    hmtx = font["hmtx"]
+    cmap = font.getBestCmap()
+    glyph_order = font.getGlyphOrder()
+    for original, copy in pairs:
+        name = cmap[original]
+        new_name = f"copy{copy:04X}"
+        glyph_order.append(new_name)
+        glyf.glyphs[new_name] = Glyph(glyf[name].compile(glyf))
+        width, lsb = hmtx[name]
+        hmtx[new_name] = (width if advance is None else advance, lsb)
+        for table in font["cmap"].tables:
+            if table.isUnicode():
+                table.cmap[copy] = new_name
+    font.setGlyphOrder(glyph_order)
+    glyf.glyphOrder = glyph_order
+    font["post"].extraNames = []
+    return font
+
+
+def save(font):
+    buf = io.BytesIO()
+    font.save(buf)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def font_data():
+    return save(add_copies(TTFont(FONT), zip(ORIGINALS, COPIES)))
+
+
+def test_find_duplicates(font_data):
+    font = TTFont(io.BytesIO(font_data))
+    cmap = font.getBestCmap()
+    assert find_duplicates(font) == {
+        cmap[copy]: cmap[original] for original, copy in zip(ORIGINALS, COPIES)
+    }
+
+
+def test_find_duplicates_excluded():
+    # 'a' is a component of accented letters, 'Ł' has other metrics, and
+    # the Cyrillic copy of 'ß' may get another style
+    font = add_copies(TTFont(FONT), [(0x61, 0xA722), (0xDF, 0x04FF)])
+    add_copies(font, [(0x141, 0xA723)], advance=500)
+    assert find_duplicates(font) == {}
+
+
+def test_find_duplicates_control(font_data):
+    font = TTFont(io.BytesIO(font_data))
+    cmap = font.getBestCmap()
+    control = f"{cmap[0xA722]} left 0\n"
+    assert cmap[0xA722] not in find_duplicates(font, control)
+    assert len(find_duplicates(font, control)) == len(COPIES) - 1
+
+
+@pytest.mark.parametrize("options", [{}, {"no_info": True, "hint_composites": True}])
+def test_hint_deduplicated(font_data, options):
+    stats = []
+    result = hint_deduplicated(font_data, verify=True, stats=stats, **options)
+    assert result == ttfautohint.ttfautohint(in_buffer=font_data, **options)
+    num_glyphs = len(TTFont(io.BytesIO(font_data)).getGlyphOrder())
+    assert stats == [DedupStats(num_glyphs, num_glyphs - len(COPIES), len(COPIES))]
+
+
+@pytest.mark.parametrize("last", [True, False])
+def test_hint_deduplicated_latin(last):
+    # a copy of 'A' as 'Ā', last or first in the glyph order
+    font = TTFont(io.BytesIO(subset_font(FONT, unicodes=range(0x41, 0x5B))))
+    add_copies(font, [(0x41, 0x100)])
+    if not last:
+        glyph_order = font.getGlyphOrder()
+        glyph_order.insert(1, glyph_order.pop())
+        font.setGlyphOrder(glyph_order)
+        font["glyf"].glyphOrder = glyph_order
+    data = save(font)
+    stats = []
+    expected = ttfautohint.ttfautohint(in_buffer=data)
+    assert hint_deduplicated(data, stats=stats) == expected
+    assert hint_deduplicated(data, verify=True) == expected
+    assert stats[0].duplicates == 1
+
+
+def test_no_duplicates():
+    with open(FONT, "rb") as f:
+        data = f.read()
+    stats = []
+    assert hint_deduplicated(data, stats=stats) == ttfautohint.ttfautohint(
+        in_buffer=data
+    )
+    assert stats[0].duplicates == 0
+
+
+def test_verify(font_data, monkeypatch):
+    # pretend that two different glyphs are duplicates
+    def find_wrong_duplicates(font, control=None):
+        cmap = font.getBestCmap()
+        return {cmap[ord("B")]: cmap[ord("A")]}
+
+    monkeypatch.setattr(dedup, "find_duplicates", find_wrong_duplicates)
+    with pytest.raises(DedupError, match="differs in B"):
+        hint_deduplicated(font_data, verify=True)
+
+
+@pytest.mark.parametrize("name", ["in_buffer", "out_file", "optimize"])
+def test_invalid_options(font_data, name):
+    with pytest.raises(TypeError, match=name):
+        hint_deduplicated(font_data, **{name: None})
+    with pytest.raises(TypeError, match="data type must be bytes"):
+        hint_deduplicated(FONT)
@@ -0,0 +1,161 @@
+import os
+import pathlib
+import subprocess
+import sys
+import time
+import zipfile
+
+import ttfautohint
+from ttfautohint import TAError
+from ttfautohint._exe_cache import CACHE_DIR_ENV, MAX_AGE, cached_executable
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="uses shell scripts as executables"
+)
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+def make_zip(path, script):
+    with zipfile.ZipFile(str(path), "w") as zf:
+        zf.writestr("ttfautohint/__init__.py", "")
+        zf.writestr("ttfautohint/ttfautohint", script)
+    return str(path)
+
+
+@pytest.fixture
+def wrapper_zip(tmpdir):
+    # a zip file containing a script that runs the real executable
+    script = f'#!/bin/sh\nexec "{ttfautohint._executable_path()}" "$@"\n'
+    return make_zip(tmpdir / "package.zip", script)
+
+
+def resource(zip_path):
+    return zipfile.Path(zip_path, "ttfautohint/ttfautohint")
+
+
+def installed(directory):
+    return sorted(name for name in os.listdir(directory) if name[0] != ".")
+
+
+def test_install(tmpdir, wrapper_zip):
+    directory = str(tmpdir / "cache")
+    path = cached_executable(resource(wrapper_zip), "ttfautohint", directory)
+    assert os.path.dirname(path) == directory
+    assert os.access(path, os.X_OK)
+    assert b"ttfautohint" in subprocess.check_output([path, "--version"])
+
+    st = os.stat(path)
+    assert cached_executable(resource(wrapper_zip), "ttfautohint", directory) == path
+    assert os.stat(path).st_ino == st.st_ino
+    assert installed(directory) == [os.path.basename(path)]
+
+
+def test_reinstall_truncated(tmpdir, wrapper_zip):
+    directory = str(tmpdir)
+    path = cached_executable(resource(wrapper_zip), "ttfautohint", directory)
+    with open(path, "r+b") as f:
+        f.truncate(2)
+    assert cached_executable(resource(wrapper_zip), "ttfautohint", directory) == path
+    assert b"ttfautohint" in subprocess.check_output([path, "--version"])
+
+
+def test_content_hash(tmpdir):
+    # resources that aren't in a zip file are hashed
+    source = tmpdir / "ttfautohint"
+    source.write_binary(b"#!/bin/sh\necho 1\n")
+    directory = str(tmpdir / "cache")
+    path = cached_executable(pathlib.Path(source), "ttfautohint.exe", directory)
+    assert os.path.basename(path).startswith("ttfautohint-")
+    assert path.endswith(".exe")
+    source.write_binary(b"#!/bin/sh\necho 2\n")
+    assert cached_executable(pathlib.Path(source), "ttfautohint.exe", directory) != path
+
+
+def test_garbage_collection(tmpdir):
+    directory = str(tmpdir / "cache")
+    old = cached_executable(
+        resource(make_zip(tmpdir / "1.zip", "#!/bin/sh\n")), "ttfautohint", directory
+    )
+    recent = cached_executable(
+        resource(make_zip(tmpdir / "2.zip", "#!/bin/sh\n\n")), "ttfautohint", directory
+    )
+    stale_tmp = os.path.join(directory, ".ttfautohint-abc.tmp")
+    open(stale_tmp, "wb").close()
+    long_ago = time.time() - MAX_AGE - 1
+    os.utime(old, (long_ago, long_ago))
+    os.utime(stale_tmp, (long_ago, long_ago))
+
+    new = cached_executable(
+        resource(make_zip(tmpdir / "3.zip", "#!/bin/sh\n\n\n")),
+        "ttfautohint",
+        directory,
+    )
+    assert installed(directory) == sorted(os.path.basename(p) for p in (recent, new))
+    assert not os.path.exists(stale_tmp)
+
+
+def test_concurrent_processes(tmpdir, wrapper_zip):
+    directory = str(tmpdir / "cache")
+    script = (
+        "import sys, zipfile; "
+        "from ttfautohint._exe_cache import cached_executable; "
+        "print(cached_executable(zipfile.Path(sys.argv[1], 'ttfautohint/ttfautohint'),"
+        " 'ttfautohint', sys.argv[2]))"
+    )
+    procs = [
+        subprocess.Popen(
+            [sys.executable, "-c", script, wrapper_zip, directory],
+            stdout=subprocess.PIPE,
+        )
+        for _ in range(8)
+    ]
+    paths = {proc.communicate()[0].strip() for proc in procs}
+    assert all(proc.returncode == 0 for proc in procs)
+    assert len(paths) == 1
+    assert installed(directory) == [os.path.basename(paths.pop().decode())]
+
+
+class TestExecutablePath(object):
+    @pytest.fixture
+    def zipped(self, monkeypatch, wrapper_zip):
+        # pretend the package was imported from the zip file
+        monkeypatch.setattr(ttfautohint, "is_resource", lambda package, name: True)
+        monkeypatch.setattr(
+            ttfautohint,
+            "files",
+            lambda package: zipfile.Path(wrapper_zip, "ttfautohint/"),
+        )
+        monkeypatch.setattr(ttfautohint, "_exe_full_path", None)
+
+    def test_cached(self, zipped, monkeypatch, tmpdir):
+        monkeypatch.setenv(CACHE_DIR_ENV, str(tmpdir / "cache"))
+        path = ttfautohint._executable_path()
+        assert os.path.dirname(path) == str(tmpdir / "cache")
+        assert ttfautohint.ttfautohint(in_file=FONT)
+
+    def test_not_writable(self, zipped, monkeypatch, tmpdir):
+        # falls back to extracting a temporary copy
+        not_a_directory = tmpdir / "file"
+        not_a_directory.write("")
+        monkeypatch.setenv(CACHE_DIR_ENV, str(not_a_directory / "cache"))
+        path = ttfautohint._executable_path()
+        assert not path.startswith(str(tmpdir))
+        assert b"ttfautohint" in subprocess.check_output([path, "--version"])
+
+    def test_not_found(self, monkeypatch):
+        monkeypatch.setattr(ttfautohint, "is_resource", lambda package, name: False)
+        monkeypatch.setattr(ttfautohint, "_exe_full_path", None)
+        monkeypatch.setenv("PATH", "")
+        with pytest.raises(TAError, match="not found") as exc_info:
+            ttfautohint._executable_path()
+        assert exc_info.value.rv == 127
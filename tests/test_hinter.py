@@ -0,0 +1,109 @@
+import os
+from io import BytesIO
+
+from fontTools.ttLib import TTFont
+
+from ttfautohint import Hinter, HintingConfig, StemWidthMode, TAError, ttfautohint
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    # make the output reproducible
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture(scope="module")
+def font_data():
+    with open(FONT, "rb") as f:
+        return f.read()
+
+
+class TestHintingConfig(object):
+    def test_hashable_and_immutable(self):
+        a = Hinter(no_info=True).config
+        b = Hinter(no_info=True).config
+        c = Hinter(no_info=True, hinting_range_max=20).config
+        assert a == b
+        assert hash(a) == hash(b)
+        assert a != c
+        assert len({a, b, c}) == 2
+        with pytest.raises(AttributeError):
+            a.key = "foo"
+        with pytest.raises(AttributeError):
+            a.foo = "bar"
+
+    def test_stem_width_mode(self):
+        a = Hinter(gray_stem_width_mode=StemWidthMode.STRONG).config
+        b = Hinter(gray_stem_width_mode=1).config
+        assert a == b
+        assert a.as_dict()["gray_stem_width_mode"] == 1
+
+    def test_control_by_content(self, tmpdir):
+        control_file = tmpdir / "control.txt"
+        control_file.write_text("a l 1\n", encoding="utf-8")
+        a = Hinter(control_buffer="a l 1\n").config
+        b = Hinter(control_file=str(control_file)).config
+        c = Hinter(control_buffer="a r 1\n").config
+        assert a == b
+        assert a != c
+        assert isinstance(a, HintingConfig)
+
+
+class TestHinter(object):
+    def test_io_options_not_allowed(self):
+        with pytest.raises(TypeError, match="'in_buffer' must be passed"):
+            Hinter(in_buffer=b"")
+
+    def test_invalid_options(self):
+        with pytest.raises(TypeError, match="unknown keyword argument: 'foo'"):
+            Hinter(foo=1)
+        with pytest.raises(ValueError, match="mutually exclusive"):
+            Hinter(no_info=True, detailed_info=True)
+
+    def test_hint(self, font_data):
+        with Hinter(no_info=True) as hinter:
+            hinted = hinter.hint(font_data)
+        assert hinted == ttfautohint(in_buffer=font_data, no_info=True)
+        assert "fpgm" in TTFont(BytesIO(hinted))
+
+    def test_hint_file(self, tmpdir, font_data):
+        out_path = tmpdir / "hinted.ttf"
+        with Hinter(no_info=True) as hinter:
+            assert hinter.hint_file(FONT, str(out_path)) is None
+            assert out_path.read_binary() == hinter.hint_file(FONT)
+
+    def test_hint_many(self, tmpdir, font_data):
+        out_path = tmpdir / "hinted.ttf"
+        with Hinter(no_info=True) as hinter:
+            results = hinter.hint_many([font_data, FONT, (FONT, str(out_path))])
+            expected = hinter.hint(font_data)
+        assert results == [expected, expected, None]
+        assert out_path.read_binary() == expected
+
+    def test_error(self):
+        with Hinter() as hinter:
+            with pytest.raises(TAError):
+                hinter.hint(b"\0\1\0\0")
+
+    def test_close_removes_tempfiles(self, font_data):
+        hinter = Hinter(control_buffer="# nothing\n", reference_buffer=font_data)
+        tempfiles = list(hinter._tempfiles)
+        assert len(tempfiles) == 2
+        assert all(os.path.exists(p) for p in tempfiles)
+        hinter.close()
+        assert hinter.closed
+        assert not any(os.path.exists(p) for p in tempfiles)
+        with pytest.raises(ValueError, match="closed"):
+            hinter.hint(font_data)
+
+    def test_cache_key(self, font_data):
+        a = Hinter(no_info=True)
+        b = Hinter(no_info=True)
+        assert a.cache_key(font_data) == b.cache_key(font_data)
+        assert a.cache_key(font_data) != a.cache_key(font_data + b"\0")
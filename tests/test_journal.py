@@ -0,0 +1,137 @@
+import json
+import os
+
+from ttfautohint import TAError, ttfautohint
+from ttfautohint.cli import main
+from ttfautohint.cost import CostHistory, hint_batch
+from ttfautohint.errors import InvalidFontError, TransientError
+from ttfautohint.journal import JobJournal, PreviousFailure, _file_digest
+from ttfautohint.subset import subset_font
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture(scope="module")
+def small_font():
+    return subset_font(FONT, unicodes=range(0x20, 0x7F))
+
+
+@pytest.fixture
+def batch(tmpdir, small_font):
+    pairs = []
+    for name in ["A.ttf", "B.ttf", "Bad.ttf"]:
+        path = tmpdir / name
+        path.write_binary(small_font if name != "Bad.ttf" else b"\0\1\0\0garbage")
+        pairs.append((str(path), str(tmpdir / "out" / name)))
+    return pairs
+
+
+def run(pairs, tmpdir, **kwargs):
+    updates = []
+    results = hint_batch(
+        pairs,
+        jobs=2,
+        history=CostHistory(str(tmpdir / "history.jsonl")),
+        journal=JobJournal(str(tmpdir / "journal.jsonl")),
+        progress=lambda *args: updates.append(args),
+        no_info=True,
+        **kwargs,
+    )
+    return results, updates
+
+
+def test_resume(batch, tmpdir, small_font):
+    results, updates = run(batch[:1], tmpdir)
+    assert results[0].error is None and not results[0].resumed
+    assert updates == [(results[0], 1, 1)]
+
+    # only the fonts that weren't done are hinted
+    results, updates = run(batch[:2], tmpdir)
+    assert [r.resumed for r in results] == [True, False]
+    assert [u[1:] for u in updates] == [(1, 2), (2, 2)]
+    assert updates[0][0] is results[0]
+    expected = ttfautohint(in_buffer=small_font, no_info=True)
+    for _, out_path in batch[:2]:
+        with open(out_path, "rb") as f:
+            assert f.read() == expected
+
+    results, _ = run(batch[:2], tmpdir)
+    assert all(r.resumed and r.error is None and r.seconds > 0 for r in results)
+
+
+def test_changes(batch, tmpdir):
+    run(batch[:2], tmpdir)
+    # a modified output, or input, or other options, and the font is hinted
+    with open(batch[0][1], "ab") as f:
+        f.write(b"\0")
+    results, _ = run(batch[:2], tmpdir)
+    assert [r.resumed for r in results] == [False, True]
+    with open(batch[1][0], "ab") as f:
+        f.write(b"\0")
+    results, _ = run(batch[:2], tmpdir)
+    assert [r.resumed for r in results] == [True, False]
+    results, _ = run(batch[:2], tmpdir, hint_composites=True)
+    assert [r.resumed for r in results] == [False, False]
+
+
+def test_failures(batch, tmpdir):
+    results, _ = run(batch, tmpdir)
+    assert isinstance(results[2].error, TAError)
+    assert not os.path.exists(batch[2][1])
+
+    # deterministic failures are only retried with "all"
+    results, _ = run(batch, tmpdir)
+    assert results[2].resumed and isinstance(results[2].error, PreviousFailure)
+    results, _ = run(batch, tmpdir, retry_failed="all")
+    assert not results[2].resumed and isinstance(results[2].error, TAError)
+    with pytest.raises(ValueError, match="retry_failed"):
+        run(batch, tmpdir, retry_failed="some")
+
+
+def test_retry_failed(batch, tmpdir):
+    journal = JobJournal(str(tmpdir / "journal.jsonl"))
+    in_path, out_path = batch[0]
+    digest = _file_digest(in_path)
+    for error, policy, resumed in [
+        (TransientError(-9, b""), "none", True),
+        (TransientError(-9, b""), "transient", False),
+        (InvalidFontError(1, b""), "transient", True),
+        (InvalidFontError(1, b""), "all", False),
+    ]:
+        journal.record(in_path, out_path, digest, "options", error=error)
+        entry = journal.resume(journal.entries(), in_path, out_path, "options", policy)
+        assert (entry is not None) == resumed
+        assert journal.resume(journal.entries(), in_path, out_path, "other") is None
+
+
+def test_truncated_journal(batch, tmpdir):
+    run(batch[:1], tmpdir)
+    path = tmpdir / "journal.jsonl"
+    # the batch died while writing the last line
+    path.write_binary(path.read_binary() + b'{"input": "')
+    results, _ = run(batch[:2], tmpdir)
+    assert [r.resumed for r in results] == [True, False]
+    lines = path.read_binary().splitlines()
+    assert len(lines) == 3 and json.loads(lines[-1])["status"] == "done"
+
+
+def test_cli(batch, tmpdir, capsys):
+    args = ["--batch"] + [in_path for in_path, _ in batch[:2]]
+    args += ["--output-dir", str(tmpdir / "out"), "--no-info"]
+    args += ["--history", str(tmpdir / "history.jsonl")]
+    args += ["--journal", str(tmpdir / "journal.jsonl")]
+    assert main(args) == 0
+    err = capsys.readouterr().err
+    assert "[1/2] " in err and "[2/2] " in err
+    assert "done in a previous run" not in err
+    assert main(args) == 0
+    assert capsys.readouterr().err.count("done in a previous run") == 2
@@ -0,0 +1,204 @@
+import gc
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import urllib.request
+from io import BytesIO
+
+from ttfautohint import Hinter, TAError, metrics, ttfautohint
+from ttfautohint.metrics import Registry
+from ttfautohint.server import HintingServer
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture
+def registry():
+    registry = metrics.enable()
+    yield registry
+    metrics.disable()
+
+
+class TestRegistry(object):
+    def test_counter(self):
+        registry = Registry()
+        counter = registry.counter("jobs_total", "Jobs.", ["status"])
+        counter.inc(status="ok")
+        counter.inc(2, status="ok")
+        counter.inc(status="error")
+        assert counter.get(status="ok") == 3
+        assert registry.counter("jobs_total", "Jobs.", ["status"]) is counter
+        with pytest.raises(ValueError, match="expects labels"):
+            counter.inc(result="ok")
+        with pytest.raises(ValueError, match="only be incremented"):
+            counter.inc(-1, status="ok")
+        with pytest.raises(ValueError, match="already defined"):
+            registry.gauge("jobs_total")
+        assert registry.to_prometheus() == (
+            "# HELP jobs_total Jobs.\n"
+            "# TYPE jobs_total counter\n"
+            'jobs_total{status="error"} 1\n'
+            'jobs_total{status="ok"} 3\n'
+        )
+
+    def test_histogram(self):
+        registry = Registry()
+        histogram = registry.histogram("latency_seconds", buckets=[0.1, 1])
+        for value in (0.05, 0.5, 0.5, 2):
+            histogram.observe(value)
+        assert registry.to_prometheus() == (
+            "# TYPE latency_seconds histogram\n"
+            'latency_seconds_bucket{le="0.1"} 1\n'
+            'latency_seconds_bucket{le="1"} 3\n'
+            'latency_seconds_bucket{le="+Inf"} 4\n'
+            "latency_seconds_sum 3.05\n"
+            "latency_seconds_count 4\n"
+        )
+        sample = registry.snapshot()["latency_seconds"]["samples"][0]
+        assert sample == {"labels": {}, "buckets": [1, 2, 1], "count": 4, "sum": 3.05}
+
+    def test_gauge_threads(self):
+        registry = Registry()
+        gauge = registry.gauge("in_flight")
+
+        def work():
+            for _ in range(1000):
+                gauge.inc()
+                gauge.dec()
+            gauge.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert gauge.get() == 8
+        json.loads(registry.to_json())
+
+    def test_not_kept_alive(self):
+        registries = [Registry() for _ in range(100)]
+        assert len(metrics._live_registries()) >= 100
+        del registries
+        gc.collect()
+        assert len(metrics._live_registries()) < 100
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+    def test_fork(self):
+        registry = Registry()
+        registry.counter("jobs_total").inc()
+        pid = os.fork()
+        if pid == 0:
+            os._exit(int(registry["jobs_total"].get() != 0))
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+        assert registry["jobs_total"].get() == 1
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+    def test_fork_while_locked(self):
+        # another thread holds the lock of the registry when the process forks
+        registry = Registry()
+        counter = registry.counter("jobs_total")
+        locked, done = threading.Event(), threading.Event()
+
+        def hold():
+            with registry._lock:
+                locked.set()
+                done.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        locked.wait()
+        try:
+            pid = os.fork()
+            if pid == 0:
+                # killed by the alarm if it deadlocks
+                signal.alarm(5)
+                counter.inc()
+                registry.collect()
+                os._exit(int(counter.get() != 1))
+        finally:
+            done.set()
+            thread.join()
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+
+    def test_processes(self, tmpdir):
+        script = (
+            "import sys; from ttfautohint.metrics import Registry; "
+            "r = Registry(sys.argv[1]); "
+            "r.counter('jobs_total').inc(); r.gauge('in_flight').inc()"
+        )
+        for _ in range(2):
+            subprocess.check_call([sys.executable, "-c", script, str(tmpdir)])
+        registry = Registry(str(tmpdir))
+        registry.counter("jobs_total").inc()
+        registry.gauge("in_flight").inc()
+        families = registry.collect()
+        assert families["jobs_total"]["samples"] == {(): 3}
+        # the gauges of exited processes are ignored
+        assert families["in_flight"]["samples"] == {(): 1}
+
+
+class TestInstrumentation(object):
+    def test_ttfautohint(self, registry):
+        data = ttfautohint(in_file=FONT)
+        buf = BytesIO()
+        with open(FONT, "rb") as f:
+            ttfautohint(in_file=f, out_file=buf)
+        with pytest.raises(TAError):
+            ttfautohint(in_buffer=b"\0\1\0\0", preflight=False)
+
+        size = os.path.getsize(FONT)
+        assert registry["ttfautohint_calls_total"].get(status="ok") == 2
+        assert registry["ttfautohint_calls_total"].get(status="error") == 1
+        assert registry["ttfautohint_input_bytes_total"].get() == 2 * size + 4
+        assert registry["ttfautohint_output_bytes_total"].get() == 2 * len(data)
+        errors = registry["ttfautohint_errors_total"]
+        assert errors.get(category="invalid-font", code="0xF6") == 1
+        assert registry["ttfautohint_calls_in_flight"].get() == 0
+        assert registry["ttfautohint_process_runs_total"].get(returncode=0) == 2
+        assert registry["ttfautohint_process_runs_total"].get(returncode=1) == 1
+
+        text = registry.to_prometheus()
+        assert 'ttfautohint_duration_seconds_count{size="<=1MiB"} 2' in text
+        assert 'ttfautohint_duration_seconds_count{size="<=64KiB"} 1' in text
+
+    def test_hinter(self, registry):
+        with Hinter() as hinter:
+            hinter.hint_file(FONT)
+        runs = registry["ttfautohint_process_runs_total"]
+        assert runs.get(returncode=0) == 1
+        assert registry["ttfautohint_calls_total"].get(status="ok") == 0
+
+    def test_disabled(self):
+        registry = metrics.enable()
+        metrics.disable()
+        assert metrics.active_registry() is None
+        ttfautohint(in_file=FONT)
+        assert registry["ttfautohint_calls_total"].get(status="ok") == 0
+
+
+def test_server_metrics(registry):
+    server = HintingServer(("127.0.0.1", 0), workers=1)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        with urllib.request.urlopen(server.url + "/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert b"# TYPE ttfautohint_calls_total counter" in response.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
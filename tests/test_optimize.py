@@ -0,0 +1,148 @@
+import os
+import string
+from io import BytesIO
+
+from fontTools.ttLib import TTFont, newTable
+from fontTools.ttLib.tables import ttProgram
+
+from ttfautohint import Hinter, ttfautohint
+from ttfautohint.optimize import (
+    OptimizeError,
+    decode,
+    encode_push,
+    optimize_font,
+    optimize_ttfont,
+    push_values,
+    verify_font,
+)
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture(scope="module")
+def hinted():
+    return ttfautohint(in_file=FONT, hinting_range_max=20)
+
+
+@pytest.fixture(scope="module")
+def small_font(tmp_path_factory):
+    from fontTools import subset
+
+    font = TTFont(FONT)
+    subsetter = subset.Subsetter()
+    subsetter.populate(text=string.printable)
+    subsetter.subset(font)
+    path = tmp_path_factory.mktemp("optimize") / "small.ttf"
+    font.save(path)
+    return str(path)
+
+
+def program(assembly):
+    p = ttProgram.Program()
+    p.fromAssembly(assembly)
+    return p
+
+
+@pytest.mark.parametrize(
+    "values, size",
+    [
+        ([1, 2, 3], 4),
+        (list(range(20)), 22),
+        ([-1, 1000], 5),
+        ([1, 1000, 2], 7),
+        (list(range(300)), 349),
+    ],
+)
+def test_encode_push(values, size):
+    code = encode_push(values)
+    assert len(code) == size
+    assert sum((push_values(i) for i in decode(code)), []) == values
+
+
+def test_decode():
+    assert decode(b"\xb1\x01\x02\x2b\x40\x01\x05") == [
+        b"\xb1\x01\x02",
+        b"\x2b",
+        b"\x40\x01\x05",
+    ]
+    with pytest.raises(OptimizeError, match="truncated"):
+        decode(b"\x40\x03\x01")
+
+
+def test_optimize_hinted_font(hinted):
+    font = TTFont(BytesIO(hinted))
+    before = font["maxp"].maxFunctionDefs
+    stats = optimize_ttfont(font)
+    assert stats.size_after < stats.size_before
+    assert stats.functions_added > 0
+    assert font["maxp"].maxFunctionDefs == before + stats.functions_added
+    # ttfautohint's functions are called with computed numbers
+    assert stats.functions_dropped == 0
+    assert stats.cvt_dropped == 0
+
+
+def test_verify(hinted):
+    pytest.importorskip("freetype")
+    glyphs = list(range(0, 600, 7))
+    optimized = optimize_font(hinted, verify=False)
+    assert len(optimized) < len(hinted)
+    verify_font(hinted, optimized, ppems=(9, 14), glyphs=glyphs)
+
+    with open(FONT, "rb") as f:
+        unhinted = f.read()
+    with pytest.raises(OptimizeError, match="hinted differently"):
+        verify_font(hinted, unhinted, ppems=(9, 14), glyphs=glyphs)
+
+
+def test_drop_unreferenced():
+    font = TTFont(FONT)
+    font["fpgm"] = newTable("fpgm")
+    # function 1 is never called, and calls function 2
+    font["fpgm"].program = program(
+        "PUSHB[ ] 2 1 0 FDEF[ ] POP[ ] ENDF[ ] "
+        "FDEF[ ] PUSHB[ ] 2 CALL[ ] ENDF[ ] FDEF[ ] POP[ ] ENDF[ ]"
+    )
+    font["prep"] = newTable("prep")
+    font["prep"].program = program("PUSHB[ ] 1 RCVT[ ] PUSHB[ ] 0 CALL[ ]")
+    font["cvt "] = newTable("cvt ")
+    font["cvt "].values = [10, 20, 30, 40, 50]
+    code = "PUSHB[ ] 2 RCVT[ ] PUSHB[ ] 0 CALL[ ] PUSHB[ ] 1 2 3 4 POP[ ] POP[ ]"
+    for name in ("A", "B", "C"):
+        font["glyf"][name].program = program(code)
+    font["maxp"].maxFunctionDefs = 3
+
+    stats = optimize_ttfont(font)
+    assert stats.functions_dropped == 2
+    assert stats.cvt_dropped == 2
+    assert list(font["cvt "].values) == [10, 20, 30]
+    assert stats.functions_added == 1
+    assert font["maxp"].maxFunctionDefs == 4
+    assert font["glyf"]["A"].program.getBytecode() == b"\xb0\x03\x2b"
+    fpgm = [i[0] for i in decode(font["fpgm"].program.getBytecode())]
+    assert fpgm.count(0x2C) == 4  # FDEF
+    assert fpgm.count(0x2B) == 1  # the new function calls function 0
+
+
+def test_no_bytecode():
+    with pytest.raises(OptimizeError, match="no TrueType bytecode"):
+        optimize_ttfont(TTFont(FONT))
+
+
+def test_ttfautohint_optimize(tmpdir, small_font):
+    out_file = tmpdir / "out.ttf"
+    assert (
+        ttfautohint(in_file=small_font, out_file=str(out_file), optimize=True) is None
+    )
+    optimized = out_file.read_binary()
+    assert len(optimized) < len(ttfautohint(in_file=small_font))
+    with Hinter(optimize=True) as hinter:
+        assert hinter.hint_file(small_font) == optimized
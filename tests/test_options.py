@@ -50,7 +50,10 @@ class TestValidateOptions(object):
         msg = "control_file and control_buffer are mutually exclusive"
         control_file = (tmpdir / "ta_ctrl.txt").ensure()
         kwargs = dict(
-            in_buffer=b"\0\1\0\0", control_file=control_file, control_buffer=b"abcd"
+            in_buffer=b"\0\1\0\0",
+            control_file=control_file,
+            control_buffer=b"abcd",
+            preflight=False,
         )
         with pytest.raises(ValueError, match=msg):
             validate_options(kwargs)
@@ -62,6 +65,7 @@ class TestValidateOptions(object):
             in_buffer=b"\0\1\0\0",
             reference_file=reference_file,
             reference_buffer=b"\x00\x01\x00\x00",
+            preflight=False,
         )
         with pytest.raises(ValueError, match=msg):
             validate_options(kwargs)
@@ -71,22 +75,28 @@ class TestValidateOptions(object):
         data = b"\0\1\0\0"
         in_file.write_binary(data)
 
-        # 'in_file' is a file-like object
-        options = validate_options({"in_file": in_file.open(mode="rb")})
-        assert options["in_buffer"] == data
-        assert "in_file" not in options
+        # 'in_file' is a file-like object, which is streamed later
+        with in_file.open(mode="rb") as f:
+            options = validate_options({"in_file": f, "preflight": False})
+            assert options["in_file"] is f
+            assert options["in_buffer"] is None
 
         # 'in_file' is a path string
-        options = validate_options({"in_file": str(in_file)})
+        options = validate_options({"in_file": str(in_file), "preflight": False})
         assert options["in_buffer"] == data
-        assert "in_file" not in options
+        assert options["in_file"] is None
+
+        # text mode file objects are rejected
+        with in_file.open(mode="r") as f:
+            with pytest.raises(TypeError, match="binary mode"):
+                validate_options({"in_file": f})
 
     def test_in_buffer_is_bytes(self, tmpdir):
         with pytest.raises(TypeError, match="in_buffer type must be bytes"):
             validate_options({"in_buffer": "abcd"})
 
     def test_control_buffer_to_control_file(self, tmpdir):
-        kwargs = {"in_buffer": b"\0", "control_buffer": "abcd"}
+        kwargs = {"in_buffer": b"\0", "preflight": False, "control_buffer": "abcd"}
         options = validate_options(kwargs)
 
         assert "control_buffer" not in options
@@ -95,7 +105,11 @@ class TestValidateOptions(object):
             assert f.read() == "abcd"
 
     def test_reference_buffer_to_reference_file(self, tmpdir):
-        kwargs = {"in_buffer": b"\0", "reference_buffer": b"\0\1\0\0"}
+        kwargs = {
+            "in_buffer": b"\0",
+            "preflight": False,
+            "reference_buffer": b"\0\1\0\0",
+        }
         options = validate_options(kwargs)
 
         assert "reference_buffer" not in options
@@ -105,15 +119,19 @@ class TestValidateOptions(object):
 
     def test_reference_buffer_is_bytes(self, tmpdir):
         with pytest.raises(TypeError, match="reference_buffer type must be bytes"):
-            validate_options({"in_buffer": b"\0", "reference_buffer": ""})
+            validate_options(
+                {"in_buffer": b"\0", "preflight": False, "reference_buffer": ""}
+            )
 
     def test_epoch(self):
-        options = validate_options({"in_buffer": b"\0", "epoch": 0})
+        options = validate_options({"in_buffer": b"\0", "preflight": False, "epoch": 0})
         assert isinstance(options["epoch"], int)
         assert options["epoch"] == 0
 
     def test_family_suffix(self):
-        options = validate_options({"in_buffer": b"\0", "family_suffix": b"-TA"})
+        options = validate_options(
+            {"in_buffer": b"\0", "preflight": False, "family_suffix": b"-TA"}
+        )
         assert isinstance(options["family_suffix"], str)
         assert options["family_suffix"] == "-TA"
 
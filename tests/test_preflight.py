@@ -0,0 +1,192 @@
+import os
+from io import BytesIO
+
+from fontTools.ttLib import TTFont
+from fontTools.ttLib.sfnt import SFNTWriter
+from fontTools.ttLib.ttCollection import TTCollection
+
+import ttfautohint
+from ttfautohint import Hinter
+from ttfautohint._woff import encode_woff
+from ttfautohint.errors import (
+    TA_ERR_INVALID_FONT_TYPE,
+    TA_ERR_MISSING_LEGAL_PERMISSION,
+    InvalidFontError,
+    RestrictedFontError,
+)
+from ttfautohint.options import validate_options
+from ttfautohint.preflight import check_font, preflight
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture(scope="module")
+def font_data():
+    with open(FONT, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="module")
+def restricted(tmp_path_factory):
+    font = TTFont(FONT)
+    font["OS/2"].fsType = 0x0002
+    path = tmp_path_factory.mktemp("fonts") / "Restricted.ttf"
+    font.save(str(path))
+    return str(path)
+
+
+def build_sfnt(tables, version=b"\0\1\0\0"):
+    buf = BytesIO()
+    writer = SFNTWriter(buf, len(tables), version)
+    for tag, data in tables.items():
+        writer[tag] = data
+    writer.close()
+    return buf.getvalue()
+
+
+@pytest.fixture
+def no_executable(monkeypatch, tmpdir):
+    # preflight errors are raised without running the executable
+    monkeypatch.setattr(ttfautohint, "_exe_full_path", str(tmpdir / "missing"))
+
+
+class TestCheckFont(object):
+    def test_sfnt(self, font_data):
+        assert check_font(FONT) == "sfnt"
+        assert check_font(font_data) == "sfnt"
+        with open(FONT, "rb") as f:
+            assert check_font(f) == "sfnt"
+
+    def test_collection(self, restricted):
+        collection = TTCollection()
+        collection.fonts = [TTFont(FONT), TTFont(restricted)]
+        buf = BytesIO()
+        collection.save(buf)
+        data = buf.getvalue()
+        with pytest.raises(RestrictedFontError):
+            check_font(data)
+        assert check_font(data, ignore_restrictions=True) == "ttc"
+
+    def test_woff(self, font_data, restricted):
+        assert check_font(encode_woff(font_data)) == "woff"
+        with open(restricted, "rb") as f:
+            woff = encode_woff(f.read())
+        with pytest.raises(RestrictedFontError):
+            check_font(woff)
+        assert check_font(woff, ignore_restrictions=True) == "woff"
+
+    def test_restricted(self, restricted):
+        with pytest.raises(RestrictedFontError) as exc_info:
+            check_font(restricted)
+        assert exc_info.value.code == TA_ERR_MISSING_LEGAL_PERMISSION
+        assert check_font(restricted, ignore_restrictions=True) == "sfnt"
+
+    @pytest.mark.parametrize(
+        "data, message",
+        [
+            (b"\0\1\0\0", "too small"),
+            (b"\0\1\0\0" + b"\0" * 200, "no 'glyf' table"),
+            (b"\1\0\0\0" + b"\0" * 200, "Unknown sfnt version"),
+        ],
+    )
+    def test_invalid(self, data, message):
+        with pytest.raises(InvalidFontError, match=message) as exc_info:
+            check_font(data)
+        assert exc_info.value.code == TA_ERR_INVALID_FONT_TYPE
+
+    def test_truncated(self, font_data):
+        with pytest.raises(InvalidFontError, match="extends past end of data"):
+            check_font(font_data[: len(font_data) // 2])
+
+    def test_cff(self):
+        font = TTFont(FONT)
+        tables = {tag: font.reader[tag] for tag in font.reader.keys() if tag != "glyf"}
+        tables["CFF "] = b"\1\0\4\2" + b"\0" * 100
+        with pytest.raises(InvalidFontError, match="CFF outlines"):
+            check_font(build_sfnt(tables, b"OTTO"))
+        del tables["CFF "]
+        with pytest.raises(InvalidFontError, match="no 'glyf' table"):
+            check_font(build_sfnt(tables))
+
+    def test_woff2(self):
+        data = b"wOF2" + b"\0" * 200
+        assert check_font(data) == "woff2"
+        with pytest.raises(InvalidFontError, match="WOFF2"):
+            preflight(data)
+
+
+class TestTTFAutohint(object):
+    def test_preflight(self, restricted, no_executable):
+        with pytest.raises(RestrictedFontError):
+            ttfautohint.ttfautohint(in_file=restricted)
+        with pytest.raises(InvalidFontError):
+            ttfautohint.ttfautohint(in_buffer=b"\0\1\0\0" + b"\0" * 200)
+
+    def test_preflight_stream(self, restricted, font_data, no_executable):
+        with open(restricted, "rb") as f:
+            with pytest.raises(RestrictedFontError):
+                ttfautohint.ttfautohint(in_file=f)
+        stream = BytesIO(b"header" + font_data[:100])
+        stream.seek(6)
+        with pytest.raises(InvalidFontError, match="truncated"):
+            ttfautohint.ttfautohint(in_file=stream)
+        # rewound, to be streamed to the executable
+        stream = BytesIO(b"header" + font_data)
+        stream.seek(6)
+        options = validate_options({"in_file": stream})
+        assert options["in_file"] is stream and stream.tell() == 6
+
+    def test_unseekable_stream(self, restricted, no_executable):
+        class Pipe(object):
+            def __init__(self, data):
+                self.stream = BytesIO(data)
+
+            def read(self, size=-1):
+                return self.stream.read(size)
+
+            def seekable(self):
+                return False
+
+        with open(restricted, "rb") as f:
+            pipe = Pipe(f.read())
+        # not checked: it goes to the executable, which is missing here
+        with pytest.raises(OSError):
+            ttfautohint.ttfautohint(in_file=pipe)
+
+    def test_same_as_executable(self, restricted):
+        with pytest.raises(RestrictedFontError) as exc_info:
+            ttfautohint.ttfautohint(in_file=restricted, preflight=False)
+        assert exc_info.value.code == TA_ERR_MISSING_LEGAL_PERMISSION
+        assert ttfautohint.ttfautohint(in_file=restricted, ignore_restrictions=True)
+
+    def test_woff_input(self, font_data):
+        expected = ttfautohint.ttfautohint(in_buffer=font_data)
+        assert ttfautohint.ttfautohint(in_buffer=encode_woff(font_data)) == expected
+
+
+class TestHinter(object):
+    def test_preflight(self, restricted):
+        with Hinter() as hinter:
+            with pytest.raises(RestrictedFontError):
+                hinter.hint_file(restricted)
+            with open(restricted, "rb") as f:
+                data = f.read()
+            with pytest.raises(RestrictedFontError):
+                hinter.hint(data)
+        with Hinter(ignore_restrictions=True) as hinter:
+            assert hinter.hint(data)
+
+    def test_no_preflight(self, monkeypatch):
+        with Hinter(preflight=False) as hinter:
+            monkeypatch.setattr(ttfautohint, "_exe_full_path", "/nonexistent")
+            with pytest.raises(OSError):
+                hinter.hint(b"\0\1\0\0")
@@ -0,0 +1,175 @@
+import os
+import sys
+
+import ttfautohint
+from ttfautohint import Hinter, TAError
+from ttfautohint.profile import (
+    GlyphTiming,
+    PhaseTiming,
+    parse_profile,
+    profile_args,
+    split_profile,
+)
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+RECORDS = b"""\
+ttfautohint-profile\tversion\t1
+ttfautohint-profile\tphase\tread\t0.001000000\t1
+ttfautohint-profile\tphase\tcoverage\t0.020000000\t1
+ttfautohint-profile\tphase\tmetrics\t0.005000000\t2
+ttfautohint-profile\tphase\tglyf\t0.400000000\t1
+ttfautohint-profile\tglyph\t0\t42\t0.030000000\t120
+ttfautohint-profile\tglyph\t0\t7\t0.010000000\t48
+ttfautohint-profile\tglyphs\t900\t0.390000000
+ttfautohint-profile\ttotal\t0.500000000\t0
+"""
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture
+def profiling_executable(tmpdir, monkeypatch):
+    # stands in for the patched executable: lists the profile options in its
+    # --help, drops the profile arguments, runs the real executable and
+    # writes the records to stderr
+    if sys.platform == "win32":
+        pytest.skip("uses a shell script as executable")
+    records = tmpdir / "records.txt"
+    records.write_binary(RECORDS)
+    script = tmpdir / "ttfautohint"
+    script.write(
+        "#!/bin/sh\n"
+        'if [ "$1" = --help ]; then\n'
+        f'  "{ttfautohint._executable_path()}" --help\n'
+        "  echo '      --profile-fd=N         write a timing profile to fd N'\n"
+        "  exit\n"
+        "fi\n"
+        'for arg; do shift; case "$arg" in --profile-*) ;; *) set -- "$@" "$arg";; '
+        "esac; done\n"
+        f'"{ttfautohint._executable_path()}" "$@"\n'
+        "rv=$?\n"
+        f'cat "{records}" >&2\n'
+        "exit $rv\n"
+    )
+    script.chmod(0o755)
+    monkeypatch.setattr(ttfautohint, "_exe_full_path", str(script))
+
+
+def test_parse_profile():
+    profile = parse_profile(RECORDS.splitlines())
+    assert list(profile.phases) == ["read", "coverage", "metrics", "glyf"]
+    assert profile.phases["metrics"] == PhaseTiming("metrics", 0.005, 2)
+    assert profile.slowest_glyphs == [
+        GlyphTiming(0, 42, 0.03, 120),
+        GlyphTiming(0, 7, 0.01, 48),
+    ]
+    assert profile.glyph_count == 900
+    assert profile.glyph_seconds == pytest.approx(0.39)
+    assert profile.total_seconds == 0.5
+    assert profile.error == 0
+    assert profile.as_dict()["slowest_glyphs"][0]["index"] == 42
+    text = profile.format()
+    assert "glyf" in text and "80.0%" in text
+
+
+@pytest.mark.parametrize(
+    "lines, message",
+    [
+        ([b"phase\tread\t0.1\t1"], "missing"),
+        ([b"version\t2"], "unsupported"),
+        ([b"version\t1", b"phase\tread\tfast\t1"], "malformed"),
+        ([b"version\t1", b"total\t0.1"], "malformed"),
+    ],
+)
+def test_parse_profile_invalid(lines, message):
+    with pytest.raises(ValueError, match=message):
+        parse_profile(lines)
+
+
+def test_parse_profile_unknown_record():
+    profile = parse_profile([b"version\t1", b"memory\t1024"])
+    assert not profile.phases
+
+
+def test_split_profile():
+    stderr = b"warning\n" + RECORDS + b"error\n"
+    profile, rest = split_profile(stderr)
+    assert profile.total_seconds == 0.5
+    assert rest == b"warning\nerror\n"
+    assert split_profile(b"error\n") == (None, b"error\n")
+
+
+def test_profile_args():
+    assert profile_args(3) == ["--profile-fd=2", "--profile-glyphs=3"]
+
+
+def test_invalid_option():
+    with pytest.raises(TypeError, match="profile must be callable"):
+        ttfautohint.ttfautohint(in_file=FONT, profile=True)
+
+
+def test_ttfautohint(profiling_executable):
+    profiles = []
+    data = ttfautohint.ttfautohint(in_file=FONT, profile=profiles.append)
+    assert data[:4] == b"\0\1\0\0"
+    assert len(profiles) == 1
+    assert profiles[0].slowest_glyphs[0].index == 42
+
+    # streamed to an output file
+    profiles.clear()
+    with open(FONT, "rb") as f, open(os.devnull, "wb") as out:
+        ttfautohint.ttfautohint(in_file=f, out_file=out, profile=profiles.append)
+    assert len(profiles) == 1
+
+
+def test_error_message(profiling_executable):
+    profiles = []
+    with pytest.raises(TAError) as exc_info:
+        ttfautohint.ttfautohint(
+            in_buffer=b"\0\1\0\0", preflight=False, profile=profiles.append
+        )
+    assert "ttfautohint-profile" not in exc_info.value.error_string
+    assert not profiles
+
+
+def test_hinter(profiling_executable, tmpdir):
+    profiles = []
+    with Hinter(profile=profiles.append) as hinter:
+        hinter.hint_file(FONT, str(tmpdir / "out.ttf"))
+        with open(FONT, "rb") as f:
+            hinter.hint(f.read())
+    assert len(profiles) == 2
+    assert all(p.total_seconds == 0.5 for p in profiles)
+
+
+def test_hint_batch(profiling_executable, tmpdir):
+    from ttfautohint.cost import CostHistory, hint_batch
+
+    profiles = []
+    (result,) = hint_batch(
+        [(FONT, str(tmpdir / "out.ttf"))],
+        history=CostHistory(str(tmpdir / "history.jsonl")),
+        profile=profiles.append,
+    )
+    assert result.error is None
+    assert len(profiles) == 1
+
+
+def test_unpatched_executable():
+    # the real executable, which doesn't support --profile-fd
+    if "profile-fd" in ttfautohint._executable_options():
+        pytest.skip("the executable is patched")
+    profiles = []
+    data = ttfautohint.ttfautohint(in_file=FONT, profile=profiles.append)
+    assert data == ttfautohint.ttfautohint(in_file=FONT)
+    (profile,) = profiles
+    assert profile.total_seconds > 0
+    assert not profile.phases and not profile.slowest_glyphs
@@ -0,0 +1,269 @@
+import os
+import signal
+import sys
+from io import BytesIO
+
+import ttfautohint
+from ttfautohint import Hinter, RetryPolicy, TAError
+from ttfautohint.errors import (
+    ControlInstructionsError,
+    CrashError,
+    InvalidFontError,
+    InvalidOptionError,
+    RestrictedFontError,
+    TransientError,
+    make_error,
+)
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+INVALID_FONT = (
+    b"This font is not a valid font in SFNT format with TrueType outlines.\n"
+    b"In particular, CFF outlines are not supported.\n"
+)
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture(scope="module")
+def expected():
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+        return ttfautohint.ttfautohint(in_file=FONT)
+
+
+@pytest.fixture
+def flaky(tmpdir, monkeypatch):
+    """Make the executable get killed while it was run fewer than $FAILURES
+    times in total."""
+    if sys.platform == "win32":
+        pytest.skip("requires a POSIX shell")
+    counter = tmpdir / "count"
+    counter.write("0")
+    script = tmpdir / "ttfautohint"
+    script.write(
+        "#!/bin/sh\n"
+        f'n=$(cat "{counter}")\n'
+        f'echo $((n + 1)) > "{counter}"\n'
+        'if [ "$n" -lt "$FAILURES" ]; then kill -9 $$; fi\n'
+        f'exec "{ttfautohint._executable_path()}" "$@"\n'
+    )
+    script.chmod(0o755)
+    monkeypatch.setattr(ttfautohint, "_exe_full_path", str(script))
+    monkeypatch.setenv("FAILURES", "1")
+
+    class Flaky(object):
+        @property
+        def calls(self):
+            return int(counter.read())
+
+    return Flaky()
+
+
+def no_sleep(seconds):
+    pass
+
+
+class TestMakeError(object):
+    @pytest.mark.parametrize(
+        "rv, stderr, cls, code",
+        [
+            (1, INVALID_FONT, InvalidFontError, 0xF6),
+            (
+                1,
+                b"Bit 1 in the `fsType' field of the `OS/2' table is set:\n"
+                b"This font must not be modified"
+                b" without permission of the legal owner.\n",
+                RestrictedFontError,
+                0x0F,
+            ),
+            (
+                1,
+                b"control.txt:1:2: syntax error, unexpected '@' (0x201)\n",
+                ControlInstructionsError,
+                0x201,
+            ),
+            (
+                1,
+                b"An error with code 0x101 occurred"
+                b" while parsing the argument of option `-X':\n",
+                InvalidOptionError,
+                0x101,
+            ),
+            (
+                1,
+                b"An error with code 0x40 occurred while autohinting fonts\n",
+                TransientError,
+                0x40,
+            ),
+            (1, b"something else", TAError, None),
+            (-signal.SIGKILL, b"", TransientError, None),
+            (-signal.SIGSEGV, b"", CrashError, None),
+        ],
+    )
+    def test_classify(self, rv, stderr, cls, code):
+        error = make_error(rv, stderr)
+        assert type(error) is cls
+        assert error.code == code
+        assert error.transient is (cls is TransientError)
+
+    def test_signal(self):
+        assert make_error(-9, b"").signal == 9
+        assert make_error(1, b"").signal is None
+
+    def test_from_executable(self):
+        with pytest.raises(InvalidFontError) as exc_info:
+            ttfautohint.ttfautohint(in_buffer=b"\0\1\0\0")
+        assert exc_info.value.category == "invalid-font"
+        with pytest.raises(InvalidOptionError):
+            ttfautohint.ttfautohint(in_file=FONT, x_height_snapping_exceptions="abc")
+
+
+class TestRetryPolicy(object):
+    def test_retry_transient(self):
+        delays = []
+        policy = RetryPolicy(max_attempts=3, backoff=1, jitter=0, sleep=delays.append)
+        errors = [make_error(-9, b""), make_error(-9, b"")]
+
+        def fn():
+            if errors:
+                raise errors.pop()
+            return "ok"
+
+        assert policy.call(fn) == "ok"
+        assert delays == [1, 2]
+
+        errors[:] = [make_error(-9, b"")] * 3
+        with pytest.raises(TransientError):
+            policy.call(fn)
+        assert len(errors) == 0
+
+    def test_retry_after(self):
+        class Busy(Exception):
+            transient = True
+            retry_after = "5"
+
+        assert RetryPolicy(backoff=1, jitter=0).delay(1, Busy()) == 5
+
+    def test_memoize(self):
+        calls = []
+        policy = RetryPolicy(sleep=no_sleep)
+
+        def fn():
+            calls.append(1)
+            raise make_error(1, INVALID_FONT)
+
+        for _ in range(3):
+            with pytest.raises(InvalidFontError):
+                policy.call(fn, key="a")
+        assert len(calls) == 1
+        # other exceptions are neither retried nor memoized
+        with pytest.raises(ZeroDivisionError):
+            policy.call(lambda: calls.append(1) or 1 / 0, key="b")
+        with pytest.raises(ZeroDivisionError):
+            policy.call(lambda: calls.append(1) or 1 / 0, key="b")
+        assert len(calls) == 3
+
+        # nor are failures of unknown cause, e.g. a missing executable
+        def unknown():
+            calls.append(1)
+            raise make_error(127, b"sh: ttfautohint: not found\n")
+
+        for _ in range(2):
+            with pytest.raises(TAError) as exc_info:
+                policy.call(unknown, key="c")
+            assert type(exc_info.value) is TAError
+        assert len(calls) == 5
+
+        policy.forget("a")
+        with pytest.raises(InvalidFontError):
+            policy.call(fn, key="a")
+        assert len(calls) == 6
+
+    def test_memo_size(self):
+        policy = RetryPolicy(memo_size=2)
+
+        def fn():
+            raise make_error(1, INVALID_FONT)
+
+        for key in "abc":
+            with pytest.raises(TAError):
+                policy.call(fn, key=key)
+        assert list(policy._failures) == ["b", "c"]
+
+
+class TestTTFAutohint(object):
+    def test_retry(self, flaky, monkeypatch, expected):
+        monkeypatch.setenv("FAILURES", "2")
+        with pytest.raises(TransientError):
+            ttfautohint.ttfautohint(in_file=FONT)
+        with pytest.raises(TransientError):
+            ttfautohint.ttfautohint(in_file=FONT, retry=RetryPolicy(max_attempts=1))
+        assert flaky.calls == 2
+
+        monkeypatch.setenv("FAILURES", "4")
+        policy = RetryPolicy(sleep=no_sleep)
+        assert ttfautohint.ttfautohint(in_file=FONT, retry=policy) == expected
+        assert flaky.calls == 5
+
+    def test_retry_streams(self, flaky, monkeypatch, expected):
+        out = BytesIO(b"header")
+        out.seek(0, os.SEEK_END)
+        with open(FONT, "rb") as f:
+            ttfautohint.ttfautohint(
+                in_file=f, out_file=out, retry=RetryPolicy(sleep=no_sleep)
+            )
+        assert out.getvalue() == b"header" + expected
+
+        class Sink(object):
+            # unseekable, so each attempt is written to a temporary file
+            def __init__(self):
+                self.chunks = []
+
+            def write(self, data):
+                self.chunks.append(bytes(data))
+
+        sink = Sink()
+        monkeypatch.setenv("FAILURES", "3")
+        ttfautohint.ttfautohint(
+            in_file=FONT, out_file=sink, retry=RetryPolicy(sleep=no_sleep)
+        )
+        assert flaky.calls == 4
+        assert b"".join(sink.chunks) == expected
+
+    def test_memoize(self, flaky, monkeypatch):
+        monkeypatch.setenv("FAILURES", "0")
+        policy = RetryPolicy()
+        for _ in range(2):
+            with pytest.raises(InvalidFontError):
+                ttfautohint.ttfautohint(
+                    in_buffer=b"\0\1\0\0", retry=policy, preflight=False
+                )
+        assert flaky.calls == 1
+        # the options are part of the key
+        with pytest.raises(InvalidFontError):
+            ttfautohint.ttfautohint(
+                in_buffer=b"\0\1\0\0", no_info=True, retry=policy, preflight=False
+            )
+        assert flaky.calls == 2
+
+    def test_hinter(self, flaky):
+        policy = RetryPolicy(sleep=no_sleep)
+        with Hinter(retry=policy, preflight=False) as hinter:
+            assert hinter.hint_file(FONT)
+            assert flaky.calls == 2
+            for _ in range(2):
+                with pytest.raises(InvalidFontError):
+                    hinter.hint(b"\0\1\0\0")
+        assert flaky.calls == 3
+
+    def test_invalid(self):
+        with pytest.raises(TypeError, match="retry must be a RetryPolicy"):
+            ttfautohint.ttfautohint(in_file=FONT, retry=3)
@@ -0,0 +1,147 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from io import BytesIO
+
+from ttfautohint import TAError, ttfautohint
+from ttfautohint.client import Client, ServerBusy
+from ttfautohint.server import HintingServer, QueueFull, WorkerPool
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture
+def server():
+    server = HintingServer(("127.0.0.1", 0), workers=2, max_queue=4)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+class TestWorkerPool(object):
+    def test_priority(self):
+        pool = WorkerPool(workers=1, max_queue=10)
+        started = threading.Event()
+        release = threading.Event()
+        order = []
+
+        def block():
+            started.set()
+            release.wait()
+
+        pool.submit("batch", block)
+        started.wait()
+        futures = [pool.submit("batch", order.append, i) for i in range(3)]
+        futures += [pool.submit("interactive", order.append, i) for i in (10, 11)]
+        assert pool.stats()["lanes"]["batch"]["queued"] == 3
+        release.set()
+        for future in futures:
+            future.result()
+        pool.shutdown()
+        assert order == [10, 11, 0, 1, 2]
+        stats = pool.stats()
+        assert stats["lanes"]["batch"]["completed"] == 4
+        assert stats["lanes"]["interactive"]["queue_time"]["count"] == 2
+
+    def test_admission(self):
+        pool = WorkerPool(workers=1, max_queue=1)
+        release = threading.Event()
+        running = pool.submit("batch", release.wait)
+        while not running.running():
+            time.sleep(0.01)
+        pool.submit("batch", int)
+        with pytest.raises(QueueFull):
+            pool.submit("batch", int)
+        # lanes have separate queues
+        pool.submit("interactive", int)
+        release.set()
+        pool.shutdown()
+        assert pool.stats()["lanes"]["batch"]["rejected"] == 1
+
+    def test_failures(self):
+        pool = WorkerPool(workers=1)
+        with pytest.raises(ZeroDivisionError):
+            pool.submit("interactive", lambda: 1 / 0).result()
+        pool.shutdown()
+        assert pool.stats()["lanes"]["interactive"]["failed"] == 1
+
+
+class TestClient(object):
+    def test_hint(self, server, tmpdir):
+        client = Client(server.url)
+        expected = ttfautohint(in_file=FONT, no_info=True)
+        assert client.ttfautohint(in_file=FONT, no_info=True) == expected
+
+        out_file = tmpdir / "out.ttf"
+        assert (
+            client.ttfautohint(in_file=FONT, out_file=str(out_file), no_info=True)
+            is None
+        )
+        assert out_file.read_binary() == expected
+
+        buf = BytesIO()
+        client.ttfautohint(in_file=FONT, out_file=buf, no_info=True, priority="batch")
+        assert buf.getvalue() == expected
+
+        stats = client.stats()
+        assert stats["workers"] == 2
+        assert stats["lanes"]["interactive"]["completed"] == 2
+        assert stats["lanes"]["batch"]["completed"] == 1
+        assert stats["lanes"]["batch"]["run_time"]["max"] > 0
+
+    def test_buffers(self, server):
+        client = Client(server.url)
+        with open(FONT, "rb") as f:
+            kwargs = dict(control_buffer="a l 1\n", reference_buffer=f.read())
+        expected = ttfautohint(in_file=FONT, **kwargs)
+        assert client.ttfautohint(in_file=FONT, **kwargs) == expected
+
+    def test_errors(self, server):
+        client = Client(server.url)
+        with pytest.raises(TAError) as exc_info:
+            client.ttfautohint(in_buffer=b"\0\1\0\0")
+        assert exc_info.value.rv == 1
+        assert "SFNT" in exc_info.value.error_string
+        with pytest.raises(TypeError, match="unknown keyword argument"):
+            client.ttfautohint(in_file=FONT, foo="bar")
+        with pytest.raises(ValueError, match="mutually exclusive"):
+            client.ttfautohint(in_file=FONT, no_info=True, detailed_info=True)
+        with pytest.raises(ValueError, match="invalid priority"):
+            client.ttfautohint(in_file=FONT, priority="urgent")
+        assert client.stats()["lanes"]["interactive"]["failed"] == 1
+
+    def test_busy(self, server, monkeypatch):
+        # make the queue full
+        monkeypatch.setattr(server.pool, "max_queue", 0)
+        with pytest.raises(ServerBusy) as exc_info:
+            Client(server.url).ttfautohint(in_file=FONT)
+        assert exc_info.value.retry_after == "1"
+
+
+def test_main():
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "ttfautohint.server", "--port", "0", "--jobs", "1"],
+        stdout=subprocess.PIPE,
+    )
+    try:
+        line = proc.stdout.readline().decode()
+        assert line.startswith("Serving on http://127.0.0.1:")
+        url = line.split()[-1]
+        assert Client(url).stats()["workers"] == 1
+    finally:
+        proc.terminate()
+        proc.wait()
@@ -0,0 +1,152 @@
+import json
+import os
+import shutil
+
+from ttfautohint import ttfautohint
+from ttfautohint.cli import main
+from ttfautohint.shard import (
+    ManifestError,
+    Shard,
+    assign_shards,
+    merge_manifests,
+    parse_shard,
+    read_manifest,
+    select_shard,
+)
+from ttfautohint.subset import subset_font
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture(scope="module")
+def fonts(tmp_path_factory):
+    # two large and three small fonts
+    directory = tmp_path_factory.mktemp("fonts")
+    small = subset_font(FONT, unicodes=range(0x20, 0x7F))
+    paths = []
+    for name in ["Large1.ttf", "Large2.ttf"]:
+        paths.append(str(directory / name))
+        shutil.copy(FONT, paths[-1])
+    for name in ["Small1.ttf", "Small2.ttf", "Small3.ttf"]:
+        paths.append(str(directory / name))
+        (directory / name).write_bytes(small)
+    return paths
+
+
+def test_parse_shard():
+    assert parse_shard("2/3") == Shard(2, 3)
+    for s in ["0/3", "4/3", "1", "a/b", "1/2/3"]:
+        with pytest.raises(ValueError, match="invalid shard"):
+            parse_shard(s)
+
+
+@pytest.mark.parametrize("strategy", ["cost", "hash"])
+def test_assign_shards(fonts, strategy):
+    shards = assign_shards(fonts, 3, strategy)
+    assert all(1 <= s <= 3 for s in shards)
+    # the same on every node, whatever the order and directory of the paths
+    moved = [os.path.join("elsewhere", os.path.basename(p)) for p in fonts]
+    if strategy == "hash":
+        assert assign_shards(moved[::-1], 3, strategy) == shards[::-1]
+    else:
+        assert assign_shards(fonts[::-1], 3, strategy) == shards[::-1]
+    selected = [select_shard(fonts, Shard(i, 3), strategy) for i in (1, 2, 3)]
+    assert sorted(sum(selected, [])) == sorted(fonts)
+
+
+def test_assign_shards_by_cost(fonts):
+    # the large fonts go to different shards, with the small ones together
+    shards = assign_shards(fonts, 3, "cost")
+    assert len(set(shards[:2])) == 2
+    assert len(set(shards[2:])) == 1 and shards[2] not in shards[:2]
+
+
+def test_assign_shards_invalid(fonts):
+    with pytest.raises(ValueError, match="unknown sharding strategy"):
+        assign_shards(fonts, 2, "random")
+
+
+def test_cli(fonts, tmpdir, capsys):
+    out_dir = str(tmpdir / "out")
+    history = str(tmpdir / "history.jsonl")
+    args = ["--batch"] + fonts + ["--output-dir", out_dir, "--history", history]
+    for i in (1, 2):
+        assert main(args + ["--shard", f"{i}/2", "--no-info"]) == 0
+    manifests = [os.path.join(out_dir, f"manifest-{i}-of-2.json") for i in (1, 2)]
+    for path in fonts:
+        assert os.path.exists(os.path.join(out_dir, os.path.basename(path)))
+
+    first = read_manifest(manifests[0])
+    assert first["shard"] == "1/2" and first["strategy"] == "cost"
+    assert len(first["batch"]) == len(fonts)
+    font = first["fonts"][0]
+    with open(font["output"], "rb") as f:
+        assert f.read() == ttfautohint(in_file=font["input"], no_info=True)
+    assert font["error"] is None and font["seconds"] > 0
+
+    merged = str(tmpdir / "merged.json")
+    assert main(["--merge-manifests"] + manifests + ["--output", merged]) == 0
+    with open(merged) as f:
+        names = [font["name"] for font in json.load(f)["fonts"]]
+    assert names == sorted(os.path.basename(p) for p in fonts)
+
+    # a missing shard is reported
+    capsys.readouterr()
+    assert main(["--merge-manifests", manifests[0]]) == 1
+    assert "not hinted" in capsys.readouterr().err
+
+
+def test_cli_dry_run(fonts, tmpdir, capsys):
+    history = str(tmpdir / "history.jsonl")
+    args = ["--batch"] + fonts + ["--history", history, "--dry-run"]
+    assert main(args + ["--shard", "3/3"]) == 0
+    out = capsys.readouterr().out
+    assert "Small1.ttf" in out and "Large1.ttf" not in out
+    with pytest.raises(SystemExit):
+        main(args + ["--shard", "4/3"])
+
+
+def manifest(shard, fonts, batch=("a.ttf", "b.ttf")):
+    return {
+        "format": "ttfautohint-shard-manifest",
+        "version": 1,
+        "shard": shard,
+        "strategy": "hash",
+        "batch": list(batch),
+        "fonts": [{"name": name, "error": None} for name in fonts],
+    }
+
+
+def test_merge_manifests():
+    merged = merge_manifests([manifest("2/2", ["b.ttf"]), manifest("1/2", ["a.ttf"])])
+    assert [font["name"] for font in merged["fonts"]] == ["a.ttf", "b.ttf"]
+
+    with pytest.raises(ManifestError, match="hinted more than once: a.ttf"):
+        merge_manifests([manifest("1/2", ["a.ttf"]), manifest("2/2", ["a.ttf"])])
+    with pytest.raises(ManifestError, match="different batches"):
+        merge_manifests(
+            [manifest("1/2", ["a.ttf"]), manifest("2/2", ["b.ttf"], ["b.ttf"])]
+        )
+    with pytest.raises(ManifestError, match="shard 1/2 appears more than once"):
+        merge_manifests([manifest("1/2", ["a.ttf"]), manifest("1/2", ["b.ttf"])])
+    with pytest.raises(ManifestError, match="no manifests"):
+        merge_manifests([])
+
+
+def test_read_manifest(tmpdir):
+    path = tmpdir / "manifest.json"
+    path.write("{}")
+    with pytest.raises(ManifestError, match="not a shard manifest"):
+        read_manifest(str(path))
+    path.write("{")
+    with pytest.raises(ManifestError, match="invalid JSON"):
+        read_manifest(str(path))
@@ -0,0 +1,120 @@
+import os
+import sys
+from io import BytesIO
+
+from ttfautohint import TAError, ttfautohint
+from ttfautohint._stream import pump
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture(scope="module")
+def expected():
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+        return ttfautohint(in_file=FONT)
+
+
+class Sink(object):
+    """Writable file object without a file descriptor."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def getvalue(self):
+        return b"".join(self.chunks)
+
+
+class TestTTFAutohint(object):
+    def test_stream_in(self, expected):
+        with open(FONT, "rb") as f:
+            assert ttfautohint(in_file=f) == expected
+
+    def test_stream_out(self, expected):
+        sink = Sink()
+        assert ttfautohint(in_file=FONT, out_file=sink) is None
+        assert sink.getvalue() == expected
+
+    def test_stream_in_and_out(self, expected):
+        buf = BytesIO()
+        with open(FONT, "rb") as f:
+            assert ttfautohint(in_file=f, out_file=buf) is None
+        assert buf.getvalue() == expected
+
+    def test_stream_in_to_file(self, expected, tmpdir):
+        out_file = tmpdir / "out.ttf"
+        with open(FONT, "rb") as f, out_file.open("wb") as out:
+            assert ttfautohint(in_file=f, out_file=out) is None
+        assert out_file.read_binary() == expected
+
+    def test_postprocess(self):
+        buf = BytesIO()
+        with open(FONT, "rb") as f:
+            assert ttfautohint(in_file=f, out_file=buf, out_format="woff") is None
+        assert buf.getvalue() == ttfautohint(in_file=FONT, out_format="woff")
+
+    def test_not_writable(self):
+        with pytest.raises(TypeError, match="not writable"):
+            ttfautohint(in_file=FONT, out_file=object())
+
+    def test_error(self, tmpdir):
+        with pytest.raises(TAError) as exc_info:
+            ttfautohint(in_file=BytesIO(b"\0\1\0\0"), out_file=Sink())
+        assert "SFNT" in exc_info.value.error_string
+        # stderr is captured when writing to a path too
+        with pytest.raises(TAError) as exc_info:
+            ttfautohint(in_buffer=b"\0\1\0\0", out_file=str(tmpdir / "out.ttf"))
+        assert "SFNT" in exc_info.value.error_string
+
+
+class TestPump(object):
+    CAT = (
+        "import shutil, sys; "
+        "shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer); "
+        "sys.stderr.write('done')"
+    )
+
+    def test_chunks(self):
+        data = os.urandom(100000)
+        sink = Sink()
+        rc, stderr, rusage = pump(
+            [sys.executable, "-c", self.CAT],
+            BytesIO(data),
+            sink=sink,
+            chunk_size=4096,
+        )
+        assert rc == 0
+        assert stderr == b"done"
+        assert sink.getvalue() == data
+        assert max(len(chunk) for chunk in sink.chunks) <= 4096
+
+    def test_early_exit(self):
+        # the process exits without reading its input
+        rc, stderr, rusage = pump(
+            [sys.executable, "-c", "import sys; sys.exit(3)"],
+            BytesIO(bytes(1 << 20)),
+            sink=Sink(),
+        )
+        assert rc == 3
+
+    def test_text_source(self):
+        with pytest.raises(TypeError, match="binary mode"):
+            pump([sys.executable, "-c", "pass"], _TextReader())
+
+
+class _TextReader(object):
+    def read(self, size):
+        return "abc"
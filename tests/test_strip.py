@@ -0,0 +1,145 @@
+import io
+import os
+import sys
+
+import ttfautohint
+from ttfautohint import Hinter
+from ttfautohint._sfnt import read_table_directory, table_sizes, write_sfnt
+from ttfautohint._strip import (
+    EMPTY_DSIG,
+    splice_tables,
+    strip_tables,
+    strippable_size,
+)
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+def add_tables(tables):
+    from fontTools.ttLib import TTFont
+    from fontTools.ttLib.tables.DefaultTable import DefaultTable
+
+    font = TTFont(FONT)
+    for tag, data in tables.items():
+        table = DefaultTable(tag)
+        table.data = data
+        font[tag] = table
+    buf = io.BytesIO()
+    font.save(buf)
+    return buf.getvalue()
+
+
+def tables(data):
+    _, records = read_table_directory(data)
+    return {r.tag: data[r.offset : r.offset + r.length] for r in records}
+
+
+@pytest.fixture
+def color_font():
+    # stands in for a color font, with a digital signature
+    return add_tables(
+        {
+            "SVG ": b"\x01" * 100001,
+            "CBDT": b"\x02" * 30000,
+            "zzzz": b"\x03" * 7,
+            "DSIG": b"\0\0\0\1\0\1\0\0" + b"\0" * 12 + b"signature",
+        }
+    )
+
+
+@pytest.fixture
+def logging_executable(tmpdir, monkeypatch):
+    # stands in for the executable, saving the input read from stdin
+    if sys.platform == "win32":
+        pytest.skip("uses a shell script as executable")
+    log = tmpdir / "input.ttf"
+    script = tmpdir / "ttfautohint"
+    script.write(
+        "#!/bin/sh\n"
+        f'if [ $# -eq 0 ] || [ "${{1#-}}" != "$1" ]; then\n'
+        f'  tee "{log}" | "{ttfautohint._executable_path()}" "$@"\n'
+        "else\n"
+        f'  "{ttfautohint._executable_path()}" "$@"\n'
+        "fi\n"
+    )
+    script.chmod(0o755)
+    monkeypatch.setattr(ttfautohint, "_exe_full_path", str(script))
+    return lambda: log.read_binary()
+
+
+def test_write_sfnt():
+    with open(FONT, "rb") as f:
+        data = f.read()
+    sfnt_version, records = read_table_directory(data)
+    records.sort(key=lambda r: r.offset)
+    layout = [(r.tag, data[r.offset : r.offset + r.length]) for r in records]
+    assert write_sfnt(sfnt_version, layout) == data
+
+
+def test_strip_splice(color_font):
+    data, stripped = strip_tables(color_font)
+    assert sorted(stripped.tables) == ["CBDT", "DSIG", "GPOS", "SVG "]
+    assert "zzzz" in stripped.kept
+    assert set(table_sizes(data)) == stripped.kept
+    spliced = tables(splice_tables(data, stripped))
+    expected = dict(tables(color_font), DSIG=EMPTY_DSIG)
+    # only the checkSumAdjustment of the `head' table differs
+    assert spliced.pop("head")[12:] == expected.pop("head")[12:]
+    assert spliced == expected
+    assert strippable_size(color_font) == sum(map(len, stripped.tables.values()))
+
+
+def test_not_stripped():
+    with open(FONT, "rb") as f:
+        data = f.read()
+    # the GPOS table is too small to bother
+    assert strip_tables(data) == (data, None)
+    assert strip_tables(data, min_size=0)[1] is not None
+    assert strip_tables(b"wOFF" + data[4:]) == (b"wOFF" + data[4:], None)
+    assert strippable_size(b"\0\1\0\0") == 0
+    assert splice_tables(data, None) is data
+
+
+@pytest.mark.parametrize(
+    "options", [{}, {"dehint": True}, {"TTFA_info": True, "no_info": True}]
+)
+def test_same_output(color_font, options):
+    expected = ttfautohint.ttfautohint(
+        in_buffer=color_font, strip_tables=False, **options
+    )
+    assert ttfautohint.ttfautohint(in_buffer=color_font, **options) == expected
+    # the signature is replaced by an empty one
+    sfnt_version, records = read_table_directory(expected)
+    (dsig,) = [r for r in records if r.tag == "DSIG"]
+    assert expected[dsig.offset : dsig.offset + dsig.length] == EMPTY_DSIG
+
+
+def test_executable_input(logging_executable, color_font):
+    out = io.BytesIO()
+    ttfautohint.ttfautohint(in_buffer=color_font, out_file=out)
+    assert out.getvalue()[:4] == b"\0\1\0\0"
+    tags = table_sizes(logging_executable())
+    assert "SVG " not in tags and "glyf" in tags
+
+
+def test_hinter(logging_executable, color_font, tmpdir):
+    expected = ttfautohint.ttfautohint(in_buffer=color_font, strip_tables=False)
+    in_path = str(tmpdir / "color.ttf")
+    with open(in_path, "wb") as f:
+        f.write(color_font)
+    with Hinter() as hinter:
+        assert hinter.hint(color_font) == expected
+        assert "SVG " not in table_sizes(logging_executable())
+        assert hinter.hint_file(in_path) == expected
+        hinter.hint_file(in_path, str(tmpdir / "out.ttf"))
+    with open(str(tmpdir / "out.ttf"), "rb") as f:
+        assert f.read() == expected
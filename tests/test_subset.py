@@ -0,0 +1,72 @@
+import os
+from io import BytesIO
+
+from fontTools.ttLib import TTFont
+
+from ttfautohint import _pipeline, ttfautohint
+from ttfautohint.subset import SubsetHinter, hint_subset, subset_font
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+ASCII = range(0x20, 0x7F)
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+def test_subset_font():
+    glyphs = TTFont(BytesIO(subset_font(FONT, text="a1"))).getGlyphOrder()
+    # glyphs reachable through GSUB are kept
+    assert len(glyphs) > 3
+    no_closure = subset_font(FONT, text="a1", layout_closure=False)
+    assert TTFont(BytesIO(no_closure)).getGlyphOrder() == [".notdef", "one", "a"]
+    # the output only depends on the input and the subset
+    assert subset_font(FONT, unicodes=[0x61, 0x31]) == subset_font(FONT, text="1a")
+    with pytest.raises(ValueError, match="no unicodes"):
+        subset_font(FONT)
+
+
+def test_hint_subset():
+    hinted = TTFont(BytesIO(hint_subset(FONT, unicodes=ASCII)))
+    assert "fpgm" in hinted
+    assert hinted["maxp"].numGlyphs < len(TTFont(FONT).getGlyphOrder()) // 2
+
+    unpinned = hint_subset(FONT, unicodes=ASCII, pin_blue_zones=False)
+    expected = ttfautohint(in_buffer=subset_font(FONT, unicodes=ASCII))
+    assert unpinned == expected
+
+    with pytest.raises(ValueError, match="another reference font"):
+        hint_subset(FONT, unicodes=ASCII, reference_file=FONT)
+
+
+def test_cache(tmpdir, monkeypatch):
+    with SubsetHinter(FONT, cache_dir=str(tmpdir)) as hinter:
+        calls = []
+        hint = hinter.hinter.hint
+        monkeypatch.setattr(hinter.hinter, "hint", lambda d: calls.append(d) or hint(d))
+
+        a = hinter.hint(unicodes=ASCII)
+        assert hinter.hint(text="".join(map(chr, ASCII))) == a
+        assert len(calls) == 1
+        assert len(tmpdir.listdir()) == 1
+
+    # a new SubsetHinter with the same options finds the result on disk
+    with SubsetHinter(FONT, cache_dir=str(tmpdir)) as hinter:
+        monkeypatch.setattr(hinter.hinter, "hint", None)
+        assert hinter.hint(unicodes=ASCII) == a
+
+    # different options don't share the cached result
+    with SubsetHinter(FONT, cache_dir=str(tmpdir), hinting_range_max=20) as hinter:
+        assert hinter.hint(unicodes=ASCII) != a
+        assert len(tmpdir.listdir()) == 2
+
+    # nor does another version of the executable
+    monkeypatch.setattr(_pipeline, "executable_digest", lambda p: "new")
+    with SubsetHinter(FONT, cache_dir=str(tmpdir)) as hinter:
+        assert hinter.hint(unicodes=ASCII) == a
+        assert len(tmpdir.listdir()) == 3
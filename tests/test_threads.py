@@ -0,0 +1,108 @@
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ttfautohint
+from ttfautohint import Hinter
+from ttfautohint.subset import subset_font
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+THREADS = 64
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture
+def temp_dir(tmpdir, monkeypatch):
+    # where the temporary files of the calls go, to check for leaks
+    directory = tmpdir / "tmp"
+    directory.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(directory))
+    return directory
+
+
+@pytest.fixture(scope="module")
+def small_font():
+    return subset_font(FONT, unicodes=range(0x20, 0x7F))
+
+
+def hammer(fn, n=THREADS):
+    # call fn(i) for each i from n threads started at once
+    barrier = threading.Barrier(n)
+
+    def call(i):
+        barrier.wait()
+        return fn(i)
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(call, range(n)))
+
+
+def test_executable_path_once(monkeypatch):
+    path = ttfautohint._executable_path()
+    calls = []
+
+    def find_executable():
+        calls.append(None)
+        # widen the window for other threads to race
+        time.sleep(0.05)
+        return path
+
+    monkeypatch.setattr(ttfautohint, "_find_executable", find_executable)
+    monkeypatch.setattr(ttfautohint, "_exe_full_path", None)
+    assert hammer(lambda i: ttfautohint._executable_path()) == [path] * THREADS
+    assert len(calls) == 1
+
+
+def test_ttfautohint(small_font, temp_dir):
+    variants = [
+        dict(),
+        dict(no_info=True),
+        dict(control_buffer="66 left 1\n"),
+        dict(reference_buffer=small_font, hint_composites=True),
+    ]
+    expected = [ttfautohint.ttfautohint(in_buffer=small_font, **v) for v in variants]
+    assert len(set(expected)) == len(variants)
+    assert temp_dir.listdir() == []
+
+    results = hammer(
+        lambda i: ttfautohint.ttfautohint(
+            in_buffer=small_font, **variants[i % len(variants)]
+        )
+    )
+    for i, result in enumerate(results):
+        assert result == expected[i % len(variants)]
+    assert temp_dir.listdir() == []
+
+
+def test_failures(small_font, temp_dir):
+    def hint(i):
+        options = dict(in_buffer=small_font, control_buffer="66 left 1\n")
+        if i % 2:
+            # fails after the control instructions are written
+            options["out_format"] = "otf"
+        else:
+            # fails in the executable
+            options["control_buffer"] = "66 left 1,\n"
+        with pytest.raises((ValueError, ttfautohint.TAError)):
+            ttfautohint.ttfautohint(**options)
+
+    hammer(hint)
+    assert temp_dir.listdir() == []
+
+
+def test_shared_hinter(small_font, temp_dir):
+    with Hinter(control_buffer="66 left 1\n", no_info=True) as hinter:
+        expected = hinter.hint(small_font)
+        assert hammer(lambda i: hinter.hint(small_font)) == [expected] * THREADS
+    assert temp_dir.listdir() == []
@@ -0,0 +1,97 @@
+import os
+from io import BytesIO
+
+from fontTools.ttLib import TTFont
+
+from ttfautohint import TAError, ttfautohint, ttfautohint_ttfont
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture
+def font():
+    return TTFont(FONT)
+
+
+def autohint_font(ttfont, **options):
+    buf = BytesIO()
+    ttfont.save(buf)
+    data = ttfautohint(in_buffer=buf.getvalue(), **options)
+    return TTFont(BytesIO(data))
+
+
+def test_same_as_round_trip(font):
+    expected = autohint_font(TTFont(FONT))
+    tags = ttfautohint_ttfont(font)
+    assert tags == [
+        "cvt ",
+        "fpgm",
+        "gasp",
+        "glyf",
+        "head",
+        "loca",
+        "maxp",
+        "name",
+        "prep",
+    ]
+    tags.remove("head")  # the modification time is set when saving
+    for tag in tags:
+        assert font.getTableData(tag) == expected.getTableData(tag)
+    assert font["glyf"]["a"].program
+    assert sorted(font.keys()) == sorted(expected.keys())
+
+
+def test_only_changed_tables_replaced(font):
+    cmap = font["cmap"]
+    font["glyf"]
+    ttfautohint_ttfont(font)
+    assert font["cmap"] is cmap
+    # replaced tables are decompiled on access
+    assert not font.isLoaded("glyf")
+    assert font.isLoaded("cmap")
+
+
+def test_save(font, tmpdir):
+    ttfautohint_ttfont(font, no_info=True)
+    for reorder in (True, False):
+        path = str(tmpdir / f"{reorder}.ttf")
+        font.save(path, reorderTables=reorder)
+        hinted = TTFont(path)
+        assert "fpgm" in hinted
+        assert hinted["glyf"]["a"].program
+
+
+def test_hint_twice(font):
+    ttfautohint_ttfont(font)
+    glyf = font.getTableData("glyf")
+    # fonts already processed by ttfautohint are returned unchanged
+    assert ttfautohint_ttfont(font) == ["head"]
+    assert font.getTableData("glyf") == glyf
+
+
+def test_flavor_kept(font):
+    font.flavor = "woff"
+    ttfautohint_ttfont(font)
+    assert font.flavor == "woff"
+
+
+def test_error_leaves_font_unchanged(font):
+    with pytest.raises(TAError):
+        ttfautohint_ttfont(font, control_buffer=b"bogus")
+    assert "fpgm" not in font
+    assert not font["glyf"]["a"].program
+
+
+@pytest.mark.parametrize("name", ["in_buffer", "out_file", "out_format"])
+def test_reserved_options(font, name):
+    with pytest.raises(TypeError, match=name):
+        ttfautohint_ttfont(font, **{name: None})
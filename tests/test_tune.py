@@ -0,0 +1,92 @@
+import os
+
+from ttfautohint._sfnt import table_sizes
+from ttfautohint.tune import (
+    TuningReport,
+    TuningResult,
+    grid,
+    hint_set_count,
+    sample,
+    tune,
+)
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+def test_grid():
+    configs = grid({"hinting_range_max": [20, 30], "hint_composites": [False, True]})
+    assert len(configs) == 4
+    assert {"hinting_range_max": 30, "hint_composites": True} in configs
+    with pytest.raises(ValueError, match="not a tunable option: 'in_file'"):
+        grid({"in_file": ["a.ttf"]})
+
+
+def test_sample():
+    space = {"hinting_range_max": list(range(10, 50))}
+    assert sample(space, 5, seed=1) == sample(space, 5, seed=1)
+    assert len(sample(space, 5)) == 5
+    assert len(sample(space, 100)) == 40
+
+
+def test_hint_set_count():
+    assert hint_set_count({}) == 43
+    assert hint_set_count({"hinting_range_max": 20, "hint_composites": True}) == 26
+
+
+def result(size, time, coverage, **options):
+    return TuningResult(options, size, time, {}, coverage, False, None)
+
+
+def test_pareto_and_best():
+    a = result(100, 1.0, 10, hinting_range_max=17)
+    b = result(200, 2.0, 20, hinting_range_max=27)
+    c = result(250, 2.5, 15, hinting_range_max=22)  # dominated by b
+    pruned = TuningResult({}, None, 5.0, None, 5, True, None)
+    report = TuningReport([a, b, c, pruned], {"no_info": True})
+    assert report.pareto == [a, b]
+    assert report.best() == {"no_info": True, "hinting_range_max": 27}
+    assert report.best(max_size=150) == {"no_info": True, "hinting_range_max": 17}
+    with pytest.raises(ValueError, match="no configuration"):
+        report.best(max_size=10)
+    assert "pruned" in report.format()
+
+
+def test_tune():
+    report = tune(
+        FONT,
+        space={"hinting_range_max": [12, 30], "hinting_range_min": [8, 20]},
+        jobs=2,
+        prune_factor=None,
+        no_info=True,
+    )
+    # the combination with min > max is skipped
+    assert len(report.results) == 3
+    for r in report.completed:
+        assert sum(r.tables.values()) < r.size
+        assert "fpgm" in r.tables
+    best = report.best()
+    assert best["no_info"] is True
+    assert best["hinting_range_max"] == 30
+
+
+def test_tune_prune():
+    # everything slower than a millionth of the first run is pruned
+    report = tune(
+        FONT,
+        configs=[{"hinting_range_max": 50}, {"hinting_range_max": 12}],
+        jobs=1,
+        prune_factor=1e-6,
+    )
+    assert [r.pruned for r in report.results] == [False, True]
+
+
+def test_table_sizes():
+    with open(FONT, "rb") as f:
+        data = f.read()
+    sizes = table_sizes(data)
+    assert "glyf" in sizes
+    assert "fpgm" not in sizes
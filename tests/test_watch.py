@@ -0,0 +1,158 @@
+import os
+import shutil
+import sys
+import threading
+import time
+
+import pytest
+
+from ttfautohint import ttfautohint
+from ttfautohint.cli import _file_options, _has_wrapper_flags, _wrapper_parser
+from ttfautohint.errors import InvalidFontError
+from ttfautohint.journal import JobJournal
+from ttfautohint.watch import JOURNAL_NAME, InotifyBackend, PollingBackend, Watcher
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(autouse=True)
+def source_date_epoch(monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+
+
+@pytest.fixture
+def src(tmp_path):
+    d = tmp_path / "src"
+    d.mkdir()
+    return d
+
+
+@pytest.fixture
+def out(tmp_path):
+    return tmp_path / "out"
+
+
+def wait_for(predicate, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestWatcher(object):
+    def test_output_path(self, tmp_path, out):
+        a = tmp_path / "a"
+        b = tmp_path / "b"
+        a.mkdir()
+        b.mkdir()
+        with Watcher([str(a)], str(out), use_inotify=False) as watcher:
+            path = str(a / "sub" / "font.ttf")
+            assert watcher.output_path(path) == str(out / "sub" / "font.ttf")
+        with Watcher([str(a), str(b)], str(out), use_inotify=False) as watcher:
+            path = str(b / "font.ttf")
+            assert watcher.output_path(path) == str(out / "b" / "font.ttf")
+
+    def test_output_dir_inside_source(self, src):
+        with pytest.raises(ValueError, match="must not be inside"):
+            Watcher([str(src)], str(src / "hinted"))
+
+    def test_hint_reuses_unchanged(self, src, out):
+        font = src / "font.ttf"
+        shutil.copy(FONT, str(font))
+        with Watcher([str(src)], str(out), use_inotify=False) as watcher:
+            assert watcher.hint(str(font)) is True
+            hinted = out / "font.ttf"
+            assert hinted.stat().st_size > 0
+            # same content: nothing to do
+            os.utime(str(font))
+            assert watcher.hint(str(font)) is False
+            # output was removed: hint again
+            hinted.unlink()
+            assert watcher.hint(str(font)) is True
+
+    def test_hint_after_restart(self, src, out):
+        font = src / "font.ttf"
+        shutil.copy(FONT, str(font))
+        with Watcher([str(src)], str(out), use_inotify=False) as watcher:
+            assert watcher.hint(str(font)) is True
+        assert (out / JOURNAL_NAME).exists()
+        # the journal of the previous run is reused
+        with Watcher([str(src)], str(out), use_inotify=False) as watcher:
+            assert watcher.hint(str(font)) is False
+        # unless the options changed
+        with Watcher([str(src)], str(out), use_inotify=False, no_info=True) as watcher:
+            assert watcher.hint(str(font)) is True
+            assert (out / "font.ttf").read_bytes() == ttfautohint(
+                in_file=FONT, no_info=True
+            )
+
+    def test_hint_invalid_font(self, src, out):
+        font = src / "font.ttf"
+        font.write_bytes(b"\0\1\0\0garbage")
+        with Watcher([str(src)], str(out), use_inotify=False) as watcher:
+            # checked before running the executable
+            with pytest.raises(InvalidFontError):
+                watcher.hint(str(font))
+            assert not (out / "font.ttf").exists()
+            (entry,) = JobJournal(str(out / JOURNAL_NAME)).entries().values()
+            assert entry["status"] == "failed"
+            # failed fonts are hinted again
+            with pytest.raises(InvalidFontError):
+                watcher.hint(str(font))
+
+    @pytest.mark.parametrize(
+        "use_inotify",
+        [
+            False,
+            pytest.param(
+                True,
+                marks=pytest.mark.skipif(
+                    not sys.platform.startswith("linux"), reason="only for linux"
+                ),
+            ),
+        ],
+        ids=["polling", "inotify"],
+    )
+    def test_run(self, src, out, use_inotify):
+        watcher = Watcher(
+            [str(src)],
+            str(out),
+            args=["--no-info"],
+            jobs=2,
+            debounce=0.1,
+            poll_interval=0.1,
+            use_inotify=use_inotify,
+        )
+        backend = InotifyBackend if use_inotify else PollingBackend
+        assert isinstance(watcher._backend, backend)
+        stop = threading.Event()
+        thread = threading.Thread(target=watcher.run, args=(stop,))
+        thread.start()
+        try:
+            (src / "sub").mkdir()
+            shutil.copy(FONT, str(src / "sub" / "font.ttf"))
+            assert wait_for(lambda: (out / "sub" / "font.ttf").exists())
+        finally:
+            stop.set()
+            thread.join()
+            watcher.close()
+
+
+def test_wrapper_args():
+    assert not _has_wrapper_flags(["-l", "8", "in.ttf", "out.ttf"])
+    args = ["-l", "8", "--watch", "a", "--watch=b", "--output-dir", "o", "-G", "0"]
+    assert _has_wrapper_flags(args)
+    options, rest = _wrapper_parser().parse_known_args(args)
+    assert options.watch == ["a", "b"]
+    assert options.output_dir == "o"
+    assert rest == ["-l", "8", "-G", "0"]
+
+
+def test_file_options():
+    options, rest = _file_options(["-m", "ctrl.txt", "-n", "--reference=ref.ttf"])
+    assert options == {"control_file": "ctrl.txt", "reference_file": "ref.ttf"}
+    assert rest == ["-n"]
@@ -0,0 +1,92 @@
+import os
+from io import BytesIO
+
+from fontTools.ttLib import TTCollection, TTFont
+
+from ttfautohint import Hinter, ttfautohint
+from ttfautohint._sfnt import SFNTError
+from ttfautohint._woff import encode_woff
+
+import pytest
+
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+FONT = os.path.join(DATA, "NotoSansMono-Regular.ttf")
+
+
+@pytest.fixture(scope="module", autouse=True)
+def source_date_epoch():
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+        yield
+
+
+@pytest.fixture
+def no_executable(monkeypatch, tmpdir):
+    # errors are raised without running the executable
+    monkeypatch.setattr("ttfautohint._exe_full_path", str(tmpdir / "missing"))
+
+
+@pytest.fixture(scope="module")
+def hinted():
+    return ttfautohint(in_file=FONT, hinting_range_max=20)
+
+
+def assert_same_tables(woff, sfnt):
+    font = TTFont(BytesIO(woff))
+    assert font.flavor == "woff"
+    expected = TTFont(BytesIO(sfnt))
+    assert sorted(font.reader.keys()) == sorted(expected.reader.keys())
+    for tag in expected.reader.keys():
+        assert font.reader[tag] == expected.reader[tag]
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_encode_woff(hinted, jobs):
+    woff = encode_woff(hinted, jobs=jobs)
+    assert woff[:4] == b"wOFF"
+    assert len(woff) < len(hinted)
+    assert_same_tables(woff, hinted)
+
+
+def test_encode_woff_collection(hinted):
+    collection = TTCollection()
+    collection.fonts = [TTFont(BytesIO(hinted)), TTFont(BytesIO(hinted))]
+    buf = BytesIO()
+    collection.save(buf)
+    with pytest.raises(SFNTError, match="collections"):
+        encode_woff(buf.getvalue())
+
+
+def test_collection_rejected_before_hinting(hinted, no_executable):
+    collection = TTCollection()
+    collection.fonts = [TTFont(BytesIO(hinted)), TTFont(BytesIO(hinted))]
+    buf = BytesIO()
+    collection.save(buf)
+    data = buf.getvalue()
+    for in_file, in_buffer in [(None, data), (BytesIO(data), None)]:
+        with pytest.raises(ValueError, match="collections can't be converted"):
+            ttfautohint(in_file=in_file, in_buffer=in_buffer, out_format="woff")
+    with Hinter(out_format="woff") as hinter:
+        with pytest.raises(ValueError, match="collections can't be converted"):
+            hinter.hint(data)
+
+
+def test_ttfautohint_woff(tmpdir, hinted):
+    woff = ttfautohint(in_file=FONT, hinting_range_max=20, out_format="woff")
+    assert woff == encode_woff(hinted)
+
+    out_file = tmpdir / "out.woff"
+    ttfautohint(
+        in_file=FONT, out_file=str(out_file), hinting_range_max=20, out_format="woff"
+    )
+    assert out_file.read_binary() == woff
+
+    with Hinter(hinting_range_max=20, out_format="woff") as hinter:
+        assert hinter.hint_file(FONT) == woff
+        assert hinter.config != Hinter(hinting_range_max=20).config
+
+
+def test_invalid_out_format():
+    with pytest.raises(ValueError, match="out_format must be one of"):
+        ttfautohint(in_file=FONT, out_format="woff2")